@@ -1,8 +1,6 @@
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
-import qrcode
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory
+from flask_socketio import SocketIO, join_room
 import io
-import base64
 import uuid
 import os
 import socket
@@ -10,12 +8,21 @@ import webbrowser
 import threading
 import time
 import sys
-import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
+from session_registry import open_session_store
+from network_interfaces import InterfaceMonitor
+from dependency_check import check_requirements_installed, install_requirements
+import telemetry
+from telemetry import logger
+from signaling import SignalingHandlers, JoinRoom, emit_count
+from ws_signaling import WebSocketSignaling
+from static_assets import StaticAssets
 
 # Load environment variables from .env file
 load_dotenv()
+# LOG_LEVEL=DEBUG shows per-connection events; repeated messages are rate-limited
+telemetry.configure_logging(os.environ.get('LOG_LEVEL', 'INFO'))
 try:
     import msvcrt  # Windows
 except ImportError:
@@ -27,15 +34,31 @@ app = Flask(__name__)
 # SECRET_KEY should be set via environment variable in production
 # Generate a secure key with: python -c "import secrets; print(secrets.token_hex(32))"
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(32).hex())
+# /static .js and .css are served minified and precompressed, with fingerprinted
+# URLs cached as immutable (see static_assets.py). ASSET_PIPELINE=0 turns it off.
+assets = StaticAssets()
+assets.init_app(app)
 # Increase ping timeout to prevent false disconnections during file picking
 # Extended timeout to allow users time to pick files from external apps (Drive, Gallery, etc.)
-socketio = SocketIO(
-    app, 
-    cors_allowed_origins="*", 
-    async_mode='threading',
-    ping_timeout=120,  # Increase timeout to 120 seconds (2 minutes) to allow file picking
-    ping_interval=30   # Send ping every 30 seconds to keep connection alive
-)
+# Shared with the asyncio server in asgi_app.py
+SOCKETIO_OPTIONS = {
+    'cors_allowed_origins': "*",
+    'ping_timeout': 120,  # Increase timeout to 120 seconds (2 minutes) to allow file picking
+    'ping_interval': 30   # Send ping every 30 seconds to keep connection alive
+}
+# Multi-worker scale-out: with REDIS_URL set, sessions live in Redis and
+# Socket.IO emits fan out to every worker through a Redis message queue
+REDIS_URL = os.environ.get('REDIS_URL', '')
+socketio = SocketIO(app, async_mode='threading', message_queue=REDIS_URL or None, **SOCKETIO_OPTIONS)
+
+# Server mode: 'threading' (Werkzeug, one thread per connection - default)
+# or 'asgi' (asyncio AsyncServer under uvicorn - see asgi_app.py)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'threading').lower()
+
+# Path of the built-in JSON WebSocket signaling endpoint (the signaling-server/server.js
+# protocol). Set SIGNALING_SERVER_URL=/ws to use it instead of Socket.IO or a separate
+# Node service. Empty disables it.
+WS_SIGNALING_PATH = os.environ.get('WS_SIGNALING_PATH', '/ws')
 
 # Get signaling server URL from environment variable (for cross-network P2P support)
 # Set this to your cloud signaling server URL, e.g., 'wss://your-signaling-server.koyeb.app'
@@ -44,11 +67,11 @@ socketio = SocketIO(
 _signaling_url_raw = os.environ.get('SIGNALING_SERVER_URL', '')
 # Note: SIGNALING_SERVER_URL must be set as environment variable for cross-network mode
 if _signaling_url_raw:
-    print("🌐 Using cloud signaling server - cross-network mode enabled")
+    logger.info("🌐 Using cloud signaling server - cross-network mode enabled")
 # Clean up if someone accidentally included the variable name in the value
 if 'SIGNALING_SERVER_URL=' in _signaling_url_raw:
     SIGNALING_SERVER_URL = _signaling_url_raw.split('SIGNALING_SERVER_URL=')[-1].strip()
-    print(f"⚠️  WARNING: SIGNALING_SERVER_URL contained variable name. Cleaned to: {SIGNALING_SERVER_URL}")
+    logger.warning("SIGNALING_SERVER_URL contained variable name. Cleaned to: %s", SIGNALING_SERVER_URL)
 else:
     SIGNALING_SERVER_URL = _signaling_url_raw
 
@@ -61,7 +84,7 @@ _public_url_raw = os.environ.get('PUBLIC_APP_URL', '')
 if _public_url_raw and not _public_url_raw.startswith('http://') and not _public_url_raw.startswith('https://'):
     if '.koyeb.app' in _public_url_raw or '.railway.app' in _public_url_raw or '.ngrok.io' in _public_url_raw:
         PUBLIC_APP_URL = 'https://' + _public_url_raw
-        print(f"⚠️  Added https:// prefix to PUBLIC_APP_URL: {PUBLIC_APP_URL}")
+        logger.warning("Added https:// prefix to PUBLIC_APP_URL: %s", PUBLIC_APP_URL)
     else:
         PUBLIC_APP_URL = _public_url_raw
 else:
@@ -71,89 +94,69 @@ else:
 TURN_USERNAME = os.environ.get('TURN_USERNAME', '')
 TURN_PASSWORD = os.environ.get('TURN_PASSWORD', '')
 
-# Store active sessions with timestamp for cleanup
-sessions = {}
+# Store active sessions; expired sessions are swept in the background
 SESSION_TIMEOUT = 120  # 2 minutes - cleanup sessions with no active users
+SESSION_REJOIN_GRACE = 60  # Keep a session this long after both peers drop, so they can rejoin and resume
 
-def cleanup_old_sessions():
-    """Remove sessions that haven't been active for SESSION_TIMEOUT seconds"""
-    import time
-    current_time = time.time()
-    to_delete = []
-    
-    for session_id, session in sessions.items():
-        # Check if session has been inactive (no connections) for too long
-        if 'created_at' in session:
-            age = current_time - session['created_at']
-            if age > SESSION_TIMEOUT and not session['pc_connected'] and not session['mobile_connected']:
-                to_delete.append(session_id)
-    
-    for session_id in to_delete:
-        del sessions[session_id]
-        print(f'Cleaned up old session: {session_id}')
-    
-    if to_delete:
-        print(f'Cleaned up {len(to_delete)} old sessions')
+def _log_expired_session(session_id):
+    logger.debug('Cleaned up old session: %s', session_id)
+
+sessions = open_session_store(REDIS_URL, timeout=SESSION_TIMEOUT, on_expire=_log_expired_session,
+                              rejoin_grace=SESSION_REJOIN_GRACE)
+telemetry.SESSIONS_ACTIVE.set_function(lambda: len(sessions))
+telemetry.SESSIONS_PAIRED.set_function(sessions.paired_count)
+
+# LAN addresses are discovered once and cached; a background thread refreshes
+# them only when network interfaces change (see network_interfaces.py)
+network = InterfaceMonitor()
 
 def get_local_ip():
-    """Get the local IP address of this machine - returns list of all non-loopback IPs"""
-    ips = []
-    try:
-        # Method 1: Connect to remote address to get primary interface IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        if ip and not ip.startswith("127."):
-            ips.append(ip)
-    except Exception:
-        pass
+    """Get the best LAN IP address of this machine (cached)"""
+    return network.primary()
+
+QR_MIN_SIZE = 400  # Minimum image size in pixels for phone cameras
+QR_BOX_SIZE = 15  # Pixels per module (larger modules scan more reliably)
+
+def render_qr_png(data):
+    """Render `data` as a 1-bit QR code PNG
+
+    The module matrix is scaled by an integer factor large enough to reach
+    QR_MIN_SIZE, and packed straight into bitmap rows - no drawing or
+    resampling pass. Not cached: every session has its own URL, and a
+    browser asking for the same image again is answered by ETag.
+    """
+    # Imported on first use - keeps qrcode/Pillow off the startup path
+    import qrcode
+    from PIL import Image
     
-    try:
-        # Method 2: Get all network interfaces (Windows/Linux compatible)
-        import platform
-        if platform.system() == 'Windows':
-            import subprocess
-            result = subprocess.run(['ipconfig'], capture_output=True, text=True, timeout=5)
-            for line in result.stdout.split('\n'):
-                if 'IPv4 Address' in line or 'IPv4' in line:
-                    parts = line.split(':')
-                    if len(parts) > 1:
-                        ip = parts[1].strip().split()[0]
-                        if ip and not ip.startswith("127.") and ip not in ips:
-                            ips.append(ip)
-        else:
-            # Linux/Mac - use netifaces if available, otherwise fallback
-            try:
-                import netifaces
-                for interface in netifaces.interfaces():
-                    addrs = netifaces.ifaddresses(interface)
-                    if netifaces.AF_INET in addrs:
-                        for addr_info in addrs[netifaces.AF_INET]:
-                            ip = addr_info.get('addr')
-                            if ip and not ip.startswith("127.") and ip not in ips:
-                                ips.append(ip)
-            except ImportError:
-                # Fallback: try hostname
-                hostname = socket.gethostname()
-                ip = socket.gethostbyname(hostname)
-                if ip and not ip.startswith("127.") and ip not in ips:
-                    ips.append(ip)
-    except Exception:
-        pass
+    start = time.perf_counter()
+    qr = qrcode.QRCode(
+        version=None,  # Auto-determine version based on data
+        error_correction=qrcode.constants.ERROR_CORRECT_H,  # High error correction (30%)
+        border=4,  # Border around QR code
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()  # Includes the border
     
-    # Fallback: try hostname IP
-    if not ips:
-        try:
-            hostname = socket.gethostname()
-            ip = socket.gethostbyname(hostname)
-            if ip and not ip.startswith("127."):
-                ips.append(ip)
-        except Exception:
-            pass
+    modules = len(matrix)
+    scale = max(QR_BOX_SIZE, -(-QR_MIN_SIZE // modules))
+    side = modules * scale
+    row_bytes = (side + 7) // 8
+    padding = row_bytes * 8 - side
+    
+    # In mode '1', a set bit is white; each module becomes `scale` bits wide and `scale` rows tall
+    white, black = '1' * scale, '0' * scale
+    packed = bytearray()
+    for row in matrix:
+        bits = ''.join(black if dark else white for dark in row) + '0' * padding
+        packed += int(bits, 2).to_bytes(row_bytes, 'big') * scale
     
-    # Return primary IP (first non-127.x.x.x IP found)
-    return ips[0] if ips else None
+    img = Image.frombytes('1', (side, side), bytes(packed))
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    telemetry.QR_RENDER_SECONDS.observe(time.perf_counter() - start)
+    return buffer.getvalue()
 
 @app.route('/')
 def index():
@@ -177,34 +180,52 @@ def debug():
     """Debug page for troubleshooting"""
     return render_template('debug.html')
 
+@app.route('/download-sw.js')
+def download_service_worker():
+    """Service worker that streams received files to disk (see static/js/stream-sink.js)
+
+    Served from the root so its scope covers /stream-download/.
+    """
+    response = send_from_directory(os.path.join(app.static_folder, 'js'), 'download-sw.js',
+                                   mimetype='application/javascript', max_age=0)
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
+
 @app.route('/api/health-check')
 def health_check():
     """Simple health check endpoint for mode switching"""
     return jsonify({'status': 'ok', 'mode': 'local'})
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (this worker's counters only)"""
+    return Response(telemetry.REGISTRY.render(), mimetype=None, content_type=telemetry.CONTENT_TYPE)
+
 @app.route('/api/generate-session', methods=['POST'])
 def generate_session():
     """Generate a new session and QR code"""
     session_id = str(uuid.uuid4())
+    candidate_urls = []
     
     # Get the base URL for QR code
     # Priority: PUBLIC_APP_URL > Railway URL (from request) > local IP
     if PUBLIC_APP_URL:
         # Use explicitly set public URL for cross-network access
         host_url = PUBLIC_APP_URL.rstrip('/') + '/'
-        print(f"Using PUBLIC_APP_URL for QR code: {host_url}")
+        logger.debug("Using PUBLIC_APP_URL for QR code: %s", host_url)
     elif request.host_url.startswith('https://') and ('.koyeb.app' in request.host_url or '.railway.app' in request.host_url):
         # Running on Cloud platform - use cloud URL
         host_url = request.host_url
-        print(f"Using cloud URL from request: {host_url}")
+        logger.debug("Using cloud URL from request: %s", host_url)
     elif '127.0.0.1' in request.host_url or 'localhost' in request.host_url:
         # Running locally - use local IP for LAN access
-        local_ip = get_local_ip()
-        if local_ip:
-            host_url = f"http://{local_ip}:5000/"
-            print(f"Using local IP for QR code: {host_url}")
-            print(f"⚠️  Make sure your phone is on the same WiFi network as this PC")
-            print(f"⚠️  If connection fails, check Windows Firewall allows port 5000")
+        local_ips = network.candidates()
+        if local_ips:
+            host_url = f"http://{local_ips[0]}:5000/"
+            # Other addresses the phone can try if the first one is unreachable
+            candidate_urls = [f"http://{ip}:5000/mobile?session={session_id}" for ip in local_ips]
+            logger.info("Using local IP for QR code: %s - make sure your phone is on the same "
+                        "WiFi network and the firewall allows port 5000", host_url)
         else:
             # If we can't get IP, show a message (handled in frontend)
             return jsonify({
@@ -213,182 +234,166 @@ def generate_session():
     else:
         # Use the request host URL (might be a public URL already)
         host_url = request.host_url
-        print(f"Using request host URL for QR code: {host_url}")
+        logger.debug("Using request host URL for QR code: %s", host_url)
     
     # Create QR code with session URL
     qr_url = f"{host_url}mobile?session={session_id}"
     
-    # Generate QR code with higher quality settings for better phone scanning
-    qr = qrcode.QRCode(
-        version=None,  # Auto-determine version based on data
-        error_correction=qrcode.constants.ERROR_CORRECT_H,  # High error correction (30%)
-        box_size=15,  # Larger box size for better scanning (increased from 12)
-        border=4,  # Border around QR code
-    )
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    
-    # Create image with higher DPI for better quality
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Resize image to ensure minimum size for phone cameras (at least 300x300px)
-    from PIL import Image
-    min_size = 400  # Minimum size in pixels
-    if img.size[0] < min_size or img.size[1] < min_size:
-        # Calculate scale factor to reach minimum size
-        scale = max(min_size / img.size[0], min_size / img.size[1])
-        new_size = (int(img.size[0] * scale), int(img.size[1] * scale))
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    qr_code_data = base64.b64encode(buffer.getvalue()).decode()
-    
-    import time
-    sessions[session_id] = {
-        'pc_connected': False,
-        'mobile_connected': False,
-        'pc_sid': None,
-        'mobile_sid': None,
-        'created_at': time.time()
-    }
-    
-    # Clean up old sessions periodically (every 10th session creation)
-    if len(sessions) % 10 == 0:
-        cleanup_old_sessions()
+    sessions.create(session_id, qr_url=qr_url)
+    telemetry.SESSIONS_CREATED.inc()
     
     return jsonify({
         'session_id': session_id,
-        'qr_code': qr_code_data,
-        'qr_url': qr_url  # Return URL for display
+        'qr_image_url': f'/api/qr/{session_id}',  # PNG served separately so the browser can cache it
+        'qr_url': qr_url,  # Return URL for display
+        'candidate_urls': candidate_urls  # Ranked LAN alternatives (LAN mode only)
     })
 
+@app.route('/api/qr/<session_id>')
+def qr_image(session_id):
+    """Serve the QR code PNG for a session"""
+    session = sessions.get(session_id)
+    if session is None or not session.get('qr_url'):
+        return jsonify({'error': 'Session not found'}), 404
+    
+    # The image for a session never changes - let the browser revalidate by ETag
+    etag = f'"{session_id}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    
+    return Response(render_qr_png(session['qr_url']), mimetype='image/png', headers={
+        'ETag': etag,
+        'Cache-Control': f'private, max-age={SESSION_TIMEOUT}, immutable'
+    })
+
+signaling = SignalingHandlers(sessions)
+
+def run_actions(actions):
+    """Perform signaling actions on the Flask-SocketIO server"""
+    for action in actions:
+        if isinstance(action, JoinRoom):
+            join_room(action.room, sid=action.sid)
+        else:
+            socketio.emit(action.event, action.data, to=action.to, skip_sid=action.skip_sid)
+
+def dispatch(event, *args):
+    """Run a signaling handler and its actions, recording latency and fan-out"""
+    start = time.perf_counter()
+    actions = getattr(signaling, event)(request.sid, *args)
+    run_actions(actions)
+    telemetry.observe_event(event, emit_count(actions), time.perf_counter() - start)
+
 @socketio.on('connect')
 def handle_connect():
-    print(f'Client connected: {request.sid}')
+    telemetry.CONNECTS.inc()
+    dispatch('connect')
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f'Client disconnected: {request.sid}')
-    # Clean up session if client disconnects
-    sessions_to_delete = []
-    for session_id, session in list(sessions.items()):  # Use list() to avoid runtime modification issues
-        if session['pc_sid'] == request.sid:
-            session['pc_connected'] = False
-            session['pc_sid'] = None
-            socketio.emit('pc_disconnected', room=session['mobile_sid'])
-            # If both peers are now disconnected, mark for deletion
-            if not session['mobile_connected']:
-                sessions_to_delete.append(session_id)
-        elif session['mobile_sid'] == request.sid:
-            session['mobile_connected'] = False
-            session['mobile_sid'] = None
-            socketio.emit('mobile_disconnected', room=session['pc_sid'])
-            # If both peers are now disconnected, mark for deletion
-            if not session['pc_connected']:
-                sessions_to_delete.append(session_id)
-    
-    # Delete sessions where both peers have disconnected
-    for session_id in sessions_to_delete:
-        del sessions[session_id]
-        print(f'Deleted session {session_id} - both peers disconnected')
+    telemetry.DISCONNECTS.inc()
+    dispatch('disconnect')
 
 @socketio.on('pc_join')
 def handle_pc_join(data):
-    session_id = data.get('session_id')
-    if session_id in sessions:
-        join_room(session_id)
-        sessions[session_id]['pc_connected'] = True
-        sessions[session_id]['pc_sid'] = request.sid
-        emit('pc_ready', {'session_id': session_id})
-        
-        # If mobile is already connected, notify both
-        if sessions[session_id]['mobile_connected']:
-            emit('peer_connected', room=session_id)
+    dispatch('pc_join', data)
 
 @socketio.on('mobile_join')
 def handle_mobile_join(data):
-    session_id = data.get('session_id')
-    print(f'Mobile join request for session: {session_id}')
-    
-    if not session_id:
-        print('No session_id provided')
-        emit('error', {'message': 'No session ID provided'})
-        return
-    
-    if session_id not in sessions:
-        print(f'Session {session_id} not found')
-        emit('error', {'message': 'Session not found. Please scan the QR code again.'})
-        return
-    
-    join_room(session_id)
-    sessions[session_id]['mobile_connected'] = True
-    sessions[session_id]['mobile_sid'] = request.sid
-    emit('mobile_ready', {'session_id': session_id})
-    print(f'Mobile connected to session {session_id}')
-    
-    # If PC is already connected, notify both
-    if sessions[session_id]['pc_connected']:
-        print(f'PC already connected, notifying both peers')
-        emit('peer_connected', room=session_id)
+    dispatch('mobile_join', data)
 
 @socketio.on('webrtc_offer')
 def handle_webrtc_offer(data):
     """Forward WebRTC offer to the other peer"""
-    session_id = data.get('session_id')
-    offer = data.get('offer')
-    socketio.emit('webrtc_offer', {'offer': offer}, room=session_id, include_self=False)
+    dispatch('webrtc_offer', data)
 
 @socketio.on('webrtc_answer')
 def handle_webrtc_answer(data):
     """Forward WebRTC answer to the other peer"""
-    session_id = data.get('session_id')
-    answer = data.get('answer')
-    socketio.emit('webrtc_answer', {'answer': answer}, room=session_id, include_self=False)
+    dispatch('webrtc_answer', data)
 
 @socketio.on('ice_candidate')
 def handle_ice_candidate(data):
     """Forward ICE candidate to the other peer"""
-    session_id = data.get('session_id')
-    candidate = data.get('candidate')
-    socketio.emit('ice_candidate', {'candidate': candidate}, room=session_id, include_self=False)
+    dispatch('ice_candidate', data)
+
+@socketio.on('ice_candidates')
+def handle_ice_candidates(data):
+    """Forward a batch of ICE candidates to the other peer"""
+    dispatch('ice_candidates', data)
+
+ws_signaling = WebSocketSignaling(signaling)
+_ws_connections = {}  # sid -> (simple_websocket.Server, send lock)
+
+def _ws_deliver(deliveries):
+    """Send JSON WebSocket messages; peers that went away are skipped"""
+    from simple_websocket import ConnectionClosed
+    for sid, text in deliveries:
+        connection = _ws_connections.get(sid)
+        if connection is None:
+            continue
+        ws, send_lock = connection
+        try:
+            with send_lock:
+                ws.send(text)
+        except (ConnectionClosed, OSError):
+            pass
+
+def ws_signaling_endpoint():
+    """JSON WebSocket signaling on the threading server (one thread per socket)"""
+    # simple-websocket ships with python-engineio, which Flask-SocketIO already needs
+    from simple_websocket import Server, ConnectionClosed
+    ws = Server.accept(request.environ)
+    sid = ws_signaling.open()
+    _ws_connections[sid] = (ws, threading.Lock())
+    try:
+        while True:
+            text = ws.receive()
+            if text is not None:
+                _ws_deliver(ws_signaling.receive(sid, text))
+    except ConnectionClosed:
+        pass
+    finally:
+        _ws_connections.pop(sid, None)
+        _ws_deliver(ws_signaling.close(sid))
+
+    class _Closed(Response):
+        def __call__(self, *args, **kwargs):
+            # The socket now belongs to the WebSocket; tell Werkzeug not to write a response
+            raise ConnectionError()
+
+    return _Closed()
+
+if WS_SIGNALING_PATH:
+    app.add_url_rule(WS_SIGNALING_PATH, 'ws_signaling', ws_signaling_endpoint, websocket=True)
 
 def open_browser():
-    """Open the browser after a short delay to allow the server to start"""
-    time.sleep(1.5)  # Wait for server to start
+    """Open the browser as soon as the server accepts connections"""
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', 5000), timeout=0.5):
+                break
+        except OSError:
+            time.sleep(0.1)
     webbrowser.open('http://127.0.0.1:5000')
 
-def check_requirements_installed():
-    """Check if requirements are already installed"""
-    try:
-        import flask
-        import flask_socketio
-        import qrcode
-        import Pillow
-        return True
-    except ImportError:
-        return False
-
-def install_requirements():
-    """Install requirements from requirements.txt"""
-    print("Installing requirements...")
-    script_dir = Path(__file__).parent.absolute()
-    requirements_file = script_dir / "requirements.txt"
-    
-    if not requirements_file.exists():
-        print(f"Error: requirements.txt not found at {requirements_file}")
-        return False
-    
-    try:
-        subprocess.check_call([
-            sys.executable, "-m", "pip", "install", "-r", str(requirements_file)
-        ])
-        print("Requirements installed successfully!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error installing requirements: {e}")
-        return False
+def run_server(port, debug=False):
+    """Run the app in the configured SERVER_MODE"""
+    if SERVER_MODE == 'asgi':
+        try:
+            import uvicorn
+        except ImportError:
+            print("SERVER_MODE=asgi needs extra packages. Install them with:")
+            print(f"  pip install -r {Path(__file__).parent / 'requirements-asgi.txt'}")
+            sys.exit(1)
+        print("Server mode: asgi (asyncio)")
+        # asgi_app imports this module as `app`. Started as `python app.py` it is __main__,
+        # and importing it again would build a second copy of every module-level object
+        sys.modules.setdefault('app', sys.modules[__name__])
+        from asgi_app import application
+        uvicorn.run(application, host='0.0.0.0', port=port, log_level='warning')
+    else:
+        socketio.run(app, host='0.0.0.0', port=port, debug=debug, allow_unsafe_werkzeug=True)
 
 if __name__ == '__main__':
     # If running on Cloud (Koyeb, Railway, etc.), PORT will be set - just run normally
@@ -399,7 +404,7 @@ if __name__ == '__main__':
         print("="*50)
         print(f"Running on Cloud Platform - Port: {port}")
         print("="*50 + "\n")
-        socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
+        run_server(port)
     else:
         # Running locally - prompt for mode selection
         print("=" * 50)
@@ -430,6 +435,7 @@ if __name__ == '__main__':
             
             choice = None
             user_input = []
+            input_received = threading.Event()
             
             def get_input():
                 """Get user input in a separate thread"""
@@ -437,6 +443,7 @@ if __name__ == '__main__':
                     # Wait for user input
                     result = input()
                     user_input.append(result.strip())
+                    input_received.set()
                 except (EOFError, KeyboardInterrupt):
                     pass
             
@@ -450,12 +457,14 @@ if __name__ == '__main__':
                     choice = user_input[0]
                     break
                 print(f"   {remaining}...", end='', flush=True)
-                time.sleep(1)
+                input_received.wait(1)  # Returns as soon as Enter is pressed
                 if remaining > 1:
                     print('\r' + ' ' * 20 + '\r', end='', flush=True)
             
             # Clear the countdown line
             print('\r' + ' ' * 20 + '\r', end='', flush=True)
+            if choice is None and user_input:
+                choice = user_input[0]  # Enter pressed during the last second
             
             # If no input received, auto-select Cross-Network Mode
             if choice is None or choice == '':
@@ -505,6 +514,10 @@ if __name__ == '__main__':
             # Open browser in a separate thread
             threading.Thread(target=open_browser, daemon=True).start()
         
+        # Discover LAN addresses now so the first QR request doesn't pay for it
+        network.start()
+        print(f"LAN addresses: {', '.join(network.candidates()) or 'none found'}")
+        
         # Debug mode only for local development
         debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
         
@@ -515,5 +528,5 @@ if __name__ == '__main__':
         print(f"Access at: http://127.0.0.1:{port}")
         print("="*50 + "\n")
         
-        socketio.run(app, host='0.0.0.0', port=port, debug=debug_mode, allow_unsafe_werkzeug=True)
+        run_server(port, debug=debug_mode)
 
@@ -0,0 +1,128 @@
+"""
+ASGI entry point for QR File Share
+Runs the same signaling handlers on python-socketio's AsyncServer, so every
+idle Socket.IO connection costs a coroutine instead of an OS thread.
+Flask routes are served through an ASGI -> WSGI adapter.
+
+Start with SERVER_MODE=asgi python app.py, or directly:
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+Requires the extra packages in requirements-asgi.txt.
+"""
+
+import asyncio
+import time
+
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+
+import telemetry
+from app import app, signaling, ws_signaling, SOCKETIO_OPTIONS, REDIS_URL, WS_SIGNALING_PATH
+from signaling import JoinRoom, emit_count
+
+# With REDIS_URL set, emits reach clients connected to any worker
+client_manager = socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+sio = socketio.AsyncServer(async_mode='asgi', client_manager=client_manager, **SOCKETIO_OPTIONS)
+
+
+async def run_actions(actions):
+    """Perform signaling actions on the asyncio server"""
+    for action in actions:
+        if isinstance(action, JoinRoom):
+            await sio.enter_room(action.sid, action.room)
+        else:
+            await sio.emit(action.event, action.data, to=action.to, skip_sid=action.skip_sid)
+
+
+async def call_store(func, *args):
+    """Call a signaling function that uses the session store
+
+    A store that blocks on I/O (Redis) is called in a worker thread, so its
+    round trips never stall the other connections on the event loop.
+    """
+    if signaling.sessions.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+_sid_locks = {}  # sid -> asyncio.Lock: one connection's events run in the order they came
+
+
+async def dispatch(event, sid, *args):
+    """Run a signaling handler and its actions, recording latency and fan-out"""
+    lock = _sid_locks.setdefault(sid, asyncio.Lock())
+    async with lock:
+        start = time.perf_counter()
+        actions = await call_store(getattr(signaling, event), sid, *args)
+        await run_actions(actions)
+        telemetry.observe_event(event, emit_count(actions), time.perf_counter() - start)
+
+
+@sio.event
+async def connect(sid, environ):
+    telemetry.CONNECTS.inc()
+    await dispatch('connect', sid)
+
+
+@sio.event
+async def disconnect(sid):
+    telemetry.DISCONNECTS.inc()
+    try:
+        await dispatch('disconnect', sid)
+    finally:
+        _sid_locks.pop(sid, None)
+
+
+def _register(event):
+    async def handler(sid, data):
+        await dispatch(event, sid, data or {})
+    sio.on(event, handler)
+
+
+for _event in signaling.EVENTS:
+    _register(_event)
+
+# Socket.IO traffic goes to the AsyncServer; everything else to Flask
+socketio_app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(app))
+_ws_senders = {}  # sid -> ASGI send callable of that JSON WebSocket connection
+
+
+async def ws_deliver(deliveries):
+    """Send JSON WebSocket messages; peers that went away are skipped"""
+    for sid, text in deliveries:
+        send = _ws_senders.get(sid)
+        if send is not None:
+            try:
+                await send({'type': 'websocket.send', 'text': text})
+            except (OSError, RuntimeError):
+                pass  # Closed while we were sending
+
+
+async def ws_signaling_endpoint(scope, receive, send):
+    """JSON WebSocket signaling (see ws_signaling.py) as a plain ASGI app"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    sid = await call_store(ws_signaling.open)
+    _ws_senders[sid] = send
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            text = message.get('text')
+            if text is None and message.get('bytes') is not None:
+                text = message['bytes'].decode('utf-8', 'replace')
+            if text is None:
+                continue  # A frame with no payload at all
+            await ws_deliver(await call_store(ws_signaling.receive, sid, text))
+    finally:
+        _ws_senders.pop(sid, None)
+        await ws_deliver(await call_store(ws_signaling.close, sid))
+
+
+async def application(scope, receive, send):
+    """Route the JSON WebSocket path to its endpoint, everything else to Socket.IO/Flask"""
+    if scope['type'] == 'websocket' and WS_SIGNALING_PATH and scope['path'] == WS_SIGNALING_PATH:
+        await ws_signaling_endpoint(scope, receive, send)
+    else:
+        await socketio_app(scope, receive, send)
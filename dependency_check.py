@@ -0,0 +1,92 @@
+"""
+Dependency check for the QR File Share launcher
+Standard library only, so it runs before any third-party import. A successful
+check is recorded in a stamp file keyed on the requirements.txt hash and the
+interpreter, so later launches skip the check entirely until either changes.
+
+    python dependency_check.py   # exit 0 if ready, otherwise install
+"""
+
+import hashlib
+import subprocess
+import sys
+from importlib import metadata
+from pathlib import Path
+
+ROOT = Path(__file__).parent.absolute()
+REQUIREMENTS_FILE = ROOT / "requirements.txt"
+STAMP_FILE = ROOT / ".requirements.ok"
+
+
+def requirements_hash():
+    """Hash of requirements.txt plus the interpreter it was checked against"""
+    digest = hashlib.sha256(REQUIREMENTS_FILE.read_bytes())
+    digest.update(sys.executable.encode())
+    digest.update(sys.version.encode())
+    return digest.hexdigest()
+
+
+def _pinned_requirements():
+    """Yield (distribution, version or None) for each line of requirements.txt"""
+    for line in REQUIREMENTS_FILE.read_text().splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('-'):
+            continue
+        name, _, version = line.partition('==')
+        yield name.strip(), version.strip() or None
+
+
+def _write_stamp():
+    try:
+        STAMP_FILE.write_text(requirements_hash())
+    except OSError:
+        pass  # Read-only install - just check again next time
+
+
+def check_requirements_installed():
+    """Check if requirements are already installed
+
+    Reads installed package metadata instead of importing the packages, and
+    caches a positive answer in STAMP_FILE.
+    """
+    try:
+        if STAMP_FILE.read_text().strip() == requirements_hash():
+            return True
+    except OSError:
+        pass
+
+    try:
+        for name, version in _pinned_requirements():
+            installed = metadata.version(name)
+            if version and installed != version:
+                return False
+    except (metadata.PackageNotFoundError, OSError):
+        return False
+    _write_stamp()
+    return True
+
+
+def install_requirements():
+    """Install requirements from requirements.txt"""
+    print("Installing requirements...")
+
+    if not REQUIREMENTS_FILE.exists():
+        print(f"Error: requirements.txt not found at {REQUIREMENTS_FILE}")
+        return False
+
+    try:
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install", "-r", str(REQUIREMENTS_FILE)
+        ])
+        print("Requirements installed successfully!")
+        _write_stamp()
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Error installing requirements: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    if check_requirements_installed():
+        sys.exit(0)
+    sys.exit(0 if install_requirements() else 1)
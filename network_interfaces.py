@@ -0,0 +1,232 @@
+"""
+LAN address discovery for QR File Share
+Finds this machine's IPv4 addresses once, ranks them by how likely a phone on
+the same network can reach them, and keeps the result cached. A background
+thread refreshes the cache only when the interfaces change: via a netlink
+subscription on Linux, by polling everywhere else.
+"""
+
+import ipaddress
+import logging
+import platform
+import socket
+import struct
+import threading
+import time
+
+# Interface name prefixes of virtual adapters (containers, VMs, VPNs) - a phone
+# can almost never reach these, so they rank last
+VIRTUAL_PREFIXES = ('docker', 'br-', 'veth', 'virbr', 'vbox', 'vmnet', 'vethernet',
+                    'tun', 'tap', 'utun', 'wg', 'zt', 'tailscale', 'lxc', 'cni', 'flannel')
+
+# Linux netlink: link, IPv4 address and IPv4 route change notifications
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+SIOCGIFADDR = 0x8915
+
+logger = logging.getLogger('qrfs.network')
+
+
+def default_route_ip():
+    """IPv4 address of the interface holding the default route
+
+    Connecting a UDP socket only performs a route lookup - no packet is sent.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def _windows_addresses():
+    import subprocess
+    result = subprocess.run(['ipconfig'], capture_output=True, text=True, timeout=5)
+    adapter = ''
+    for line in result.stdout.split('\n'):
+        if line and not line[0].isspace() and line.rstrip().endswith(':'):
+            # "Wireless LAN adapter Wi-Fi:" -> "Wi-Fi"
+            adapter = line.rstrip().rstrip(':').split(' adapter ')[-1]
+        elif 'IPv4' in line:
+            parts = line.split(':')
+            if len(parts) > 1 and parts[1].strip():
+                yield adapter, parts[1].strip().split()[0]
+
+
+def _netifaces_addresses():
+    import netifaces
+    for interface in netifaces.interfaces():
+        for addr_info in netifaces.ifaddresses(interface).get(netifaces.AF_INET, []):
+            if addr_info.get('addr'):
+                yield interface, addr_info['addr']
+
+
+def _ioctl_addresses():
+    """Primary IPv4 address of every interface via SIOCGIFADDR (Linux, stdlib only)"""
+    import fcntl
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _, name in socket.if_nameindex():
+            try:
+                packed = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', name[:15].encode()))
+            except OSError:
+                continue  # Interface has no IPv4 address
+            yield name, socket.inet_ntoa(packed[20:24])
+
+
+def _hostname_addresses():
+    for ip in socket.gethostbyname_ex(socket.gethostname())[2]:
+        yield '', ip
+
+
+def interface_addresses():
+    """List (interface, ip) pairs for every IPv4 address on this machine"""
+    system = platform.system()
+    if system == 'Windows':
+        sources = (_windows_addresses, _hostname_addresses)
+    elif system == 'Linux':
+        sources = (_netifaces_addresses, _ioctl_addresses, _hostname_addresses)
+    else:
+        sources = (_netifaces_addresses, _hostname_addresses)
+    for source in sources:
+        try:
+            found = list(source())
+        except (ImportError, OSError, ValueError):
+            continue
+        if found:
+            return found
+    return []
+
+
+def _usable_ipv4(ip):
+    """The IPv4Address of `ip`, or None if it does not parse or is loopback"""
+    try:
+        addr = ipaddress.IPv4Address(ip)
+    except ValueError:
+        return None  # An IPv6 address, or an odd line from ipconfig
+    return None if addr.is_loopback else addr
+
+
+def rank_key(interface, addr, primary):
+    """Sort key for a parsed address: lower means more likely reachable from a phone on the LAN"""
+    name = interface.lower()
+    if addr.is_private and addr in ipaddress.IPv4Network('192.168.0.0/16'):
+        network_class = 0  # Home / office Wi-Fi
+    elif addr.is_private and addr in ipaddress.IPv4Network('10.0.0.0/8'):
+        network_class = 1
+    elif addr.is_private and addr in ipaddress.IPv4Network('172.16.0.0/12'):
+        network_class = 2  # Often container bridges
+    else:
+        network_class = 3
+    return (
+        str(addr) != primary,
+        name.startswith(VIRTUAL_PREFIXES),
+        addr.is_link_local,
+        network_class,
+    )
+
+
+def discover():
+    """Return this machine's LAN IPv4 addresses, best candidate first"""
+    primary = default_route_ip()
+    found = interface_addresses()
+    if primary and primary not in (ip for _, ip in found):
+        found.insert(0, ('', primary))
+    # Parse once, dropping what cannot be used, so one bad address cannot fail the ranking
+    valid = []
+    for interface, ip in found:
+        addr = _usable_ipv4(ip)
+        if addr is not None:
+            valid.append((interface, addr))
+    ranked, seen = [], set()
+    for interface, addr in sorted(valid, key=lambda item: rank_key(*item, primary)):
+        ip = str(addr)
+        if ip not in seen:
+            seen.add(ip)
+            ranked.append(ip)
+    return tuple(ranked)
+
+
+class InterfaceMonitor:
+    """Cached, ranked LAN addresses, refreshed only when interfaces change
+
+    candidates() never does I/O once the first discovery has run, so it is
+    safe to call on every request.
+    """
+
+    def __init__(self, poll_interval=30, debounce=0.5, log=logger):
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.log = log
+        self._candidates = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def candidates(self):
+        """Ranked IPv4 addresses (tuple, possibly empty)"""
+        candidates = self._candidates
+        if candidates is None:
+            # First use before start() - discover inline once
+            self.start()
+            candidates = self._candidates
+        return candidates
+
+    def primary(self):
+        """Best single address, or None"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else None
+
+    def refresh(self):
+        """Re-run discovery; returns True if the candidate list changed"""
+        candidates = discover()
+        changed = self._candidates is not None and candidates != self._candidates
+        self._candidates = candidates
+        if changed:
+            self.log.info('Network change detected - LAN addresses: %s', ', '.join(candidates) or 'none')
+        return changed
+
+    def start(self):
+        """Discover now and start the background watcher (idempotent)"""
+        with self._lock:
+            if self._candidates is None:
+                self.refresh()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name='interface-monitor', daemon=True)
+                self._thread.start()
+
+    def _netlink_socket(self):
+        if not hasattr(socket, 'AF_NETLINK'):
+            return None
+        try:
+            s = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0)  # NETLINK_ROUTE
+            s.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE))
+            return s
+        except OSError:
+            return None
+
+    def _watch(self):
+        netlink = self._netlink_socket()
+        if netlink is None:
+            while True:
+                time.sleep(self.poll_interval)
+                self._safe_refresh()
+        with netlink:
+            while True:
+                netlink.recv(65536)
+                # Changes arrive in bursts (link up, address, routes) - settle, drain, refresh once
+                time.sleep(self.debounce)
+                netlink.setblocking(False)
+                try:
+                    while netlink.recv(65536):
+                        pass
+                except (BlockingIOError, InterruptedError):
+                    pass
+                netlink.setblocking(True)
+                self._safe_refresh()
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            self.log.exception('Network discovery failed')
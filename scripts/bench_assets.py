@@ -0,0 +1,137 @@
+"""
+Benchmark: time until /mobile is interactive on a throttled phone link,
+with the static asset pipeline (static_assets.py) off and on
+
+Fetches the page and its same-origin stylesheet and scripts through the Flask
+test client, as a browser would (Accept-Encoding: gzip, deflate, br), for a
+first visit and a repeat visit with the first visit's responses cached
+(revalidated with If-None-Match / If-Modified-Since unless still fresh).
+The bytes each response took are then replayed over a model of the link:
+  - one round trip to connect and one per request
+  - up to 6 connections, each new one costing a connect round trip
+  - the bandwidth shared evenly by the responses in flight
+Every asset on these pages is render-blocking (stylesheet and classic
+scripts), so the page is interactive once the last one is in. Script parse
+and run time, and the CDN scripts (Socket.IO, qr-scanner), are the same in
+both modes and left out.
+
+Run from the repository root:
+    python scripts/bench_assets.py
+    python scripts/bench_assets.py --page / --profile slow-3g
+
+Prints one JSON object per profile, mode and visit.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as qr_app  # noqa: E402
+
+qr_app.logger.setLevel(logging.WARNING)  # Silence per-request logging
+
+# Round trip (ms) and downlink (kbit/s): Lighthouse's mobile throttling, and Chrome's "Slow 3G"
+PROFILES = {
+    'slow-4g': (150, 1638),
+    'slow-3g': (400, 400),
+}
+HEADER_BYTES = 300  # Status line and headers of a response
+CONNECTIONS = 6  # Per origin, HTTP/1.1
+STEP = 0.001  # Simulation step, seconds
+ASSET_URL = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+BROWSER_HEADERS = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def is_fresh(response):
+    cache_control = response.headers.get('Cache-Control', '')
+    return 'immutable' in cache_control or re.search(r'max-age=[1-9]', cache_control) is not None
+
+
+def visit(client, page, cache):
+    """Fetch `page` and its assets; returns [bytes of each response, page first]
+
+    `cache` maps asset URL -> its last 200 response and is updated in place;
+    fresh entries are not requested at all.
+    """
+    html = client.get(page, headers=BROWSER_HEADERS)
+    sizes = [len(html.data) + HEADER_BYTES]
+    for url in ASSET_URL.findall(html.get_data(as_text=True)):
+        cached = cache.get(url)
+        if cached is not None and is_fresh(cached):
+            continue
+        headers = dict(BROWSER_HEADERS)
+        if cached is not None:
+            if cached.headers.get('ETag'):
+                headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        response = client.get(url, headers=headers)
+        if response.status_code == 200:
+            cache[url] = response
+        elif response.status_code != 304:
+            raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        sizes.append(len(response.data) + HEADER_BYTES)
+    return sizes
+
+
+def load_seconds(sizes, rtt_ms, kbps):
+    """Seconds until every response is in, over the modelled link"""
+    rtt = rtt_ms / 1000
+    rate = kbps * 1000 / 8 * STEP  # Bytes per step
+    # The page: connect, request, then its bytes alone on the link
+    now = 2 * rtt + sizes[0] / (rate / STEP)
+    ready = [now] + [now + rtt] * (CONNECTIONS - 1)  # When each connection can take a request
+    queue = list(sizes[1:])
+    waiting = []  # [first byte time, bytes, connection]
+    active = []  # [bytes left, connection]
+    while queue or waiting or active:
+        for connection, at in enumerate(ready):
+            if queue and at is not None and at <= now:
+                waiting.append([max(at, now) + rtt, queue.pop(0), connection])
+                ready[connection] = None
+        for request in [request for request in waiting if request[0] <= now]:
+            waiting.remove(request)
+            active.append([request[1], request[2]])
+        for response in list(active):
+            response[0] -= rate / len(active)
+            if response[0] <= 0:
+                active.remove(response)
+                ready[response[1]] = now
+        now += STEP
+    return now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--page', default='/mobile?session=bench')
+    parser.add_argument('--profile', default=','.join(PROFILES), help=f'comma-separated: {", ".join(PROFILES)}')
+    args = parser.parse_args()
+
+    client = qr_app.app.test_client()
+    qr_app.assets.build_all()
+    for profile in args.profile.split(','):
+        rtt_ms, kbps = PROFILES[profile]
+        for mode, enabled in (('before', False), ('after', True)):
+            qr_app.assets.enabled = enabled
+            cache = {}
+            for name in ('first', 'repeat'):
+                sizes = visit(client, args.page, cache)
+                print(json.dumps({
+                    'page': args.page,
+                    'profile': profile,
+                    'mode': mode,
+                    'visit': name,
+                    'requests': len(sizes),
+                    'kb': round(sum(sizes) / 1024, 1),
+                    'tti_ms': round(load_seconds(sizes, rtt_ms, kbps) * 1000),
+                    'harness': 'flask-test-client+link-model'
+                }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+/**
+ * Batching benchmark: many small files one by one vs as FileBatch archives
+ *
+ * Sends --files generated files of --size-kb each over bench_striping.js's
+ * throttled link, once the way the pages send single files (one offer,
+ * accept and ack round per file, maxConcurrentFiles at a time) and once
+ * taken off the queue in batches with takeBatch() and unpacked on the
+ * receiver with TarUnpackSink.
+ *
+ *   node scripts/bench_batch.js [--files 500] [--size-kb 200] [--channels 4]
+ *       [--runs 3] [--profile clean,lossy]
+ *
+ * The receiver accepts every offer at once. On the pages each single file is
+ * also a click, so the real difference is larger than reported here.
+ * Prints one JSON object per profile and mode (median run by time).
+ */
+
+const ft = require('../static/js/file-transfer.js');
+const batch = require('../static/js/file-batch.js');
+const { PROFILES, connect, CountingSink } = require('./bench_striping.js');
+
+function smallFiles(count, sizeBytes) {
+    const bytes = new Uint8Array(sizeBytes);
+    return Array.from({ length: count }, (_, i) => {
+        crypto.getRandomValues(bytes.subarray(0, Math.min(sizeBytes, 65536)));
+        return new File([bytes], `IMG_${String(i).padStart(4, '0')}.jpg`, { type: 'image/jpeg' });
+    });
+}
+
+/**
+ * Drain `queue` through maxConcurrentFiles() senders, as processFileQueue does
+ */
+async function sendQueue(connection, queue, batched) {
+    const { protocol } = connection;
+    const worker = async () => {
+        while (queue.length > 0) {
+            const item = (batched && batch.takeBatch(queue)) || queue.shift();
+            const fileId = protocol.nextFileId();
+            const complete = connection.completion(fileId);
+            await ft.sendFileBinary(protocol.channel, item, fileId, {
+                flowControl: protocol.pool,
+                acceptor: protocol
+            });
+            await complete;
+        }
+    };
+    await Promise.all(Array.from({ length: protocol.maxConcurrentFiles() }, worker));
+}
+
+async function benchMode(profileName, mode, channels, files) {
+    let unpacked = 0;
+    const makeSink = (start) => start.batch ?
+        new batch.TarUnpackSink(() => unpacked++) : new CountingSink();
+    const connection = connect(PROFILES[profileName], channels, makeSink);
+    try {
+        const start = performance.now();
+        await sendQueue(connection, [...files], mode === 'batched');
+        const seconds = (performance.now() - start) / 1000;
+        const received = mode === 'batched' ? unpacked : files.length;
+        if (received !== files.length) {
+            throw new Error(`Received ${received} of ${files.length} files`);
+        }
+        const bytes = files.reduce((total, file) => total + file.size, 0);
+        return {
+            profile: profileName,
+            mode: mode,
+            files: files.length,
+            size_mb: +(bytes / 2 ** 20).toFixed(1),
+            seconds: +seconds.toFixed(3),
+            files_per_s: Math.round(files.length / seconds),
+            mb_per_s: +(bytes / 2 ** 20 / seconds).toFixed(1)
+        };
+    } finally {
+        connection.close();
+    }
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? args[i + 1] : fallback;
+    };
+    const count = Number(option('--files', 500));
+    const sizeKb = Number(option('--size-kb', 200));
+    const channels = Number(option('--channels', 4));
+    const runs = Number(option('--runs', 3));
+    const profiles = option('--profile', 'clean,lossy').split(',');
+
+    const files = smallFiles(count, sizeKb * 1024);
+    for (const profile of profiles) {
+        if (!PROFILES[profile]) {
+            throw new Error(`Unknown profile ${profile} (${Object.keys(PROFILES).join(', ')})`);
+        }
+        for (const mode of ['single', 'batched']) {
+            const list = [];
+            for (let run = 0; run < runs; run++) {
+                list.push(await benchMode(profile, mode, channels, files));
+            }
+            const median = list.sort((x, y) => x.seconds - y.seconds)[Math.floor(list.length / 2)];
+            console.log(JSON.stringify({ ...median, runs: runs, harness: 'node-throttled-loopback' }));
+        }
+    }
+}
+
+main().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
@@ -0,0 +1,149 @@
+/**
+ * Compression benchmark: deflate-v1 on vs off over a throttled link
+ *
+ * Sends generated files through the pages' accept-v1 transfer over
+ * bench_striping.js's simulated link, once with the peer listing
+ * 'deflate-v1' and once without, and checks the receiver wrote the same
+ * bytes the sender read.
+ *
+ *   node scripts/bench_compression.js [--size-mb 16] [--channels 4] [--runs 3]
+ *       [--profile relay,lan]
+ *
+ * Payloads:
+ *   csv      generated CSV rows - compresses well
+ *   random   random bytes - the first-chunk probe turns compression off
+ *   jpeg     random bytes named .jpg - skipped by type, no probe
+ *
+ * Prints one JSON object per profile, payload and mode (median run by
+ * time): seconds, MB/s of file data, and MB actually sent as frames.
+ */
+
+const ft = require('../static/js/file-transfer.js');
+const { randomFile } = require('./bench_transfer.js');
+const { PROFILES, connect } = require('./bench_striping.js');
+
+const BENCH_PROFILES = {
+    // Both peers behind NAT, traffic through a TURN relay
+    relay: { mbps: 20, latencyMs: 30, loss: 0, retransmitMs: 0, channelMbps: 0 },
+    lan: PROFILES.clean
+};
+
+function csvFile(sizeBytes) {
+    const rows = [];
+    let length = 0;
+    for (let i = 0; length < sizeBytes; i++) {
+        const row = `${i},2026-10-${String(1 + i % 28).padStart(2, '0')}T${String(i % 24).padStart(2, '0')}:00:00Z,` +
+            `sensor-${i % 97},${(Math.sin(i) * 100).toFixed(3)},${i % 3 === 0 ? 'ok' : 'degraded'}\n`;
+        rows.push(row);
+        length += row.length;
+    }
+    return new File([rows.join('').slice(0, sizeBytes)], 'readings.csv', { type: 'text/csv' });
+}
+
+/**
+ * A sink that keeps the CRC-32 of every chunk it is given, to compare with the sent file
+ */
+class CrcSink {
+    constructor() {
+        this.parts = [];
+    }
+
+    write(chunk) {
+        this.parts.push(ft.crc32(chunk));
+        return Promise.resolve();
+    }
+
+    close() {
+        return null;
+    }
+
+    abort() {}
+}
+
+async function fileCrcs(file, chunkSize) {
+    const crcs = [];
+    for (let offset = 0; offset < file.size; offset += chunkSize) {
+        crcs.push(ft.crc32(new Uint8Array(await file.slice(offset, offset + chunkSize).arrayBuffer())));
+    }
+    return crcs;
+}
+
+async function benchMode(profile, file, channels, compression) {
+    let sink = null;
+    const connection = connect(profile, channels, () => (sink = new CrcSink()));
+    const { protocol } = connection;
+    if (compression) {
+        protocol.peerProtocols.push('deflate-v1');
+    }
+    try {
+        const fileId = protocol.nextFileId();
+        const complete = connection.completion(fileId);
+        const start = performance.now();
+        const result = await ft.sendFileBinary(protocol.channel, file, fileId, {
+            flowControl: protocol.pool,
+            acceptor: protocol
+        });
+        await complete;
+        const seconds = (performance.now() - start) / 1000;
+        const expected = await fileCrcs(file, protocol.pool.chunkSize);
+        if (expected.join() !== sink.parts.join()) {
+            throw new Error('Received bytes differ from the file');
+        }
+        return {
+            mode: compression ? 'deflate-v1' : 'plain',
+            compressed: result.compressed,
+            seconds: +seconds.toFixed(3),
+            mb_per_s: +(file.size / 2 ** 20 / seconds).toFixed(1),
+            wire_mb: +(result.wireBytes / 2 ** 20).toFixed(2),
+            wire_savings: +(1 - result.wireBytes / file.size).toFixed(3)
+        };
+    } finally {
+        connection.close();
+    }
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? args[i + 1] : fallback;
+    };
+    const sizeMb = Number(option('--size-mb', 16));
+    const channels = Number(option('--channels', 4));
+    const runs = Number(option('--runs', 3));
+    const profiles = option('--profile', Object.keys(BENCH_PROFILES).join(',')).split(',');
+
+    const random = randomFile(sizeMb * 2 ** 20);
+    const payloads = {
+        csv: csvFile(sizeMb * 2 ** 20),
+        random: random,
+        jpeg: new File([random], 'photo.jpg', { type: 'image/jpeg' })
+    };
+    for (const profile of profiles) {
+        if (!BENCH_PROFILES[profile]) {
+            throw new Error(`Unknown profile ${profile} (${Object.keys(BENCH_PROFILES).join(', ')})`);
+        }
+        for (const [payload, file] of Object.entries(payloads)) {
+            for (const compression of [false, true]) {
+                const list = [];
+                for (let run = 0; run < runs; run++) {
+                    list.push(await benchMode(BENCH_PROFILES[profile], file, channels, compression));
+                }
+                const median = list.sort((x, y) => x.seconds - y.seconds)[Math.floor(list.length / 2)];
+                console.log(JSON.stringify({
+                    profile: profile,
+                    payload: payload,
+                    size_mb: sizeMb,
+                    ...median,
+                    runs: runs,
+                    harness: 'node-throttled-loopback'
+                }));
+            }
+        }
+    }
+}
+
+main().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
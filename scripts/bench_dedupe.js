@@ -0,0 +1,122 @@
+/**
+ * Duplicate-skip benchmark: sending the same files a second time
+ *
+ * Sends --files generated files over bench_striping.js's throttled link
+ * with the peer listing 'dedupe-v1', and a receiver that keeps a HashIndex
+ * of what it received and declines offers it already has, as the pages do.
+ * Then sends the same files again, once to that receiver and once to one
+ * without dedupe-v1 (everything goes through again).
+ *
+ *   node scripts/bench_dedupe.js [--files 20] [--size-mb 4] [--channels 4]
+ *       [--profile lossy]
+ *
+ * Node has no Web Worker, so FileHasher hashes on the bench's own thread and
+ * the first round pays for it in its time; on the pages it runs in
+ * hash-worker.js. hash_mb_per_s is that hashing rate on its own.
+ * Prints one JSON object per round: seconds, files skipped, MB on the wire.
+ */
+
+const ft = require('../static/js/file-transfer.js');
+const { FileHasher, HashIndex } = require('../static/js/file-hash.js');
+const { randomFile } = require('./bench_transfer.js');
+const { PROFILES, connect } = require('./bench_striping.js');
+
+/**
+ * Send `files` one after another (maxConcurrentFiles at a time); resolves to
+ * {seconds, skipped, wireBytes}
+ */
+async function sendRound(profile, channels, files, { hasher = null, index = null } = {}) {
+    const onOffer = (incoming) => {
+        if (index && incoming.hash && index.get(incoming.hash)) {
+            incoming.reject('duplicate');
+            return false;
+        }
+        return true;
+    };
+    const connection = connect(profile, channels, undefined, onOffer);
+    const { protocol } = connection;
+    if (hasher) {
+        protocol.peerProtocols.push('dedupe-v1');
+    }
+    let skipped = 0;
+    let wireBytes = 0;
+    try {
+        const queue = [...files];
+        const started = performance.now();
+        const worker = async () => {
+            while (queue.length > 0) {
+                const file = queue.shift();
+                const fileId = protocol.nextFileId();
+                const complete = connection.completion(fileId);
+                const result = await ft.sendFileBinary(protocol.channel, file, fileId, {
+                    flowControl: protocol.pool,
+                    acceptor: protocol,
+                    hasher: hasher
+                });
+                if (result.status === 'duplicate') {
+                    skipped++;
+                    continue;
+                }
+                wireBytes += result.wireBytes;
+                await complete;
+                if (index) {
+                    index.add(await hasher.hash(file), file.name, file.size);
+                }
+            }
+        };
+        await Promise.all(Array.from({ length: protocol.maxConcurrentFiles() }, worker));
+        return { seconds: (performance.now() - started) / 1000, skipped, wireBytes };
+    } finally {
+        connection.close();
+    }
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? args[i + 1] : fallback;
+    };
+    const count = Number(option('--files', 20));
+    const sizeMb = Number(option('--size-mb', 4));
+    const channels = Number(option('--channels', 4));
+    const profileName = option('--profile', 'lossy');
+    const profile = PROFILES[profileName];
+    if (!profile) {
+        throw new Error(`Unknown profile ${profileName} (${Object.keys(PROFILES).join(', ')})`);
+    }
+
+    const files = Array.from({ length: count }, () => randomFile(sizeMb * 2 ** 20));
+    const probe = new FileHasher();
+    await probe.hash(files[0]); // Warm up the JIT
+    const hashStarted = performance.now();
+    await probe.hash(files[1 % count]);
+    const hashRate = sizeMb / ((performance.now() - hashStarted) / 1000);
+
+    const hasher = new FileHasher();
+    const index = new HashIndex();
+    const rounds = [
+        ['first', { hasher, index }],
+        ['again', { hasher, index }],
+        ['again-without-dedupe', {}]
+    ];
+    for (const [round, options] of rounds) {
+        const result = await sendRound(profile, channels, files, options);
+        console.log(JSON.stringify({
+            profile: profileName,
+            round: round,
+            files: count,
+            size_mb: count * sizeMb,
+            seconds: +result.seconds.toFixed(3),
+            skipped: result.skipped,
+            wire_mb: +(result.wireBytes / 2 ** 20).toFixed(1),
+            hash_mb_per_s: Math.round(hashRate),
+            harness: 'node-throttled-loopback'
+        }));
+    }
+}
+
+main().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
@@ -0,0 +1,145 @@
+/**
+ * Fan-out benchmark: one PC sending the same files to several phones
+ *
+ * Connects --receivers phones over bench_striping.js's throttled links, one
+ * of them on a --slow-mbps link, and sends each of them --files files the
+ * pages' way (sendFileBinary + IncomingFile, accept-v1 + resume-v1 so every
+ * chunk is check-summed) in three modes:
+ *
+ *   independent  each phone's sends read and frame their own chunks, as a
+ *                page driving one connection per phone would
+ *   shared       per-phone queues, one SharedChunks per file (pc.js)
+ *   lockstep     one SharedChunks per file, and no phone starts a file
+ *                before every phone has the previous one
+ *
+ *   node scripts/bench_fanout.js [--receivers 4] [--files 8] [--size-mb 4]
+ *       [--slow-mbps 40] [--runs 3]
+ *
+ * Prints one JSON object per mode (median run by the fast phones' time):
+ * seconds until the fast phones and the slow one had every file, chunks
+ * prepared against chunks sent, and main-thread busy ms.
+ */
+
+const ft = require('../static/js/file-transfer.js');
+const { randomFile } = require('./bench_transfer.js');
+const { PROFILES, connect } = require('./bench_striping.js');
+
+const PROTOCOLS = ['binary-v1', 'accept-v1', 'resume-v1'];
+
+/**
+ * ChunkPipeline on the bench's thread, counting the chunks it prepares
+ */
+class CountingPipeline {
+    constructor() {
+        this.pipeline = new ft.ChunkPipeline();
+        this.packed = 0;
+    }
+
+    pack(blob, fileId, chunkIndex, options) {
+        this.packed++;
+        return this.pipeline.pack(blob, fileId, chunkIndex, options);
+    }
+
+    probe(file, blob) {
+        return this.pipeline.probe(file, blob);
+    }
+
+    crc(blob) {
+        return this.pipeline.crc(blob);
+    }
+}
+
+/**
+ * Send `file` as `fileId` to one phone and wait until it has all of it
+ */
+async function sendTo(connection, file, fileId, pipeline) {
+    const complete = connection.completion(fileId);
+    const result = await ft.sendFileBinary(connection.protocol.channel, file, fileId, {
+        flowControl: connection.protocol.pool,
+        acceptor: connection.protocol,
+        pipeline: pipeline,
+        chunkSize: ft.BINARY_CHUNK_SIZE
+    });
+    await complete;
+    return Math.max(1, Math.ceil(file.size / ft.BINARY_CHUNK_SIZE)) - (result.resumedFrom || 0);
+}
+
+async function benchMode(mode, files, profiles) {
+    const connections = profiles.map(profile => connect(profile, 1));
+    connections.forEach(connection => { connection.protocol.peerProtocols = PROTOCOLS; });
+    const counter = new CountingPipeline();
+    const done = new Array(connections.length);
+    let sent = 0;
+    const before = performance.eventLoopUtilization();
+    const started = performance.now();
+    try {
+        if (mode === 'lockstep') {
+            for (let index = 0; index < files.length; index++) {
+                const shared = new ft.SharedChunks(counter, connections.length);
+                await Promise.all(connections.map(async (connection) => {
+                    const chunks = await sendTo(connection, files[index], index + 1, shared);
+                    sent += chunks;
+                    shared.leave();
+                }));
+            }
+            connections.forEach((connection, peer) => { done[peer] = performance.now() - started; });
+        } else {
+            const shared = files.map(() => new ft.SharedChunks(counter, connections.length));
+            await Promise.all(connections.map(async (connection, peer) => {
+                for (let index = 0; index < files.length; index++) {
+                    const pipeline = mode === 'shared' ? shared[index] : counter;
+                    const chunks = await sendTo(connection, files[index], index + 1, pipeline);
+                    sent += chunks;
+                    shared[index].leave();
+                }
+                done[peer] = performance.now() - started;
+            }));
+        }
+    } finally {
+        connections.forEach(connection => connection.close());
+    }
+    const busy = performance.eventLoopUtilization(before);
+    const fast = done.slice(1);
+    return {
+        mode: mode,
+        receivers: connections.length,
+        files: files.length,
+        size_mb: +(files.reduce((total, file) => total + file.size, 0) / 2 ** 20).toFixed(1),
+        fast_seconds: +(Math.max(...fast) / 1000).toFixed(3),
+        slow_seconds: +(done[0] / 1000).toFixed(3),
+        chunks_sent: sent,
+        chunks_prepared: counter.packed,
+        main_thread_busy_ms: Math.round(busy.active)
+    };
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? Number(args[i + 1]) : fallback;
+    };
+    const receivers = option('--receivers', 4);
+    const fileCount = option('--files', 8);
+    const sizeMb = option('--size-mb', 4);
+    const slowMbps = option('--slow-mbps', 40);
+    const runs = option('--runs', 3);
+
+    // The first phone is the slow one
+    const fast = PROFILES.clean;
+    const profiles = [{ ...fast, mbps: slowMbps }, ...Array.from({ length: receivers - 1 }, () => fast)];
+    const files = Array.from({ length: fileCount }, () => randomFile(sizeMb * 2 ** 20));
+    for (const mode of ['independent', 'shared', 'lockstep']) {
+        const list = [];
+        for (let run = 0; run < runs; run++) {
+            list.push(await benchMode(mode, files, profiles));
+        }
+        const median = list.sort((x, y) => x.fast_seconds - y.fast_seconds)[Math.floor(list.length / 2)];
+        console.log(JSON.stringify({ ...median, slow_mbps: slowMbps, runs: runs, harness: 'node-throttled-loopback' }));
+    }
+}
+
+main().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
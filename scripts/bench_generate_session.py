@@ -0,0 +1,73 @@
+"""
+Timing check: /api/generate-session in LAN mode with cached interface discovery
+
+Run from the repository root:
+    python scripts/bench_generate_session.py
+
+discovery  - one full network_interfaces.discover() (what the old
+             get_local_ip() did on every LAN request)
+session    - POST /api/generate-session from 127.0.0.1 (LAN branch) with the
+             address cache warm, through the Flask test client
+
+Exits non-zero if the session p50 is not under 1 ms.
+"""
+
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as qr_app  # noqa: E402
+import network_interfaces  # noqa: E402
+
+qr_app.logger.setLevel(logging.WARNING)  # Silence per-request logging
+
+ITERATIONS = 2000
+BUDGET_MS = 1.0
+
+
+def timings_ms(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    return (f'p50 {statistics.median(ordered):7.3f} ms  '
+            f'p99 {ordered[int(len(ordered) * 0.99)]:7.3f} ms  max {ordered[-1]:7.3f} ms')
+
+
+def main():
+    discovery = timings_ms(network_interfaces.discover, 50)
+
+    qr_app.network.start()
+    client = qr_app.app.test_client()
+    # The app's own sessions registry would grow by ITERATIONS; that is part of the real cost
+
+    def generate():
+        response = client.post('/api/generate-session', base_url='http://127.0.0.1:5000')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    for _ in range(50):
+        generate()  # Warm up Flask, the test client and the session heap
+    session = timings_ms(generate, ITERATIONS)
+
+    print(f'LAN addresses: {", ".join(qr_app.network.candidates()) or "none"}')
+    print(f'discovery: {summary(discovery)}')
+    print(f'  session: {summary(session)}')
+    p50 = statistics.median(session)
+    if p50 >= BUDGET_MS:
+        print(f'FAIL generate-session p50 {p50:.3f} ms >= {BUDGET_MS} ms')
+        sys.exit(1)
+    print(f'OK generate-session p50 under {BUDGET_MS} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+/**
+ * Main-thread busy time per GB transferred: page thread vs transfer worker
+ *
+ * Sends a generated file between two pages' worth of transfer code joined
+ * by bench_transfer.js's in-process loopback, with the per-chunk work done
+ * on the main thread (ChunkPipeline without a worker, as before) and in
+ * transfer-worker.js (a worker_threads thread standing in for the Web
+ * Worker). The main thread's busy time is measured with Node's event loop
+ * utilization, and includes both ends plus the loopback's copying.
+ *
+ *   node scripts/bench_main_thread.js [--size-mb 128] [--runs 3]
+ *
+ * Workloads:
+ *   binary        accept-v1 + resume-v1 frames (CRC-32 on both ends)
+ *   binary-csv    the same with deflate-v1 on a compressible file
+ *   legacy        base64 JSON messages, as sent to pages without a hello
+ *   legacy-before the legacy path as the pages had it: the whole file read,
+ *                 base64-encoded and decoded again on the main thread (at
+ *                 most 16 MB and one run; more runs the heap out of memory)
+ *
+ * Prints one JSON object per workload and mode (median run by busy time):
+ * main-thread ms per GB, share of the transfer time the thread was busy,
+ * and MB/s.
+ */
+
+const path = require('path');
+const { Worker: ThreadWorker } = require('worker_threads');
+const ft = require('../static/js/file-transfer.js');
+const { randomFile, loopbackChannelPair, benchProtocol } = require('./bench_transfer.js');
+const { CountingSink } = require('./bench_striping.js');
+
+const LEGACY_BEFORE_MAX_MB = 16;
+const TRANSFER_WORKER = path.join(__dirname, '..', 'static', 'js', 'transfer-worker.js');
+
+// Runs a worker script the way a browser does: a classic script with self and importScripts()
+const WORKER_BOOTSTRAP = `
+const { parentPort, workerData } = require('worker_threads');
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const run = (file) => vm.runInThisContext(fs.readFileSync(file, 'utf8'), { filename: file });
+globalThis.self = globalThis;
+globalThis.postMessage = (message, transfer) => parentPort.postMessage(message, transfer);
+globalThis.importScripts = (...names) => names.forEach(name => run(path.join(path.dirname(workerData.script), name)));
+parentPort.on('message', (data) => self.onmessage({ data }));
+run(workerData.script);
+`;
+
+/**
+ * The Web Worker API over worker_threads, as far as ChunkPipeline uses it
+ */
+class NodeWorker {
+    constructor(script) {
+        this.onmessage = null;
+        this.onerror = null;
+        this.thread = new ThreadWorker(WORKER_BOOTSTRAP, { eval: true, workerData: { script } });
+        this.thread.on('message', (data) => this.onmessage && this.onmessage({ data }));
+        this.thread.on('error', (error) => this.onerror && this.onerror({ message: error.message }));
+    }
+
+    postMessage(message, transfer = []) {
+        this.thread.postMessage(message, transfer);
+    }
+
+    terminate() {
+        this.thread.terminate();
+    }
+}
+
+globalThis.Worker = NodeWorker; // For ChunkPipeline
+
+function csvFile(sizeBytes) {
+    const rows = [];
+    let length = 0;
+    for (let i = 0; length < sizeBytes; i++) {
+        const row = `${i},2026-10-${String(1 + i % 28).padStart(2, '0')},sensor-${i % 97},${(Math.sin(i) * 100).toFixed(3)}\n`;
+        rows.push(row);
+        length += row.length;
+    }
+    return new File([rows.join('').slice(0, sizeBytes)], 'readings.csv', { type: 'text/csv' });
+}
+
+/**
+ * Send `file` over a loopback pair as the pages do with a current peer
+ */
+async function sendBinary(file, pipeline, protocols) {
+    const [sendMain, receiveMain] = loopbackChannelPair();
+    const protocol = new ft.TransferProtocol({ channels: 1 });
+    protocol.attach(sendMain);
+    protocol.peerProtocols = protocols;
+    sendMain.onmessage = (event) => protocol.handleControl(JSON.parse(event.data));
+    const sink = new CountingSink();
+    let incoming = null;
+    const done = new Promise((resolve, reject) => {
+        receiveMain.onmessage = (event) => {
+            if (event.data instanceof ArrayBuffer) {
+                incoming.handleChunk(ft.decodeChunkFrame(event.data));
+                return;
+            }
+            const start = JSON.parse(event.data);
+            incoming = new ft.IncomingFile(receiveMain, start);
+            incoming.pipeline = pipeline;
+            incoming.onComplete = resolve;
+            incoming.onError = (message) => reject(new Error(message));
+            incoming.accept(sink);
+        };
+    });
+    await ft.sendFileBinary(sendMain, file, protocol.nextFileId(), {
+        flowControl: protocol.pool,
+        acceptor: protocol,
+        pipeline: pipeline
+    });
+    await done;
+    return sink.size;
+}
+
+/**
+ * Send `file` as legacy JSON messages and decode it on arrival, as the pages do now
+ */
+async function sendLegacy(file, pipeline) {
+    const [sender, receiver] = loopbackChannelPair();
+    const chunks = [];
+    let transfer = null;
+    const done = new Promise((resolve, reject) => {
+        receiver.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'file_start') {
+                transfer = { totalChunks: data.totalChunks, received: 0 };
+            } else if (data.type === 'file_chunk') {
+                chunks[data.chunkIndex] = data.data;
+                if (++transfer.received === transfer.totalChunks) {
+                    pipeline.base64Blob(chunks, data.fileType).then(resolve, reject);
+                }
+            }
+        };
+    });
+    await ft.sendFileLegacy(sender, file, { pipeline: pipeline });
+    return (await done).size;
+}
+
+async function benchWorkload(workload, mode, file) {
+    const pipeline = new ft.ChunkPipeline(mode === 'worker' ? TRANSFER_WORKER : null);
+    try {
+        const before = performance.eventLoopUtilization();
+        const started = performance.now();
+        let received;
+        if (workload === 'legacy-before') {
+            const [sender, receiver] = loopbackChannelPair();
+            received = (await benchProtocol('json', sender, receiver, file, { paced: false })).size_mb * 2 ** 20;
+        } else if (workload === 'legacy') {
+            received = await sendLegacy(file, pipeline);
+        } else {
+            const protocols = ['binary-v1', 'accept-v1', 'resume-v1', ...(workload === 'binary-csv' ? ['deflate-v1'] : [])];
+            received = await sendBinary(file, pipeline, protocols);
+        }
+        const seconds = (performance.now() - started) / 1000;
+        const busy = performance.eventLoopUtilization(before);
+        if (Math.round(received) !== file.size) {
+            throw new Error(`${workload}/${mode}: received ${received} of ${file.size} bytes`);
+        }
+        const gb = file.size / 2 ** 30;
+        return {
+            workload: workload,
+            mode: mode,
+            size_mb: file.size / 2 ** 20,
+            main_thread_ms_per_gb: Math.round(busy.active / gb),
+            main_thread_busy_pct: +(busy.utilization * 100).toFixed(1),
+            seconds: +seconds.toFixed(3),
+            mb_per_s: +(file.size / 2 ** 20 / seconds).toFixed(1)
+        };
+    } finally {
+        if (pipeline.worker) {
+            pipeline.worker.terminate();
+        }
+    }
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? Number(args[i + 1]) : fallback;
+    };
+    const sizeMb = option('--size-mb', 128);
+    const runs = option('--runs', 3);
+
+    const random = randomFile(sizeMb * 2 ** 20);
+    const workloads = {
+        'binary': random,
+        'binary-csv': csvFile(sizeMb * 2 ** 20),
+        'legacy': random,
+        'legacy-before': randomFile(Math.min(sizeMb, LEGACY_BEFORE_MAX_MB) * 2 ** 20)
+    };
+    for (const [workload, file] of Object.entries(workloads)) {
+        for (const mode of workload === 'legacy-before' ? ['page-thread'] : ['page-thread', 'worker']) {
+            const list = [];
+            for (let run = 0; run < (workload === 'legacy-before' ? 1 : runs); run++) {
+                list.push(await benchWorkload(workload, mode, file));
+            }
+            const median = list.sort((x, y) => x.main_thread_ms_per_gb - y.main_thread_ms_per_gb)[Math.floor(list.length / 2)];
+            console.log(JSON.stringify({ ...median, runs: list.length, harness: 'node-loopback' }));
+        }
+    }
+}
+
+main().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
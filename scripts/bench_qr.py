@@ -0,0 +1,98 @@
+"""
+Benchmark: QR generation throughput, legacy path vs. direct 1-bit rendering
+
+Run from the repository root:
+    python scripts/bench_qr.py
+
+legacy      - qrcode.make_image at box_size=15, LANCZOS resize, PNG, base64
+              (the work the old /api/generate-session did inline on every request)
+session     - POST /api/generate-session through the Flask test client (no image)
+direct      - render_qr_png on a fresh URL every time (a new session's first render)
+first-get   - POST /api/generate-session, then GET its /api/qr/<session_id>: what
+              showing one new QR code costs, the case that matters
+revalidate  - GET /api/qr/<session_id> again with its ETag (304, nothing rendered)
+
+Every session has its own URL, so each QR code is rendered once; a page
+asking for it again is answered by ETag. Most of a render is qrcode's matrix
+encoding and mask search; the rendering step itself is a few percent of it.
+"""
+
+import base64
+import io
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app as qr_app  # noqa: E402
+
+qr_app.logger.setLevel(logging.WARNING)  # Silence per-request logging
+
+DURATION = 2.0  # Seconds per variant
+
+
+def make_url():
+    return f'http://192.168.1.10:5000/mobile?session={uuid.uuid4()}'
+
+
+def legacy_render(url):
+    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=15, border=4)
+    qr.add_data(url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    min_size = 400
+    if img.size[0] < min_size or img.size[1] < min_size:
+        scale = max(min_size / img.size[0], min_size / img.size[1])
+        img = img.resize((int(img.size[0] * scale), int(img.size[1] * scale)), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def direct_render(url):
+    return qr_app.render_qr_png(url)
+
+
+def first_get(client):
+    session_id = client.post('/api/generate-session', base_url='http://example.com').get_json()['session_id']
+    return client.get(f'/api/qr/{session_id}')
+
+
+def rate(fn, make_arg):
+    count = 0
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        fn(make_arg())
+        count += 1
+    return count / DURATION
+
+
+def main():
+    client = qr_app.app.test_client()
+    session_id = client.post('/api/generate-session', base_url='http://example.com').get_json()['session_id']
+    qr_url = f'/api/qr/{session_id}'
+    etag = client.get(qr_url).headers['ETag']
+
+    results = {
+        'legacy': rate(legacy_render, make_url),
+        'session': rate(lambda _: client.post('/api/generate-session', base_url='http://example.com'), lambda: None),
+        'direct': rate(direct_render, make_url),
+        'first-get': rate(lambda _: first_get(client), lambda: None),
+        'revalidate': rate(lambda url: client.get(url, headers={'If-None-Match': etag}), lambda: qr_url),
+    }
+    legacy_size = len(base64.b64decode(legacy_render(make_url())))
+    direct_size = len(direct_render(make_url()))
+
+    for name, per_sec in results.items():
+        print(f'{name:>10}: {per_sec:8.1f} req/s  ({per_sec / results["legacy"]:.1f}x legacy)')
+    print(f'PNG size: legacy {legacy_size} B, direct {direct_size} B')
+
+
+if __name__ == '__main__':
+    main()
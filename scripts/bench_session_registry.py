@@ -0,0 +1,84 @@
+"""
+Benchmark: session registry disconnect and cleanup cost vs. live session count
+
+Run from the repository root:
+    python scripts/bench_session_registry.py
+
+Compares the registry against the old linear scan over a plain dict. Disconnect
+and sweep cost per operation should stay flat as the table grows to 100k.
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_registry import SessionRegistry  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+OPS = 1_000  # Disconnects / expiries measured per size
+
+
+def populate(size, timeout):
+    """Build a registry with `size` paired sessions plus OPS stale ones"""
+    registry = SessionRegistry(timeout=timeout)
+    registry.start_sweeper = lambda: None  # Drive sweeps by hand
+    now = time.time()
+    for i in range(size):
+        session_id = str(uuid.uuid4())
+        registry.create(session_id, now=now)
+        registry.attach(session_id, 'pc', f'pc-{i}')
+        registry.attach(session_id, 'mobile', f'm-{i}')
+    for _ in range(OPS):
+        registry.create(str(uuid.uuid4()), now=now - timeout - 1)
+    return registry
+
+
+def legacy_disconnect(sessions, sid):
+    """The pre-registry handle_disconnect scan"""
+    for session_id, session in list(sessions.items()):
+        if session['pc_sid'] == sid:
+            session['pc_connected'] = False
+            session['pc_sid'] = None
+            return session_id
+        elif session['mobile_sid'] == sid:
+            session['mobile_connected'] = False
+            session['mobile_sid'] = None
+            return session_id
+    return None
+
+
+def bench(size):
+    registry = populate(size, timeout=120)
+    legacy = dict(registry._sessions)
+
+    start = time.perf_counter()
+    for i in range(OPS):
+        registry.detach(f'pc-{i}')
+    detach_us = (time.perf_counter() - start) / OPS * 1e6
+
+    start = time.perf_counter()
+    expired = registry.sweep()
+    sweep_us = (time.perf_counter() - start) / max(len(expired), 1) * 1e6
+
+    legacy_ops = min(OPS, 50)  # The scan is slow; sample fewer at large sizes
+    start = time.perf_counter()
+    for i in range(legacy_ops):
+        legacy_disconnect(legacy, f'm-{size - 1 - i}')
+    legacy_us = (time.perf_counter() - start) / legacy_ops * 1e6
+
+    return detach_us, sweep_us, len(expired), legacy_us
+
+
+def main():
+    print(f"{'sessions':>10} {'detach us/op':>14} {'sweep us/expired':>18} {'legacy scan us/op':>19}")
+    for size in SIZES:
+        detach_us, sweep_us, expired, legacy_us = bench(size)
+        assert expired == OPS, f'expected {OPS} expired sessions, got {expired}'
+        print(f'{size:>10} {detach_us:>14.2f} {sweep_us:>18.2f} {legacy_us:>19.1f}')
+
+
+if __name__ == '__main__':
+    main()
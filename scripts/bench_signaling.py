@@ -0,0 +1,326 @@
+"""
+Signaling benchmark: N simulated PC/mobile pairs against either backend
+
+Each pair runs the full pairing path:
+    join (pc, then mobile) -> peer_connected on both -> offer -> answer
+    -> ICE burst in both directions -> disconnect
+against localhost only. The ICE burst is sent as one ice_candidate message
+per candidate (--ice-mode single, what clients did before batching) or as one
+ice_candidates message per side (batched: the whole burst falls inside the
+clients' coalescing window); --ice-mode compare runs both. Backends:
+
+flask     - app.py's Socket.IO handlers (--server-mode threading or asgi);
+            sessions are created through POST /api/generate-session
+flask-ws  - app.py's JSON WebSocket endpoint (/ws), same protocol as node
+node      - signaling-server/server.js (join/webrtc_offer/webrtc_answer/
+            ice_candidate/ping); needs `npm install` in signaling-server/
+
+Run from the repository root:
+    python scripts/bench_signaling.py --backend flask --pairs 500 --concurrency 50
+    python scripts/bench_signaling.py --backend node --output bench_results.jsonl
+
+Prints one JSON object per backend and ICE mode: time-to-pair and relay
+latency (p50/p99), ping round trip (JSON backends), relayed messages per pair,
+throughput and server RSS. --output appends the same
+objects, stamped with time and git revision, to a JSON-lines file for tracking.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from loadtest_server_modes import raise_fd_limit, rss_bytes, percentile
+from ws_client import SocketIOClient, JsonSignalingClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def start_backend(backend, port, server_mode):
+    if backend == 'node':
+        command, cwd, health = ['node', 'server.js'], os.path.join(ROOT, 'signaling-server'), '/health'
+        env = dict(os.environ, PORT=str(port))
+    else:
+        command, cwd, health = [sys.executable, 'app.py'], ROOT, '/api/health-check'
+        env = dict(os.environ, PORT=str(port), SERVER_MODE=server_mode, LOG_LEVEL='WARNING')
+    # stderr goes to a file, not a pipe: a chatty server must never block on a full pipe
+    errors = tempfile.TemporaryFile()
+    proc = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=errors)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}{health}', timeout=1)
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                errors.seek(0)
+                lines = errors.read().decode(errors='replace').strip().splitlines()
+                error = next((line for line in lines if 'Error' in line), lines[-1] if lines else proc.returncode)
+                hint = ' (run `npm install` in signaling-server/)' if backend == 'node' else ''
+                raise RuntimeError(f'{backend} backend exited: {error}{hint}')
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{backend} backend did not start on port {port}')
+
+
+def stop_backend(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def create_session(port):
+    # A non-local Host header skips LAN IP discovery, which is not under test here
+    req = urllib.request.Request(f'http://{HOST}:{port}/api/generate-session', method='POST',
+                                 headers={'Host': 'bench.invalid'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.load(resp)['session_id']
+
+
+def candidate(seq):
+    return {'candidate': f'candidate:{seq} 1 udp 2122260223 10.0.0.{seq % 250 + 1} {50000 + seq} typ host',
+            'sdpMid': '0', 'sdpMLineIndex': 0}
+
+
+def field(kind):
+    """Payload field of a relay message: webrtc_offer -> offer, ice_candidate -> candidate"""
+    return kind.split('_', 1)[-1]
+
+
+class FlaskPeer:
+    """Drive app.py's Socket.IO events"""
+
+    def __init__(self, port, session_id, role):
+        self.port, self.session_id, self.role = port, session_id, role
+        self.client = SocketIOClient()
+
+    async def connect(self):
+        await self.client.connect(HOST, self.port)
+
+    async def join(self):
+        await self.client.emit(f'{self.role}_join', {'session_id': self.session_id})
+
+    async def send(self, kind, payload):
+        await self.client.emit(kind, {'session_id': self.session_id, field(kind): payload})
+
+
+class JsonPeer:
+    """Drive the JSON WebSocket protocol (server.js, or app.py's /ws)"""
+
+    path = '/'
+
+    def __init__(self, port, session_id, role):
+        self.port, self.session_id, self.role = port, session_id, role
+        self.client = JsonSignalingClient()
+
+    async def connect(self):
+        await self.client.connect(HOST, self.port, self.path)
+
+
+class AppJsonPeer(JsonPeer):
+    path = '/ws'
+
+    async def join(self):
+        await self.client.send({'type': 'join', 'session_id': self.session_id, 'peer_type': self.role})
+
+    async def send(self, kind, payload):
+        await self.client.send({'type': kind, 'session_id': self.session_id, field(kind): payload})
+
+
+async def send_timed(sender, kind, payload, sent_times, key):
+    """Send one message and remember when, for latency matching on arrival"""
+    sent_times[key] = time.perf_counter()
+    await sender.send(kind, payload)
+
+
+async def run_pair(backend, port, ice_burst, ice_mode, stats):
+    loop = asyncio.get_running_loop()
+    if backend == 'flask':
+        start = time.perf_counter()
+        session_id = await loop.run_in_executor(None, create_session, port)
+        stats['session_create'].append(time.perf_counter() - start)
+        peer_type = FlaskPeer
+    else:
+        session_id = os.urandom(8).hex()
+        peer_type = JsonPeer if backend == 'node' else AppJsonPeer
+
+    pc, mobile = peer_type(port, session_id, 'pc'), peer_type(port, session_id, 'mobile')
+    await asyncio.gather(pc.connect(), mobile.connect())
+    try:
+        pc_paired, mobile_paired = pc.client.wait_for('peer_connected'), mobile.client.wait_for('peer_connected')
+        start = time.perf_counter()
+        await pc.join()
+        await mobile.join()
+        (_, pc_at), (_, mobile_at) = await asyncio.gather(pc_paired, mobile_paired)
+        stats['time_to_pair'].append(max(pc_at, mobile_at) - start)
+
+        sent_times = {}
+        pending = mobile.client.wait_for('webrtc_offer')
+        await send_timed(pc, 'webrtc_offer', {'type': 'offer', 'sdp': 'v=0 offer'}, sent_times, 'offer')
+        _, at = await pending
+        stats['relay'].append(at - sent_times['offer'])
+
+        pending = pc.client.wait_for('webrtc_answer')
+        await send_timed(mobile, 'webrtc_answer', {'type': 'answer', 'sdp': 'v=0 answer'}, sent_times, 'answer')
+        _, at = await pending
+        stats['relay'].append(at - sent_times['answer'])
+
+        if ice_mode == 'batched':
+            # ICE burst: each side sends its candidates as one batch
+            burst = [candidate(seq) for seq in range(ice_burst)]
+            await send_timed(pc, 'ice_candidates', burst, sent_times, 'pc')
+            await send_timed(mobile, 'ice_candidates', burst, sent_times, 'mobile')
+            for receiver, sender_role in ((mobile, 'pc'), (pc, 'mobile')):
+                (data, at), = await receiver.client.collect('ice_candidates', 1)
+                assert len(data['candidates']) == ice_burst, data
+                # One latency sample per candidate, comparable with single mode
+                stats['relay'].extend([at - sent_times[sender_role]] * ice_burst)
+            stats['messages'] += 2 + 2
+        else:
+            # ICE burst: both sides trickle candidates back to back
+            for seq in range(ice_burst):
+                await send_timed(pc, 'ice_candidate', candidate(seq), sent_times, ('pc', seq))
+                await send_timed(mobile, 'ice_candidate', candidate(seq), sent_times, ('mobile', seq))
+            for receiver, sender_role in ((mobile, 'pc'), (pc, 'mobile')):
+                arrivals = await receiver.client.collect('ice_candidate', ice_burst)
+                for data, at in arrivals:
+                    seq = int(data['candidate']['candidate'].split()[0].split(':')[1])
+                    stats['relay'].append(at - sent_times[(sender_role, seq)])
+            stats['messages'] += 2 + 2 * ice_burst
+
+        if backend != 'flask':
+            pending = pc.client.wait_for('pong')
+            start = time.perf_counter()
+            await pc.client.send({'type': 'ping'})
+            _, at = await pending
+            stats['ping'].append(at - start)
+    finally:
+        await pc.client.close()
+        await mobile.client.close()
+
+
+async def sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(rss_bytes(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.25)
+        except asyncio.TimeoutError:
+            pass
+
+
+def new_stats():
+    return {'session_create': [], 'time_to_pair': [], 'relay': [], 'ping': [], 'messages': 0}
+
+
+def ms(values):
+    values = [v * 1000 for v in values]
+    if not values:
+        return None
+    return {'p50': round(statistics.median(values), 3), 'p99': round(percentile(values, 99), 3),
+            'max': round(max(values), 3)}
+
+
+async def run_backend(backend, port, server_mode, pairs, concurrency, ice_burst, ice_mode):
+    proc = start_backend(backend, port, server_mode)
+    try:
+        # Warm-up pair: lazy imports and first-connection setup
+        await run_pair(backend, port, 1, ice_mode, new_stats())
+        stats = new_stats()
+        rss_baseline = rss_bytes(proc.pid)
+        rss_samples, stop = [], asyncio.Event()
+        sampler = asyncio.ensure_future(sample_rss(proc.pid, rss_samples, stop))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await run_pair(backend, port, ice_burst, ice_mode, stats)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(pairs)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await sampler
+        failures = [r for r in results if isinstance(r, BaseException)]
+        return {
+            'backend': backend if backend == 'node' else f'{backend}-{server_mode}',
+            'pairs': pairs,
+            'concurrency': concurrency,
+            'ice_burst': ice_burst,
+            'ice_mode': ice_mode,
+            'failed_pairs': len(failures),
+            'first_failure': repr(failures[0]) if failures else None,
+            'elapsed_s': round(elapsed, 3),
+            'pairs_per_s': round((pairs - len(failures)) / elapsed, 1),
+            'relayed_messages_per_pair': round(stats['messages'] / max(pairs - len(failures), 1), 1),
+            'relayed_messages_per_s': round(stats['messages'] / elapsed, 1),
+            'session_create_ms': ms(stats['session_create']),
+            'time_to_pair_ms': ms(stats['time_to_pair']),
+            'relay_latency_ms': ms(stats['relay']),
+            'ping_rtt_ms': ms(stats['ping']),
+            'rss_baseline_mb': round(rss_baseline / 2**20, 1),
+            'rss_peak_mb': round(max(rss_samples + [rss_baseline]) / 2**20, 1),
+        }
+    finally:
+        stop_backend(proc)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('flask', 'flask-ws', 'node', 'all'), default='flask')
+    parser.add_argument('--server-mode', choices=('threading', 'asgi'), default='threading',
+                        help='SERVER_MODE for the flask backend')
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--ice-burst', type=int, default=10, help='ICE candidates sent by each side')
+    parser.add_argument('--ice-mode', choices=('single', 'batched', 'compare'), default='single',
+                        help='one message per ICE candidate, one batch per side, or both')
+    parser.add_argument('--port', type=int, default=5060)
+    parser.add_argument('--output', help='append results as JSON lines to this file')
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    backends = ('flask', 'flask-ws', 'node') if args.backend == 'all' else (args.backend,)
+    ice_modes = ('single', 'batched') if args.ice_mode == 'compare' else (args.ice_mode,)
+    runs = [(backend, ice_mode) for backend in backends for ice_mode in ice_modes]
+    failed = False
+    for i, (backend, ice_mode) in enumerate(runs):
+        try:
+            result = asyncio.run(run_backend(backend, args.port + i, args.server_mode,
+                                             args.pairs, args.concurrency, args.ice_burst, ice_mode))
+        except RuntimeError as e:
+            result = {'backend': backend, 'ice_mode': ice_mode, 'error': str(e)}
+        failed = failed or 'error' in result or result['failed_pairs'] > 0
+        result.update({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+        })
+        print(json.dumps(result))
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
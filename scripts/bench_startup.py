@@ -0,0 +1,104 @@
+"""
+Benchmark: cold launch to first 200 on /
+
+Spawns a fresh `python app.py` per run and polls GET / until it returns 200.
+Each run is a new interpreter, so module imports are paid every time; the OS
+file cache stays warm after the first run.
+
+Run from the repository root:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --path lan --runs 10
+
+cloud  - PORT set: no prompt, no dependency check (how Koyeb/Railway start it)
+lan    - the local launcher path: answers "2" at the mode prompt, runs the
+         dependency check, serves on port 5000. The stamp file is removed
+         first on --cold-deps runs, forcing the uncached metadata check.
+
+Prints one JSON object per path with the per-run times in ms.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dependency_check import STAMP_FILE  # noqa: E402
+
+HOST = '127.0.0.1'
+LAN_PORT = 5000  # app.py's LAN path always serves here
+
+
+def wait_for_200(port, proc, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://{HOST}:{port}/', timeout=1) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f'app.py exited with code {proc.returncode}')
+            time.sleep(0.005)
+    raise RuntimeError(f'no 200 on port {port} within {timeout}s')
+
+
+def launch_once(path, port, cold_deps):
+    env = dict(os.environ, BROWSER='true')  # webbrowser runs `true` instead of opening a browser
+    env.pop('PORT', None)
+    if path == 'cloud':
+        env['PORT'] = str(port)
+    else:
+        port = LAN_PORT
+        if cold_deps:
+            STAMP_FILE.unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if path == 'lan':
+            proc.stdin.write(b'2\n')  # LAN mode at the prompt
+            proc.stdin.flush()
+        wait_for_200(port, proc)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', choices=('cloud', 'lan', 'both'), default='both')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--port', type=int, default=5057, help='port for the cloud path')
+    parser.add_argument('--cold-deps', action='store_true', help='delete the dependency stamp before each LAN run')
+    args = parser.parse_args()
+
+    paths = ('cloud', 'lan') if args.path == 'both' else (args.path,)
+    for path in paths:
+        runs = [launch_once(path, args.port, args.cold_deps) for _ in range(args.runs)]
+        print(json.dumps({
+            'path': path,
+            'cold_deps': args.cold_deps and path == 'lan',
+            'time_to_first_200_ms': {
+                'median': round(statistics.median(runs), 1),
+                'min': round(min(runs), 1),
+                'max': round(max(runs), 1),
+            },
+            'runs_ms': [round(r, 1) for r in runs],
+        }))
+
+
+if __name__ == '__main__':
+    main()
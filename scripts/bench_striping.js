@@ -0,0 +1,313 @@
+/**
+ * Striping benchmark: one data channel vs a pool of N over a throttled link
+ *
+ * Runs the pages' accept-v1 transfer (sendFileBinary + IncomingFile) over an
+ * in-process link that models bandwidth, one-way latency, packet loss and an
+ * optional per-channel rate cap. Each channel delivers in order, so a lost
+ * message holds up everything behind it on that channel until its
+ * retransmission arrives - the head-of-line blocking striping works around.
+ *
+ *   node scripts/bench_striping.js [--channels 4] [--size-mb 16] [--small-files 16]
+ *       [--runs 3] [--profile clean,lossy,capped]
+ *
+ * Two workloads per profile and channel count:
+ *   large   one --size-mb file
+ *   mixed   the large file queued first, then --small-files 256KB files;
+ *           files go out as many at a time as the page would send
+ *           (TransferProtocol.maxConcurrentFiles)
+ *
+ * Prints one JSON object per profile, workload and channel count (median run
+ * by throughput): MB/s for the whole workload and, for mixed, the median
+ * time until a small file completed.
+ */
+
+const ft = require('../static/js/file-transfer.js');
+const { randomFile } = require('./bench_transfer.js');
+
+const PROFILES = {
+    // Fast LAN, nothing lost: striping should neither help nor hurt
+    clean: { mbps: 400, latencyMs: 2, loss: 0, retransmitMs: 0, channelMbps: 0 },
+    // Busy Wi-Fi: 1% of messages wait an extra round trip to be retransmitted
+    lossy: { mbps: 200, latencyMs: 10, loss: 0.01, retransmitMs: 60, channelMbps: 0 },
+    // Each channel capped below the link rate (per-stream send scheduling)
+    capped: { mbps: 400, latencyMs: 5, loss: 0, retransmitMs: 0, channelMbps: 120 }
+};
+const SMALL_FILE_SIZE = 256 * 1024;
+const TICK_MS = 1;
+
+/**
+ * One direction of a link shared by any number of channels
+ *
+ * Every tick the bytes the link could have carried since the last tick are
+ * handed round-robin to the channels' send queues (each capped at
+ * channelMbps if set). A message whose last byte left drops out of the
+ * sender's bufferedAmount and is delivered latencyMs later, or
+ * latencyMs + retransmitMs later if it was "lost" - and never before the
+ * message ahead of it on the same channel.
+ */
+class ThrottledLink {
+    constructor({ mbps, latencyMs, loss, retransmitMs, channelMbps }) {
+        this.bytesPerMs = mbps * 1e6 / 8 / 1000;
+        this.channelBytesPerMs = channelMbps ? channelMbps * 1e6 / 8 / 1000 : Infinity;
+        this.latencyMs = latencyMs;
+        this.loss = loss;
+        this.retransmitMs = retransmitMs;
+        this.ends = [];
+        this.lastTick = performance.now();
+        this.timer = setInterval(() => this.tick(), TICK_MS);
+    }
+
+    add(end) {
+        end.outgoing = []; // {data, size, left}
+        end.inFlight = []; // {data, deliverAt}
+        this.ends.push(end);
+    }
+
+    tick() {
+        const now = performance.now();
+        const elapsed = now - this.lastTick;
+        this.lastTick = now;
+        let budget = this.bytesPerMs * elapsed;
+        const channelBudget = this.channelBytesPerMs * elapsed;
+        const busy = this.ends.filter(end => end.outgoing.length > 0);
+        const quota = new Map(busy.map(end => [end, channelBudget]));
+        // Round-robin in slices so no channel starves the others
+        const slice = Math.max(1024, budget / Math.max(1, busy.length) / 4);
+        while (budget > 0 && busy.some(end => end.outgoing.length > 0 && quota.get(end) > 0)) {
+            for (const end of busy) {
+                const message = end.outgoing[0];
+                if (!message || quota.get(end) <= 0 || budget <= 0) {
+                    continue;
+                }
+                const take = Math.min(slice, message.left, budget, quota.get(end));
+                message.left -= take;
+                budget -= take;
+                quota.set(end, quota.get(end) - take);
+                if (message.left <= 0) {
+                    end.outgoing.shift();
+                    this.transmitted(end, message, now);
+                }
+            }
+        }
+        for (const end of this.ends) {
+            while (end.inFlight.length > 0 && end.inFlight[0].deliverAt <= now) {
+                const { data } = end.inFlight.shift();
+                if (end.peer.readyState === 'open' && end.peer.onmessage) {
+                    end.peer.onmessage({ data });
+                }
+            }
+        }
+    }
+
+    transmitted(end, message, now) {
+        const before = end.bufferedAmount;
+        end.bufferedAmount -= message.size;
+        if (before > end.bufferedAmountLowThreshold && end.bufferedAmount <= end.bufferedAmountLowThreshold) {
+            end.dispatchEvent(new Event('bufferedamountlow'));
+        }
+        let deliverAt = now + this.latencyMs;
+        if (Math.random() < this.loss) {
+            deliverAt += this.retransmitMs;
+        }
+        const last = end.inFlight[end.inFlight.length - 1];
+        if (last) {
+            deliverAt = Math.max(deliverAt, last.deliverAt); // In order per channel
+        }
+        end.inFlight.push({ data: message.data, deliverAt });
+    }
+
+    close() {
+        clearInterval(this.timer);
+    }
+}
+
+/**
+ * A data channel pair whose forward direction runs over `link` and whose
+ * reverse direction (acks, accept) runs over `reverse`
+ */
+function throttledChannelPair(label, link, reverse) {
+    const make = (direction) => {
+        const end = Object.assign(new EventTarget(), {
+            label: label,
+            readyState: 'open',
+            binaryType: 'arraybuffer',
+            bufferedAmount: 0,
+            bufferedAmountLowThreshold: 0,
+            onmessage: null,
+            send(data) {
+                const size = typeof data === 'string' ? data.length : data.byteLength;
+                const copy = typeof data === 'string' ? data : data.slice(0);
+                this.bufferedAmount += size;
+                this.outgoing.push({ data: copy, size, left: Math.max(size, 1) });
+            }
+        });
+        direction.add(end);
+        return end;
+    };
+    const sender = make(link), receiver = make(reverse);
+    sender.peer = receiver;
+    receiver.peer = sender;
+    return [sender, receiver];
+}
+
+class CountingSink {
+    constructor() {
+        this.size = 0;
+    }
+
+    write(chunk) {
+        this.size += chunk.byteLength;
+        return Promise.resolve();
+    }
+
+    close() {
+        return new Blob([]); // The bench only counts bytes
+    }
+
+    abort() {}
+}
+
+/**
+ * Connect a sending TransferProtocol with `channels` channels to an
+ * auto-accepting receiver that writes into makeSink(start); returns
+ * {protocol, completion, close}
+ * onOffer(incoming) may decline an offer first (reject it and return false).
+ */
+function connect(profile, channels, makeSink = () => new CountingSink(), onOffer = null) {
+    const link = new ThrottledLink(profile);
+    const reverse = new ThrottledLink({ ...profile, mbps: 1000, channelMbps: 0, loss: 0 });
+    const [sendMain, receiveMain] = throttledChannelPair('files', link, reverse);
+
+    const protocol = new ft.TransferProtocol({ channels });
+    protocol.attach(sendMain);
+    protocol.peerProtocols = ['binary-v1', 'accept-v1', 'stripe-v1']; // As if the peer's hello arrived
+    sendMain.onmessage = (event) => protocol.handleControl(JSON.parse(event.data));
+
+    const incoming = {};
+    const received = {}; // fileId -> resolves that file's completion()
+    const onFrame = (buffer) => {
+        const frame = ft.decodeChunkFrame(buffer);
+        if (incoming[frame.fileId]) {
+            incoming[frame.fileId].handleChunk(frame);
+        }
+    };
+    receiveMain.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+            onFrame(event.data);
+            return;
+        }
+        const start = JSON.parse(event.data);
+        if (start.type === 'file_start') {
+            const file = new ft.IncomingFile(receiveMain, start);
+            if (onOffer && !onOffer(file)) {
+                return;
+            }
+            incoming[start.fileId] = file;
+            file.onComplete = () => received[start.fileId]();
+            file.onError = (message) => console.error('Receive failed:', message);
+            file.accept(makeSink(start));
+        }
+    };
+    for (let lane = 1; lane < channels; lane++) {
+        const [sendLane, receiveLane] = throttledChannelPair(`files-lane-${lane}`, link, reverse);
+        protocol.receiveLane(receiveLane, onFrame);
+        protocol.pool.addLane(sendLane);
+    }
+    return {
+        protocol,
+        // Resolves when the receiver has written the whole file
+        completion: (fileId) => new Promise(resolve => { received[fileId] = resolve; }),
+        close: () => { link.close(); reverse.close(); }
+    };
+}
+
+/**
+ * Send `files` through a queue that keeps maxConcurrentFiles() in flight
+ * Resolves to the ms from start until each file was fully received.
+ */
+async function sendAll(connection, files) {
+    const { protocol } = connection;
+    const start = performance.now();
+    const done = new Array(files.length);
+    let next = 0;
+    const worker = async () => {
+        while (next < files.length) {
+            const index = next++;
+            const fileId = protocol.nextFileId();
+            const complete = connection.completion(fileId);
+            await ft.sendFileBinary(protocol.channel, files[index], fileId, {
+                flowControl: protocol.pool,
+                acceptor: protocol
+            });
+            await complete;
+            done[index] = performance.now() - start;
+        }
+    };
+    await Promise.all(Array.from({ length: protocol.maxConcurrentFiles() }, worker));
+    return done;
+}
+
+async function benchWorkload(profileName, workload, channels, large, smallFiles) {
+    const files = workload === 'large' ? [large] : [large, ...smallFiles];
+    const connection = connect(PROFILES[profileName], channels);
+    try {
+        const done = await sendAll(connection, files);
+        const seconds = Math.max(...done) / 1000;
+        const bytes = files.reduce((total, file) => total + file.size, 0);
+        const result = {
+            profile: profileName,
+            workload: workload,
+            channels: channels,
+            size_mb: +(bytes / 2 ** 20).toFixed(1),
+            seconds: +seconds.toFixed(3),
+            mb_per_s: +(bytes / 2 ** 20 / seconds).toFixed(1)
+        };
+        if (workload === 'mixed') {
+            const small = done.slice(1).sort((x, y) => x - y);
+            result.small_file_p50_ms = Math.round(small[Math.floor(small.length / 2)]);
+        }
+        return result;
+    } finally {
+        connection.close();
+    }
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? args[i + 1] : fallback;
+    };
+    const channels = Number(option('--channels', 4));
+    const sizeMb = Number(option('--size-mb', 16));
+    const smallCount = Number(option('--small-files', 16));
+    const runs = Number(option('--runs', 3));
+    const profiles = option('--profile', Object.keys(PROFILES).join(',')).split(',');
+
+    const large = randomFile(sizeMb * 2 ** 20);
+    const smallFiles = Array.from({ length: smallCount }, () => randomFile(SMALL_FILE_SIZE));
+    for (const profile of profiles) {
+        if (!PROFILES[profile]) {
+            throw new Error(`Unknown profile ${profile} (${Object.keys(PROFILES).join(', ')})`);
+        }
+        for (const workload of ['large', 'mixed']) {
+            for (const count of [1, channels]) {
+                const list = [];
+                for (let run = 0; run < runs; run++) {
+                    list.push(await benchWorkload(profile, workload, count, large, smallFiles));
+                }
+                const median = list.sort((x, y) => x.mb_per_s - y.mb_per_s)[Math.floor(list.length / 2)];
+                console.log(JSON.stringify({ ...median, runs: runs, harness: 'node-throttled-loopback' }));
+            }
+        }
+    }
+}
+
+module.exports = { PROFILES, connect, CountingSink }; // scripts/bench_batch.js
+
+if (require.main === module) {
+    main().catch(error => {
+        console.error(error);
+        process.exit(1);
+    });
+}
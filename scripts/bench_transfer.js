@@ -0,0 +1,242 @@
+/**
+ * Transfer protocol benchmark: binary frames vs legacy base64-in-JSON chunks
+ *
+ * Sends the same generated file through a loopback channel pair with each
+ * protocol and reports throughput, bytes on the wire and peak memory.
+ *
+ *   node scripts/bench_transfer.js [--size-mb 32] [--runs 3] [--unpaced]
+ *       In-process channel pair, no network: measures what the pages spend
+ *       on encoding, copying and pacing.
+ *   scripts/bench_transfer.html (open the file in a browser)
+ *       The same runs over a real RTCDataChannel between two peer
+ *       connections in one page.
+ *
+ * The legacy sender reproduces pc.js/mobile.js before binary framing: base64
+ * of the whole file, 200KB JSON chunks and a 50 ms pause after each chunk
+ * (--unpaced drops the pauses to show the encoding cost alone).
+ */
+
+const ft = typeof module !== 'undefined' ? require('../static/js/file-transfer.js') : window;
+
+const JSON_CHUNK_SIZE = 200 * 1024;
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+function arrayBufferToBase64(buffer) {
+    const bytes = new Uint8Array(buffer);
+    let binary = '';
+    for (let i = 0; i < bytes.byteLength; i++) {
+        binary += String.fromCharCode(bytes[i]);
+    }
+    return btoa(binary);
+}
+
+function base64ToArrayBuffer(base64) {
+    const binaryString = atob(base64);
+    const bytes = new Uint8Array(binaryString.length);
+    for (let i = 0; i < binaryString.length; i++) {
+        bytes[i] = binaryString.charCodeAt(i);
+    }
+    return bytes.buffer;
+}
+
+async function sendLegacy(channel, file, paced) {
+    // The pages' pre-flow-control sender, kept as the baseline
+    const base64 = arrayBufferToBase64(await file.arrayBuffer());
+    const totalChunks = Math.ceil(base64.length / JSON_CHUNK_SIZE);
+    const fileId = Date.now() + Math.random();
+    channel.send(JSON.stringify({
+        type: 'file_start', fileId, fileName: file.name, fileSize: file.size, fileType: file.type, totalChunks
+    }));
+    for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
+        while (channel.bufferedAmount > 64 * 1024) {
+            await sleep(paced ? 50 : 5);
+        }
+        const start = chunkIndex * JSON_CHUNK_SIZE;
+        channel.send(JSON.stringify({
+            type: 'file_chunk', fileId, chunkIndex, totalChunks,
+            data: base64.substring(start, start + JSON_CHUNK_SIZE)
+        }));
+        if (paced) {
+            await sleep(50);
+        }
+    }
+}
+
+/**
+ * Receiving side of both protocols, as in the pages; done resolves to the Blob
+ */
+function createReceiver() {
+    const receiver = { wireBytes: 0, messages: 0 };
+    let transfer = null;
+    receiver.done = new Promise(resolve => {
+        const complete = () => {
+            const parts = transfer.binary
+                ? transfer.chunks
+                : [base64ToArrayBuffer(transfer.chunks.join(''))];
+            resolve(new Blob(parts, { type: transfer.fileType }));
+        };
+        receiver.handle = (event) => {
+            receiver.messages++;
+            if (event.data instanceof ArrayBuffer) {
+                receiver.wireBytes += event.data.byteLength;
+                const frame = ft.decodeChunkFrame(event.data);
+                transfer.chunks[frame.chunkIndex] = frame.data;
+            } else {
+                receiver.wireBytes += event.data.length;
+                const data = JSON.parse(event.data);
+                if (data.type === 'file_start') {
+                    transfer = {
+                        chunks: new Array(data.totalChunks), totalChunks: data.totalChunks,
+                        fileType: data.fileType, binary: data.encoding === 'binary-v1', received: -1
+                    };
+                } else if (data.type === 'file_chunk') {
+                    transfer.chunks[data.chunkIndex] = data.data;
+                }
+            }
+            transfer.received++;
+            if (transfer.received === transfer.totalChunks) {
+                complete();
+            }
+        };
+    });
+    return receiver;
+}
+
+function memoryBytes() {
+    if (typeof process !== 'undefined') {
+        const usage = process.memoryUsage();
+        return usage.heapUsed + usage.arrayBuffers;
+    }
+    return performance.memory ? performance.memory.usedJSHeapSize : null; // Chromium only
+}
+
+/**
+ * Send `file` from `sender` to `receiverChannel` with one protocol
+ */
+async function benchProtocol(protocol, sender, receiverChannel, file, { paced = true, flowControl = null } = {}) {
+    const receiver = createReceiver();
+    receiverChannel.onmessage = receiver.handle;
+    const baseline = memoryBytes();
+    let peak = baseline;
+    const sampler = setInterval(() => { peak = Math.max(peak, memoryBytes()); }, 20);
+
+    const start = performance.now();
+    let flow = null;
+    if (protocol === 'binary') {
+        flow = flowControl || new ft.FlowController(sender);
+        await ft.sendFileBinary(sender, file, 1, { flowControl: flow });
+    } else {
+        await sendLegacy(sender, file, paced);
+    }
+    const blob = await receiver.done;
+    const seconds = (performance.now() - start) / 1000;
+    clearInterval(sampler);
+
+    if (blob.size !== file.size) {
+        throw new Error(`${protocol}: received ${blob.size} bytes, sent ${file.size}`);
+    }
+    return {
+        protocol: protocol === 'binary' ? 'binary-v1' : (paced ? 'json' : 'json-unpaced'),
+        size_mb: +(file.size / 2 ** 20).toFixed(1),
+        seconds: +seconds.toFixed(3),
+        mb_per_s: +(file.size / 2 ** 20 / seconds).toFixed(1),
+        messages: receiver.messages,
+        wire_overhead_pct: +((receiver.wireBytes / file.size - 1) * 100).toFixed(1),
+        peak_memory_mb: baseline === null ? null : +((peak - baseline) / 2 ** 20).toFixed(1),
+        flow: flow && flowSummary(flow.stats())
+    };
+}
+
+function flowSummary(stats) {
+    return {
+        chunk_kb: stats.chunkSize / 1024,
+        window_kb: Math.round(stats.window / 1024),
+        rtt_ms: stats.rttMs,
+        waits: stats.waits,
+        starved: stats.starved
+    };
+}
+
+function randomFile(sizeBytes) {
+    const bytes = new Uint8Array(sizeBytes);
+    for (let offset = 0; offset < sizeBytes; offset += 65536) {
+        crypto.getRandomValues(bytes.subarray(offset, offset + 65536));
+    }
+    return new File([bytes], 'bench.bin', { type: 'application/octet-stream' });
+}
+
+/**
+ * In-process stand-in for a connected RTCDataChannel pair: messages are
+ * copied and delivered on a later event loop turn, bufferedAmount counts
+ * what has not been delivered yet and `bufferedamountlow` fires when it
+ * drops to bufferedAmountLowThreshold.
+ */
+function loopbackChannelPair() {
+    const make = () => {
+        const channel = new EventTarget();
+        return Object.assign(channel, {
+            readyState: 'open',
+            binaryType: 'arraybuffer',
+            bufferedAmount: 0,
+            bufferedAmountLowThreshold: 0,
+            onmessage: null,
+            send(data) {
+                const size = typeof data === 'string' ? data.length : data.byteLength;
+                const copy = typeof data === 'string' ? data : data.slice(0);
+                this.bufferedAmount += size;
+                setImmediate(() => {
+                    const before = this.bufferedAmount;
+                    this.bufferedAmount -= size;
+                    if (before > this.bufferedAmountLowThreshold && this.bufferedAmount <= this.bufferedAmountLowThreshold) {
+                        this.dispatchEvent(new Event('bufferedamountlow'));
+                    }
+                    this.peer.onmessage({ data: copy });
+                });
+            }
+        });
+    };
+    const a = make(), b = make();
+    a.peer = b;
+    b.peer = a;
+    return [a, b];
+}
+
+async function main() {
+    const args = process.argv.slice(2);
+    const option = (name, fallback) => {
+        const i = args.indexOf(name);
+        return i >= 0 ? Number(args[i + 1]) : fallback;
+    };
+    const sizeMb = option('--size-mb', 32);
+    const runs = option('--runs', 3);
+    const paced = !args.includes('--unpaced');
+
+    const file = randomFile(sizeMb * 2 ** 20);
+    const results = {};
+    for (let run = 0; run < runs; run++) {
+        for (const protocol of ['binary', 'json']) {
+            const [sender, receiver] = loopbackChannelPair();
+            const result = await benchProtocol(protocol, sender, receiver, file, { paced });
+            (results[result.protocol] = results[result.protocol] || []).push(result);
+            if (global.gc) {
+                global.gc();
+            }
+        }
+    }
+    for (const [protocol, list] of Object.entries(results)) {
+        // Report the median run by throughput
+        const median = list.sort((x, y) => x.mb_per_s - y.mb_per_s)[Math.floor(list.length / 2)];
+        console.log(JSON.stringify({ ...median, runs: list.length, harness: 'node-loopback' }));
+    }
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { randomFile, loopbackChannelPair, benchProtocol }; // scripts/bench_striping.js
+}
+
+if (typeof module !== 'undefined' && require.main === module) {
+    main().catch(error => {
+        console.error(error);
+        process.exit(1);
+    });
+}
@@ -0,0 +1,167 @@
+"""
+Integration check: one session split across two app.py workers
+
+Starts two workers sharing a Redis URL, connects the PC to worker A and the
+phone to worker B, and checks pairing, offer/answer/ICE relay, the QR endpoint
+and disconnect notices across workers. Exits non-zero on the first failure.
+
+Run from the repository root:
+    python scripts/check_multi_worker.py --redis-url redis://localhost:6379/15
+    python scripts/check_multi_worker.py --mode asgi
+
+Without --redis-url an in-process fakeredis server is used as the Redis
+stand-in (pip install fakeredis). Needs requirements-redis.txt, plus
+requirements-asgi.txt for --mode asgi.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from ws_client import SocketIOClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_fake_redis():
+    from fakeredis import TcpFakeServer
+    port = free_port()
+    server = TcpFakeServer((HOST, port), server_type='redis')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'redis://{HOST}:{port}/0'
+
+
+def start_worker(mode, port, redis_url):
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port), REDIS_URL=redis_url)
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}/api/health-check', timeout=1)
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'worker on port {port} did not start')
+
+
+def stop_worker(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def http(port, path, method='GET'):
+    # A non-local Host header skips LAN IP discovery, which is not under test here
+    req = urllib.request.Request(f'http://{HOST}:{port}{path}', method=method,
+                                 headers={'Host': 'check.invalid'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return resp.status, resp.headers.get('Content-Type'), resp.read()
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f'  ok  {message}')
+
+
+async def run_checks(port_a, port_b):
+    loop = asyncio.get_running_loop()
+    _, _, body = await loop.run_in_executor(None, http, port_a, '/api/generate-session', 'POST')
+    session_id = json.loads(body)['session_id']
+    check(bool(session_id), f'worker A created session {session_id}')
+
+    status, content_type, _ = await loop.run_in_executor(None, http, port_b, f'/api/qr/{session_id}')
+    check(status == 200 and content_type == 'image/png', 'worker B serves the QR for a session created on A')
+
+    pc = await SocketIOClient().connect(HOST, port_a)
+    mobile = await SocketIOClient().connect(HOST, port_b)
+    try:
+        pc_ready = pc.wait_for('pc_ready')
+        await pc.emit('pc_join', {'session_id': session_id})
+        await pc_ready
+
+        pc_paired, mobile_paired = pc.wait_for('peer_connected'), mobile.wait_for('peer_connected')
+        await mobile.emit('mobile_join', {'session_id': session_id, 'peer_id': 'phone'})
+        await mobile.wait_for('mobile_ready')
+        await asyncio.gather(pc_paired, mobile_paired)
+        check(True, 'peer_connected reached both workers')
+
+        offer = {'type': 'offer', 'sdp': 'v=0 offer'}
+        pending = mobile.wait_for('webrtc_offer')
+        await pc.emit('webrtc_offer', {'session_id': session_id, 'offer': offer})
+        data, _ = await pending
+        check(data == {'offer': offer, 'from': 'pc'}, 'offer relayed A -> B')
+
+        answer = {'type': 'answer', 'sdp': 'v=0 answer'}
+        pending = pc.wait_for('webrtc_answer')
+        await mobile.emit('webrtc_answer', {'session_id': session_id, 'answer': answer})
+        data, _ = await pending
+        check(data == {'answer': answer, 'from': 'phone'}, 'answer relayed B -> A')
+
+        candidate = {'candidate': 'candidate:1 1 udp 1 10.0.0.2 5000 typ host', 'sdpMid': '0'}
+        pending = pc.wait_for('ice_candidate')
+        await mobile.emit('ice_candidate', {'session_id': session_id, 'candidate': candidate})
+        data, _ = await pending
+        check(data == {'candidate': candidate, 'from': 'phone'}, 'ICE candidate relayed B -> A')
+        check(not any(e == 'webrtc_offer' for e, _, _ in pc.received), 'sender did not get its own offer back')
+
+        pending = pc.wait_for('mobile_disconnected')
+        await mobile.close()
+        await pending
+        check(True, 'mobile_disconnected reached the PC on the other worker')
+    finally:
+        await pc.close()
+        await mobile.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('threading', 'asgi'), default='threading')
+    parser.add_argument('--redis-url', default='')
+    args = parser.parse_args()
+
+    fake = None
+    redis_url = args.redis_url
+    if not redis_url:
+        fake, redis_url = start_fake_redis()
+
+    workers = []
+    try:
+        ports = free_port(), free_port()
+        workers = [start_worker(args.mode, port, redis_url) for port in ports]
+        print(f'Workers ({args.mode}) on ports {ports[0]} and {ports[1]}, Redis at {redis_url}')
+        asyncio.run(run_checks(*ports))
+    except (AssertionError, asyncio.TimeoutError, RuntimeError) as e:
+        print(f'FAIL {e!r}')
+        sys.exit(1)
+    finally:
+        for proc in workers:
+            stop_worker(proc)
+        if fake:
+            fake.shutdown()
+    print('All multi-worker checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+/**
+ * Smoke check: every page's scripts load together without errors
+ *
+ * The pages' scripts are classic scripts, so they share one global lexical
+ * scope: a top-level const or let declared twice, or a name one script uses
+ * before another defines it, stops a whole script before any of it runs.
+ * For each template this evaluates the inline scripts and the static/js
+ * scripts it includes, in the page's order, in one vm realm whose browser
+ * APIs (DOM, Socket.IO, qr-scanner, WebRTC, storage, workers) are inert
+ * stubs, and reports the first error each script throws.
+ *
+ *   node scripts/check_page_scripts.js [templates/pc.html ...]
+ *
+ * Exits non-zero if any script of any page fails to load.
+ */
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const ROOT = path.join(__dirname, '..');
+const PAGES = ['templates/pc.html', 'templates/mobile.html'];
+const SCRIPT = /<script(?:\s+src="([^"]*)")?[^>]*>([\s\S]*?)<\/script>/g;
+const STATIC_SRC = /url_for\('static',\s*filename='([^']+)'\)/;
+
+/**
+ * Anything a page might call or read: every property, call and `new` gives
+ * another stub, so code wiring up the DOM runs without doing anything.
+ * Properties of `known` are read from it instead.
+ */
+function stub(known = {}) {
+    const target = function () {};
+    const proxy = new Proxy(target, {
+        get: (_, key) => {
+            if (Object.prototype.hasOwnProperty.call(known, key)) return known[key];
+            if (key === Symbol.toPrimitive) return () => '';
+            if (key === Symbol.iterator) return function* () {};
+            if (key === 'then') return undefined; // Not a thenable, so awaiting a stub resolves
+            return stub();
+        },
+        set: (_, key, value) => {
+            known[key] = value;
+            return true;
+        },
+        apply: () => stub(),
+        construct: () => stub()
+    });
+    return proxy;
+}
+
+function storage() {
+    const items = new Map();
+    return {
+        getItem: key => (items.has(key) ? items.get(key) : null),
+        setItem: (key, value) => { items.set(key, String(value)); },
+        removeItem: key => { items.delete(key); },
+        clear: () => items.clear()
+    };
+}
+
+function browserRealm(document) {
+    const globals = {
+        console, setTimeout, clearTimeout, setInterval, clearInterval, queueMicrotask,
+        TextEncoder, TextDecoder, URL, URLSearchParams, Blob, AbortController, performance,
+        crypto: globalThis.crypto,
+        location: new URL('http://localhost:5000/mobile?session=check'),
+        localStorage: storage(),
+        sessionStorage: storage(),
+        navigator: stub(),
+        document: stub(document),
+        io: stub(),
+        QrScanner: stub(),
+        Worker: stub(),
+        RTCPeerConnection: stub(),
+        RTCSessionDescription: stub(),
+        RTCIceCandidate: stub(),
+        WebSocket: stub(),
+        fetch: stub(),
+        alert: () => {},
+        confirm: () => false,
+        addEventListener: () => {},
+        removeEventListener: () => {}
+    };
+    const context = vm.createContext(globals);
+    context.window = context.self = vm.runInContext('globalThis', context);
+    return context;
+}
+
+/**
+ * [[name, source]] of a template's inline and static/js scripts, in page order
+ */
+function pageScripts(template) {
+    const html = fs.readFileSync(path.join(ROOT, template), 'utf8');
+    const scripts = [];
+    for (const [, src, body] of html.matchAll(SCRIPT)) {
+        if (src === undefined) {
+            // Jinja expressions in inline scripts only ever fill string literals
+            scripts.push([`${template} (inline)`, body.replace(/\{\{[\s\S]*?\}\}/g, '')]);
+            continue;
+        }
+        const local = STATIC_SRC.exec(src);
+        if (local) {
+            const file = path.join('static', local[1]);
+            scripts.push([file, fs.readFileSync(path.join(ROOT, file), 'utf8')]);
+        }
+        // CDN scripts (Socket.IO, qr-scanner) are the realm's stubs
+    }
+    return scripts;
+}
+
+function checkPage(template) {
+    const document = {};
+    const context = browserRealm(document);
+    let failures = 0;
+    for (const [name, source] of pageScripts(template)) {
+        document.currentScript = { src: `http://localhost:5000/${name}` };
+        try {
+            vm.runInContext(source, context, { filename: name });
+            console.log(`ok    ${template}: ${name}`);
+        } catch (error) {
+            failures++;
+            console.log(`FAIL  ${template}: ${name}: ${error && error.name}: ${error && error.message}`);
+        }
+    }
+    return failures;
+}
+
+function main() {
+    const pages = process.argv.length > 2 ? process.argv.slice(2) : PAGES;
+    process.on('unhandledRejection', error => {
+        console.log(`FAIL  async: ${error && error.name}: ${error && error.message}`);
+        process.exitCode = 1;
+    });
+    let failures = 0;
+    for (const page of pages) {
+        failures += checkPage(page);
+    }
+    if (failures) {
+        console.log(`${failures} script(s) failed to load`);
+        process.exitCode = 1;
+    }
+    // Let rejections from the pages' startup code surface; their timers are not waited for
+    setTimeout(() => process.exit(), 100);
+}
+
+main();
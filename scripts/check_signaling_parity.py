@@ -0,0 +1,328 @@
+"""
+Parity check: JSON WebSocket signaling in app.py vs signaling-server/server.js
+
+Runs the same scripted conversations (join validation, pairing, offer/answer/
+ICE relay (single and batched), ping, error replies, disconnect notices, rejoin grace,
+routing between one PC and several phones) against every backend and
+checks each reply against the protocol signaling-client.js expects. Exits
+non-zero if any backend deviates.
+
+Run from the repository root:
+    python scripts/check_signaling_parity.py
+    python scripts/check_signaling_parity.py --require-node
+
+Backends: app.py /ws in threading and asgi mode, and server.js when its
+dependencies are installed (`npm install` in signaling-server/; skipped
+otherwise unless --require-node is given).
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+from bench_signaling import start_backend, stop_backend
+from ws_client import JsonSignalingClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from session_registry import MAX_RECEIVERS  # noqa: E402
+
+HOST = '127.0.0.1'
+OFFER = {'type': 'offer', 'sdp': 'v=0 offer'}
+ANSWER = {'type': 'answer', 'sdp': 'v=0 answer'}
+
+
+def ice(n):
+    return {'candidate': f'candidate:{n} 1 udp 2122260223 10.0.0.{n} 5000{n} typ host', 'sdpMid': '0', 'sdpMLineIndex': 0}
+
+
+def send(client, message):
+    return ('send', client, message)
+
+
+def expect(client, message):
+    return ('expect', client, message)
+
+
+def close(client):
+    return ('close', client)
+
+
+def joined(role):
+    return {'type': 'joined', 'session_id': 'SESSION', 'peer_type': role, 'features': ['ice_candidates', 'fanout']}
+
+
+def join(role, peer_id=None):
+    message = {'type': 'join', 'session_id': 'SESSION', 'peer_type': role}
+    if peer_id:
+        message['peer_id'] = peer_id
+    return message
+
+
+def paired(peer_id):
+    return {'type': 'peer_connected', 'peer_id': peer_id}
+
+
+def error(message):
+    return {'type': 'error', 'message': message}
+
+
+# Each scenario is a list of steps over named clients; 'SESSION' is replaced by
+# a fresh session id per run. After the last step no client may have unread messages.
+SCENARIOS = {
+    'join validation': [
+        send('a', {'type': 'join'}),
+        expect('a', error('Missing session_id or peer_type')),
+        send('a', {'type': 'join', 'session_id': 'SESSION'}),
+        expect('a', error('Missing session_id or peer_type')),
+        send('a', {'type': 'join', 'session_id': 'SESSION', 'peer_type': 'tv'}),
+        expect('a', error('Invalid peer_type. Must be "pc" or "mobile"')),
+        send('a', join('mobile', 'pc')),
+        expect('a', error('Invalid peer_id')),
+        send('a', join('mobile', 'x' * 65)),
+        expect('a', error('Invalid peer_id')),
+    ],
+    'pairing and relay': [
+        send('pc', join('pc')),
+        expect('pc', joined('pc')),
+        send('mobile', join('mobile', 'phone')),
+        expect('mobile', joined('mobile')),
+        expect('pc', paired('phone')),
+        expect('mobile', paired('pc')),
+        send('pc', {'type': 'webrtc_offer', 'session_id': 'SESSION', 'offer': OFFER}),
+        expect('mobile', {'type': 'webrtc_offer', 'offer': OFFER, 'from': 'pc'}),
+        send('mobile', {'type': 'webrtc_answer', 'session_id': 'SESSION', 'answer': ANSWER}),
+        expect('pc', {'type': 'webrtc_answer', 'answer': ANSWER, 'from': 'phone'}),
+        send('pc', {'type': 'ice_candidate', 'session_id': 'SESSION', 'candidate': ice(1)}),
+        send('pc', {'type': 'ice_candidate', 'session_id': 'SESSION', 'candidate': ice(2)}),
+        send('mobile', {'type': 'ice_candidate', 'session_id': 'SESSION', 'candidate': ice(3)}),
+        send('pc', {'type': 'ice_candidate', 'session_id': 'SESSION', 'candidate': None}),
+        expect('mobile', {'type': 'ice_candidate', 'candidate': ice(1), 'from': 'pc'}),
+        expect('mobile', {'type': 'ice_candidate', 'candidate': ice(2), 'from': 'pc'}),
+        expect('pc', {'type': 'ice_candidate', 'candidate': ice(3), 'from': 'phone'}),
+        expect('mobile', {'type': 'ice_candidate', 'candidate': None, 'from': 'pc'}),  # End of candidates
+        send('mobile', {'type': 'ping'}),
+        expect('mobile', {'type': 'pong'}),
+    ],
+    'batched ICE relay': [
+        send('pc', join('pc')),
+        expect('pc', joined('pc')),
+        send('mobile', join('mobile', 'phone')),
+        expect('mobile', joined('mobile')),
+        expect('pc', paired('phone')),
+        expect('mobile', paired('pc')),
+        send('pc', {'type': 'ice_candidates', 'session_id': 'SESSION', 'candidates': [ice(1), ice(2), None]}),
+        expect('mobile', {'type': 'ice_candidates', 'candidates': [ice(1), ice(2), None], 'from': 'pc'}),
+        send('mobile', {'type': 'ice_candidates', 'session_id': 'SESSION', 'candidates': []}),
+        expect('pc', {'type': 'ice_candidates', 'candidates': [], 'from': 'phone'}),
+        send('mobile', {'type': 'ice_candidates', 'session_id': 'SESSION', 'candidates': ice(3)}),
+        expect('mobile', error('Missing session_id or candidates')),
+    ],
+    'relay errors': [
+        send('a', {'type': 'webrtc_offer', 'offer': OFFER}),
+        expect('a', error('Missing session_id or offer')),
+        send('a', {'type': 'webrtc_answer', 'session_id': 'SESSION'}),
+        expect('a', error('Missing session_id or answer')),
+        send('a', {'type': 'ice_candidate', 'candidate': ice(1)}),
+        expect('a', error('Missing session_id')),
+        send('a', {'type': 'webrtc_offer', 'session_id': 'SESSION', 'offer': OFFER}),
+        expect('a', error('Session not found')),
+        send('a', 'not json'),
+        expect('a', error('Invalid message format')),
+        send('a', {'type': 'no_such_type'}),  # Ignored
+        send('a', {'type': 'ping'}),
+        expect('a', {'type': 'pong'}),
+    ],
+    'disconnect notices': [
+        send('pc', join('pc')),
+        expect('pc', joined('pc')),
+        send('mobile', join('mobile', 'phone')),
+        expect('mobile', joined('mobile')),
+        expect('pc', paired('phone')),
+        expect('mobile', paired('pc')),
+        close('mobile'),
+        expect('pc', {'type': 'mobile_disconnected', 'peer_id': 'phone'}),
+        send('mobile2', join('mobile', 'phone2')),
+        expect('mobile2', joined('mobile')),
+        expect('pc', paired('phone2')),
+        expect('mobile2', paired('pc')),
+        close('pc'),
+        expect('mobile2', {'type': 'pc_disconnected'}),
+        close('mobile2'),
+        # The empty session has no peers: a new join starts unpaired
+        send('late', join('pc')),
+        expect('late', joined('pc')),
+    ],
+    'rejoin grace': [
+        send('pc', join('pc')),
+        expect('pc', joined('pc')),
+        send('mobile', join('mobile', 'phone')),
+        expect('mobile', joined('mobile')),
+        expect('pc', paired('phone')),
+        expect('mobile', paired('pc')),
+        close('mobile'),
+        expect('pc', {'type': 'mobile_disconnected', 'peer_id': 'phone'}),
+        close('pc'),
+        # Both gone, but the session is kept for a rejoin: relaying to it is no error
+        send('a', {'type': 'webrtc_offer', 'session_id': 'SESSION', 'offer': OFFER}),
+        send('a', {'type': 'ping'}),
+        expect('a', {'type': 'pong'}),
+        send('pc2', join('pc')),
+        expect('pc2', joined('pc')),
+        send('mobile2', join('mobile', 'phone2')),
+        expect('mobile2', joined('mobile')),
+        expect('pc2', paired('phone2')),
+        expect('mobile2', paired('pc')),
+    ],
+    'fan-out routing': [
+        send('pc', join('pc')),
+        expect('pc', joined('pc')),
+        send('a', join('mobile', 'phone-a')),
+        expect('a', joined('mobile')),
+        expect('pc', paired('phone-a')),
+        expect('a', paired('pc')),
+        send('b', join('mobile', 'phone-b')),
+        expect('b', joined('mobile')),
+        expect('pc', paired('phone-b')),
+        expect('b', paired('pc')),
+        # Addressed to one phone, answered by the other: nobody else sees either
+        send('pc', {'type': 'webrtc_offer', 'session_id': 'SESSION', 'offer': OFFER, 'to': 'phone-b'}),
+        expect('b', {'type': 'webrtc_offer', 'offer': OFFER, 'from': 'pc'}),
+        send('a', {'type': 'webrtc_answer', 'session_id': 'SESSION', 'answer': ANSWER}),
+        expect('pc', {'type': 'webrtc_answer', 'answer': ANSWER, 'from': 'phone-a'}),
+        # No `to` from the PC: every phone
+        send('pc', {'type': 'ice_candidates', 'session_id': 'SESSION', 'candidates': [None]}),
+        expect('a', {'type': 'ice_candidates', 'candidates': [None], 'from': 'pc'}),
+        expect('b', {'type': 'ice_candidates', 'candidates': [None], 'from': 'pc'}),
+        # A phone back on a new socket takes its slot over; its old socket closing is no disconnect
+        send('a2', join('mobile', 'phone-a')),
+        expect('a2', joined('mobile')),
+        expect('pc', paired('phone-a')),
+        expect('a2', paired('pc')),
+        close('a'),
+        send('pc', {'type': 'ice_candidate', 'session_id': 'SESSION', 'candidate': ice(1), 'to': 'phone-a'}),
+        expect('a2', {'type': 'ice_candidate', 'candidate': ice(1), 'from': 'pc'}),
+        close('b'),
+        expect('pc', {'type': 'mobile_disconnected', 'peer_id': 'phone-b'}),
+        close('pc'),
+        expect('a2', {'type': 'pc_disconnected'}),
+        # A PC joining pairs with every phone already there
+        send('pc2', join('pc')),
+        expect('pc2', joined('pc')),
+        expect('pc2', paired('phone-a')),
+        expect('a2', paired('pc')),
+    ],
+    'receiver limit': [
+        *[step for i in range(MAX_RECEIVERS) for step in (
+            send(f'm{i}', join('mobile', f'phone-{i}')),
+            expect(f'm{i}', joined('mobile')),
+        )],
+        send('extra', join('mobile', 'phone-extra')),
+        expect('extra', error(f'This QR code already has {MAX_RECEIVERS} devices connected.')),
+        # A phone already in the session can still rejoin
+        send('again', join('mobile', 'phone-0')),
+        expect('again', joined('mobile')),
+    ],
+}
+
+
+def substitute(value, session_id):
+    if value == 'SESSION':
+        return session_id
+    if isinstance(value, dict):
+        return {k: substitute(v, session_id) for k, v in value.items()}
+    return value
+
+
+async def next_message(client, cursor, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while len(client.received) <= cursor:
+        if time.perf_counter() > deadline:
+            return None
+        await asyncio.sleep(0.005)
+    return client.received[cursor][1]
+
+
+async def run_scenario(port, path, steps):
+    import json
+    session_id = f'parity-{uuid.uuid4().hex[:12]}'
+    clients, cursors, problems = {}, {}, []
+
+    async def client(name):
+        if name not in clients:
+            clients[name] = await JsonSignalingClient().connect(HOST, port, path)
+            cursors[name] = 0
+        return clients[name]
+
+    try:
+        for step in steps:
+            kind, name = step[0], step[1]
+            if kind == 'send':
+                message = substitute(step[2], session_id)
+                c = await client(name)
+                await c.ws.send(message if isinstance(message, str) else json.dumps(message))
+            elif kind == 'expect':
+                wanted = substitute(step[2], session_id)
+                got = await next_message(await client(name), cursors[name])
+                cursors[name] += 1
+                if got != wanted:
+                    problems.append(f'{name}: expected {wanted}, got {got}')
+                    break
+            elif kind == 'close':
+                await clients[name].close()
+                clients[name].received.clear()
+                cursors[name] = 0
+        await asyncio.sleep(0.2)
+        for name, c in clients.items():
+            extra = c.received[cursors[name]:]
+            if extra:
+                problems.append(f'{name}: unexpected {[data for _, data, _ in extra]}')
+    finally:
+        for c in clients.values():
+            await c.close()
+    return problems
+
+
+async def run_backend(port, path):
+    results = {}
+    for title, steps in SCENARIOS.items():
+        results[title] = await run_scenario(port, path, steps)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--require-node', action='store_true', help='fail instead of skipping server.js')
+    parser.add_argument('--port', type=int, default=5070)
+    args = parser.parse_args()
+
+    backends = [('flask', 'threading', '/ws'), ('flask', 'asgi', '/ws'), ('node', None, '/')]
+    failed = False
+    for i, (backend, mode, path) in enumerate(backends):
+        label = backend if backend == 'node' else f'app.py ({mode})'
+        try:
+            proc = start_backend(backend, args.port + i, mode)
+        except RuntimeError as e:
+            if backend == 'node' and not args.require_node:
+                print(f'SKIP {label}: {e}')
+                continue
+            print(f'FAIL {label}: {e}')
+            failed = True
+            continue
+        try:
+            results = asyncio.run(run_backend(args.port + i, path))
+        finally:
+            stop_backend(proc)
+        for title, problems in results.items():
+            status = 'ok  ' if not problems else 'FAIL'
+            print(f'{status} {label}: {title}')
+            for problem in problems:
+                print(f'       {problem}')
+            failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
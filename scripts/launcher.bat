@@ -3,7 +3,8 @@ REM QR File Share Launcher for Windows
 REM First launch: Installs requirements and opens the app
 REM Subsequent launches: Just opens the app
 
-cd /d "%~dp0"
+REM The launcher lives in scripts\ - run from the project root
+cd /d "%~dp0.."
 
 REM Check if Python is installed
 python --version >nul 2>&1
@@ -25,19 +26,14 @@ if errorlevel 1 (
     exit /b 1
 )
 
-REM Check if requirements are installed
-python -c "import flask, flask_socketio, qrcode, PIL" 2>nul
+REM Check if requirements are installed (cached until requirements.txt changes)
+python dependency_check.py
 if errorlevel 1 (
-    echo Installing requirements...
-    python -m pip install -r requirements.txt
-    if errorlevel 1 (
-        echo.
-        echo Failed to install requirements. Please install manually:
-        echo   pip install -r requirements.txt
-        pause
-        exit /b 1
-    )
-    echo Requirements installed!
+    echo.
+    echo Failed to install requirements. Please install manually:
+    echo   pip install -r requirements.txt
+    pause
+    exit /b 1
 )
 
 REM Run the app
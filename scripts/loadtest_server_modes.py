@@ -0,0 +1,163 @@
+"""
+Load test: idle-connection memory and signaling latency per server mode
+
+Starts app.py on localhost in each SERVER_MODE, opens --connections idle
+Socket.IO sockets, then runs --pairs PC/mobile pairings and times how long a
+webrtc_offer takes to reach the other peer. Prints one JSON object per mode.
+
+Run from the repository root:
+    python scripts/loadtest_server_modes.py --connections 10000
+    python scripts/loadtest_server_modes.py --mode asgi --connections 2000
+
+asgi mode needs requirements-asgi.txt installed. Large --connections values
+need a high open-files limit (the script raises its own soft limit).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from ws_client import SocketIOClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def rss_bytes(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def start_server(mode, port):
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port))
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}/api/health-check', timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start on port {port}')
+
+
+def create_session(port):
+    # A non-local Host header skips LAN IP discovery, which is not under test here
+    req = urllib.request.Request(f'http://{HOST}:{port}/api/generate-session', method='POST',
+                                 headers={'Host': 'loadtest.invalid'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.load(resp)['session_id']
+
+
+async def open_idle(port, count, concurrency=200):
+    clients = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            clients.append(await SocketIOClient().connect(HOST, port))
+
+    results = await asyncio.gather(*(one() for _ in range(count)), return_exceptions=True)
+    failures = sum(isinstance(r, Exception) for r in results)
+    return clients, failures
+
+
+async def pair_and_relay(port):
+    loop = asyncio.get_running_loop()
+    session_id = await loop.run_in_executor(None, create_session, port)
+    pc = await SocketIOClient().connect(HOST, port)
+    mobile = await SocketIOClient().connect(HOST, port)
+    try:
+        pc_paired = pc.wait_for('peer_connected')
+        start = time.perf_counter()
+        await pc.emit('pc_join', {'session_id': session_id})
+        await mobile.emit('mobile_join', {'session_id': session_id})
+        _, paired_at = await pc_paired
+        offer = mobile.wait_for('webrtc_offer')
+        sent_at = time.perf_counter()
+        await pc.emit('webrtc_offer', {'session_id': session_id, 'offer': {'type': 'offer', 'sdp': 'v=0'}})
+        _, received_at = await offer
+        return paired_at - start, received_at - sent_at
+    finally:
+        await pc.close()
+        await mobile.close()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_mode(mode, port, connections, pairs):
+    proc = start_server(mode, port)
+    try:
+        warmup, _ = await open_idle(port, 10)
+        await asyncio.sleep(1)
+        baseline = rss_bytes(proc.pid)
+
+        idle, failures = await open_idle(port, connections)
+        await asyncio.sleep(2)
+        loaded = rss_bytes(proc.pid)
+        opened = len(idle)
+
+        timings = []
+        for _ in range(pairs):
+            timings.append(await pair_and_relay(port))
+        pair_ms = [t[0] * 1000 for t in timings]
+        relay_ms = [t[1] * 1000 for t in timings]
+
+        await asyncio.gather(*(c.close() for c in idle + warmup))
+        return {
+            'mode': mode,
+            'idle_connections': opened,
+            'failed_connections': failures,
+            'rss_baseline_mb': round(baseline / 2**20, 1),
+            'rss_loaded_mb': round(loaded / 2**20, 1),
+            'bytes_per_idle_connection': round((loaded - baseline) / max(opened, 1)),
+            'time_to_pair_ms': {'p50': round(statistics.median(pair_ms), 2), 'p99': round(percentile(pair_ms, 99), 2)},
+            'relay_latency_ms': {'p50': round(statistics.median(relay_ms), 2), 'p99': round(percentile(relay_ms, 99), 2)},
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('threading', 'asgi', 'both'), default='both')
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--pairs', type=int, default=50)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    modes = ('threading', 'asgi') if args.mode == 'both' else (args.mode,)
+    for i, mode in enumerate(modes):
+        result = asyncio.run(run_mode(mode, args.port + i, args.connections, args.pairs))
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
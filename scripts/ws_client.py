@@ -0,0 +1,201 @@
+"""
+Minimal asyncio WebSocket and Socket.IO clients for the load-test scripts
+Standard library only, so thousands of sockets can be opened from one process
+without extra packages. Not meant for use outside scripts/.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+
+
+class WebSocket:
+    """Bare RFC 6455 client: text frames, ping/pong, close"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port, path='/'):
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {host}:{port}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        status = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in status.split(b'\r\n', 1)[0]:
+            writer.close()
+            raise ConnectionError(f'WebSocket upgrade failed: {status[:80]!r}')
+        return cls(reader, writer)
+
+    def _frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack('!H', length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('!Q', length)
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return header + mask + masked
+
+    async def send(self, text):
+        self.writer.write(self._frame(0x1, text.encode()))
+        await self.writer.drain()
+
+    async def recv(self):
+        """Return the next text message, or None once the socket is closed"""
+        message = b''
+        while True:
+            head = await self.reader.readexactly(2)
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.writer.write(self._frame(0xA, payload))
+                continue
+            if opcode in (0x1, 0x2, 0x0):
+                message += payload
+                if head[0] & 0x80:
+                    return message.decode()
+
+    async def close(self):
+        try:
+            self.writer.write(self._frame(0x8, b''))
+            self.writer.close()
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class _EventClient:
+    """Arrival bookkeeping shared by the Socket.IO and JSON clients
+
+    Received events are stamped with time.perf_counter() on arrival and can be
+    awaited with wait_for(event) or collect(event, count).
+    """
+
+    def __init__(self):
+        self.ws = None
+        self._reader = None
+        self._waiters = {}
+        self._arrived = asyncio.Event()
+        self.received = []  # (event, data, arrival_time)
+
+    def _deliver(self, event, data):
+        now = time.perf_counter()
+        self.received.append((event, data, now))
+        self._arrived.set()
+        for future in self._waiters.pop(event, []):
+            if not future.done():
+                future.set_result((data, now))
+
+    def wait_for(self, event, timeout=10):
+        """Await the next `event`; resolves to (data, arrival_time)"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(event, []).append(future)
+        return asyncio.wait_for(future, timeout)
+
+    async def collect(self, event, count, timeout=10):
+        """Wait until `count` `event`s have arrived in total; returns [(data, arrival_time)]"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            matches = [(data, at) for name, data, at in self.received if name == event]
+            if len(matches) >= count:
+                return matches
+            self._arrived.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f'{len(matches)}/{count} {event} received')
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        if self.ws:
+            await self.ws.close()
+
+
+class SocketIOClient(_EventClient):
+    """Socket.IO v5 / Engine.IO v4 client over the websocket transport"""
+
+    def __init__(self):
+        super().__init__()
+        self.sid = None
+
+    async def connect(self, host, port):
+        self.ws = await WebSocket.connect(host, port, '/socket.io/?EIO=4&transport=websocket')
+        opening = await self.ws.recv()
+        if not opening or opening[0] != '0':
+            raise ConnectionError(f'Unexpected Engine.IO open packet: {opening!r}')
+        await self.ws.send('40')
+        reply = await self.ws.recv()
+        if not reply or not reply.startswith('40'):
+            raise ConnectionError(f'Socket.IO connect refused: {reply!r}')
+        self.sid = json.loads(reply[2:] or '{}').get('sid')
+        self._reader = asyncio.ensure_future(self._read_loop())
+        return self
+
+    async def _read_loop(self):
+        try:
+            while True:
+                packet = await self.ws.recv()
+                if packet is None:
+                    break
+                if packet == '2':
+                    await self.ws.send('3')
+                elif packet.startswith('42'):
+                    event, *args = json.loads(packet[2:])
+                    self._deliver(event, args[0] if args else None)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+
+    async def emit(self, event, data=None):
+        payload = [event] if data is None else [event, data]
+        await self.ws.send('42' + json.dumps(payload))
+
+
+class JsonSignalingClient(_EventClient):
+    """Client for the raw-WebSocket JSON protocol of signaling-server/server.js
+
+    Messages are {"type": ..., ...}; the type is used as the event name and the
+    whole message as its data.
+    """
+
+    async def connect(self, host, port, path='/'):
+        self.ws = await WebSocket.connect(host, port, path)
+        self._reader = asyncio.ensure_future(self._read_loop())
+        return self
+
+    async def _read_loop(self):
+        try:
+            while True:
+                text = await self.ws.recv()
+                if text is None:
+                    break
+                message = json.loads(text)
+                self._deliver(message.get('type'), message)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+
+    async def send(self, message):
+        await self.ws.send(json.dumps(message))
@@ -0,0 +1,463 @@
+"""
+Session registry for QR File Share
+Keeps pairing sessions in memory with a sid -> session index and timed cleanup
+"""
+
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger('qrfs.sessions')
+
+# Peer roles a Socket.IO connection can hold inside a session
+ROLES = ('pc', 'mobile')
+# Phones that may join one session's QR at once (one PC sends to all of them)
+MAX_RECEIVERS = 16
+
+
+class SessionFull(Exception):
+    """A mobile tried to join a session that already has max_receivers phones"""
+
+
+def _snapshot(session):
+    """A copy of a session dict the caller may keep (mobiles is copied too)"""
+    return {**session, 'mobiles': dict(session['mobiles'])}
+
+
+class SessionRegistry:
+    """Thread-safe store of pairing sessions
+
+    Every session is a small dict ({'pc_connected', 'mobile_connected', 'pc_sid',
+    'mobile_sid', 'mobiles', 'created_at'}). One PC and up to max_receivers
+    phones can hold a session: `mobiles` maps each phone's peer id to its sid,
+    and mobile_sid is the phone that joined last. A reverse index maps each
+    Socket.IO sid to the session and peer it joined, so disconnects never scan
+    the whole table. Expiry is kept in a min-heap ordered by deadline and
+    drained by a background sweeper thread.
+
+    With rejoin_grace > 0 a session whose last peer leaves is not deleted at once
+    but kept that many seconds, so peers whose sockets dropped (a phone in the
+    file picker) can rejoin it and resume their transfers.
+    """
+
+    blocking = False  # Calls never wait on I/O, so asyncio servers may make them on the event loop
+
+    def __init__(self, timeout=120, sweep_interval=10, on_expire=None, rejoin_grace=0, max_receivers=MAX_RECEIVERS):
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.on_expire = on_expire  # Optional callback(session_id) for logging
+        self.rejoin_grace = rejoin_grace
+        self.max_receivers = max_receivers
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._sid_index = {}  # sid -> (session_id, role, peer_id)
+        self._expiry_heap = []  # (deadline, session_id), stale entries skipped lazily
+        self._deadlines = {}  # session_id -> current deadline; older heap entries are stale
+        self._paired = 0  # Sessions with both peers attached, kept for metrics
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def paired_count(self):
+        """Number of sessions with both PC and mobile attached"""
+        return self._paired
+
+    def create(self, session_id, now=None, **fields):
+        """Register a new, empty session and schedule its expiry
+
+        Extra keyword arguments (e.g. qr_url) are stored on the session as-is.
+        """
+        with self._lock:
+            session = self._insert(session_id, now, fields)
+        self.start_sweeper()
+        return _snapshot(session)
+
+    def get_or_create(self, session_id, now=None, **fields):
+        """Return a copy of the session, creating it first if it does not exist"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._insert(session_id, now, fields)
+        self.start_sweeper()
+        return _snapshot(session)
+
+    def _insert(self, session_id, now, fields):
+        """Store a new session and schedule its expiry; caller must hold the lock"""
+        now = time.time() if now is None else now
+        session = {
+            'pc_connected': False,
+            'mobile_connected': False,
+            'pc_sid': None,
+            'mobile_sid': None,
+            'mobiles': {},
+            'created_at': now,
+            **fields
+        }
+        self._sessions[session_id] = session
+        self._schedule(session_id, now + self.timeout)
+        return session
+
+    def _schedule(self, session_id, deadline):
+        """Set a session's expiry deadline; caller must hold the lock"""
+        self._deadlines[session_id] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, session_id))
+
+    def get(self, session_id):
+        """Return a copy of the session, or None if it does not exist"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return _snapshot(session) if session is not None else None
+
+    def peer(self, sid):
+        """(session_id, role, peer_id) of the slot `sid` holds, or None"""
+        return self._sid_index.get(sid)
+
+    def attach(self, session_id, role, sid, peer_id=None):
+        """Mark `sid` as the `role` peer of a session
+
+        A phone is known by `peer_id` (its sid if not given), so a phone that
+        reconnects with the same peer_id takes its old slot back instead of
+        counting as another receiver. The PC's peer_id is always 'pc'.
+        Returns a copy of the updated session, or None if the session is unknown.
+        Raises SessionFull if the session has max_receivers other phones.
+        """
+        if role not in ROLES:
+            raise ValueError(f'Invalid role: {role}')
+        peer_id = 'pc' if role == 'pc' else peer_id or sid
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            mobiles = session['mobiles']
+            if role == 'mobile' and peer_id not in mobiles and len(mobiles) >= self.max_receivers:
+                raise SessionFull(session_id)
+            # A socket that re-joins under another session leaves its old slot
+            previous = self._sid_index.get(sid)
+            if previous and previous != (session_id, role, peer_id):
+                self._release(sid, *previous)
+            # Drop the index entry of a stale socket still holding this slot
+            old_sid = session['pc_sid'] if role == 'pc' else mobiles.get(peer_id)
+            if old_sid and old_sid != sid:
+                self._sid_index.pop(old_sid, None)
+            was_paired = session['pc_connected'] and session['mobile_connected']
+            if role == 'pc':
+                session['pc_sid'] = sid
+            else:
+                mobiles.pop(peer_id, None)
+                mobiles[peer_id] = sid  # Last joined goes last
+                session['mobile_sid'] = sid
+            session[f'{role}_connected'] = True
+            self._sid_index[sid] = (session_id, role, peer_id)
+            if not was_paired and session['pc_connected'] and session['mobile_connected']:
+                self._paired += 1
+            return _snapshot(session)
+
+    def detach(self, sid):
+        """Release whatever slot `sid` holds
+
+        Returns (session_id, role, peer_id, session) where session is a copy
+        taken after the release, or None if the sid was not in any session.
+        Sessions with no peers left are deleted, or kept for rejoin_grace
+        seconds if that is set; `session['deleted']` tells the caller which.
+        """
+        with self._lock:
+            entry = self._sid_index.get(sid)
+            if entry is None:
+                return None
+            return (*entry, self._release(sid, *entry))
+
+    def _release(self, sid, session_id, role, peer_id):
+        """Free a peer slot; caller must hold the lock"""
+        self._sid_index.pop(sid, None)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        holder = session['pc_sid'] if role == 'pc' else session['mobiles'].get(peer_id)
+        if holder == sid:
+            was_paired = session['pc_connected'] and session['mobile_connected']
+            if role == 'pc':
+                session['pc_sid'] = None
+                session['pc_connected'] = False
+            else:
+                mobiles = session['mobiles']
+                del mobiles[peer_id]
+                session['mobile_sid'] = next(reversed(mobiles.values()), None)
+                session['mobile_connected'] = bool(mobiles)
+            if was_paired and not (session['pc_connected'] and session['mobile_connected']):
+                self._paired -= 1
+        snapshot = _snapshot(session)
+        abandoned = not session['pc_connected'] and not session['mobile_connected']
+        snapshot['deleted'] = abandoned and not self.rejoin_grace
+        if snapshot['deleted']:
+            del self._sessions[session_id]
+            self._deadlines.pop(session_id, None)
+        elif abandoned:
+            self._schedule(session_id, time.time() + self.rejoin_grace)
+        return snapshot
+
+    def sweep(self, now=None):
+        """Delete sessions past their deadline that have no connected peers
+
+        Only heap entries whose deadline has passed are touched, so the cost is
+        proportional to the number of expired entries, not to the live table.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                _, session_id = heapq.heappop(heap)
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue  # Already removed on disconnect
+                if session['pc_connected'] or session['mobile_connected']:
+                    continue  # In use; disconnect will remove it
+                if self._deadlines.get(session_id, now) > now:
+                    continue  # Rescheduled (rejoin grace); a later entry covers it
+                del self._sessions[session_id]
+                del self._deadlines[session_id]
+                expired.append(session_id)
+        if self.on_expire:
+            for session_id in expired:
+                self.on_expire(session_id)
+        return expired
+
+    def start_sweeper(self):
+        """Start the background expiry thread (idempotent)"""
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        """Stop the background expiry thread"""
+        self._stop.set()
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is not None and sweeper is not threading.current_thread():
+            sweeper.join()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self._next_wait()):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('Session sweep failed')
+
+    def _next_wait(self):
+        """Sleep until the earliest deadline, capped at sweep_interval"""
+        with self._lock:
+            if not self._expiry_heap:
+                return self.sweep_interval
+            delay = self._expiry_heap[0][0] - time.time()
+        return min(max(delay, 0.05), self.sweep_interval)
+
+
+class RedisSessionStore:
+    """Session store shared by every worker through a Redis-protocol server
+
+    Same interface as SessionRegistry. Each session is a hash with a TTL that
+    Redis evicts on its own; the TTL is dropped while a peer is attached and the
+    hash is deleted when the last peer leaves. Phones are `mobile:<peer_id>`
+    fields holding their sid. sid -> session entries are plain keys. Updates
+    run in WATCH/MULTI transactions, so workers can race safely.
+    With rejoin_grace the last peer leaving sets a TTL of that many seconds
+    instead of deleting the hash.
+    """
+
+    PREFIX = 'qrfs:'
+    SID_TTL = 24 * 3600  # Safety net for sids orphaned by a crashed worker
+
+    MOBILE_FIELD = 'mobile:'
+    blocking = True  # Every call is a Redis round trip: asyncio servers make them in a worker thread
+
+    def __init__(self, url, timeout=120, on_expire=None, rejoin_grace=0, max_receivers=MAX_RECEIVERS, **_):
+        import redis  # Optional dependency, see requirements-redis.txt
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.timeout = timeout
+        self.rejoin_grace = rejoin_grace
+        self.max_receivers = max_receivers
+        self.on_expire = on_expire  # Redis expires keys itself; kept for interface parity
+
+    def _session_key(self, session_id):
+        return f'{self.PREFIX}session:{session_id}'
+
+    def _sid_key(self, sid):
+        return f'{self.PREFIX}sid:{sid}'
+
+    @staticmethod
+    def _new_mapping(now, fields):
+        now = time.time() if now is None else now
+        mapping = {'pc_sid': '', 'mobile_sid': '', 'created_at': repr(now)}
+        mapping.update({k: str(v) for k, v in fields.items() if v is not None})
+        return mapping
+
+    @classmethod
+    def _decode(cls, raw):
+        """Turn a Redis hash back into the session dict shape"""
+        prefix = cls.MOBILE_FIELD
+        session = {k: v for k, v in raw.items() if not k.startswith(prefix)}
+        session['mobiles'] = {k[len(prefix):]: v for k, v in raw.items() if k.startswith(prefix) and v}
+        for role in ROLES:
+            session[f'{role}_sid'] = raw.get(f'{role}_sid') or None
+            session[f'{role}_connected'] = session[f'{role}_sid'] is not None
+        session['created_at'] = float(raw.get('created_at', 0))
+        return session
+
+    @staticmethod
+    def _parse_entry(entry):
+        """A sid key's value: (session_id, role, peer_id)"""
+        session_id, role, *peer = entry.split('\t')
+        return session_id, role, peer[0] if peer else role
+
+    def __len__(self):
+        # SCAN walks the keyspace; fine for health checks, not for hot paths
+        return sum(1 for _ in self.redis.scan_iter(f'{self.PREFIX}session:*', count=1000))
+
+    def __contains__(self, session_id):
+        return bool(self.redis.exists(self._session_key(session_id)))
+
+    def paired_count(self):
+        """Number of sessions with both peers attached, across all workers (SCAN)"""
+        keys = list(self.redis.scan_iter(f'{self.PREFIX}session:*', count=1000))
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, 'pc_sid', 'mobile_sid')
+        return sum(1 for pc_sid, mobile_sid in pipe.execute() if pc_sid and mobile_sid)
+
+    def create(self, session_id, now=None, **fields):
+        key = self._session_key(session_id)
+        mapping = self._new_mapping(now, fields)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+        return self._decode(mapping)
+
+    def get(self, session_id):
+        raw = self.redis.hgetall(self._session_key(session_id))
+        return self._decode(raw) if raw else None
+
+    def get_or_create(self, session_id, now=None, **fields):
+        key = self._session_key(session_id)
+
+        def update(pipe):
+            raw = pipe.hgetall(key)
+            if raw:
+                return self._decode(raw)
+            mapping = self._new_mapping(now, fields)
+            pipe.multi()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.timeout)
+            return self._decode(mapping)
+
+        return self.redis.transaction(update, key, value_from_callable=True)
+
+    def peer(self, sid):
+        entry = self.redis.get(self._sid_key(sid))
+        return self._parse_entry(entry) if entry else None
+
+    def attach(self, session_id, role, sid, peer_id=None):
+        if role not in ROLES:
+            raise ValueError(f'Invalid role: {role}')
+        peer_id = 'pc' if role == 'pc' else peer_id or sid
+        key, sid_key = self._session_key(session_id), self._sid_key(sid)
+        entry = f'{session_id}\t{role}\t{peer_id}'
+        field = 'pc_sid' if role == 'pc' else f'{self.MOBILE_FIELD}{peer_id}'
+
+        def update(pipe):
+            raw = pipe.hgetall(key)
+            if not raw:
+                return None
+            if role == 'mobile' and not raw.get(field) and len(self._decode(raw)['mobiles']) >= self.max_receivers:
+                raise SessionFull(session_id)
+            previous = pipe.get(sid_key)
+            released = None
+            if previous and previous != entry:
+                released = self._parse_entry(previous)
+                pipe.watch(self._session_key(released[0]))
+            old_sid = raw.get(field)
+            pipe.multi()
+            if released:
+                self._queue_release(pipe, sid, *released)
+            if old_sid and old_sid != sid:
+                pipe.delete(self._sid_key(old_sid))
+            if role == 'mobile':
+                raw.pop(field, None)  # Re-added last: the phone that joined last
+                pipe.hdel(key, field)
+                raw['mobile_sid'] = sid
+                pipe.hset(key, 'mobile_sid', sid)
+            raw[field] = sid
+            pipe.hset(key, field, sid)
+            pipe.persist(key)  # In use - no longer subject to the unpaired TTL
+            pipe.set(sid_key, entry, ex=self.SID_TTL)
+            return self._decode(raw)
+
+        return self.redis.transaction(update, key, sid_key, value_from_callable=True)
+
+    def _queue_release(self, pipe, sid, session_id, role, peer_id):
+        """Queue a slot release inside MULTI; watched keys guard the read"""
+        key = self._session_key(session_id)
+        raw = self.redis.hgetall(key)
+        if not raw:
+            return None
+        field = 'pc_sid' if role == 'pc' else f'{self.MOBILE_FIELD}{peer_id}'
+        if raw.get(field) == sid:
+            if role == 'pc':
+                raw[field] = ''
+                pipe.hset(key, field, '')
+            else:
+                del raw[field]
+                pipe.hdel(key, field)
+                remaining = self._decode(raw)['mobiles']
+                raw['mobile_sid'] = next(reversed(remaining.values()), '')
+                pipe.hset(key, 'mobile_sid', raw['mobile_sid'])
+        session = self._decode(raw)
+        abandoned = not session['pc_connected'] and not session['mobile_connected']
+        session['deleted'] = abandoned and not self.rejoin_grace
+        if session['deleted']:
+            pipe.delete(key)
+        elif abandoned:
+            pipe.expire(key, self.rejoin_grace)
+        return session
+
+    def detach(self, sid):
+        sid_key = self._sid_key(sid)
+
+        def update(pipe):
+            entry = pipe.get(sid_key)
+            if not entry:
+                return None
+            session_id, role, peer_id = self._parse_entry(entry)
+            pipe.watch(self._session_key(session_id))
+            pipe.multi()
+            pipe.delete(sid_key)
+            return (session_id, role, peer_id, self._queue_release(pipe, sid, session_id, role, peer_id))
+
+        return self.redis.transaction(update, sid_key, value_from_callable=True)
+
+    def sweep(self, now=None):
+        """Redis evicts expired sessions itself"""
+        return []
+
+    def start_sweeper(self):
+        pass
+
+    def stop_sweeper(self):
+        pass
+
+
+def open_session_store(url=None, **kwargs):
+    """Return a RedisSessionStore for a redis:// URL, else an in-memory SessionRegistry"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSessionStore(url, **kwargs)
+    return SessionRegistry(**kwargs)
@@ -3,20 +3,37 @@
  * 
  * This server facilitates peer-to-peer connections by relaying WebRTC signaling messages
  * (offers, answers, and ICE candidates) between peers in the same session.
+ *
+ * One PC and up to MAX_RECEIVERS phones share a session. Phones are known by
+ * the peer_id they join with, the PC as 'pc'. A phone's messages go to the PC;
+ * the PC's go to the phone named in `to` (every phone if none). Relayed
+ * messages carry `from`, the sender's peer_id (same as app.py).
  * 
  * Compatible with Railway and other cloud hosting platforms that set PORT environment variable.
  */
 
 const WebSocket = require('ws');
 const http = require('http');
+const crypto = require('crypto');
 
 // Get port from environment variable (Railway, Heroku, etc.) or default to 3000
 const PORT = process.env.PORT || 3000;
 
 // Store active sessions and their connected peers
-// Structure: { sessionId: { peers: Set<ws>, pcPeer: ws, mobilePeer: ws } }
+// Structure: { sessionId: { peers: Set<ws>, pcPeer: ws, mobilePeers: Map<peerId, ws> } }
 const sessions = new Map();
 
+// Optional protocol features announced to clients in the 'joined' message
+const FEATURES = ['ice_candidates', 'fanout'];
+
+// Phones that may join one session at once, and the longest peer_id accepted
+const MAX_RECEIVERS = 16;
+const MAX_PEER_ID = 64;
+
+// Keep a session this long after its last peer leaves, so peers whose sockets
+// dropped can rejoin it and resume their transfers (same as app.py)
+const REJOIN_GRACE_MS = 60 * 1000;
+
 // Create HTTP server (required for WebSocket upgrade)
 const server = http.createServer((req, res) => {
     // Health check endpoint
@@ -46,6 +63,7 @@ const wss = new WebSocket.Server({
 // Handle WebSocket connections
 wss.on('connection', (ws, req) => {
     console.log(`[${new Date().toISOString()}] New WebSocket connection`);
+    ws.id = crypto.randomUUID();
     
     let sessionId = null;
     let peerType = null; // 'pc' or 'mobile'
@@ -73,6 +91,10 @@ wss.on('connection', (ws, req) => {
                     handleIceCandidate(ws, data);
                     break;
                     
+                case 'ice_candidates':
+                    handleIceCandidates(ws, data);
+                    break;
+                    
                 case 'ping':
                     // Respond to ping with pong to keep connection alive
                     sendMessage(ws, { type: 'pong' });
@@ -119,51 +141,107 @@ wss.on('connection', (ws, req) => {
             return;
         }
         
-        sessionId = session_id;
-        peerType = peer_type;
+        // A phone keeps its peer_id across reconnects; without one it is this socket
+        const peerId = peer_type === 'pc' ? 'pc' : data.peer_id || ws.id;
+        if (peer_type === 'mobile' && !validPeerId(peerId)) {
+            sendError(ws, 'Invalid peer_id');
+            return;
+        }
         
         // Get or create session
-        let session = sessions.get(sessionId);
+        let session = sessions.get(session_id);
         if (!session) {
             session = {
                 peers: new Set(),
                 pcPeer: null,
-                mobilePeer: null
+                mobilePeers: new Map(),
+                expiryTimer: null
             };
-            sessions.set(sessionId, session);
+            sessions.set(session_id, session);
+        }
+        
+        if (peer_type === 'mobile' && !session.mobilePeers.has(peerId) && session.mobilePeers.size >= MAX_RECEIVERS) {
+            sendError(ws, `This QR code already has ${MAX_RECEIVERS} devices connected.`);
+            return;
+        }
+        
+        sessionId = session_id;
+        peerType = peer_type;
+        
+        // Rejoined within the grace period
+        if (session.expiryTimer) {
+            clearTimeout(session.expiryTimer);
+            session.expiryTimer = null;
         }
         
         // Add peer to session
         session.peers.add(ws);
         
-        // Store peer by type
+        // Store peer by type; a rejoining phone takes its old slot over
         if (peerType === 'pc') {
             session.pcPeer = ws;
         } else {
-            session.mobilePeer = ws;
+            session.mobilePeers.delete(peerId);
+            session.mobilePeers.set(peerId, ws);
         }
         
         // Store session info on WebSocket
         ws.sessionId = sessionId;
         ws.peerType = peerType;
+        ws.peerId = peerId;
         
-        console.log(`[${new Date().toISOString()}] Peer joined: session=${sessionId}, type=${peerType}`);
+        console.log(`[${new Date().toISOString()}] Peer joined: session=${sessionId}, type=${peerType}, peer=${peerId}`);
         
         // Notify peer that they've joined
         sendMessage(ws, {
             type: 'joined',
             session_id: sessionId,
-            peer_type: peerType
+            peer_type: peerType,
+            features: FEATURES
         });
         
-        // If both peers are connected, notify them
-        if (session.pcPeer && session.mobilePeer) {
-            console.log(`[${new Date().toISOString()}] Both peers connected for session ${sessionId}`);
-            sendMessage(session.pcPeer, { type: 'peer_connected' });
-            sendMessage(session.mobilePeer, { type: 'peer_connected' });
+        // Notify each PC-phone pair this join completes
+        if (session.pcPeer) {
+            const pairs = peerType === 'pc' ? session.mobilePeers : new Map([[peerId, ws]]);
+            pairs.forEach((mobile, mobileId) => {
+                sendMessage(session.pcPeer, { type: 'peer_connected', peer_id: mobileId });
+                sendMessage(mobile, { type: 'peer_connected', peer_id: 'pc' });
+            });
         }
     }
     
+    function validPeerId(peerId) {
+        return typeof peerId === 'string' && peerId.length <= MAX_PEER_ID && !peerId.includes('/') && peerId !== 'pc';
+    }
+    
+    /**
+     * Forward a relayed message to its recipients, stamped with the sender's peer_id
+     *
+     * A phone's messages go to the PC; the PC's go to the phone in `to`, or
+     * to every phone if it names none. A sender that never joined this
+     * session reaches every other peer in it, as before.
+     */
+    function relay(ws, session, data, message) {
+        let targets;
+        if (ws.sessionId !== data.session_id) {
+            targets = [...session.peers].filter(peer => peer !== ws);
+        } else {
+            message.from = ws.peerId;
+            if (ws.peerType === 'mobile') {
+                targets = [session.pcPeer];
+            } else if (data.to) {
+                targets = [session.mobilePeers.get(data.to)];
+            } else {
+                targets = [...session.mobilePeers.values()];
+            }
+        }
+        targets.forEach(peer => {
+            if (peer && peer.readyState === WebSocket.OPEN) {
+                sendMessage(peer, message);
+            }
+        });
+    }
+    
     /**
      * Handle WebRTC offer - forward to the other peer
      */
@@ -181,14 +259,9 @@ wss.on('connection', (ws, req) => {
             return;
         }
         
-        // Forward offer to the other peer (exclude sender)
-        session.peers.forEach(peer => {
-            if (peer !== ws && peer.readyState === WebSocket.OPEN) {
-                sendMessage(peer, {
-                    type: 'webrtc_offer',
-                    offer: offer
-                });
-            }
+        relay(ws, session, data, {
+            type: 'webrtc_offer',
+            offer: offer
         });
     }
     
@@ -209,14 +282,9 @@ wss.on('connection', (ws, req) => {
             return;
         }
         
-        // Forward answer to the other peer (exclude sender)
-        session.peers.forEach(peer => {
-            if (peer !== ws && peer.readyState === WebSocket.OPEN) {
-                sendMessage(peer, {
-                    type: 'webrtc_answer',
-                    answer: answer
-                });
-            }
+        relay(ws, session, data, {
+            type: 'webrtc_answer',
+            answer: answer
         });
     }
     
@@ -237,14 +305,32 @@ wss.on('connection', (ws, req) => {
             return;
         }
         
-        // Forward ICE candidate to the other peer (exclude sender)
-        session.peers.forEach(peer => {
-            if (peer !== ws && peer.readyState === WebSocket.OPEN) {
-                sendMessage(peer, {
-                    type: 'ice_candidate',
-                    candidate: candidate
-                });
-            }
+        relay(ws, session, data, {
+            type: 'ice_candidate',
+            candidate: candidate
+        });
+    }
+    
+    /**
+     * Handle a batch of ICE candidates - forward to the other peer as one message
+     */
+    function handleIceCandidates(ws, data) {
+        const { session_id, candidates } = data;
+        
+        if (!session_id || !Array.isArray(candidates)) {
+            sendError(ws, 'Missing session_id or candidates');
+            return;
+        }
+        
+        const session = sessions.get(session_id);
+        if (!session) {
+            sendError(ws, 'Session not found');
+            return;
+        }
+        
+        relay(ws, session, data, {
+            type: 'ice_candidates',
+            candidates: candidates
         });
     }
     
@@ -258,26 +344,26 @@ wss.on('connection', (ws, req) => {
         // Remove peer from session
         session.peers.delete(ws);
         
-        // Clear peer type references
-        if (session.pcPeer === ws) {
+        // Free the slot and notify the other side - unless the peer has
+        // already rejoined on a new socket, which took the slot over
+        if (ws.peerType === 'pc' && session.pcPeer === ws) {
             session.pcPeer = null;
-        }
-        if (session.mobilePeer === ws) {
-            session.mobilePeer = null;
-        }
-        
-        // Notify other peer about disconnection
-        session.peers.forEach(peer => {
-            if (peer !== ws && peer.readyState === WebSocket.OPEN) {
-                const disconnectType = ws.peerType === 'pc' ? 'pc_disconnected' : 'mobile_disconnected';
-                sendMessage(peer, { type: disconnectType });
+            session.mobilePeers.forEach(mobile => sendMessage(mobile, { type: 'pc_disconnected' }));
+        } else if (ws.peerType === 'mobile' && session.mobilePeers.get(ws.peerId) === ws) {
+            session.mobilePeers.delete(ws.peerId);
+            if (session.pcPeer) {
+                sendMessage(session.pcPeer, { type: 'mobile_disconnected', peer_id: ws.peerId });
             }
-        });
+        }
         
-        // Remove session if no peers left
-        if (session.peers.size === 0) {
-            sessions.delete(sessionId);
-            console.log(`[${new Date().toISOString()}] Session ${sessionId} removed (no peers)`);
+        // Remove session if no peers rejoin within the grace period
+        if (session.peers.size === 0 && !session.expiryTimer) {
+            session.expiryTimer = setTimeout(() => {
+                if (sessions.get(sessionId) === session && session.peers.size === 0) {
+                    sessions.delete(sessionId);
+                    console.log(`[${new Date().toISOString()}] Session ${sessionId} removed (no peers)`);
+                }
+            }, REJOIN_GRACE_MS);
         }
     }
     
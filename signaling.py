@@ -0,0 +1,211 @@
+"""
+Socket.IO signaling logic for QR File Share (LAN mode)
+The handlers here are transport-agnostic: each one takes the caller's sid and
+event data and returns the actions to perform (join a room, emit an event).
+app.py runs them on Flask-SocketIO; asgi_app.py runs them on an asyncio server.
+
+One PC and up to MAX_RECEIVERS phones share a session. Every peer has a
+peer id - 'pc' for the PC, the phone's own `peer_id` from its join (its sid
+if it sends none) - and its own room, `<session_id>/<peer_id>`. Offers,
+answers and candidates are routed, not broadcast: a phone's go to the PC,
+the PC's go to the phone named in `to`. Relayed messages carry `from`, the
+sender's peer id, so the PC can tell its phones apart. peer_connected and
+mobile_disconnected carry the phone's `peer_id`.
+"""
+
+import logging
+from collections import namedtuple
+
+from session_registry import ROLES, SessionFull
+
+logger = logging.getLogger('qrfs.signaling')
+
+# Put connection `sid` into `room`
+JoinRoom = namedtuple('JoinRoom', 'sid room')
+# Emit `event` with `data` to a sid or room, optionally skipping one sid
+Emit = namedtuple('Emit', 'event data to skip_sid')
+
+
+def emit_count(actions):
+    """How many of a handler's actions emit a message (its fan-out, for metrics)"""
+    return sum(1 for action in actions if isinstance(action, Emit))
+
+
+class SignalingHandlers:
+    """Pairing and relay handlers shared by every server mode"""
+
+    # Client events handled with the (sid, data) signature
+    EVENTS = ('pc_join', 'mobile_join', 'webrtc_offer', 'webrtc_answer', 'ice_candidate', 'ice_candidates')
+    # Optional protocol features announced in pc_ready/mobile_ready/joined
+    FEATURES = ('ice_candidates', 'fanout')
+    MAX_PEER_ID = 64  # Characters in a phone's peer_id
+
+    def __init__(self, sessions, log=logger):
+        self.sessions = sessions
+        self.log = log
+
+    def connect(self, sid):
+        self.log.debug('Client connected: %s', sid)
+        return []
+
+    def disconnect(self, sid):
+        self.log.debug('Client disconnected: %s', sid)
+        # Release the slot this client held (O(1) via the sid index)
+        released = self.sessions.detach(sid)
+        if released is None or released[3] is None:
+            return []
+        session_id, role, peer_id, session = released
+        actions = []
+        # Notify the other side that this peer left - unless it has already
+        # rejoined on a new connection, which took the slot over
+        if role == 'pc' and not session['pc_sid']:
+            actions.extend(Emit('pc_disconnected', None, mobile_sid, None)
+                           for mobile_sid in session['mobiles'].values())
+        elif role == 'mobile' and peer_id not in session['mobiles'] and session['pc_sid']:
+            actions.append(Emit('mobile_disconnected', {'peer_id': peer_id}, session['pc_sid'], None))
+
+        if session['deleted']:
+            self.log.info('Deleted session %s - both peers disconnected', session_id)
+        elif not session['pc_connected'] and not session['mobile_connected']:
+            self.log.info('Both peers left session %s - kept for a rejoin', session_id)
+        return actions
+
+    def pc_join(self, sid, data):
+        session_id = data.get('session_id')
+        session = self.sessions.attach(session_id, 'pc', sid)
+        if session is None:
+            return []
+        return [
+            *self._join_rooms(sid, session_id, 'pc'),
+            Emit('pc_ready', {'session_id': session_id, 'features': list(self.FEATURES)}, sid, None),
+            *self._pairings(session, 'pc')
+        ]
+
+    def mobile_join(self, sid, data):
+        session_id = data.get('session_id')
+        self.log.debug('Mobile join request for session: %s', session_id)
+
+        if not session_id:
+            self.log.warning('No session_id provided')
+            return [Emit('error', {'message': 'No session ID provided'}, sid, None)]
+        peer_id = data.get('peer_id') or sid
+        if not self._valid_mobile_id(peer_id):
+            return [Emit('error', {'message': 'Invalid peer_id'}, sid, None)]
+
+        try:
+            session = self.sessions.attach(session_id, 'mobile', sid, peer_id)
+        except SessionFull:
+            self.log.warning('Session %s is full', session_id)
+            return [Emit('error', {'message': self._full_message()}, sid, None)]
+        if session is None:
+            self.log.warning('Session %s not found', session_id)
+            return [Emit('error', {'message': 'Session not found. Please scan the QR code again.'}, sid, None)]
+
+        self.log.info('Mobile %s connected to session %s (%d receivers)', peer_id, session_id,
+                      len(session['mobiles']))
+        return [
+            *self._join_rooms(sid, session_id, peer_id),
+            Emit('mobile_ready', {'session_id': session_id, 'features': list(self.FEATURES)}, sid, None),
+            *self._pairings(session, peer_id)
+        ]
+
+    def join(self, sid, data):
+        """Join as data['peer_type'], creating the session if needed
+
+        This is the `join` message of the JSON WebSocket protocol spoken by
+        signaling-client.js and signaling-server/server.js.
+        """
+        session_id, role = data.get('session_id'), data.get('peer_type')
+        if not session_id or not role:
+            return [Emit('error', {'message': 'Missing session_id or peer_type'}, sid, None)]
+        if role not in ROLES:
+            return [Emit('error', {'message': 'Invalid peer_type. Must be "pc" or "mobile"'}, sid, None)]
+        peer_id = 'pc' if role == 'pc' else data.get('peer_id') or sid
+        if role == 'mobile' and not self._valid_mobile_id(peer_id):
+            return [Emit('error', {'message': 'Invalid peer_id'}, sid, None)]
+
+        session = None
+        try:
+            while session is None:  # Retry if the session expired in between
+                self.sessions.get_or_create(session_id)
+                session = self.sessions.attach(session_id, role, sid, peer_id)
+        except SessionFull:
+            return [Emit('error', {'message': self._full_message()}, sid, None)]
+        self.log.debug('Peer joined: session=%s, type=%s, peer=%s', session_id, role, peer_id)
+
+        return [
+            *self._join_rooms(sid, session_id, peer_id),
+            Emit('joined', {'session_id': session_id, 'peer_type': role, 'features': list(self.FEATURES)}, sid, None),
+            *self._pairings(session, peer_id)
+        ]
+
+    def webrtc_offer(self, sid, data):
+        """Forward WebRTC offer to the other peer"""
+        return self._relay(sid, data, 'webrtc_offer', {'offer': data.get('offer')})
+
+    def webrtc_answer(self, sid, data):
+        """Forward WebRTC answer to the other peer"""
+        return self._relay(sid, data, 'webrtc_answer', {'answer': data.get('answer')})
+
+    def ice_candidate(self, sid, data):
+        """Forward ICE candidate to the other peer"""
+        return self._relay(sid, data, 'ice_candidate', {'candidate': data.get('candidate')})
+
+    def ice_candidates(self, sid, data):
+        """Forward a batch of ICE candidates to the other peer as one message
+
+        Clients coalesce candidates trickled within a few milliseconds; a null
+        entry marks end-of-candidates, exactly as in the single-candidate form.
+        """
+        return self._relay(sid, data, 'ice_candidates', {'candidates': data.get('candidates') or []})
+
+    def _relay(self, sid, data, event, payload):
+        """Route a relayed message to its one recipient, stamped with the sender's peer id
+
+        A phone's messages go to the PC; the PC's go to the phone in `to`, or
+        to every phone if it names none (a page from before fan-out). A sender
+        that never joined gets the old behaviour: everyone else in the room.
+        """
+        session_id = data.get('session_id')
+        peer = self.sessions.peer(sid)
+        if peer is None or peer[0] != session_id:
+            return [Emit(event, payload, session_id, sid)]
+        _, role, peer_id = peer
+        payload['from'] = peer_id
+        if role == 'mobile':
+            return [Emit(event, payload, peer_room(session_id, 'pc'), None)]
+        to = data.get('to')
+        if not to:
+            return [Emit(event, payload, session_id, sid)]
+        return [Emit(event, payload, peer_room(session_id, to), None)]
+
+    @staticmethod
+    def _join_rooms(sid, session_id, peer_id):
+        """The session's room (for older clients) and the peer's own"""
+        return [JoinRoom(sid, session_id), JoinRoom(sid, peer_room(session_id, peer_id))]
+
+    @staticmethod
+    def _pairings(session, peer_id):
+        """peer_connected for each PC-phone pair the join of `peer_id` completes"""
+        if peer_id == 'pc':
+            pairs = session['mobiles'].items()
+        elif session['pc_sid']:
+            pairs = [(peer_id, session['mobiles'][peer_id])]
+        else:
+            pairs = []
+        actions = []
+        for mobile_id, mobile_sid in pairs:
+            actions.append(Emit('peer_connected', {'peer_id': mobile_id}, session['pc_sid'], None))
+            actions.append(Emit('peer_connected', {'peer_id': 'pc'}, mobile_sid, None))
+        return actions
+
+    def _valid_mobile_id(self, peer_id):
+        return isinstance(peer_id, str) and len(peer_id) <= self.MAX_PEER_ID and '/' not in peer_id and peer_id != 'pc'
+
+    def _full_message(self):
+        return f'This QR code already has {self.sessions.max_receivers} devices connected.'
+
+
+def peer_room(session_id, peer_id):
+    """Room of one peer of a session"""
+    return f'{session_id}/{peer_id}'
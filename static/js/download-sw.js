@@ -0,0 +1,94 @@
+/**
+ * Download service worker
+ *
+ * Turns a file arriving over the data channel into an ordinary browser
+ * download without holding it in memory. The page (ServiceWorkerSink in
+ * stream-sink.js) announces a stream over a MessageChannel and then loads
+ * /stream-download/<id>/<name> in a hidden iframe; this worker answers that
+ * request with a ReadableStream fed by the page's chunks.
+ *
+ * Chunks are acknowledged only while the stream's queue has room, so the
+ * page - and through its acks the sending peer - slows down to the speed
+ * the browser writes the download to disk.
+ *
+ * Served by app.py at /download-sw.js so that its scope is the whole origin.
+ */
+
+const DOWNLOAD_PREFIX = '/stream-download/';
+const QUEUED_CHUNKS = 16;
+
+const downloads = new Map(); // id -> {stream, name, size, mimeType}
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => event.waitUntil(self.clients.claim()));
+
+self.addEventListener('message', (event) => {
+    const request = event.data || {};
+    if (request.type !== 'stream') {
+        return; // Keepalive pings only need to wake us up
+    }
+    const port = event.ports[0];
+    let ackPending = false;
+
+    const stream = new ReadableStream({
+        start(controller) {
+            port.onmessage = ({ data: message }) => {
+                if (message.type === 'chunk') {
+                    controller.enqueue(message.chunk);
+                    if (controller.desiredSize > 0) {
+                        port.postMessage({ type: 'ack' });
+                    } else {
+                        ackPending = true; // Acknowledge once the download catches up
+                    }
+                } else if (message.type === 'end') {
+                    controller.close(); // Queued chunks are still delivered
+                } else if (message.type === 'abort') {
+                    controller.error(new Error('Transfer cancelled'));
+                    downloads.delete(request.id);
+                }
+            };
+        },
+        pull() {
+            if (ackPending) {
+                ackPending = false;
+                port.postMessage({ type: 'ack' });
+            }
+        },
+        cancel() {
+            // The user cancelled the download in the browser
+            downloads.delete(request.id);
+            port.postMessage({ type: 'cancelled' });
+        }
+    }, new CountQueuingStrategy({ highWaterMark: QUEUED_CHUNKS }));
+
+    downloads.set(request.id, {
+        stream: stream,
+        name: request.name,
+        size: request.size,
+        mimeType: request.mimeType
+    });
+    port.postMessage({ type: 'ready' });
+});
+
+self.addEventListener('fetch', (event) => {
+    const url = new URL(event.request.url);
+    if (url.origin !== self.location.origin || !url.pathname.startsWith(DOWNLOAD_PREFIX)) {
+        return; // Everything else goes to the network untouched
+    }
+    const id = url.pathname.slice(DOWNLOAD_PREFIX.length).split('/')[0];
+    const download = downloads.get(id);
+    if (!download) {
+        return;
+    }
+    downloads.delete(id); // A stream can be read only once
+    const headers = {
+        'Content-Type': download.mimeType || 'application/octet-stream',
+        'Content-Disposition': `attachment; filename*=UTF-8''${encodeURIComponent(download.name)}`,
+        'X-Content-Type-Options': 'nosniff'
+    };
+    if (Number.isFinite(download.size)) {
+        headers['Content-Length'] = String(download.size);
+    }
+    event.respondWith(new Response(download.stream, { headers: headers }));
+});
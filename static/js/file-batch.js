@@ -0,0 +1,263 @@
+/**
+ * Batched sending of many small files as one tar stream
+ *
+ * Every file sent on its own costs a file_start, an accept prompt on the
+ * receiver and at least one ack round trip, which dominates when a phone
+ * sends hundreds of photos. When the peer lists 'batch-v1' in its hello and
+ * the queue holds at least BATCH_MIN_FILES small files, the sender wraps
+ * them in a FileBatch: a ustar archive (pax headers for long names) built
+ * as a Blob of headers, the Files themselves and padding. Blob parts that
+ * are Files are not read until slice(), so the archive is read chunk by
+ * chunk like any other file and never exists in memory as a whole.
+ *
+ * The batch goes out as one file (sendFileBinary) whose file_start carries
+ * `batch: {files}`, so the receiver gets one prompt for all of it. A
+ * streaming sink saves it as a single .tar; where the page would have to
+ * collect it in memory anyway, TarUnpackSink unpacks it as the chunks
+ * arrive and hands out each file as it completes.
+ */
+
+const BATCH_MIN_FILES = 8; // Fewer small files than this go out one by one
+const BATCH_MAX_FILES = 1000;
+const BATCH_SMALL_FILE = 1024 * 1024; // Larger files are sent on their own
+const BATCH_MAX_BYTES = 64 * 1024 * 1024; // One batch is one resumable transfer
+const TAR_BLOCK = 512;
+
+const tarEncoder = new TextEncoder();
+const tarDecoder = new TextDecoder();
+
+/**
+ * A ustar header block for a regular file (preceded by a pax header if the
+ * name does not fit the 100-byte name field)
+ */
+function tarHeader(name, size, mtime) {
+    const nameBytes = tarEncoder.encode(name);
+    if (nameBytes.length <= 100) {
+        return tarBlock(nameBytes, size, mtime, '0');
+    }
+    // "<length> path=<name>\n", where <length> counts the whole record
+    const body = ` path=${name}\n`;
+    const bodyLength = tarEncoder.encode(body).length;
+    let length = bodyLength + 1;
+    while (String(length).length + bodyLength !== length) {
+        length = String(length).length + bodyLength;
+    }
+    const record = tarEncoder.encode(`${length}${body}`);
+    const padding = (TAR_BLOCK - record.length % TAR_BLOCK) % TAR_BLOCK;
+    const header = new Uint8Array(TAR_BLOCK * 2 + record.length + padding);
+    header.set(tarBlock(tarEncoder.encode('PaxHeader'), record.length, mtime, 'x'), 0);
+    header.set(record, TAR_BLOCK);
+    // The ustar name is only a fallback for readers without pax support
+    header.set(tarBlock(nameBytes.slice(0, 100), size, mtime, '0'), TAR_BLOCK + record.length + padding);
+    return header;
+}
+
+function tarBlock(nameBytes, size, mtime, type) {
+    const block = new Uint8Array(TAR_BLOCK);
+    const octal = (offset, width, value) => {
+        block.set(tarEncoder.encode(value.toString(8).padStart(width - 1, '0')), offset);
+    };
+    block.set(nameBytes, 0);
+    octal(100, 8, 0o644); // mode
+    octal(108, 8, 0); // uid
+    octal(116, 8, 0); // gid
+    octal(124, 12, size);
+    octal(136, 12, Math.floor(mtime / 1000));
+    block.set(tarEncoder.encode('        '), 148); // Checksum field counts as spaces
+    block[156] = type.charCodeAt(0);
+    block.set(tarEncoder.encode('ustar\u000000'), 257);
+    let checksum = 0;
+    for (const byte of block) {
+        checksum += byte;
+    }
+    block.set(tarEncoder.encode(checksum.toString(8).padStart(6, '0') + '\u0000 '), 148);
+    return block;
+}
+
+/**
+ * Small files sent as one tar archive
+ *
+ * Quacks like the File it stands in for (name, size, type, slice()), and
+ * `files` lists the Files inside, in archive order.
+ */
+class FileBatch {
+    constructor(files) {
+        this.files = files;
+        const parts = [];
+        for (const file of files) {
+            parts.push(tarHeader(file.name, file.size, file.lastModified || Date.now()), file);
+            const padding = (TAR_BLOCK - file.size % TAR_BLOCK) % TAR_BLOCK;
+            if (padding) {
+                parts.push(new Uint8Array(padding));
+            }
+        }
+        parts.push(new Uint8Array(TAR_BLOCK * 2)); // End of archive
+        this.archive = new Blob(parts, { type: 'application/x-tar' });
+        this.name = `${files.length} files.tar`;
+        this.size = this.archive.size;
+        this.type = this.archive.type;
+    }
+
+    slice(start, end) {
+        return this.archive.slice(start, end);
+    }
+}
+
+/**
+ * Take a batch of small files off the front of `queue`, or return null
+ *
+ * Batches only if the first queued file is small and the queue holds at
+ * least BATCH_MIN_FILES small files; they leave the queue, larger files
+ * keep their place.
+ */
+function takeBatch(queue) {
+    if (queue.length < BATCH_MIN_FILES || !(queue[0] instanceof File) || queue[0].size > BATCH_SMALL_FILE) {
+        return null;
+    }
+    const files = [];
+    let bytes = 0;
+    for (const file of queue) {
+        if (files.length >= BATCH_MAX_FILES) {
+            break;
+        }
+        if (file instanceof File && file.size <= BATCH_SMALL_FILE && bytes + file.size <= BATCH_MAX_BYTES) {
+            files.push(file);
+            bytes += file.size;
+        }
+    }
+    if (files.length < BATCH_MIN_FILES) {
+        return null;
+    }
+    const batched = new Set(files);
+    queue.splice(0, queue.length, ...queue.filter(file => !batched.has(file)));
+    return new FileBatch(files);
+}
+
+/**
+ * A sink that unpacks a tar stream as it arrives
+ *
+ * onEntry({name, size, blob}) runs for every regular file once its last
+ * byte is written; directories and other entries are skipped. Entry names
+ * are reduced to their last path component.
+ */
+class TarUnpackSink {
+    constructor(onEntry) {
+        this.onEntry = onEntry;
+        this.header = new Uint8Array(TAR_BLOCK);
+        this.headerFill = 0;
+        this.entry = null; // {name, size, parts, left, skip, pax} while reading a body
+        this.padding = 0; // Bytes to skip after the current body
+        this.paxPath = null; // Name for the next entry, from a pax header
+        this.ended = false;
+        this.files = 0;
+    }
+
+    write(chunk) {
+        let offset = 0;
+        while (offset < chunk.length && !this.ended) {
+            if (this.padding > 0) {
+                const skip = Math.min(this.padding, chunk.length - offset);
+                this.padding -= skip;
+                offset += skip;
+            } else if (this.entry) {
+                const take = Math.min(this.entry.left, chunk.length - offset);
+                if (!this.entry.skip) {
+                    this.entry.parts.push(chunk.subarray(offset, offset + take));
+                }
+                this.entry.left -= take;
+                offset += take;
+                if (this.entry.left === 0) {
+                    this.finishEntry();
+                }
+            } else {
+                const take = Math.min(TAR_BLOCK - this.headerFill, chunk.length - offset);
+                this.header.set(chunk.subarray(offset, offset + take), this.headerFill);
+                this.headerFill += take;
+                offset += take;
+                if (this.headerFill === TAR_BLOCK) {
+                    this.headerFill = 0;
+                    this.startEntry();
+                }
+            }
+        }
+        return Promise.resolve();
+    }
+
+    startEntry() {
+        const header = this.header;
+        if (header.every(byte => byte === 0)) {
+            this.ended = true; // First of the two zero blocks that end the archive
+            return;
+        }
+        const field = (offset, length) => {
+            const bytes = header.subarray(offset, offset + length);
+            const end = bytes.indexOf(0);
+            return tarDecoder.decode(end >= 0 ? bytes.subarray(0, end) : bytes);
+        };
+        const size = parseInt(field(124, 12).trim() || '0', 8);
+        const type = String.fromCharCode(header[156] || 48);
+        let name = field(0, 100);
+        if (field(257, 6) === 'ustar' && header[345]) {
+            name = `${field(345, 155)}/${name}`;
+        }
+        if (this.paxPath !== null && type !== 'x') {
+            name = this.paxPath;
+            this.paxPath = null;
+        }
+        this.entry = {
+            name: name.split(/[\\/]/).filter(Boolean).pop() || 'file',
+            size: size,
+            parts: [],
+            left: size,
+            pax: type === 'x',
+            skip: type !== '0' && type !== 'x'
+        };
+        this.padding = 0;
+        if (size === 0) {
+            this.finishEntry();
+        }
+    }
+
+    finishEntry() {
+        const entry = this.entry;
+        this.entry = null;
+        this.padding = (TAR_BLOCK - entry.size % TAR_BLOCK) % TAR_BLOCK;
+        if (entry.pax) {
+            const record = new Uint8Array(entry.size);
+            let at = 0;
+            for (const part of entry.parts) {
+                record.set(part, at);
+                at += part.length;
+            }
+            const text = tarDecoder.decode(record);
+            const match = /(?:^|\n)\d+ path=([^\n]*)\n/.exec(text);
+            this.paxPath = match ? match[1] : null;
+        } else if (!entry.skip) {
+            this.files++;
+            this.onEntry({ name: entry.name, size: entry.size, blob: new Blob(entry.parts) });
+        }
+    }
+
+    close() {
+        return null; // The files went out through onEntry
+    }
+
+    abort() {
+        this.entry = null;
+        this.ended = true;
+    }
+}
+
+/**
+ * The sink for an accepted batch: a streaming sink saves the .tar as it is,
+ * otherwise it is unpacked into Blobs handed to onEntry
+ */
+async function openBatchSink(name, size, type, onEntry) {
+    const sink = await openFileSink(name, size, type);
+    return sink instanceof MemorySink ? new TarUnpackSink(onEntry) : sink;
+}
+
+if (typeof module !== 'undefined') {
+    // Node (scripts/bench_batch.js)
+    module.exports = { FileBatch, TarUnpackSink, takeBatch, tarHeader, BATCH_MIN_FILES, BATCH_SMALL_FILE, BATCH_MAX_BYTES };
+}
@@ -0,0 +1,225 @@
+/**
+ * Content hashes for skipping files the receiver already has
+ *
+ * People send the same photos again after a failed or forgotten attempt.
+ * With 'dedupe-v1' on both sides file_start carries `fileHash`, the
+ * SHA-256 of the file, and a receiver that already holds a file with that
+ * hash answers file_reject with `reason: 'duplicate'` before any chunk is
+ * sent.
+ *
+ * Sender: FileHasher hashes files in a Web Worker (hash-worker.js), one at
+ * a time in the order asked, so the main thread never reads a byte for it.
+ * The page asks as soon as a file is queued; by the time the file reaches
+ * the front of the queue its hash is usually ready, and the offer only
+ * waits for the rest. A FileBatch is hashed from its members' hashes,
+ * names, sizes and dates - everything its tar archive is built from.
+ *
+ * Receiver: HashIndex remembers the hash of every file received, newest
+ * HASH_INDEX_LIMIT of them. Where IndexedDB is available the index is kept
+ * there too, for HASH_INDEX_MAX_AGE, so it outlives the page.
+ */
+
+const HASH_INDEX_LIMIT = 5000;
+const HASH_INDEX_MAX_AGE = 7 * 24 * 60 * 60 * 1000; // ms a remembered file counts as still on this device
+const HASH_INDEX_DB = 'qr-file-share';
+const HASH_INDEX_STORE = 'received-hashes';
+// Next to this script, wherever the page serves it from
+const HASH_WORKER_URL = typeof document !== 'undefined' && document.currentScript ?
+    new URL('hash-worker.js', document.currentScript.src).href : null;
+
+/**
+ * SHA-256 (hex) of Files and FileBatches, computed once per object
+ */
+class FileHasher {
+    constructor(workerUrl = HASH_WORKER_URL) {
+        this.worker = null;
+        this.inline = null; // hashBlob() on this thread, where there is no Worker (Node)
+        this.hashes = new WeakMap(); // File or FileBatch -> Promise of its hash
+        this.pending = new Map(); // Worker job id -> {resolve, reject}
+        this.jobCounter = 0;
+        if (typeof Worker !== 'undefined' && workerUrl) {
+            try {
+                this.worker = new Worker(workerUrl);
+                this.worker.onmessage = (event) => this.finished(event.data);
+                this.worker.onerror = (event) => this.failAll(event.message || 'Hash worker failed');
+            } catch (error) {
+                console.warn('No hash worker, files will not be checked for duplicates:', error);
+            }
+        } else if (typeof module !== 'undefined') {
+            this.inline = require('./hash-worker.js').hashBlob;
+        }
+    }
+
+    /**
+     * True if hash() can return anything
+     */
+    available() {
+        return !!(this.worker || this.inline);
+    }
+
+    /**
+     * Resolve to the hash of `file` (a File, Blob or FileBatch)
+     * The first call starts the work; later calls share its result.
+     */
+    hash(file) {
+        let hash = this.hashes.get(file);
+        if (!hash) {
+            hash = file.files ? this.hashBatch(file) : this.hashBlob(file);
+            this.hashes.set(file, hash);
+            hash.catch(() => this.hashes.delete(file)); // Asking again tries again
+        }
+        return hash;
+    }
+
+    async hashBatch(batch) {
+        const members = await Promise.all(batch.files.map(async file => [
+            file.name, file.size, file.lastModified || 0, await this.hash(file)
+        ]));
+        return this.hashBlob(new Blob([JSON.stringify(members)]));
+    }
+
+    hashBlob(blob) {
+        if (this.inline) {
+            return this.inline(blob);
+        }
+        if (!this.worker) {
+            return Promise.reject(new Error('No hash worker'));
+        }
+        return new Promise((resolve, reject) => {
+            const id = ++this.jobCounter;
+            this.pending.set(id, { resolve, reject });
+            this.worker.postMessage({ id, blob });
+        });
+    }
+
+    finished({ id, hash, error }) {
+        const job = this.pending.get(id);
+        this.pending.delete(id);
+        if (job) {
+            error ? job.reject(new Error(error)) : job.resolve(hash);
+        }
+    }
+
+    failAll(message) {
+        this.pending.forEach(job => job.reject(new Error(message)));
+        this.pending.clear();
+    }
+}
+
+/**
+ * The files received on this device, by hash: bounded, oldest dropped first
+ *
+ * Lookups are synchronous against the in-memory map; load() fills it from
+ * IndexedDB, and add() and delete() write through to it in the background.
+ * Without IndexedDB (or in a private window that refuses it) the index
+ * lasts as long as the page.
+ */
+class HashIndex {
+    constructor({ limit = HASH_INDEX_LIMIT, maxAge = HASH_INDEX_MAX_AGE } = {}) {
+        this.limit = limit;
+        this.maxAge = maxAge;
+        this.entries = new Map(); // hash -> {hash, name, size, at}, least recently used first
+        this.db = null; // Promise of the IDBDatabase, or null without IndexedDB
+    }
+
+    /**
+     * Read the persisted index; resolves once lookups see it
+     */
+    async load() {
+        if (typeof indexedDB === 'undefined') {
+            return;
+        }
+        this.db = new Promise((resolve, reject) => {
+            const request = indexedDB.open(HASH_INDEX_DB, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(HASH_INDEX_STORE, { keyPath: 'hash' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+        try {
+            const stored = await this.request('readonly', store => store.getAll());
+            const now = Date.now();
+            stored.sort((a, b) => a.at - b.at);
+            for (const entry of stored) {
+                if (now - entry.at > this.maxAge) {
+                    this.request('readwrite', store => store.delete(entry.hash));
+                } else if (!this.entries.has(entry.hash)) {
+                    this.entries.set(entry.hash, entry);
+                }
+            }
+            this.evict();
+        } catch (error) {
+            console.warn('Received-file index not available, remembering files for this page only:', error);
+            this.db = null;
+        }
+    }
+
+    /**
+     * The entry for `hash` ({name, size, at}), or null if no such file was received
+     */
+    get(hash) {
+        const entry = this.entries.get(hash);
+        if (!entry) {
+            return null;
+        }
+        if (Date.now() - entry.at > this.maxAge) {
+            this.delete(hash);
+            return null;
+        }
+        this.entries.delete(hash); // Most recently used goes last
+        this.entries.set(hash, entry);
+        return entry;
+    }
+
+    add(hash, name, size) {
+        const entry = { hash, name, size, at: Date.now() };
+        this.entries.delete(hash);
+        this.entries.set(hash, entry);
+        this.request('readwrite', store => store.put(entry));
+        this.evict();
+    }
+
+    /**
+     * Forget `hash`, so the file is received again next time it is sent
+     */
+    delete(hash) {
+        this.entries.delete(hash);
+        this.request('readwrite', store => store.delete(hash));
+    }
+
+    evict() {
+        for (const hash of this.entries.keys()) {
+            if (this.entries.size <= this.limit) {
+                break;
+            }
+            this.delete(hash);
+        }
+    }
+
+    /**
+     * Run `operation(store)` in a transaction; resolves to its result (null without IndexedDB)
+     */
+    async request(mode, operation) {
+        if (!this.db) {
+            return null;
+        }
+        try {
+            const db = await this.db;
+            return await new Promise((resolve, reject) => {
+                const request = operation(db.transaction(HASH_INDEX_STORE, mode).objectStore(HASH_INDEX_STORE));
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        } catch (error) {
+            if (mode === 'readonly') {
+                throw error;
+            }
+            console.warn('Could not update the received-file index:', error);
+            return null;
+        }
+    }
+}
+
+if (typeof module !== 'undefined') {
+    // Node (scripts/bench_dedupe.js)
+    module.exports = { FileHasher, HashIndex, HASH_INDEX_LIMIT };
+}
@@ -0,0 +1,1600 @@
+/**
+ * Data channel file transfer protocol
+ *
+ * File metadata travels as JSON control messages, file bytes as binary
+ * frames read lazily from the File with slice() - no base64, no full copy
+ * of the file in memory on either side.
+ *
+ * When the channel opens each page sends a `hello` listing the protocols it
+ * speaks. Files go out as binary frames once the peer's hello lists
+ * 'binary-v1'; a peer that never says hello (an older page) gets the legacy
+ * base64-in-JSON messages (`file`, `file_start` + `file_chunk`).
+ *
+ * With 'accept-v1' on both sides the receiver decides before any bytes move:
+ * file_start carries needsAccept, the receiver answers file_accept or
+ * file_reject, and while the file streams into its sink (stream-sink.js)
+ * it acknowledges written chunks with file_ack. The sender keeps at most
+ * ACK_WINDOW chunks unacknowledged, so a slow disk slows the sender down
+ * instead of piling chunks up in the receiver's memory. Either side can stop
+ * a running transfer: the receiver with file_reject, the sender with
+ * file_cancel.
+ *
+ * With 'stripe-v1' on both sides each page also opens a pool of extra data
+ * channels ("lanes", labelled files-lane-N) for the chunk frames it sends.
+ * The chunks of an accepted file are spread over whichever lanes have room,
+ * so one stalled SCTP stream no longer holds up the whole transfer, and
+ * several files can be in flight at once. Lanes carry chunk frames only;
+ * control messages stay on the main channel. Frames can therefore overtake
+ * each other, and IncomingFile puts them back in order by chunk index.
+ *
+ * With 'resume-v1' on both sides a transfer survives losing the connection.
+ * file_start carries a resumeId that stays with the File for as long as the
+ * page keeps it, and every frame carries the CRC-32 of its chunk. Together
+ * with the file_start fields this is the transfer's manifest: fileId, size,
+ * chunk count and a per-chunk checksum. The receiver checks each chunk
+ * against its checksum and keeps the IncomingFile (its sink, the chunks it
+ * has, their checksums) after the channel goes away. When the sender offers
+ * the same resumeId again over a new channel, the receiver skips the prompt
+ * and answers file_accept with `resume: {from, have, crc}`: chunks below
+ * `from` are written, `have` lists the later ones it already holds, and `crc`
+ * is the checksum of chunk from - 1. The sender compares that checksum with
+ * its own copy of the chunk and then sends only the missing chunks.
+ *
+ * With 'batch-v1' on both sides many small files may go out as one tar
+ * archive (FileBatch, file-batch.js) whose file_start carries
+ * `batch: {files}`; the receiver accepts or rejects the batch as a whole.
+ *
+ * With 'dedupe-v1' on both sides file_start carries `fileHash`, the SHA-256
+ * of the file (FileHasher, file-hash.js). A receiver that already has a file
+ * with that hash answers file_reject with `reason: 'duplicate'` instead of
+ * asking the user, and the sender reports the file as already there.
+ *
+ * With 'deflate-v1' on both sides (pages list it only where the browser has
+ * CompressionStream and DecompressionStream) the sender compresses files
+ * that are worth it: not a known compressed format (JPEG, MP4, ZIP, OOXML
+ * documents, ...) and the first chunk shrinks to under
+ * COMPRESSION_MIN_SAVING of its size. file_start then says
+ * `compression: 'deflate'` and every chunk is compressed on its own, so
+ * chunks stay independent for striping and resume; a frame carries the
+ * deflate flag only if compressing made it smaller. Chunk indexes, sizes
+ * and CRCs all refer to the uncompressed bytes.
+ *
+ * The per-chunk work - reading, CRC-32, (de)compression, framing and the
+ * legacy base64 - runs in a Web Worker (ChunkPipeline, transfer-worker.js),
+ * which hands finished frames and chunks over as transferred ArrayBuffers.
+ * The page thread only sends frames and writes chunks to the sink.
+ *
+ * One sender can serve several receivers at once (one PC, many phones):
+ * each receiver has its own connection, TransferProtocol and flow control,
+ * and its own sendFileBinary() call per file, so each is paced by its own
+ * link and acks and a slow phone never holds up the rest. What they share is
+ * the per-chunk work: every call sends the file under the same fileId and
+ * chunk size, through one SharedChunks, which reads, checks and frames each
+ * chunk once and hands the same frame to every receiver that asks for it.
+ *
+ * Binary chunk frame, big-endian:
+ *   0   uint8   protocol version (1)
+ *   1   uint8   frame type (1 = file chunk, 2 = file chunk with CRC-32)
+ *   2   uint8   flags (bit 0: payload is deflate-compressed)
+ *   3   uint8   reserved, 0
+ *   4   uint32  fileId (from the preceding file_start)
+ *   8   uint32  chunk index
+ *   12  uint32  CRC-32 of the chunk bytes (type 2 only)
+ *   12/16 ...   chunk bytes (compressed if flagged)
+ *
+ * Usage:
+ *   const transferProtocol = new TransferProtocol({ channels: 4 });
+ *   transferProtocol.attach(dataChannel, peerConnection); // before any message arrives
+ *   dataChannel.onopen = () => transferProtocol.sendHello();
+ *   peerConnection.ondatachannel = (event) =>
+ *       transferProtocol.receiveLane(event.channel, handleBinaryChunk) || ...;
+ *   if (await transferProtocol.useBinary()) {
+ *       await sendFileBinary(dataChannel, file, transferProtocol.nextFileId(), {
+ *           flowControl: transferProtocol.pool,
+ *           acceptor: transferProtocol.supportsAccept() ? transferProtocol : null
+ *       });
+ *   }
+ */
+
+const TRANSFER_PROTOCOL_VERSION = 1;
+const COMPRESSION_SUPPORTED = typeof CompressionStream !== 'undefined' && typeof DecompressionStream !== 'undefined';
+const TRANSFER_PROTOCOLS = ['binary-v1', 'accept-v1', 'stripe-v1', 'resume-v1', 'batch-v1', 'dedupe-v1',
+    ...(COMPRESSION_SUPPORTED ? ['deflate-v1'] : []), 'json'];
+const FRAME_HEADER_SIZE = 12;
+const FRAME_CRC_HEADER_SIZE = 16;
+const FRAME_FILE_CHUNK = 1;
+const FRAME_FILE_CHUNK_CRC = 2;
+const FRAME_FLAG_DEFLATE = 1;
+const READ_AHEAD = 4; // Chunks read (and compressed, in parallel) ahead of the one being sent
+const COMPRESSION_MIN_SAVING = 0.1; // Compress only files whose first chunk shrinks by at least this much
+const COMPRESSION_SAMPLE_EVERY = 16; // Compress at least every this many chunks to keep measuring the compressor
+const COMPRESSED_TYPES = /^(image\/(?!svg|bmp)|video\/|audio\/(?!wav|x-wav))|zip|compressed|x-7z|x-rar|x-xz|x-bzip|zstd|officedocument|opendocument|epub|java-archive/;
+const COMPRESSED_EXTENSIONS = /\.(jpe?g|png|gif|webp|heic|heif|avif|mp4|m4v|mov|mkv|webm|avi|mp3|m4a|aac|ogg|opus|flac|zip|gz|tgz|7z|rar|xz|bz2|zst|docx|xlsx|pptx|odt|ods|odp|apk|ipa|jar|epub)$/i;
+const BINARY_CHUNK_SIZE = 64 * 1024; // Until the SCTP max message size is known: safe everywhere
+const HELLO_TIMEOUT = 1000; // ms to wait for the peer's hello before falling back to JSON
+const ACK_WINDOW = 64; // Chunks in flight before the sender waits for file_ack (4MB)
+const ACK_EVERY = 16; // Receiver acknowledges every this many written chunks
+const WAIT_POLL_INTERVAL = 250; // ms between cancellation checks while waiting on the peer
+const FLOW_INITIAL_WINDOW = 1024 * 1024; // Send buffer bytes before waiting for bufferedamountlow
+const FLOW_MIN_WINDOW = 256 * 1024;
+const FLOW_MAX_WINDOW = 16 * 1024 * 1024;
+const FLOW_MIN_CHUNK = 16 * 1024;
+const FLOW_MAX_MESSAGE = 256 * 1024; // Larger messages only add head-of-line blocking
+const FLOW_DEFAULT_RTT = 50; // ms, until getStats() reports the candidate pair's RTT
+const FLOW_SCHEDULING_SLACK = 50; // ms the page may take to react to bufferedamountlow
+const FLOW_SAMPLE_INTERVAL = 250; // ms between window adjustments
+const FLOW_RTT_INTERVAL = 2000; // ms between RTT polls
+const FLOW_WAKE_INTERVAL = 250; // ms, longest wait without checking for cancellation
+const TRANSFER_CHANNELS = 4; // Data channels per peer for striped transfers, main channel included
+const LANE_LABEL_PREFIX = 'files-lane-';
+const LEGACY_CHUNK_SIZE = 200 * 1024; // base64 characters per legacy file_chunk message
+const LEGACY_CHUNK_BYTES = LEGACY_CHUNK_SIZE / 4 * 3; // File bytes per legacy chunk
+const FANOUT_CACHE_CHUNKS = 64; // Prepared chunks SharedChunks keeps for receivers that are behind
+// Next to this script, wherever the page serves it from
+const TRANSFER_WORKER_URL = typeof document !== 'undefined' && document.currentScript ?
+    new URL('transfer-worker.js', document.currentScript.src).href : null;
+
+/**
+ * The data channel closed under a transfer (as opposed to a user cancel)
+ */
+class ChannelClosedError extends Error {
+    constructor(message = 'Data channel closed during send') {
+        super(message);
+        this.name = 'ChannelClosedError';
+    }
+}
+
+const CRC32_TABLE = new Uint32Array(256).map((_, n) => {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+        c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    }
+    return c;
+});
+
+/**
+ * CRC-32 (as in zip and PNG) of a Uint8Array
+ * crypto.subtle would give SHA-256, but it is missing on plain http:// LAN pages.
+ */
+function crc32(bytes) {
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = CRC32_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    }
+    return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+
+/**
+ * CRC-32 of the bytes of `blob`
+ */
+async function crc32Blob(blob) {
+    return crc32(new Uint8Array(await blob.arrayBuffer()));
+}
+
+/**
+ * deflate `bytes` (a Uint8Array or ArrayBuffer) with CompressionStream
+ */
+async function deflateChunk(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new CompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+async function inflateChunk(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+/**
+ * Whether `file` ({name, type}) is worth compressing, judged by its type and
+ * `sample` (a Blob of its first chunk)
+ * Resolves to the bytes/s the sample compressed at, or 0 if it is not worth it.
+ */
+async function worthCompressing(file, sample) {
+    if (COMPRESSED_TYPES.test(file.type || '') || COMPRESSED_EXTENSIONS.test(file.name || '') || sample.size === 0) {
+        return 0;
+    }
+    const bytes = new Uint8Array(await sample.arrayBuffer());
+    const started = performance.now();
+    const packed = await deflateChunk(bytes);
+    const rate = bytes.byteLength / Math.max(performance.now() - started, 0.1) * 1000;
+    return packed.byteLength <= bytes.byteLength * (1 - COMPRESSION_MIN_SAVING) ? rate : 0;
+}
+
+/**
+ * Read `blob` (one chunk's slice of the file) and frame it as chunk `chunkIndex`
+ * With `deflate` the frame is compressed if that makes it smaller, and
+ * deflateRate reports the bytes/s the compressor managed (0 if not tried).
+ * Resolves to {chunkIndex, frame: ArrayBuffer, size, flags, deflateRate}.
+ */
+async function packChunk(blob, fileId, chunkIndex, { withCrc = false, deflate = false } = {}) {
+    const bytes = new Uint8Array(await blob.arrayBuffer());
+    const crc = withCrc ? crc32(bytes) : null;
+    let payload = bytes, flags = 0, deflateRate = 0;
+    if (deflate) {
+        const started = performance.now();
+        const packed = await deflateChunk(bytes);
+        deflateRate = bytes.byteLength / Math.max(performance.now() - started, 0.1) * 1000;
+        if (packed.byteLength < bytes.byteLength) {
+            payload = packed;
+            flags = FRAME_FLAG_DEFLATE;
+        }
+    }
+    return {
+        chunkIndex: chunkIndex,
+        frame: encodeChunkFrame(fileId, chunkIndex, payload, crc, flags),
+        size: bytes.byteLength,
+        flags: flags,
+        deflateRate: deflateRate
+    };
+}
+
+/**
+ * The chunk bytes of a received frame's `data`, inflated if `compressed`
+ * Resolves to null if they do not match `crc` (when there is one).
+ */
+async function unpackChunk(data, compressed, crc) {
+    const bytes = compressed ? await inflateChunk(data) : data;
+    return crc === null || crc === undefined || crc32(bytes) === crc ? bytes : null;
+}
+
+function bytesToBase64(bytes) {
+    let binary = '';
+    for (let offset = 0; offset < bytes.length; offset += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(offset, offset + 0x8000));
+    }
+    return btoa(binary);
+}
+
+function base64ToBytes(base64) {
+    const binary = atob(base64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+/**
+ * A legacy JSON message: `fields` plus `data`, the base64 of `blob`
+ */
+async function legacyMessage(blob, fields) {
+    return JSON.stringify({ ...fields, data: bytesToBase64(new Uint8Array(await blob.arrayBuffer())) });
+}
+
+/**
+ * A Blob of the bytes in legacy base64 `parts` (each a whole number of base64 quanta)
+ */
+function base64Blob(parts, type) {
+    return new Blob(parts.map(base64ToBytes), { type: type });
+}
+
+/**
+ * Per-chunk work for sending and receiving, off the page's thread
+ *
+ * Every method runs in a Web Worker (transfer-worker.js) where the browser
+ * allows one, and on this thread otherwise, with the same results. Frames
+ * and chunk bytes go to and from the worker as transferred ArrayBuffers, so
+ * they are never copied; a received frame's buffer belongs to the worker
+ * once unpack() is called.
+ */
+class ChunkPipeline {
+    constructor(workerUrl = TRANSFER_WORKER_URL) {
+        this.worker = null;
+        this.pending = new Map(); // Job id -> {resolve, reject}
+        this.jobCounter = 0;
+        if (typeof Worker !== 'undefined' && workerUrl) {
+            try {
+                this.worker = new Worker(workerUrl);
+                this.worker.onmessage = (event) => this.finished(event.data);
+                this.worker.onerror = (event) => this.stopWorker(event.message || 'Transfer worker failed');
+            } catch (error) {
+                console.warn('No transfer worker, chunks are handled on the page thread:', error);
+            }
+        }
+    }
+
+    /**
+     * packChunk() for chunk `chunkIndex`, read from `blob` (the chunk's slice)
+     */
+    pack(blob, fileId, chunkIndex, options) {
+        if (!this.worker) {
+            return packChunk(blob, fileId, chunkIndex, options);
+        }
+        return this.call('pack', { blob, fileId, chunkIndex, options });
+    }
+
+    /**
+     * worthCompressing() for `file`, sampling `blob` (its first chunk's slice)
+     */
+    probe(file, blob) {
+        if (!this.worker) {
+            return worthCompressing(file, blob);
+        }
+        return this.call('probe', { blob, name: file.name, type: file.type });
+    }
+
+    /**
+     * CRC-32 of the bytes of `blob` (a chunk's slice), as a resume check
+     */
+    crc(blob) {
+        return this.worker ? this.call('crc', { blob }) : crc32Blob(blob);
+    }
+
+    /**
+     * unpackChunk() for a decoded frame: resolves to its bytes, or null on a CRC mismatch
+     */
+    async unpack(frame) {
+        if (!this.worker) {
+            return unpackChunk(frame.data, frame.compressed, frame.crc);
+        }
+        const { buffer, byteOffset, byteLength } = frame.data;
+        const result = await this.call('unpack', {
+            buffer, byteOffset, byteLength, compressed: frame.compressed, crc: frame.crc
+        }, [buffer]);
+        return result && new Uint8Array(result.buffer, result.byteOffset, result.byteLength);
+    }
+
+    legacyMessage(blob, fields) {
+        return this.worker ? this.call('legacyMessage', { blob, fields }) : legacyMessage(blob, fields);
+    }
+
+    async base64Blob(parts, type) {
+        return this.worker ? this.call('base64Blob', { parts, type }) : base64Blob(parts, type);
+    }
+
+    call(op, args, transfer = []) {
+        return new Promise((resolve, reject) => {
+            const id = ++this.jobCounter;
+            this.pending.set(id, { resolve, reject });
+            this.worker.postMessage({ id, op, args }, transfer);
+        });
+    }
+
+    finished({ id, result, error }) {
+        const job = this.pending.get(id);
+        this.pending.delete(id);
+        if (job) {
+            error ? job.reject(new Error(error)) : job.resolve(result);
+        }
+    }
+
+    /**
+     * The worker died: fail what it was doing and work on this thread from now on
+     */
+    stopWorker(message) {
+        console.error('Transfer worker failed, continuing on the page thread:', message);
+        this.worker.terminate();
+        this.worker = null;
+        this.pending.forEach(job => job.reject(new Error(message)));
+        this.pending.clear();
+    }
+}
+
+const inlineChunks = new ChunkPipeline(null); // For callers without a pipeline (and Node)
+
+/**
+ * pack() shared by the sends of one file to several receivers
+ *
+ * The first receiver to ask for a chunk has `pipeline` prepare it; the
+ * others get the same prepared chunk. A chunk is dropped once every
+ * receiver still sending the file has taken it, and the oldest ones go when
+ * more than `capacity` are held: a receiver that far behind the rest
+ * prepares its chunks again itself, so it costs work, never a stall or
+ * unbounded memory. Receivers that want a chunk differently (without a
+ * CRC, uncompressed) get their own. Pass it as sendFileBinary()'s
+ * `pipeline`, with the same fileId and chunkSize for every receiver.
+ */
+class SharedChunks {
+    constructor(pipeline = null, readers = 0, capacity = FANOUT_CACHE_CHUNKS) {
+        this.pipeline = pipeline || inlineChunks;
+        this.readers = readers; // Receivers the file is still being sent to
+        this.capacity = capacity;
+        this.held = new Map(); // key -> {chunk: Promise, taken}, oldest first
+        this.packed = 0; // Chunks prepared, for stats
+        this.probed = null; // The file's compression probe, run once for every receiver
+    }
+
+    /**
+     * One more receiver will read the file
+     */
+    join() {
+        this.readers++;
+    }
+
+    /**
+     * A receiver is done with the file (sent, declined or failed)
+     */
+    leave() {
+        this.readers = Math.max(0, this.readers - 1);
+        if (this.readers === 0) {
+            this.held.clear();
+        }
+    }
+
+    pack(blob, fileId, chunkIndex, options = {}) {
+        const key = `${chunkIndex}/${blob.size}/${!!options.withCrc}/${!!options.deflate}`;
+        let entry = this.held.get(key);
+        if (!entry) {
+            this.packed++;
+            entry = { chunk: this.pipeline.pack(blob, fileId, chunkIndex, options), taken: 0 };
+            entry.chunk.catch(() => this.held.delete(key)); // A failed read is retried by whoever asks next
+            this.held.set(key, entry);
+            if (this.held.size > this.capacity) {
+                this.held.delete(this.held.keys().next().value);
+            }
+        }
+        if (++entry.taken >= this.readers) {
+            this.held.delete(key);
+        }
+        return entry.chunk;
+    }
+
+    probe(file, blob) {
+        if (!this.probed) {
+            this.probed = this.pipeline.probe(file, blob);
+            this.probed.catch(() => { this.probed = null; });
+        }
+        return this.probed;
+    }
+
+    crc(blob) {
+        return this.pipeline.crc(blob);
+    }
+}
+
+class TransferProtocol {
+    constructor({ channels = TRANSFER_CHANNELS } = {}) {
+        this.channels = Math.max(1, channels);
+        this.channel = null;
+        this.pool = null; // ChannelPool: the attached channel plus any striping lanes
+        this.flow = null; // FlowController of the attached channel
+        this.peerProtocols = null; // null until the peer's hello (or its timeout)
+        this.helloWaiters = [];
+        this.fileIdCounter = 0;
+        this.decisions = {}; // fileId -> 'accept' | 'reject' | 'duplicate' from the receiver
+        this.acked = {}; // fileId -> highest chunk index the receiver has written
+        this.resumes = {}; // fileId -> resume point from a file_accept
+        this.waiters = new Set();
+        // Survive attach(): they are what lets a transfer continue on a new channel
+        this.tickets = new WeakMap(); // File -> {resumeId, chunkSize} while it is being sent
+        this.incoming = new Map(); // resumeId -> IncomingFile while it is being received
+    }
+
+    /**
+     * Use `channel` for transfers; call again for every new data channel
+     */
+    attach(channel, peerConnection = null) {
+        this.channel = channel;
+        this.pool = new ChannelPool(channel, peerConnection);
+        this.flow = this.pool.main;
+        this.peerProtocols = null;
+        this.decisions = {};
+        this.acked = {};
+        this.resumes = {};
+        channel.binaryType = 'arraybuffer';
+        this.waiters.forEach(check => check()); // Waits on the replaced channel fail now, not at the next poll
+    }
+
+    /**
+     * Announce our protocols to the peer (call once the channel is open)
+     */
+    sendHello() {
+        this.channel.send(JSON.stringify({
+            type: 'hello',
+            version: TRANSFER_PROTOCOL_VERSION,
+            protocols: TRANSFER_PROTOCOLS
+        }));
+    }
+
+    /**
+     * Handle the peer's `hello` control message
+     */
+    handleHello(message) {
+        this.peerProtocols = Array.isArray(message.protocols) ? message.protocols : [];
+        console.log('Peer transfer protocols:', this.peerProtocols.join(', '));
+        if (this.supportsStriping()) {
+            this.pool.open(this.channels - 1);
+        }
+        this.helloWaiters.forEach(resolve => resolve());
+        this.helloWaiters = [];
+    }
+
+    /**
+     * Wire up a data channel the peer opened; returns false if it is not a lane
+     * Lanes only carry chunk frames, which go to onFrame(buffer).
+     */
+    receiveLane(channel, onFrame) {
+        if (!channel.label.startsWith(LANE_LABEL_PREFIX)) {
+            return false;
+        }
+        channel.binaryType = 'arraybuffer';
+        channel.onmessage = (event) => {
+            if (event.data instanceof ArrayBuffer) {
+                onFrame(event.data);
+            }
+        };
+        return true;
+    }
+
+    /**
+     * Handle a sender-side control message; returns false for anything else
+     */
+    handleControl(message) {
+        if (message.type === 'hello') {
+            this.handleHello(message);
+        } else if (message.type === 'file_accept' || message.type === 'file_reject') {
+            this.decisions[message.fileId] = message.type === 'file_accept' ? 'accept' :
+                message.reason === 'duplicate' ? 'duplicate' : 'reject';
+            if (message.resume) {
+                this.resumes[message.fileId] = message.resume;
+                // Chunks below `from` are written already
+                this.acked[message.fileId] = message.resume.from - 1;
+            }
+        } else if (message.type === 'file_ack') {
+            this.acked[message.fileId] = Math.max(this.acked[message.fileId] ?? -1, message.chunkIndex);
+        } else {
+            return false;
+        }
+        [...this.waiters].forEach(check => check());
+        return true;
+    }
+
+    /**
+     * True if the peer decides on files before they are sent (accept-v1)
+     */
+    supportsAccept() {
+        return this.peerProtocols !== null && this.peerProtocols.includes('accept-v1');
+    }
+
+    /**
+     * True if chunks may be striped over several channels (stripe-v1)
+     * Striping needs accept-v1 too: file_accept is what guarantees the
+     * receiver has seen file_start before frames arrive on other channels.
+     */
+    supportsStriping() {
+        return this.supportsAccept() && this.peerProtocols.includes('stripe-v1');
+    }
+
+    /**
+     * True if interrupted transfers can continue where they stopped (resume-v1)
+     */
+    supportsResume() {
+        return this.supportsAccept() && this.peerProtocols.includes('resume-v1');
+    }
+
+    /**
+     * True if chunks may be sent deflate-compressed (deflate-v1 on both sides)
+     */
+    supportsCompression() {
+        return COMPRESSION_SUPPORTED && this.supportsAccept() && this.peerProtocols.includes('deflate-v1');
+    }
+
+    /**
+     * True if small files may go out together as one archive (batch-v1)
+     */
+    supportsBatch() {
+        return this.supportsAccept() && this.peerProtocols.includes('batch-v1');
+    }
+
+    /**
+     * True if the receiver can skip files it already has, by hash (dedupe-v1)
+     */
+    supportsDedupe() {
+        return this.supportsAccept() && this.peerProtocols.includes('dedupe-v1');
+    }
+
+    /**
+     * The resumeId and chunk size `file` is sent with, the same on every attempt
+     * A new ticket uses `chunkSize`; an old one whose chunks no longer fit in a
+     * message is replaced, which makes the receiver start over.
+     */
+    resumeTicket(file, chunkSize) {
+        let ticket = this.tickets.get(file);
+        if (!ticket || ticket.chunkSize > chunkSize) {
+            const id = crypto.getRandomValues(new Uint8Array(16));
+            ticket = {
+                resumeId: Array.from(id, b => b.toString(16).padStart(2, '0')).join(''),
+                chunkSize: chunkSize
+            };
+            this.tickets.set(file, ticket);
+        }
+        return ticket;
+    }
+
+    /**
+     * The file is through (or failed for good): a later send starts afresh
+     */
+    dropTicket(file) {
+        this.tickets.delete(file);
+    }
+
+    /**
+     * The receiver's resume point for fileId: {from, have: Set, crc} or null
+     */
+    takeResume(fileId) {
+        const resume = this.resumes[fileId];
+        delete this.resumes[fileId];
+        if (!resume) {
+            return null;
+        }
+        return { from: resume.from, have: new Set(resume.have || []), crc: resume.crc ?? null };
+    }
+
+    /**
+     * Remember a received file so the sender can resume it after a reconnect
+     */
+    trackIncoming(incoming) {
+        for (const [resumeId, file] of this.incoming) {
+            if (!file.resumable()) {
+                this.incoming.delete(resumeId);
+            }
+        }
+        if (incoming.resumeId) {
+            this.incoming.set(incoming.resumeId, incoming);
+        }
+    }
+
+    /**
+     * The IncomingFile a file_start continues, or null for a new file
+     */
+    findResumable(start) {
+        const incoming = start.resumeId ? this.incoming.get(start.resumeId) : null;
+        if (!incoming || !incoming.resumable() || incoming.size !== start.fileSize ||
+            incoming.totalChunks !== start.totalChunks || incoming.chunkSize !== start.chunkSize) {
+            return null;
+        }
+        return incoming;
+    }
+
+    /**
+     * How many files the page may send at once
+     */
+    maxConcurrentFiles() {
+        return this.supportsStriping() ? this.channels : 1;
+    }
+
+    /**
+     * Resolve to 'accept', 'reject' or 'duplicate' once the receiver has decided on fileId
+     */
+    async waitForDecision(fileId, isCancelled) {
+        await this.waitFor(() => fileId in this.decisions, isCancelled);
+        return this.decisions[fileId];
+    }
+
+    /**
+     * Resolve once the receiver has written chunk `chunkIndex` (immediately if negative)
+     * Rejects if the receiver cancels the accepted transfer.
+     */
+    waitForAck(fileId, chunkIndex, isCancelled) {
+        this.checkNotCancelled(fileId);
+        if ((this.acked[fileId] ?? -1) >= chunkIndex) {
+            return Promise.resolve();
+        }
+        return this.waitFor(() => {
+            this.checkNotCancelled(fileId);
+            return (this.acked[fileId] ?? -1) >= chunkIndex;
+        }, isCancelled);
+    }
+
+    /**
+     * Throw if the receiver rejected fileId after accepting it
+     */
+    checkNotCancelled(fileId) {
+        if (this.decisions[fileId] === 'reject') {
+            throw new Error('Cancelled by receiver');
+        }
+    }
+
+    /**
+     * Forget the bookkeeping of a finished transfer
+     */
+    forget(fileId) {
+        delete this.decisions[fileId];
+        delete this.acked[fileId];
+        delete this.resumes[fileId];
+    }
+
+    /**
+     * Resolve once ready() is true, re-checked on every control message
+     * Rejects if the channel closes or attach() replaces it, the user cancels, or ready() throws.
+     */
+    waitFor(ready, isCancelled) {
+        const channel = this.channel; // attach() may replace it while we wait
+        return new Promise((resolve, reject) => {
+            const check = () => {
+                let error = null;
+                try {
+                    if (this.channel !== channel || channel.readyState !== 'open') {
+                        error = new ChannelClosedError();
+                    } else if (isCancelled && isCancelled()) {
+                        error = new Error('Queue cancelled by user');
+                    } else if (!ready()) {
+                        return;
+                    }
+                } catch (failure) {
+                    error = failure;
+                }
+                clearInterval(timer);
+                this.waiters.delete(check);
+                error ? reject(error) : resolve();
+            };
+            const timer = setInterval(check, WAIT_POLL_INTERVAL);
+            this.waiters.add(check);
+            check();
+        });
+    }
+
+    /**
+     * Resolve to true if files should go out as binary frames
+     * Waits up to HELLO_TIMEOUT for the peer's hello, once per channel.
+     */
+    async useBinary() {
+        if (this.peerProtocols === null) {
+            await new Promise(resolve => {
+                this.helloWaiters.push(resolve);
+                setTimeout(resolve, HELLO_TIMEOUT);
+            });
+            if (this.peerProtocols === null) {
+                console.log('No transfer hello from peer, using JSON transfers');
+                this.peerProtocols = ['json'];
+            }
+        }
+        return this.peerProtocols.includes('binary-v1');
+    }
+
+    /**
+     * Next fileId for a binary transfer (fits the frame's uint32)
+     */
+    nextFileId() {
+        this.fileIdCounter = (this.fileIdCounter + 1) % 0x100000000;
+        return this.fileIdCounter;
+    }
+}
+
+/**
+ * Build a file chunk frame: header followed by `bytes` (ArrayBuffer or view)
+ * With a `crc` the frame is type 2 and carries it; `flags` is FRAME_FLAG_*.
+ */
+function encodeChunkFrame(fileId, chunkIndex, bytes, crc = null, flags = 0) {
+    const headerSize = crc === null ? FRAME_HEADER_SIZE : FRAME_CRC_HEADER_SIZE;
+    const frame = new Uint8Array(headerSize + bytes.byteLength);
+    const view = new DataView(frame.buffer);
+    view.setUint8(0, TRANSFER_PROTOCOL_VERSION);
+    view.setUint8(1, crc === null ? FRAME_FILE_CHUNK : FRAME_FILE_CHUNK_CRC);
+    view.setUint8(2, flags);
+    view.setUint32(4, fileId);
+    view.setUint32(8, chunkIndex);
+    if (crc !== null) {
+        view.setUint32(12, crc);
+    }
+    frame.set(bytes instanceof Uint8Array ? bytes : new Uint8Array(bytes), headerSize);
+    return frame.buffer;
+}
+
+/**
+ * Parse a frame; returns {fileId, chunkIndex, crc, compressed, data} or null if unsupported
+ * `crc` is null for type 1 frames; `data` is a view into `buffer`, not a copy.
+ */
+function decodeChunkFrame(buffer) {
+    if (buffer.byteLength < FRAME_HEADER_SIZE) {
+        return null;
+    }
+    const view = new DataView(buffer);
+    const type = view.getUint8(1);
+    if (view.getUint8(0) !== TRANSFER_PROTOCOL_VERSION || (type !== FRAME_FILE_CHUNK && type !== FRAME_FILE_CHUNK_CRC)) {
+        return null;
+    }
+    const withCrc = type === FRAME_FILE_CHUNK_CRC;
+    if (withCrc && buffer.byteLength < FRAME_CRC_HEADER_SIZE) {
+        return null;
+    }
+    return {
+        fileId: view.getUint32(4),
+        chunkIndex: view.getUint32(8),
+        crc: withCrc ? view.getUint32(12) : null,
+        compressed: (view.getUint8(2) & FRAME_FLAG_DEFLATE) !== 0,
+        data: new Uint8Array(buffer, withCrc ? FRAME_CRC_HEADER_SIZE : FRAME_HEADER_SIZE)
+    };
+}
+
+/**
+ * Event-driven send-side flow control for one data channel
+ *
+ * Senders await ready() before each message and report it with sent().
+ * ready() returns at once while the channel's send buffer holds less than
+ * the window, and otherwise sleeps until the browser fires
+ * `bufferedamountlow` - no polling loops or fixed delays.
+ *
+ * The window follows the link: every SAMPLE_INTERVAL it is set to twice
+ * the bytes the link drains in one RTT plus scheduling slack (measured
+ * throughput x RTT, RTT from the selected ICE candidate pair). It also grows
+ * whenever the buffer ran completely dry while we waited, which means the
+ * link idled for lack of data. The chunk size follows the SCTP max message
+ * size negotiated for the connection.
+ */
+class FlowController {
+    constructor(channel, peerConnection = null) {
+        this.channel = channel;
+        this.peerConnection = peerConnection;
+        this.window = FLOW_INITIAL_WINDOW;
+        this.rtt = FLOW_DEFAULT_RTT; // ms
+        this.throughput = 0; // Bytes/s, smoothed
+        this.bytesSent = 0;
+        this.payloadBytes = 0;
+        this.startedAt = null;
+        this.waits = 0; // ready() calls that had to wait for the buffer to drain
+        this.starved = 0; // Waits after which the buffer had run dry
+        this.sampleAt = 0;
+        this.sampleDelivered = 0;
+        this.rttPolledAt = 0;
+        this.starvedSinceSample = false;
+        channel.bufferedAmountLowThreshold = this.window / 2;
+    }
+
+    /**
+     * SCTP max message size negotiated with the peer (0 if unknown)
+     */
+    get maxMessageSize() {
+        const sctp = this.peerConnection && this.peerConnection.sctp;
+        return sctp ? sctp.maxMessageSize : 0;
+    }
+
+    /**
+     * Payload bytes per binary frame: the largest power of two that fits a message
+     */
+    get chunkSize() {
+        const maxMessageSize = this.maxMessageSize;
+        if (!maxMessageSize) {
+            return BINARY_CHUNK_SIZE;
+        }
+        const fits = Math.min(maxMessageSize, FLOW_MAX_MESSAGE) - FRAME_CRC_HEADER_SIZE;
+        return Math.max(FLOW_MIN_CHUNK, 2 ** Math.floor(Math.log2(fits)));
+    }
+
+    /**
+     * Resolve when another message may be queued
+     * Throws if the channel closes or isCancelled() turns true while waiting.
+     */
+    async ready(isCancelled = null) {
+        this.adapt();
+        while (this.channel.bufferedAmount > this.window) {
+            this.waits++;
+            await this.drained();
+            if (this.channel.readyState !== 'open') {
+                throw new ChannelClosedError();
+            }
+            if (isCancelled && isCancelled()) {
+                throw new Error('Queue cancelled by user');
+            }
+            if (this.channel.bufferedAmount === 0) {
+                // Woken too late: the link sat idle
+                this.starved++;
+                this.starvedSinceSample = true;
+            }
+        }
+    }
+
+    /**
+     * Resolve to the FlowController to send the next chunk on - this one
+     * The single-channel counterpart of ChannelPool.acquire().
+     */
+    async acquire(isCancelled = null) {
+        await this.ready(isCancelled);
+        return this;
+    }
+
+    /**
+     * Bytes queued on the channel, not yet sent
+     */
+    get bufferedAmount() {
+        return this.channel.bufferedAmount;
+    }
+
+    /**
+     * Fraction of the window in use; the pool sends on the least loaded lane
+     */
+    load() {
+        return this.channel.bufferedAmount / this.window;
+    }
+
+    /**
+     * Count a sent message of `bytes`, carrying `payloadBytes` of file data
+     * (fewer than `bytes` for a plain frame, more for a compressed one)
+     */
+    sent(bytes, payloadBytes = bytes) {
+        if (this.startedAt === null) {
+            this.startedAt = performance.now();
+            this.sampleAt = this.startedAt;
+        }
+        this.bytesSent += bytes;
+        this.payloadBytes += payloadBytes;
+    }
+
+    drained() {
+        return new Promise(resolve => {
+            const done = () => {
+                clearTimeout(timer);
+                this.channel.removeEventListener('bufferedamountlow', done);
+                this.channel.removeEventListener('close', done);
+                resolve();
+            };
+            // The timer only bounds how long a cancel goes unnoticed
+            const timer = setTimeout(done, FLOW_WAKE_INTERVAL);
+            this.channel.addEventListener('bufferedamountlow', done);
+            this.channel.addEventListener('close', done);
+        });
+    }
+
+    adapt() {
+        const now = performance.now();
+        if (this.startedAt === null || now - this.sampleAt < FLOW_SAMPLE_INTERVAL) {
+            return;
+        }
+        const delivered = this.bytesSent - this.channel.bufferedAmount;
+        const rate = (delivered - this.sampleDelivered) / ((now - this.sampleAt) / 1000);
+        this.sampleAt = now;
+        this.sampleDelivered = delivered;
+        this.throughput = this.throughput ? 0.7 * this.throughput + 0.3 * rate : rate;
+
+        const target = 2 * this.throughput * (this.rtt + FLOW_SCHEDULING_SLACK) / 1000;
+        const grown = this.starvedSinceSample ? this.window * 1.5 : 0;
+        this.starvedSinceSample = false;
+        this.window = Math.min(FLOW_MAX_WINDOW, Math.max(FLOW_MIN_WINDOW, target, grown));
+        this.channel.bufferedAmountLowThreshold = this.window / 2;
+
+        if (this.peerConnection && now - this.rttPolledAt > FLOW_RTT_INTERVAL) {
+            this.rttPolledAt = now;
+            this.pollRtt();
+        }
+    }
+
+    async pollRtt() {
+        try {
+            const stats = await this.peerConnection.getStats();
+            stats.forEach(report => {
+                if (report.type === 'candidate-pair' && report.nominated && report.state === 'succeeded' &&
+                    report.currentRoundTripTime !== undefined) {
+                    this.rtt = report.currentRoundTripTime * 1000;
+                }
+            });
+        } catch (error) {
+            // Keep the last estimate
+        }
+    }
+
+    /**
+     * Snapshot for logging and benchmarks (rates in bytes/s, times in ms)
+     */
+    stats() {
+        const elapsed = this.startedAt === null ? 0 : performance.now() - this.startedAt;
+        return {
+            bytesSent: this.bytesSent,
+            payloadBytes: this.payloadBytes,
+            elapsedMs: Math.round(elapsed),
+            averageThroughput: elapsed ? Math.round(this.bytesSent / (elapsed / 1000)) : 0,
+            throughput: Math.round(this.throughput),
+            rttMs: Math.round(this.rtt * 10) / 10,
+            window: Math.round(this.window),
+            bufferedAmount: this.channel.bufferedAmount,
+            chunkSize: this.chunkSize,
+            maxMessageSize: this.maxMessageSize,
+            waits: this.waits,
+            starved: this.starved
+        };
+    }
+}
+
+/**
+ * The data channels chunk frames may be sent on, each with its own FlowController
+ *
+ * `main` is the page's data channel, which also carries the control
+ * messages; open() adds lanes next to it. acquire() hands out the least
+ * loaded open lane that has room in its window and otherwise sleeps until
+ * any lane drains. Lanes that close drop out of the pool; the transfer only
+ * fails when no open channel is left.
+ */
+class ChannelPool {
+    constructor(channel, peerConnection = null) {
+        this.peerConnection = peerConnection;
+        this.main = new FlowController(channel, peerConnection);
+        this.lanes = [this.main];
+        this.waits = 0; // acquire() calls that found every lane full
+    }
+
+    /**
+     * Open `count` extra lanes; each joins the pool once it is open
+     */
+    open(count) {
+        if (!this.peerConnection) {
+            return;
+        }
+        for (let i = 1; i <= count; i++) {
+            const channel = this.peerConnection.createDataChannel(`${LANE_LABEL_PREFIX}${i}`, { ordered: true });
+            channel.binaryType = 'arraybuffer';
+            channel.addEventListener('open', () => this.addLane(channel), { once: true });
+        }
+    }
+
+    /**
+     * Add an already open channel as a lane
+     */
+    addLane(channel) {
+        if (this.main.channel.readyState === 'open') {
+            this.lanes.push(new FlowController(channel, this.peerConnection));
+        } else {
+            channel.close(); // Opened after the connection went away
+        }
+    }
+
+    /**
+     * The main channel's chunk size: all lanes share one SCTP association
+     */
+    get chunkSize() {
+        return this.main.chunkSize;
+    }
+
+    /**
+     * Bytes queued on all lanes, not yet sent
+     */
+    get bufferedAmount() {
+        return this.lanes.reduce((total, lane) => total + lane.channel.bufferedAmount, 0);
+    }
+
+    /**
+     * Bytes/s the lanes drain together (their FlowController estimates)
+     */
+    get throughput() {
+        return this.lanes.reduce((total, lane) => total + lane.throughput, 0);
+    }
+
+    /**
+     * Resolve to the FlowController of the lane to send the next chunk on
+     */
+    async acquire(isCancelled = null) {
+        for (;;) {
+            const lanes = this.lanes.filter(lane => lane.channel.readyState === 'open');
+            if (lanes.length === 0) {
+                throw new ChannelClosedError();
+            }
+            lanes.forEach(lane => lane.adapt());
+            const lane = lanes.reduce((best, candidate) => candidate.load() < best.load() ? candidate : best);
+            if (lane.load() <= 1) {
+                return lane;
+            }
+            this.waits++;
+            await this.anyDrained(lanes);
+            if (isCancelled && isCancelled()) {
+                throw new Error('Queue cancelled by user');
+            }
+        }
+    }
+
+    anyDrained(lanes) {
+        return new Promise(resolve => {
+            const done = () => {
+                clearTimeout(timer);
+                lanes.forEach(lane => {
+                    lane.channel.removeEventListener('bufferedamountlow', done);
+                    lane.channel.removeEventListener('close', done);
+                });
+                resolve();
+            };
+            const timer = setTimeout(done, FLOW_WAKE_INTERVAL);
+            lanes.forEach(lane => {
+                lane.channel.addEventListener('bufferedamountlow', done);
+                lane.channel.addEventListener('close', done);
+            });
+        });
+    }
+
+    /**
+     * Snapshot of every lane's FlowController stats plus pool totals
+     */
+    stats() {
+        const lanes = this.lanes.map(lane => lane.stats());
+        const bytesSent = lanes.reduce((total, lane) => total + lane.bytesSent, 0);
+        const payloadBytes = lanes.reduce((total, lane) => total + lane.payloadBytes, 0);
+        return {
+            channels: lanes.length,
+            bytesSent: bytesSent,
+            payloadBytes: payloadBytes,
+            // Share of the file bytes compression kept off the wire (frame headers count against it)
+            wireSavings: payloadBytes ? Math.round((1 - bytesSent / payloadBytes) * 1000) / 1000 : 0,
+            throughput: Math.round(this.throughput),
+            waits: this.waits,
+            lanes: lanes
+        };
+    }
+}
+
+/**
+ * Send `file` as a file_start message plus binary chunk frames
+ *
+ * Chunks are read from the file one at a time, so memory use stays at a few
+ * chunks plus the channel's send buffer regardless of file size.
+ * onProgress(fraction) runs after each chunk; isCancelled() is checked
+ * before each chunk and aborts the transfer by throwing.
+ *
+ * Sending is paced by `flowControl` - a FlowController, or a ChannelPool
+ * to stripe the chunks over several channels (a new FlowController for
+ * `channel` if not given) - which also picks the chunk size. Control
+ * messages always go on `channel`.
+ * Chunks are read, check-summed, compressed and framed by `pipeline` (a
+ * ChunkPipeline; on this thread if not given), READ_AHEAD of them at a time.
+ *
+ * With `acceptor` (the TransferProtocol, when the peer supports accept-v1)
+ * the file is offered first: onWaiting() runs while the receiver decides.
+ * If the peer also speaks resume-v1 the offer carries the file's resumeId,
+ * and a receiver that holds part of the file from an interrupted attempt
+ * gets only the chunks it is missing. When the send fails because the
+ * connection dropped - a ChannelClosedError, or isInterrupted() is true -
+ * the receiver is not told to cancel, so the page can send the same File
+ * again once reconnected.
+ * With deflate-v1 negotiated, files worth it go out compressed (see the top
+ * of this file). With dedupe-v1 and a `hasher` (FileHasher) the offer waits
+ * for the file's hash, so the receiver can say it has the file already.
+ * Resolves to {status, bytes, wireBytes, compressed, seconds, resumedFrom},
+ * where status is 'rejected' if the receiver declined, 'duplicate' if it
+ * had the file, and 'sent' once the last chunk is queued, bytes counts the file bytes this call sent,
+ * wireBytes the frames they went out in, and resumedFrom is the chunk it
+ * started at. `chunkSize` overrides the flow controller's, so that the
+ * sends of one file to several receivers (see SharedChunks) cut it the same.
+ */
+async function sendFileBinary(channel, file, fileId, { onProgress = null, isCancelled = null, isInterrupted = null, acceptor = null, hasher = null, pipeline = null, onWaiting = null, onStart = null, flowControl = null, chunkSize: fixedChunkSize = null } = {}) {
+    if (!channel || channel.readyState !== 'open') {
+        throw new Error('Data channel not ready. Please wait a moment and try again.');
+    }
+    const flow = flowControl || new FlowController(channel);
+    const resumable = !!acceptor && acceptor.supportsResume();
+    const ticket = resumable ? acceptor.resumeTicket(file, fixedChunkSize || flow.chunkSize) : null;
+    const chunkSize = ticket ? ticket.chunkSize : fixedChunkSize || flow.chunkSize;
+    const totalChunks = Math.max(1, Math.ceil(file.size / chunkSize)); // Empty files send one empty chunk
+
+    const start = {
+        type: 'file_start',
+        encoding: 'binary-v1',
+        fileId: fileId,
+        fileName: file.name,
+        fileSize: file.size,
+        fileType: file.type,
+        totalChunks: totalChunks,
+        chunkSize: chunkSize,
+        needsAccept: !!acceptor
+    };
+    if (ticket) {
+        start.resumeId = ticket.resumeId;
+    }
+    if (file.files) {
+        start.batch = { files: file.files.length }; // A FileBatch
+    }
+    if (hasher && acceptor && acceptor.supportsDedupe()) {
+        try {
+            start.fileHash = await hasher.hash(file);
+        } catch (error) {
+            console.warn('Could not hash', file.name, '- sending it without:', error);
+        }
+        if (channel.readyState !== 'open') {
+            throw new ChannelClosedError();
+        }
+        if (isCancelled && isCancelled()) {
+            throw new Error('Queue cancelled by user');
+        }
+    }
+    // Chunks are read, check-summed, compressed and framed by the pipeline (in its worker)
+    const chunks = pipeline || inlineChunks;
+    const sliceChunk = (chunkIndex) => file.slice(chunkIndex * chunkSize, (chunkIndex + 1) * chunkSize);
+    let compressRate = acceptor && acceptor.supportsCompression() ? await chunks.probe(file, sliceChunk(0)) : 0;
+    const compress = compressRate > 0;
+    if (compress) {
+        start.compression = 'deflate';
+    }
+    channel.send(JSON.stringify(start));
+
+    // Compression pays only while the link is slower than the compressor;
+    // either way the slower of the two sets the pace. Start compressing
+    // unless the link is known to be faster. A link that keeps draining
+    // completely while we compress is waiting on the compressor, so send
+    // as-is; sent as-is, the flow controller measures the real link rate,
+    // and compressing resumes if that is below the compressor's rate (from
+    // the probe, refreshed by every COMPRESSION_SAMPLE_EVERY-th chunk).
+    let deflating = compress && !(flow.throughput > compressRate);
+    let idle = 0; // EWMA of how often the send buffer was empty when a compressed chunk was ready
+    // Prepare the next chunks while the current one is sent
+    const prepareChunk = async (chunkIndex) => {
+        const chunk = await chunks.pack(sliceChunk(chunkIndex), fileId, chunkIndex, {
+            withCrc: resumable,
+            deflate: deflating || (compress && chunkIndex % COMPRESSION_SAMPLE_EVERY === 0)
+        });
+        if (chunk.deflateRate) {
+            compressRate = compressRate * 0.8 + chunk.deflateRate * 0.2;
+        }
+        return chunk;
+    };
+    let started = null;
+    let sentBytes = 0;
+    let wireBytes = 0;
+    let resume = null;
+    const ahead = []; // Promises of prepared chunks, in send order
+    try {
+        if (acceptor) {
+            if (onWaiting) {
+                onWaiting();
+            }
+            const decision = await acceptor.waitForDecision(fileId, isCancelled);
+            if (decision !== 'accept') {
+                if (ticket) {
+                    acceptor.dropTicket(file);
+                }
+                return { status: decision === 'duplicate' ? 'duplicate' : 'rejected', bytes: 0, seconds: 0 };
+            }
+            resume = acceptor.takeResume(fileId);
+        }
+        if (resume && resume.from > 0 && resume.crc !== await chunks.crc(sliceChunk(resume.from - 1))) {
+            acceptor.dropTicket(file);
+            throw new Error('File changed since the interrupted transfer - send it again');
+        }
+        if (onStart) {
+            onStart();
+        }
+        started = performance.now();
+
+        const pending = [];
+        for (let chunkIndex = resume ? resume.from : 0; chunkIndex < totalChunks; chunkIndex++) {
+            if (!(resume && resume.have.has(chunkIndex))) {
+                pending.push(chunkIndex); // Chunks the receiver kept from before a reconnect are skipped
+            }
+        }
+        let index = 0;
+        while (index < pending.length || ahead.length > 0) {
+            if (isCancelled && isCancelled()) {
+                throw new Error('Queue cancelled by user');
+            }
+            while (index < pending.length && ahead.length < READ_AHEAD) {
+                ahead.push(prepareChunk(pending[index++]));
+            }
+            const chunk = await ahead.shift();
+            if (acceptor) {
+                // Keep at most ACK_WINDOW chunks ahead of what the receiver has written
+                await acceptor.waitForAck(fileId, chunk.chunkIndex - ACK_WINDOW, isCancelled);
+            }
+            let lane = await flow.acquire(isCancelled);
+            while (lane.channel.readyState !== 'open' && channel.readyState === 'open') {
+                lane = await flow.acquire(isCancelled); // The lane closed meanwhile: take another, if one is left
+            }
+            if (channel.readyState !== 'open') {
+                throw new ChannelClosedError();
+            }
+            if (deflating && chunk.flags & FRAME_FLAG_DEFLATE) {
+                idle = idle * 0.8 + (flow.bufferedAmount === 0 ? 0.2 : 0);
+                deflating = idle < 0.5;
+            } else if (compress && !deflating && flow.throughput > 0 && flow.throughput < compressRate) {
+                deflating = true;
+                idle = 0;
+            }
+            const frameBytes = chunk.frame.byteLength;
+            try {
+                lane.channel.send(chunk.frame);
+            } catch (error) {
+                // A channel closing under send() is a dropped connection, so the file can resume
+                throw error.name === 'InvalidStateError' ? new ChannelClosedError() : error;
+            }
+            lane.sent(frameBytes, chunk.size);
+            sentBytes += chunk.size;
+            wireBytes += frameBytes;
+            if (onProgress) {
+                onProgress((chunk.chunkIndex + 1) / totalChunks);
+            }
+        }
+    } catch (error) {
+        ahead.forEach(chunk => chunk.catch(() => {})); // The read-ahead is no longer wanted
+        // Tell the receiver to drop the partial file (it already knows if it cancelled),
+        // unless the connection dropped and the file is to be resumed
+        const interrupted = error instanceof ChannelClosedError || (isInterrupted && isInterrupted());
+        if (acceptor && !interrupted && channel.readyState === 'open' && acceptor.decisions[fileId] !== 'reject') {
+            channel.send(JSON.stringify({ type: 'file_cancel', fileId: fileId }));
+        }
+        if (ticket && !interrupted) {
+            acceptor.dropTicket(file);
+        }
+        throw error;
+    } finally {
+        if (acceptor) {
+            acceptor.forget(fileId);
+        }
+    }
+    if (ticket) {
+        acceptor.dropTicket(file);
+    }
+    return {
+        status: 'sent',
+        bytes: sentBytes,
+        wireBytes: wireBytes,
+        compressed: compress,
+        seconds: (performance.now() - started) / 1000,
+        resumedFrom: resume ? resume.from : 0
+    };
+}
+
+/**
+ * Send `file` the legacy way, for a peer that never said hello
+ *
+ * Files whose base64 fits in one message go as a single `file` message,
+ * larger ones as file_start plus LEGACY_CHUNK_SIZE-character file_chunk
+ * messages - the format older pages expect. Each message is read and
+ * encoded (by `pipeline`'s worker) only when it is about to be sent, one
+ * ahead of the send.
+ */
+async function sendFileLegacy(channel, file, { flowControl = null, pipeline = null, isCancelled = null, onProgress = null } = {}) {
+    const flow = flowControl || new FlowController(channel);
+    const chunks = pipeline || inlineChunks;
+    const send = async (json) => {
+        await flow.ready(isCancelled);
+        if (channel.readyState !== 'open') {
+            throw new ChannelClosedError();
+        }
+        channel.send(json);
+        flow.sent(json.length);
+    };
+    // 500 characters for the JSON around the data
+    if (Math.ceil(file.size / 3) * 4 + 500 <= LEGACY_CHUNK_SIZE) {
+        await send(await chunks.legacyMessage(file, { type: 'file', name: file.name, size: file.size, fileType: file.type }));
+        if (onProgress) {
+            onProgress(1);
+        }
+        return { totalChunks: 1 };
+    }
+    const totalChunks = Math.ceil(file.size / LEGACY_CHUNK_BYTES);
+    const fileId = Date.now() + Math.random();
+    await send(JSON.stringify({
+        type: 'file_start',
+        fileId: fileId,
+        fileName: file.name,
+        fileSize: file.size,
+        fileType: file.type,
+        totalChunks: totalChunks
+    }));
+    const encode = (chunkIndex) => chunks.legacyMessage(
+        file.slice(chunkIndex * LEGACY_CHUNK_BYTES, (chunkIndex + 1) * LEGACY_CHUNK_BYTES),
+        { type: 'file_chunk', fileId: fileId, chunkIndex: chunkIndex, totalChunks: totalChunks });
+    let next = encode(0);
+    for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
+        const message = next;
+        next = chunkIndex + 1 < totalChunks ? encode(chunkIndex + 1) : null;
+        try {
+            if (isCancelled && isCancelled()) {
+                throw new Error('Queue cancelled by user');
+            }
+            await send(await message);
+        } catch (error) {
+            if (next) {
+                next.catch(() => {});
+            }
+            throw error;
+        }
+        if (onProgress) {
+            onProgress((chunkIndex + 1) / totalChunks);
+        }
+    }
+    return { totalChunks: totalChunks };
+}
+
+/**
+ * A file the peer offered with needsAccept, received into a sink
+ *
+ * Nothing is sent until accept(); chunks are then written to the sink in
+ * chunk index order (striped frames may arrive out of order) and
+ * acknowledged to the sender. A file offered with a resumeId stays
+ * resumable while it is offered or receiving: resume() moves it to the
+ * channel of a new connection. Callbacks (set by the page):
+ *   onProgress(fraction)   after each written chunk
+ *   onComplete(blob)       the Blob for memory sinks, null for streaming sinks
+ *   onError(message)       the transfer stopped (sender cancel, write failure)
+ */
+class IncomingFile {
+    constructor(channel, start) {
+        this.channel = channel;
+        this.fileId = start.fileId;
+        this.name = start.fileName;
+        this.size = start.fileSize;
+        this.type = start.fileType || 'application/octet-stream';
+        this.totalChunks = start.totalChunks;
+        this.chunkSize = start.chunkSize;
+        this.resumeId = start.resumeId || null;
+        this.batch = start.batch || null; // {files} for a FileBatch archive
+        this.compression = start.compression || null; // 'deflate': flagged frames need inflating
+        this.hash = start.fileHash || null; // SHA-256 from a dedupe-v1 sender
+        this.openSink = null; // (name, size, type) -> sink; openFileSink() if not set
+        this.pipeline = null; // ChunkPipeline that inflates and checks chunks; this thread if not set
+        this.state = 'offered'; // offered -> receiving -> done | rejected | failed
+        this.sink = null;
+        this.written = 0;
+        this.nextChunk = 0; // Index of the next chunk to hand to the sink
+        this.early = new Map(); // chunkIndex -> data that overtook an earlier chunk
+        this.crcs = this.resumeId ? new Uint32Array(this.totalChunks) : null; // CRC-32 of every chunk received
+        this.writes = Promise.resolve();
+        this.onProgress = null;
+        this.onComplete = null;
+        this.onError = null;
+    }
+
+    /**
+     * Open a sink and ask the sender to start; call from the Accept click
+     * Resolves to false if the user cancelled the save dialog (file rejected).
+     * `sink` overrides the openFileSink() (or this.openSink) choice.
+     */
+    async accept(sink = null) {
+        if (this.state !== 'offered') {
+            return false;
+        }
+        this.state = 'receiving';
+        try {
+            this.sink = sink || await (this.openSink || openFileSink)(this.name, this.size, this.type);
+        } catch (error) {
+            this.state = 'offered';
+            if (error.name === 'AbortError') {
+                this.reject();
+                return false;
+            }
+            throw error;
+        }
+        if (this.state !== 'receiving') {
+            // Sender gave up while the save dialog was open
+            this.sink.abort();
+            return false;
+        }
+        this.send(this.acceptMessage());
+        return true;
+    }
+
+    /**
+     * Continue this file on a new channel: the sender offered it again
+     * `start` is the new file_start; its fileId replaces ours. A file that was
+     * already receiving tells the sender where to pick up, an offered one
+     * waits for accept() as before.
+     */
+    resume(channel, start) {
+        this.channel = channel;
+        this.fileId = start.fileId;
+        if (this.state === 'receiving' && this.sink) {
+            this.send(this.acceptMessage());
+        }
+    }
+
+    /**
+     * True while a reconnecting sender can still continue this file
+     */
+    resumable() {
+        return !!this.resumeId && (this.state === 'offered' || this.state === 'receiving');
+    }
+
+    /**
+     * What we hold of the file: {from, have, crc} as sent in a resuming file_accept
+     */
+    manifest() {
+        return {
+            from: this.nextChunk,
+            have: [...this.early.keys()],
+            crc: this.nextChunk > 0 ? this.crcs[this.nextChunk - 1] : null
+        };
+    }
+
+    acceptMessage() {
+        const message = { type: 'file_accept', fileId: this.fileId };
+        if (this.resumeId && this.nextChunk + this.early.size > 0) {
+            message.resume = this.manifest();
+        }
+        return message;
+    }
+
+    /**
+     * Decline the file, or stop it if it is already being received
+     * `reason` 'duplicate' tells the sender we have the file already.
+     */
+    reject(reason = null) {
+        if (this.state !== 'offered' && this.state !== 'receiving') {
+            return;
+        }
+        this.state = 'rejected';
+        this.send(reason ? { type: 'file_reject', fileId: this.fileId, reason: reason } : { type: 'file_reject', fileId: this.fileId });
+        this.early.clear();
+        if (this.sink) {
+            this.sink.abort();
+        }
+    }
+
+    /**
+     * The sender cancelled (file_cancel)
+     */
+    cancel() {
+        this.fail('Cancelled by sender');
+    }
+
+    handleChunk(frame) {
+        if (this.state !== 'receiving') {
+            return; // In flight when we rejected or failed
+        }
+        if (frame.chunkIndex < this.nextChunk || this.early.has(frame.chunkIndex)) {
+            return; // Sent again after a reconnect
+        }
+        if (this.crcs && frame.crc !== null && frame.crc !== undefined) {
+            this.crcs[frame.chunkIndex] = frame.crc; // Checked against the bytes in write()
+        }
+        if (frame.chunkIndex !== this.nextChunk) {
+            // Bounded by the sender's ACK_WINDOW
+            this.early.set(frame.chunkIndex, frame);
+            return;
+        }
+        let next = frame;
+        while (next) {
+            this.write(next);
+            this.nextChunk++;
+            next = this.early.get(this.nextChunk);
+            this.early.delete(this.nextChunk);
+        }
+    }
+
+    write(frame) {
+        // Inflating and checking start now, alongside the writes queued before this one
+        const unpacked = (this.pipeline || inlineChunks).unpack(frame);
+        unpacked.catch(() => {}); // Reported below, in order
+        this.writes = this.writes.then(async () => {
+            if (this.state !== 'receiving') {
+                return;
+            }
+            const data = await unpacked;
+            if (!data) {
+                this.send({ type: 'file_reject', fileId: this.fileId });
+                this.fail(`Chunk ${frame.chunkIndex} failed its checksum`);
+                return;
+            }
+            await this.sink.write(data);
+            this.written++;
+            if (this.written % ACK_EVERY === 0 || this.written === this.totalChunks) {
+                this.send({ type: 'file_ack', fileId: this.fileId, chunkIndex: this.written - 1 });
+            }
+            if (this.onProgress) {
+                this.onProgress(this.written / this.totalChunks);
+            }
+            if (this.written === this.totalChunks) {
+                const blob = await this.sink.close();
+                this.state = 'done';
+                if (this.onComplete) {
+                    this.onComplete(blob);
+                }
+            }
+        }).catch(error => {
+            console.error('Error writing received file:', error);
+            this.send({ type: 'file_reject', fileId: this.fileId });
+            this.fail(`Could not save file: ${error.message}`);
+        });
+    }
+
+    fail(message) {
+        if (this.state === 'done' || this.state === 'failed' || this.state === 'rejected') {
+            return;
+        }
+        this.state = 'failed';
+        this.early.clear();
+        if (this.sink) {
+            this.sink.abort();
+        }
+        if (this.onError) {
+            this.onError(message);
+        }
+    }
+
+    send(message) {
+        if (this.channel.readyState === 'open') {
+            this.channel.send(JSON.stringify(message));
+        }
+    }
+}
+
+if (typeof module !== 'undefined') {
+    // Node (scripts/bench_transfer.js)
+    module.exports = {
+        TransferProtocol, IncomingFile, FlowController, ChannelPool, ChannelClosedError, ChunkPipeline, SharedChunks, encodeChunkFrame, decodeChunkFrame,
+        sendFileBinary, sendFileLegacy, packChunk, unpackChunk, base64Blob, crc32, crc32Blob, deflateChunk, inflateChunk, worthCompressing,
+        TRANSFER_PROTOCOL_VERSION, FRAME_HEADER_SIZE, FRAME_CRC_HEADER_SIZE, BINARY_CHUNK_SIZE
+    };
+}
@@ -0,0 +1,154 @@
+/**
+ * Web Worker: SHA-256 of Blobs, for FileHasher (file-hash.js)
+ *
+ * Messages in:  {id, blob}
+ * Messages out: {id, hash} (lowercase hex) or {id, error}
+ *
+ * Blobs are hashed one at a time, read HASH_READ_SIZE bytes at a time, so
+ * the worker holds one piece of one file no matter how many are queued.
+ * crypto.subtle is missing on plain http:// LAN pages and cannot hash
+ * incrementally anyway, hence the hash in plain JS.
+ */
+
+const HASH_READ_SIZE = 4 * 1024 * 1024;
+
+// Int32Array, not Uint32Array: keeps every value a small integer for V8
+const SHA256_K = new Int32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+]);
+
+/**
+ * Incremental SHA-256: update() with the bytes in order, then digest()
+ */
+class Sha256 {
+    constructor() {
+        this.state = new Int32Array([
+            0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+        ]);
+        this.words = new Int32Array(64);
+        this.block = new Uint8Array(64); // Bytes of an unfinished block
+        this.blockFill = 0;
+        this.length = 0; // Bytes hashed so far
+    }
+
+    update(bytes) {
+        let offset = 0;
+        this.length += bytes.length;
+        if (this.blockFill > 0) {
+            const take = Math.min(64 - this.blockFill, bytes.length);
+            this.block.set(bytes.subarray(0, take), this.blockFill);
+            this.blockFill += take;
+            offset = take;
+            if (this.blockFill < 64) {
+                return this;
+            }
+            this.compress(this.block, 0, 64);
+            this.blockFill = 0;
+        }
+        const whole = offset + Math.floor((bytes.length - offset) / 64) * 64;
+        this.compress(bytes, offset, whole);
+        offset = whole;
+        this.block.set(bytes.subarray(offset), 0);
+        this.blockFill = bytes.length - offset;
+        return this;
+    }
+
+    /**
+     * The hash of everything passed to update(), as lowercase hex
+     */
+    digest() {
+        const bits = this.length * 8;
+        const tail = new Uint8Array(this.blockFill < 56 ? 64 : 128);
+        tail.set(this.block.subarray(0, this.blockFill));
+        tail[this.blockFill] = 0x80;
+        const view = new DataView(tail.buffer);
+        view.setUint32(tail.length - 8, Math.floor(bits / 0x100000000));
+        view.setUint32(tail.length - 4, bits >>> 0);
+        this.compress(tail, 0, tail.length);
+        return Array.from(this.state, word => (word >>> 0).toString(16).padStart(8, '0')).join('');
+    }
+
+    /**
+     * Run the 64-byte blocks of bytes[offset, end) through the compression function
+     */
+    compress(bytes, offset, end) {
+        const w = this.words;
+        const state = this.state;
+        let h0 = state[0], h1 = state[1], h2 = state[2], h3 = state[3];
+        let h4 = state[4], h5 = state[5], h6 = state[6], h7 = state[7];
+        for (; offset < end; offset += 64) {
+            for (let i = 0; i < 16; i++) {
+                const at = offset + i * 4;
+                w[i] = (bytes[at] << 24) | (bytes[at + 1] << 16) | (bytes[at + 2] << 8) | bytes[at + 3];
+            }
+            for (let i = 16; i < 64; i++) {
+                const x = w[i - 15], y = w[i - 2];
+                const s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+                const s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+                w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+            }
+            let a = h0, b = h1, c = h2, d = h3, e = h4, f = h5, g = h6, h = h7;
+            for (let i = 0; i < 64; i++) {
+                const s1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+                const t1 = (h + s1 + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+                const s0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+                const t2 = (s0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+                h = g;
+                g = f;
+                f = e;
+                e = (d + t1) | 0;
+                d = c;
+                c = b;
+                b = a;
+                a = (t1 + t2) | 0;
+            }
+            h0 = (h0 + a) | 0;
+            h1 = (h1 + b) | 0;
+            h2 = (h2 + c) | 0;
+            h3 = (h3 + d) | 0;
+            h4 = (h4 + e) | 0;
+            h5 = (h5 + f) | 0;
+            h6 = (h6 + g) | 0;
+            h7 = (h7 + h) | 0;
+        }
+        state[0] = h0;
+        state[1] = h1;
+        state[2] = h2;
+        state[3] = h3;
+        state[4] = h4;
+        state[5] = h5;
+        state[6] = h6;
+        state[7] = h7;
+    }
+}
+
+/**
+ * Resolve to the SHA-256 (hex) of a Blob, reading it piece by piece
+ */
+async function hashBlob(blob) {
+    const sha = new Sha256();
+    for (let offset = 0; offset < blob.size; offset += HASH_READ_SIZE) {
+        sha.update(new Uint8Array(await blob.slice(offset, offset + HASH_READ_SIZE).arrayBuffer()));
+    }
+    return sha.digest();
+}
+
+if (typeof module !== 'undefined') {
+    // Node (file-hash.js without Worker, scripts/bench_dedupe.js)
+    module.exports = { Sha256, hashBlob };
+} else {
+    let queue = Promise.resolve();
+    self.onmessage = (event) => {
+        const { id, blob } = event.data;
+        queue = queue
+            .then(() => hashBlob(blob))
+            .then(hash => self.postMessage({ id, hash }), error => self.postMessage({ id, error: error.message }));
+    };
+}
@@ -6,22 +6,49 @@ let qrScanner = null;
 let isProcessingQRCode = false; // Prevent multiple QR code processing
 let receivedFiles = [];
 let fileQueue = [];
-let isSendingFile = false;
+let activeSends = new Set(); // Files being sent right now (several at once with striping)
+let interruptedFiles = []; // Files whose send the connection dropped - resumed on reconnect
 let sendingFiles = {}; // Track sending files by name
 let fileErrors = {}; // Store error messages for files
 let queueProcessingTimeout = null;
 let shouldStopQueue = false;
 let receivingChunks = {}; // Track file chunks being received {fileId: {chunks: [], totalChunks, fileName, fileSize, fileType}}
-const CHUNK_SIZE = 200 * 1024; // 200KB chunks (safe for WebRTC)
+const transferProtocol = new TransferProtocol({ channels: TRANSFER_CHANNELS }); // Binary framing, negotiated per data channel
+const chunkPipeline = new ChunkPipeline(); // Reads, frames, checks and (de)compresses chunks in a Web Worker
+const fileHasher = new FileHasher(); // SHA-256 of outgoing files, in a worker, for dedupe-v1 offers
+const receivedHashes = new HashIndex(); // Files received on this device, to skip them when sent again
+receivedHashes.load();
+// Sender-side flow control numbers (throughput, RTT, window, chunk size per channel, compression savings) for the console
+window.transferStats = () => transferProtocol.pool && transferProtocol.pool.stats();
 
 // Signaling client for cross-network P2P support
 let signalingClient = null;
 
+// This phone's id in the session: the PC keeps a connection per phone, and a
+// reload or reconnect must land on the same one
+const peerId = loadPeerId();
+
+function loadPeerId() {
+    const key = 'qrfs-peer-id';
+    try {
+        let id = sessionStorage.getItem(key);
+        if (!id) {
+            id = `m${Date.now().toString(36)}${Math.random().toString(36).slice(2, 10)}`;
+            sessionStorage.setItem(key, id);
+        }
+        return id;
+    } catch (error) {
+        // Storage blocked (private mode): a new id per page load still works, reloads rejoin as a new phone
+        return `m${Date.now().toString(36)}${Math.random().toString(36).slice(2, 10)}`;
+    }
+}
+
 // Get session ID from URL
 const urlParams = new URLSearchParams(window.location.search);
 sessionId = urlParams.get('session');
 
 window.addEventListener('DOMContentLoaded', () => {
+    registerDownloadWorker(); // Streaming downloads for received files
     setupFileHandlers();
     setupPageVisibilityTracking();
     
@@ -95,11 +122,12 @@ function waitForQrScanner() {
 function initializeSignaling() {
     // Check if we should use the Node.js WebSocket signaling server
     if (window.SIGNALING_SERVER_URL && window.SIGNALING_SERVER_URL.trim() !== '') {
-        console.log('Using Node.js WebSocket signaling server:', window.SIGNALING_SERVER_URL);
+        console.log('Using WebSocket signaling server:', window.SIGNALING_SERVER_URL);
         signalingClient = new SignalingClient(
             window.SIGNALING_SERVER_URL,
             sessionId,
-            'mobile'
+            'mobile',
+            peerId
         );
         
         // Set up event handlers
@@ -155,7 +183,7 @@ function initializeSignaling() {
         setupSocketListeners();
         // Join socket room for Socket.IO
         if (socket.connected) {
-            socket.emit('mobile_join', { session_id: sessionId });
+            socket.emit('mobile_join', { session_id: sessionId, peer_id: peerId });
         }
     }
 }
@@ -165,7 +193,7 @@ function setupSocketListeners() {
         console.log('Socket connected');
         // If we have a session ID, try to join
         if (sessionId) {
-            socket.emit('mobile_join', { session_id: sessionId });
+            socket.emit('mobile_join', { session_id: sessionId, peer_id: peerId });
         }
     });
     
@@ -215,6 +243,14 @@ function setupSocketListeners() {
         }
     });
     
+    socket.on('ice_candidates', async (data) => {
+        for (const candidate of data.candidates || []) {
+            if (candidate) {
+                await peerConnection.addIceCandidate(new RTCIceCandidate(candidate));
+            }
+        }
+    });
+    
     socket.on('pc_disconnected', () => {
         handleDisconnection('PC disconnected');
     });
@@ -573,11 +609,27 @@ function initializeWebRTC() {
         console.log(`     ${idx + 1}. ${server.urls} (${server.username || 'no auth'})`);
     });
     
+    if (peerConnection) {
+        // A reconnect: drop the old connection so its sends fail now and can resume on the new one
+        peerConnection.onconnectionstatechange = null;
+        peerConnection.close();
+    }
     peerConnection = new RTCPeerConnection(configuration);
     
     // Log ICE candidates for debugging
     let candidateCount = { host: 0, srflx: 0, relay: 0 };
     let turnServerErrors = [];
+    // Candidates trickle in bursts - relay each burst as one signaling message
+    const iceBatcher = new IceCandidateBatcher((candidates) => {
+        if (signalingClient) {
+            signalingClient.sendIceCandidates(candidates);
+        } else {
+            socket.emit('ice_candidates', {
+                session_id: sessionId,
+                candidates: candidates
+            });
+        }
+    });
     peerConnection.onicecandidate = (event) => {
         if (event.candidate) {
             // Log candidate type
@@ -593,16 +645,10 @@ function initializeWebRTC() {
             
             console.log('Candidate counts:', candidateCount);
             
-            if (signalingClient) {
-                signalingClient.sendIceCandidate(event.candidate);
-            } else {
-                socket.emit('ice_candidate', {
-                    session_id: sessionId,
-                    candidate: event.candidate
-                });
-            }
+            iceBatcher.add(event.candidate);
         } else {
-            // ICE gathering complete
+            // ICE gathering complete - send what is still waiting for the batch timer
+            iceBatcher.end();
             console.log('✅ ICE gathering complete. Total candidates:', candidateCount);
             
             // Warn if no relay candidates (TURN servers not working)
@@ -650,7 +696,7 @@ function initializeWebRTC() {
             console.error('❌ Peer connection failed');
             // Stop queue processing immediately
             shouldStopQueue = true;
-            isSendingFile = false;
+            activeSends.clear();
             if (queueProcessingTimeout) {
                 clearTimeout(queueProcessingTimeout);
                 queueProcessingTimeout = null;
@@ -658,7 +704,7 @@ function initializeWebRTC() {
             // Clear file queue and show error
             if (fileQueue.length > 0) {
                 fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection failed - WebRTC peer connection failed');
+                    updateSendStatus(file, 'error', 'Connection failed - WebRTC peer connection failed');
                 });
                 fileQueue = [];
             }
@@ -673,6 +719,7 @@ function initializeWebRTC() {
             console.log('✅ Peer connection established');
             // Reset stop flag when connection is restored
             shouldStopQueue = false;
+            resumeInterruptedFiles();
         }
     };
     
@@ -691,7 +738,7 @@ function initializeWebRTC() {
             // Clear all files in queue and show error
             if (fileQueue.length > 0) {
                 fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Network connection failed. Both devices may be behind strict firewalls.');
+                    updateSendStatus(file, 'error', 'Network connection failed. Both devices may be behind strict firewalls.');
                 });
                 fileQueue = [];
             }
@@ -713,6 +760,9 @@ function initializeWebRTC() {
     // Handle incoming data channel
     peerConnection.ondatachannel = (event) => {
         console.log('Received data channel:', event.channel.label);
+        if (transferProtocol.receiveLane(event.channel, handleBinaryChunk)) {
+            return; // The peer's extra channel for striped chunks
+        }
         dataChannel = event.channel;
         setupDataChannel();
     };
@@ -745,6 +795,7 @@ function setupDataChannel() {
     }
     
     console.log('Setting up data channel, current state:', dataChannel.readyState);
+    transferProtocol.attach(dataChannel, peerConnection);
     
     // Add timeout for data channel opening (30 seconds)
     let dataChannelTimeout = setTimeout(() => {
@@ -752,7 +803,7 @@ function setupDataChannel() {
             console.error('❌ Data channel timeout - failed to open within 30 seconds');
             if (fileQueue.length > 0) {
                 fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Data channel failed to open - connection timeout');
+                    updateSendStatus(file, 'error', 'Data channel failed to open - connection timeout');
                 });
                 fileQueue = [];
             }
@@ -764,7 +815,7 @@ function setupDataChannel() {
     if (dataChannel.readyState === 'open') {
         clearTimeout(dataChannelTimeout);
         console.log('Data channel already open');
-        dataChannel.bufferedAmountLowThreshold = 256 * 1024; // 256KB
+        transferProtocol.sendHello();
         // Setup handlers only once (guard will prevent duplicates)
         if (!fileInputHandlersSetup) {
             setupFileInputHandlers();
@@ -777,16 +828,15 @@ function setupDataChannel() {
     dataChannel.onopen = () => {
         clearTimeout(dataChannelTimeout);
         console.log('✅ Data channel opened successfully');
-        // Set buffer threshold for monitoring
-        dataChannel.bufferedAmountLowThreshold = 256 * 1024; // 256KB
+        transferProtocol.sendHello();
         // Setup file upload handlers once data channel is ready (guard will prevent duplicates)
         if (!fileInputHandlersSetup) {
             setupFileInputHandlers();
         }
-        // Start processing queue if there are files waiting
-        if (fileQueue.length > 0) {
-            console.log(`Processing ${fileQueue.length} queued files`);
-            processFileQueue();
+        // Start processing queue if there are files waiting, interrupted ones first
+        if (fileQueue.length > 0 || interruptedFiles.length > 0) {
+            console.log(`Processing ${fileQueue.length + interruptedFiles.length} queued files`);
+            resumeInterruptedFiles();
         }
     };
     
@@ -795,7 +845,7 @@ function setupDataChannel() {
         console.error('❌ Data channel error:', error);
         if (fileQueue.length > 0) {
             fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Data channel error occurred');
+                updateSendStatus(file, 'error', 'Data channel error occurred');
             });
             fileQueue = [];
         }
@@ -803,33 +853,35 @@ function setupDataChannel() {
     
     dataChannel.onclose = () => {
         clearTimeout(dataChannelTimeout);
+        // Queued files stay queued: they go out over the next data channel
         console.warn('⚠️  Data channel closed');
-        if (fileQueue.length > 0 && dataChannel.readyState === 'closed') {
-            fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Data channel closed before file could be sent');
-            });
-            fileQueue = [];
-        }
-    };
-    
-    // Monitor bufferedAmount to help with queue processing
-    dataChannel.onbufferedamountlow = () => {
-        console.log('Buffer cleared, checking if we can process next file');
-        if (fileQueue.length > 0 && !isSendingFile && !shouldStopQueue) {
-            processFileQueue();
-        }
     };
     
     dataChannel.onmessage = (event) => {
         try {
+            if (event.data instanceof ArrayBuffer) {
+                // Binary chunk frame
+                handleBinaryChunk(event.data);
+                return;
+            }
             console.log('Received message on data channel, size:', event.data.length);
             const data = JSON.parse(event.data);
             console.log('Parsed data, type:', data.type);
             
-            if (data.type === 'file') {
+            if (transferProtocol.handleControl(data)) {
+                // hello, file_accept, file_reject, file_ack - handled by the sender side
+            } else if (data.type === 'file_cancel') {
+                handleFileCancel(data);
+            } else if (data.type === 'file_start' && data.needsAccept) {
+                // Offered file - nothing is sent until the user accepts it,
+                // unless it continues a file the connection dropped or we have it already
+                if (!resumeIncomingFile(data) && !skipDuplicateFile(data)) {
+                    receiveFileOffer(data);
+                }
+            } else if (data.type === 'file') {
                 // Single message file (small files)
                 console.log('Receiving file:', data.name, 'Size:', data.size);
-                receiveFile(data);
+                receiveBase64File(data);
             } else if (data.type === 'file_start') {
                 // Start of chunked file transfer
                 console.log('Starting chunked file transfer:', data.fileName, 'Total chunks:', data.totalChunks);
@@ -839,6 +891,7 @@ function setupDataChannel() {
                     fileName: data.fileName,
                     fileSize: data.fileSize,
                     fileType: data.fileType,
+                    binary: data.encoding === 'binary-v1',
                     receivedChunks: 0
                 };
             } else if (data.type === 'file_chunk') {
@@ -849,8 +902,10 @@ function setupDataChannel() {
             }
         } catch (error) {
             console.error('Error handling data channel message:', error);
-            console.error('Message length:', event.data ? event.data.length : 'null');
-            console.error('Message preview:', event.data ? event.data.substring(0, 200) : 'null');
+            console.error('Message length:', event.data ? (event.data.length || event.data.byteLength) : 'null');
+            if (typeof event.data === 'string') {
+                console.error('Message preview:', event.data.substring(0, 200));
+            }
             // Try to show user-friendly error
             alert('Error receiving file. The file might be too large or corrupted.');
         }
@@ -861,6 +916,163 @@ function setupDataChannel() {
     };
 }
 
+function handleBinaryChunk(buffer) {
+    const frame = decodeChunkFrame(buffer);
+    if (!frame) {
+        console.error('Unsupported binary frame of', buffer.byteLength, 'bytes');
+        return;
+    }
+    const incoming = receivingChunks[frame.fileId];
+    if (incoming instanceof IncomingFile) {
+        incoming.handleChunk(frame);
+        return;
+    }
+    handleFileChunk(frame);
+}
+
+/**
+ * Continue a file the sender offers again after a reconnect
+ * Returns false if `data` is a new file.
+ */
+function resumeIncomingFile(data) {
+    const incoming = transferProtocol.findResumable(data);
+    if (!incoming) {
+        return false;
+    }
+    console.log('Resuming file:', incoming.name, 'from chunk', incoming.nextChunk);
+    delete receivingChunks[incoming.fileId];
+    receivingChunks[data.fileId] = incoming;
+    incoming.resume(dataChannel, data);
+    return true;
+}
+
+/**
+ * Turn down an offered file we received before (same hash) without asking
+ * Returns false if `data` is a file we do not have.
+ */
+function skipDuplicateFile(data) {
+    const held = data.fileHash ? receivedHashes.get(data.fileHash) : null;
+    if (!held) {
+        return false;
+    }
+    console.log('Already received:', data.fileName, 'as', held.name);
+    new IncomingFile(dataChannel, data).reject('duplicate');
+    const fileData = {
+        id: Date.now() + Math.random(),
+        name: data.batch ? `${data.batch.files} files (${data.fileName})` : data.fileName,
+        size: data.fileSize,
+        type: data.fileType,
+        data: null,
+        blob: null,
+        incoming: null,
+        hash: data.fileHash,
+        downloaded: true // Processed
+    };
+    receivedFiles.push(fileData);
+    displayReceivedFile(fileData);
+    setReceivedFileStatus(fileData.id, `✓ Already received <button class="btn-reject" onclick="receiveAgain('${fileData.id}')">Receive again</button>`, '#4caf50');
+    updateDownloadAllButton();
+    return true;
+}
+
+/**
+ * Forget a skipped file's hash, so it comes through when the sender sends it again
+ */
+function receiveAgain(fileId) {
+    const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
+    if (file && file.hash) {
+        receivedHashes.delete(file.hash);
+        setReceivedFileStatus(file.id, 'Will be received if sent again', '#999');
+    }
+}
+
+function receiveFileOffer(data) {
+    const incoming = new IncomingFile(dataChannel, data);
+    incoming.pipeline = chunkPipeline;
+    receivingChunks[data.fileId] = incoming;
+    transferProtocol.trackIncoming(incoming);
+    if (incoming.batch) {
+        // Saved as one .tar, or unpacked into the list where it would sit in memory anyway
+        incoming.openSink = (name, size, type) => openBatchSink(name, size, type, receiveFile);
+    }
+    const fileData = {
+        id: Date.now() + Math.random(), // Unique ID for each file
+        name: incoming.batch ? `${incoming.batch.files} files (${incoming.name})` : incoming.name,
+        size: incoming.size,
+        type: incoming.type,
+        data: null,
+        blob: null,
+        incoming: incoming,
+        downloaded: false
+    };
+    console.log('File offered:', fileData.name, 'Size:', fileData.size);
+    
+    let lastPercent = -1;
+    incoming.onProgress = (fraction) => {
+        const percent = Math.floor(fraction * 100);
+        if (percent !== lastPercent) {
+            lastPercent = percent;
+            setReceivedFileStatus(fileData.id, `Receiving... ${percent}%`, '#667eea');
+        }
+    };
+    incoming.onComplete = (blob) => {
+        delete receivingChunks[incoming.fileId];
+        fileData.incoming = null;
+        if (incoming.hash) {
+            receivedHashes.add(incoming.hash, fileData.name, fileData.size);
+        }
+        if (blob) {
+            // No streaming sink on this page - hand the Blob to the browser now
+            downloadFile({ name: fileData.name, type: fileData.type, blob: blob });
+        }
+        updateFileItemUI(fileData.id, true);
+    };
+    incoming.onError = (message) => {
+        delete receivingChunks[incoming.fileId];
+        fileData.incoming = null;
+        fileData.downloaded = true; // Processed
+        setReceivedFileStatus(fileData.id, `✗ ${message}`, '#f44336');
+        updateDownloadAllButton();
+    };
+    
+    receivedFiles.push(fileData);
+    displayReceivedFile(fileData);
+    updateDownloadAllButton();
+}
+
+function handleFileCancel(data) {
+    const incoming = receivingChunks[data.fileId];
+    if (incoming instanceof IncomingFile) {
+        incoming.cancel();
+    } else if (incoming) {
+        // Legacy in-memory transfer - drop the partial chunks
+        delete receivingChunks[data.fileId];
+    }
+}
+
+async function acceptIncomingFile(file) {
+    file.downloaded = true; // Accepted - no second accept, not pending any more
+    setReceivedFileStatus(file.id, 'Waiting for sender...', '#667eea');
+    updateDownloadAllButton();
+    try {
+        if (!await file.incoming.accept()) {
+            // Save dialog cancelled
+            setReceivedFileStatus(file.id, 'Rejected', '#999');
+        }
+    } catch (error) {
+        console.error('Error accepting file:', error);
+        file.incoming.reject();
+        setReceivedFileStatus(file.id, `✗ ${error.message}`, '#f44336');
+    }
+}
+
+function setReceivedFileStatus(fileId, text, color) {
+    const fileItem = document.getElementById(`file-${fileId}`);
+    if (fileItem) {
+        fileItem.querySelector('.file-actions').innerHTML = `<span style="color: ${color};">${text}</span>`;
+    }
+}
+
 function handleFileChunk(chunkData) {
     const fileId = chunkData.fileId;
     const chunkInfo = receivingChunks[fileId];
@@ -874,36 +1086,48 @@ function handleFileChunk(chunkData) {
     chunkInfo.chunks[chunkData.chunkIndex] = chunkData.data;
     chunkInfo.receivedChunks++;
     
-    console.log(`Received chunk ${chunkData.chunkIndex + 1}/${chunkData.totalChunks} for file ${chunkInfo.fileName}`);
+    console.log(`Received chunk ${chunkData.chunkIndex + 1}/${chunkInfo.totalChunks} for file ${chunkInfo.fileName}`);
     
     // Check if all chunks received
     if (chunkInfo.receivedChunks === chunkInfo.totalChunks) {
-        // Reassemble file
-        const completeData = chunkInfo.chunks.join('');
-        
         const fileData = {
             name: chunkInfo.fileName,
             size: chunkInfo.fileSize,
-            fileType: chunkInfo.fileType,
-            data: completeData
+            fileType: chunkInfo.fileType
         };
-        
         console.log(`All chunks received for ${chunkInfo.fileName}, reassembling...`);
-        receiveFile(fileData);
-        
-        // Clean up
         delete receivingChunks[fileId];
+        if (chunkInfo.binary) {
+            // Binary chunks go straight into a Blob - no string copies
+            fileData.blob = new Blob(chunkInfo.chunks, { type: chunkInfo.fileType });
+            receiveFile(fileData);
+        } else {
+            // Reassemble base64 file, decoded in the worker
+            chunkPipeline.base64Blob(chunkInfo.chunks, chunkInfo.fileType).then(blob => {
+                fileData.blob = blob;
+                receiveFile(fileData);
+            }).catch(error => console.error('Could not decode received file:', chunkInfo.fileName, error));
+        }
     }
 }
 
+/**
+ * A legacy single-message file: decode its base64 in the worker, then list it
+ */
+function receiveBase64File(data) {
+    chunkPipeline.base64Blob([data.data], data.fileType || 'application/octet-stream').then(blob => {
+        receiveFile({ name: data.name, size: data.size, fileType: data.fileType, blob: blob });
+    }).catch(error => console.error('Could not decode received file:', data.name, error));
+}
+
 function receiveFile(data) {
     console.log('receiveFile called with:', {
         name: data.name,
         size: data.size,
         fileType: data.fileType,
         type: data.type,
-        hasData: !!data.data,
-        dataLength: data.data ? data.data.length : 0
+        hasData: !!(data.data || data.blob),
+        dataLength: data.data ? data.data.length : (data.blob ? data.blob.size : 0)
     });
     
     // Handle both fileType and type properties for compatibility
@@ -914,7 +1138,7 @@ function receiveFile(data) {
         return;
     }
     
-    if (!data.data) {
+    if (!data.data && !data.blob) {
         console.error('Received file without data:', data.name);
         return;
     }
@@ -925,6 +1149,7 @@ function receiveFile(data) {
         size: data.size || 0,
         type: fileType,
         data: data.data,
+        blob: data.blob || null,
         downloaded: false
     };
     
@@ -967,8 +1192,16 @@ function displayReceivedFile(file) {
 function acceptFile(fileId) {
     const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
     if (file && !file.downloaded) {
+        if (file.incoming) {
+            // Offered file: stream it to disk from here on
+            acceptIncomingFile(file);
+            return;
+        }
         downloadFile(file);
         file.downloaded = true;
+        // The browser has its own copy now
+        file.data = null;
+        file.blob = null;
         updateFileItemUI(fileId, true);
     }
 }
@@ -982,7 +1215,15 @@ function rejectFile(fileId) {
     
     const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
     if (file) {
+        if (file.incoming) {
+            // Tell the sender not to send it (or to stop)
+            file.incoming.reject();
+            delete receivingChunks[file.incoming.fileId];
+            file.incoming = null;
+        }
         file.downloaded = true; // Mark as processed
+        file.data = null;
+        file.blob = null;
     }
     
     updateDownloadAllButton();
@@ -1046,14 +1287,15 @@ function updateDownloadAllButton() {
 
 // Clear processed files (accepted/rejected)
 function clearProcessedFiles() {
-    const processedFiles = receivedFiles.filter(f => f.downloaded);
+    // Files still streaming in stay listed until they finish
+    const processedFiles = receivedFiles.filter(f => f.downloaded && !f.incoming);
     
     if (processedFiles.length === 0) {
         return;
     }
     
     // Remove processed files from array
-    receivedFiles = receivedFiles.filter(f => !f.downloaded);
+    receivedFiles = receivedFiles.filter(f => !processedFiles.includes(f));
     
     // Remove processed files from DOM
     processedFiles.forEach(file => {
@@ -1085,6 +1327,7 @@ window.rejectAllFiles = rejectAllFiles;
 // Make functions globally accessible
 window.acceptFile = acceptFile;
 window.rejectFile = rejectFile;
+window.receiveAgain = receiveAgain;
 
 // Setup download all and reject all button handlers using event delegation
 let buttonHandlersSetup = false;
@@ -1131,7 +1374,7 @@ function setupDownloadAllButton() {
 
 function downloadFile(file) {
     // Always use default download method - reliable and no permission issues
-    const blob = new Blob([base64ToArrayBuffer(file.data)], { type: file.type });
+    const blob = file.blob;
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
@@ -1140,15 +1383,6 @@ function downloadFile(file) {
     URL.revokeObjectURL(url);
 }
 
-function base64ToArrayBuffer(base64) {
-    const binaryString = window.atob(base64);
-    const bytes = new Uint8Array(binaryString.length);
-    for (let i = 0; i < binaryString.length; i++) {
-        bytes[i] = binaryString.charCodeAt(i);
-    }
-    return bytes.buffer;
-}
-
 function formatFileSize(bytes) {
     if (bytes === 0) return '0 Bytes';
     const k = 1024;
@@ -1230,7 +1464,7 @@ function setupFileInputHandlers() {
             }, 100);
             
             // Start processing queue if not already processing
-            if (!isSendingFile && fileQueue.length > 0) {
+            if (activeSends.size === 0 && fileQueue.length > 0) {
                 processFileQueue();
             }
         } else {
@@ -1255,6 +1489,10 @@ function setupFileInputHandlers() {
 
 function queueFile(file) {
     fileQueue.push(file);
+    if (fileHasher.available()) {
+        // Hashed in the background while earlier files send; sendFileBinary() waits for it
+        fileHasher.hash(file).catch(() => {});
+    }
     displaySendingFile(file, 'queued');
     console.log('File queued:', file.name, 'Total in queue:', fileQueue.length);
     updateCancelButton();
@@ -1267,7 +1505,7 @@ function cancelQueue() {
     // Clear the queue
     const cancelledCount = fileQueue.length;
     fileQueue.forEach(file => {
-        updateFileStatus(file.name, 'error', 'Cancelled by user');
+        updateSendStatus(file, 'error', 'Cancelled by user');
     });
     fileQueue = [];
     
@@ -1277,9 +1515,6 @@ function cancelQueue() {
         queueProcessingTimeout = null;
     }
     
-    // Reset sending flag
-    isSendingFile = false;
-    
     console.log(`Cancelled ${cancelledCount} files from queue`);
     updateCancelButton();
 }
@@ -1287,9 +1522,9 @@ function cancelQueue() {
 function updateCancelButton() {
     const cancelBtn = document.getElementById('cancel-queue-btn');
     if (cancelBtn) {
-        if (fileQueue.length > 0 || isSendingFile) {
+        if (fileQueue.length > 0 || activeSends.size > 0) {
             cancelBtn.style.display = 'inline-block';
-            cancelBtn.textContent = `Cancel Queue (${fileQueue.length + (isSendingFile ? 1 : 0)})`;
+            cancelBtn.textContent = `Cancel Queue (${fileQueue.length + activeSends.size})`;
         } else {
             cancelBtn.style.display = 'none';
         }
@@ -1299,7 +1534,7 @@ function updateCancelButton() {
     const viewProgressBtn = document.getElementById('view-progress-btn');
     if (viewProgressBtn) {
         // Show button if there are files in queue or being sent
-        if (fileQueue.length > 0 || isSendingFile || Object.keys(sendingFiles).length > 0) {
+        if (fileQueue.length > 0 || activeSends.size > 0 || Object.keys(sendingFiles).length > 0) {
             viewProgressBtn.style.display = 'inline-block';
         } else {
             viewProgressBtn.style.display = 'none';
@@ -1330,7 +1565,7 @@ async function processFileQueue() {
         console.error('❌ Cannot process queue - peer connection failed');
         if (fileQueue.length > 0) {
             fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Connection failed - cannot send files');
+                updateSendStatus(file, 'error', 'Connection failed - cannot send files');
             });
             fileQueue = [];
         }
@@ -1342,17 +1577,15 @@ async function processFileQueue() {
         console.error('❌ Cannot process queue - ICE connection failed');
         if (fileQueue.length > 0) {
             fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Network connection failed');
+                updateSendStatus(file, 'error', 'Network connection failed');
             });
             fileQueue = [];
         }
         return;
     }
     
-    // If we're currently sending a file, wait for it to finish
-    if (isSendingFile) {
-        if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-        queueProcessingTimeout = setTimeout(processFileQueue, 300);
+    // Every send slot is busy - the next send to finish picks up the queue
+    if (activeSends.size >= transferProtocol.maxConcurrentFiles()) {
         return;
     }
     
@@ -1379,16 +1612,12 @@ async function processFileQueue() {
         const stateName = stateNames[dataChannel.readyState] || dataChannel.readyState;
         console.warn(`⚠️  Data channel not ready, state: ${stateName} (${dataChannel.readyState}), waiting...`);
         
-        // If closed or closing, don't keep retrying - show error
+        // If closed or closing, don't keep retrying - the next data channel picks the files up
         if (dataChannel.readyState === 'closed' || dataChannel.readyState === 'closing') {
             console.error('❌ Data channel is closed/closing. Connection may be lost.');
-            shouldStopQueue = true;
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection lost - data channel closed');
-                });
-                fileQueue = [];
-            }
+            fileQueue.forEach(file => updateSendStatus(file, 'interrupted'));
+            interruptedFiles.push(...fileQueue);
+            fileQueue = [];
             return;
         }
         
@@ -1398,7 +1627,7 @@ async function processFileQueue() {
             shouldStopQueue = true;
             if (fileQueue.length > 0) {
                 fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection failed before data channel could open');
+                    updateSendStatus(file, 'error', 'Connection failed before data channel could open');
                 });
                 fileQueue = [];
             }
@@ -1410,186 +1639,142 @@ async function processFileQueue() {
         return;
     }
     
-    // Wait for buffer to clear - be more conservative
-    const maxBufferSize = 128 * 1024; // 128KB max before waiting
-    
-    if (dataChannel.bufferedAmount > maxBufferSize) {
-        console.log('Buffer full, waiting...', Math.round(dataChannel.bufferedAmount / 1024), 'KB');
-        if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-        queueProcessingTimeout = setTimeout(processFileQueue, 500);
+    // The peer's protocols decide how many files may be in flight at once
+    await transferProtocol.useBinary();
+    if (activeSends.size >= transferProtocol.maxConcurrentFiles()) {
         return;
     }
     
-    // Get next file from queue
-    const file = fileQueue.shift();
+    // Get next file from queue - many small ones go out together as one archive
+    const file = (transferProtocol.supportsBatch() && takeBatch(fileQueue)) || fileQueue.shift();
     if (!file) {
         updateCancelButton();
         return;
     }
     
+    activeSends.add(file);
     console.log(`Processing file: ${file.name} (${fileQueue.length} remaining in queue)`);
     updateCancelButton();
     
-    isSendingFile = true;
+    // Fill the remaining send slots
+    if (fileQueue.length > 0 && activeSends.size < transferProtocol.maxConcurrentFiles()) {
+        processFileQueue();
+    }
     
     try {
-        // Wait for buffer to be ready
-        let waitCount = 0;
-        while (dataChannel.bufferedAmount > 64 * 1024 && waitCount < 200) {
-            await new Promise(resolve => setTimeout(resolve, 50));
-            waitCount++;
-            if (shouldStopQueue) {
-                console.log('Queue stopped during buffer wait');
-                fileQueue.unshift(file); // Put file back in queue
-                isSendingFile = false;
-                shouldStopQueue = false;
-                updateCancelButton();
-                return;
-            }
-        }
-        
-        if (waitCount >= 200) {
-            console.warn('Buffer wait timeout for file:', file.name);
-        }
-        
+        // Flow control inside sendFile() waits for the channel's buffer to drain
         await sendFile(file);
         console.log('File sent successfully:', file.name);
     } catch (error) {
+        if (error instanceof ChannelClosedError || isConnectionInterrupted()) {
+            // The connection dropped, not the file: send it again once reconnected
+            console.warn('Send interrupted, will resume:', file.name);
+            interruptedFiles.push(file);
+            updateSendStatus(file, 'interrupted');
+            return;
+        }
         console.error('Error sending file:', error);
         const errorMsg = error.message || error.toString() || 'Unknown error occurred';
-        updateFileStatus(file.name, 'error', errorMsg);
+        updateSendStatus(file, 'error', errorMsg);
     } finally {
-        isSendingFile = false;
+        activeSends.delete(file);
         
-        // Wait before processing next file to ensure buffer clears
+        // Start the next file right away - its first send waits on flow control if needed
         if (fileQueue.length > 0 && !shouldStopQueue) {
             if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-            queueProcessingTimeout = setTimeout(() => {
-                processFileQueue();
-            }, 300); // Wait 300ms between files
+            processFileQueue();
         } else {
             updateCancelButton();
         }
     }
 }
 
+/**
+ * True while the peer connection is down (it may still recover)
+ */
+function isConnectionInterrupted() {
+    return !dataChannel || dataChannel.readyState !== 'open' ||
+        !peerConnection || peerConnection.connectionState !== 'connected';
+}
+
+/**
+ * Put the files an interrupted connection stopped back at the front of the queue
+ */
+function resumeInterruptedFiles() {
+    if (interruptedFiles.length > 0) {
+        fileQueue.unshift(...interruptedFiles);
+        interruptedFiles.forEach(file => updateSendStatus(file, 'queued'));
+        interruptedFiles = [];
+    }
+    if (fileQueue.length > 0) {
+        processFileQueue();
+    }
+}
+
 async function sendFile(file) {
-    return new Promise((resolve, reject) => {
-        if (!dataChannel) {
-            const error = new Error('Connection not ready. Please wait for the connection to establish...');
-            updateFileStatus(file.name, 'error', error.message);
-            reject(error);
-            return;
-        }
-        
-        if (dataChannel.readyState !== 'open') {
-            const error = new Error('Data channel not ready. Please wait a moment and try again.');
-            console.log('Data channel state:', dataChannel.readyState);
-            updateFileStatus(file.name, 'error', error.message);
-            reject(error);
-            return;
-        }
-        
-        // Check file size - warn if very large
-        if (file.size > 50 * 1024 * 1024) { // 50MB
-            console.warn('Large file detected:', file.name, Math.round(file.size / 1024 / 1024), 'MB');
-        }
-        
-        const reader = new FileReader();
-        reader.onerror = (error) => {
-            console.error('FileReader error:', error);
-            const errorMsg = error.message || 'Failed to read file';
-            updateFileStatus(file.name, 'error', errorMsg);
-            isSendingFile = false;
-            reject(error);
-        };
-        
-        reader.onload = async (e) => {
-            try {
-                const arrayBuffer = e.target.result;
-                console.log('File read, converting to base64:', file.name, 'Size:', Math.round(arrayBuffer.byteLength / 1024), 'KB');
-                
-                const base64 = arrayBufferToBase64(arrayBuffer);
-                console.log('Base64 conversion complete, length:', base64.length);
-                
-                const fileData = {
-                    type: 'file',
-                    name: file.name,
-                    size: file.size,
-                    fileType: file.type,
-                    data: base64
-                };
-                
-                // Update status to sending
-                updateFileStatus(file.name, 'sending');
-                
-                // Wait for buffer to be ready - conservative approach
-                let waitCount = 0;
-                const maxWait = 300; // Max 15 seconds of waiting
-                while (dataChannel.bufferedAmount > 64 * 1024 && waitCount < maxWait) {
-                    await new Promise(resolve => setTimeout(resolve, 50));
-                    waitCount++;
-                    if (shouldStopQueue) {
-                        reject(new Error('Queue cancelled by user'));
-                        return;
-                    }
-                }
-                
-                if (waitCount >= maxWait) {
-                    console.warn('Buffer wait timeout for file:', file.name, 'bufferedAmount:', dataChannel.bufferedAmount);
-                }
-                
-                // Check if file needs chunking
-                const base64Length = base64.length;
-                const estimatedJsonSize = base64Length + 500; // Add overhead for JSON structure
-                
-                if (estimatedJsonSize > CHUNK_SIZE) {
-                    // File is too large, send in chunks
-                    console.log(`File ${file.name} is large (${Math.round(estimatedJsonSize / 1024)}KB), sending in chunks`);
-                    await sendFileInChunks(file, base64, fileData);
-                    updateFileStatus(file.name, 'sent');
-                    resolve();
-                } else {
-                    // File is small enough, send normally
-                    console.log('Stringifying file data for:', file.name);
-                    const jsonString = JSON.stringify(fileData);
-                    console.log('JSON string length:', Math.round(jsonString.length / 1024), 'KB');
-                    
-                    // Send file - ensure data channel is still open
-                    if (dataChannel.readyState !== 'open') {
-                        const errorMsg = 'Data channel closed during send';
-                        updateFileStatus(file.name, 'error', errorMsg);
-                        reject(new Error(errorMsg));
-                        return;
-                    }
-                    
-                    try {
-                        dataChannel.send(jsonString);
-                        console.log('File sent successfully:', file.name, 'Size:', file.size, 'JSON size:', Math.round(jsonString.length / 1024), 'KB');
-                        
-                        // Small delay to ensure message is queued
-                        await new Promise(resolve => setTimeout(resolve, 100));
-                        
-                        // Update status to sent
-                        updateFileStatus(file.name, 'sent');
-                        resolve();
-                    } catch (sendError) {
-                        console.error('Error sending data channel message:', sendError);
-                        const errorMsg = sendError.message || sendError.toString() || 'Failed to send file over data channel';
-                        updateFileStatus(file.name, 'error', errorMsg);
-                        reject(sendError);
-                    }
-                }
-            } catch (error) {
-            console.error('Error processing file:', error);
-            const errorMsg = error.message || error.toString() || 'Unknown error occurred';
-            updateFileStatus(file.name, 'error', errorMsg);
-            reject(error);
+    if (await transferProtocol.useBinary()) {
+        return sendFileAsFrames(file);
+    }
+    // A peer without a hello (an older page) gets base64 JSON messages, encoded in the worker
+    updateSendStatus(file, 'sending');
+    const progressEl = document.getElementById(`progress-${file.name.replace(/[^a-zA-Z0-9]/g, '_')}`);
+    const result = await sendFileLegacy(dataChannel, file, {
+        flowControl: transferProtocol.flow,
+        pipeline: chunkPipeline,
+        isCancelled: () => shouldStopQueue,
+        onProgress: (fraction) => {
+            if (progressEl) {
+                progressEl.style.width = `${Math.round(fraction * 100)}%`;
             }
-        };
-        
-        reader.readAsArrayBuffer(file);
+        }
     });
+    console.log('File sent as JSON:', file.name, 'Size:', file.size, 'Messages:', result.totalChunks, transferProtocol.flow.stats());
+    updateSendStatus(file, 'sent');
+}
+
+async function sendFileAsFrames(file) {
+    updateSendStatus(file, 'sending');
+    // A batch moves the progress bars of all its files together
+    const progressEls = (file.files || [file])
+        .map(member => document.getElementById(`progress-${member.name.replace(/[^a-zA-Z0-9]/g, '_')}`))
+        .filter(Boolean);
+    const result = await sendFileBinary(dataChannel, file, transferProtocol.nextFileId(), {
+        onProgress: (fraction) => {
+            progressEls.forEach(progressEl => {
+                progressEl.style.width = `${Math.round(fraction * 100)}%`;
+            });
+        },
+        isCancelled: () => shouldStopQueue,
+        // A dropped connection leaves the receiver's partial file in place for a resume
+        isInterrupted: isConnectionInterrupted,
+        // Stripes the chunks over the extra channels when the peer supports it
+        flowControl: transferProtocol.pool,
+        // Peers that support it accept or reject the file before it is sent
+        acceptor: transferProtocol.supportsAccept() ? transferProtocol : null,
+        // Peers that support it skip files they already have
+        hasher: fileHasher.available() ? fileHasher : null,
+        pipeline: chunkPipeline,
+        onWaiting: () => updateSendStatus(file, 'waiting'),
+        onStart: () => updateSendStatus(file, 'sending')
+    });
+    if (result.status === 'rejected') {
+        console.log('File rejected by receiver:', file.name);
+        updateSendStatus(file, 'rejected');
+        return;
+    }
+    if (result.status === 'duplicate') {
+        console.log('Receiver already has:', file.name);
+        updateSendStatus(file, 'duplicate');
+        return;
+    }
+    if (result.resumedFrom > 0) {
+        console.log('Resumed', file.name, 'from chunk', result.resumedFrom);
+    }
+    console.log('File sent as binary frames:', file.name, 'Size:', file.size,
+        'Speed:', formatFileSize(result.bytes / Math.max(result.seconds, 0.001)) + '/s',
+        result.compressed ? `Compressed: ${formatFileSize(result.wireBytes)} on the wire (${Math.round((1 - result.wireBytes / Math.max(result.bytes, 1)) * 100)}% saved)` : 'Uncompressed',
+        transferProtocol.pool.stats());
+    updateSendStatus(file, 'sent');
 }
 
 function displaySendingFile(file, status = 'queued') {
@@ -1598,7 +1783,7 @@ function displaySendingFile(file, status = 'queued') {
     
     // Check if file already displayed
     if (sendingFiles[file.name]) {
-        updateFileStatus(file.name, status);
+        updateSendStatus(file, status);
         return;
     }
     
@@ -1618,7 +1803,14 @@ function displaySendingFile(file, status = 'queued') {
     `;
     container.appendChild(fileItem);
     sendingFiles[file.name] = fileItem;
-    updateFileStatus(file.name, status);
+    updateSendStatus(file, status);
+}
+
+/**
+ * updateFileStatus() for a queued item: a File, or every File in a FileBatch
+ */
+function updateSendStatus(item, status, errorMessage = null) {
+    (item.files || [item]).forEach(file => updateFileStatus(file.name, status, errorMessage));
 }
 
 function updateFileStatus(fileName, status, errorMessage = null) {
@@ -1640,6 +1832,22 @@ function updateFileStatus(fileName, status, errorMessage = null) {
                 if (progressEl) progressEl.style.width = '10%';
                 if (errorDetailEl) errorDetailEl.style.display = 'none';
                 break;
+            case 'waiting':
+                statusEl.textContent = 'Waiting for receiver to accept...';
+                statusEl.style.color = '#ffa726';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '0%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
+            case 'rejected':
+                statusEl.textContent = '✗ Declined by receiver';
+                statusEl.style.color = '#999';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '0%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
             case 'sending':
                 statusEl.textContent = 'Sending...';
                 statusEl.style.color = '#667eea';
@@ -1648,6 +1856,21 @@ function updateFileStatus(fileName, status, errorMessage = null) {
                 if (progressEl) progressEl.style.width = '50%';
                 if (errorDetailEl) errorDetailEl.style.display = 'none';
                 break;
+            case 'duplicate':
+                statusEl.textContent = '✓ Already on the receiver';
+                statusEl.style.color = '#4caf50';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '100%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
+            case 'interrupted':
+                statusEl.textContent = 'Interrupted - will resume when reconnected';
+                statusEl.style.color = '#ff9800';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
             case 'sent':
                 statusEl.textContent = '✓ Sent';
                 statusEl.style.color = '#4caf50';
@@ -1682,76 +1905,6 @@ function updateFileStatus(fileName, status, errorMessage = null) {
     }
 }
 
-async function sendFileInChunks(file, base64Data, fileMetadata) {
-    const totalChunks = Math.ceil(base64Data.length / CHUNK_SIZE);
-    const fileId = Date.now() + Math.random(); // Unique ID for this file transfer
-    
-    console.log(`Sending file ${file.name} in ${totalChunks} chunks`);
-    
-    // Send file start message
-    const startMessage = {
-        type: 'file_start',
-        fileId: fileId,
-        fileName: file.name,
-        fileSize: file.size,
-        fileType: file.type,
-        totalChunks: totalChunks
-    };
-    
-    // Wait for buffer
-    while (dataChannel.bufferedAmount > 64 * 1024) {
-        await new Promise(resolve => setTimeout(resolve, 50));
-        if (shouldStopQueue) {
-            throw new Error('Queue cancelled by user');
-        }
-    }
-    
-    dataChannel.send(JSON.stringify(startMessage));
-    await new Promise(resolve => setTimeout(resolve, 50));
-    
-    // Send chunks
-    for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
-        if (shouldStopQueue) {
-            throw new Error('Queue cancelled by user');
-        }
-        
-        const start = chunkIndex * CHUNK_SIZE;
-        const end = Math.min(start + CHUNK_SIZE, base64Data.length);
-        const chunkData = base64Data.substring(start, end);
-        
-        const chunkMessage = {
-            type: 'file_chunk',
-            fileId: fileId,
-            chunkIndex: chunkIndex,
-            totalChunks: totalChunks,
-            data: chunkData
-        };
-        
-        // Wait for buffer to clear
-        while (dataChannel.bufferedAmount > 64 * 1024) {
-            await new Promise(resolve => setTimeout(resolve, 50));
-            if (shouldStopQueue) {
-                throw new Error('Queue cancelled by user');
-            }
-        }
-        
-        dataChannel.send(JSON.stringify(chunkMessage));
-        
-        // Update progress
-        const progress = Math.round(((chunkIndex + 1) / totalChunks) * 100);
-        const fileId_clean = file.name.replace(/[^a-zA-Z0-9]/g, '_');
-        const progressEl = document.getElementById(`progress-${fileId_clean}`);
-        if (progressEl) {
-            progressEl.style.width = `${progress}%`;
-        }
-        
-        // Small delay between chunks
-        await new Promise(resolve => setTimeout(resolve, 50));
-    }
-    
-    console.log(`File ${file.name} sent successfully in ${totalChunks} chunks`);
-}
-
 function toggleErrorDetail(fileName) {
     const fileId = fileName.replace(/[^a-zA-Z0-9]/g, '_');
     const errorDetailEl = document.getElementById(`error-detail-${fileId}`);
@@ -1772,15 +1925,6 @@ function toggleErrorDetail(fileName) {
     }
 }
 
-function arrayBufferToBase64(buffer) {
-    const bytes = new Uint8Array(buffer);
-    let binary = '';
-    for (let i = 0; i < bytes.byteLength; i++) {
-        binary += String.fromCharCode(bytes[i]);
-    }
-    return window.btoa(binary);
-}
-
 // Disconnection handling
 let isReconnecting = false;
 let reconnectCountdown = null;
@@ -1951,9 +2095,13 @@ function cleanupConnections() {
         socket.removeAllListeners();
     }
     
-    // Reset file sending state
+    // Reset file sending state - a new session cannot resume these
+    [...fileQueue, ...interruptedFiles].forEach(file => {
+        updateSendStatus(file, 'error', 'Connection closed before file could be sent');
+    });
     fileQueue = [];
-    isSendingFile = false;
+    interruptedFiles = [];
+    activeSends.clear();
     shouldStopQueue = false;
     if (queueProcessingTimeout) {
         clearTimeout(queueProcessingTimeout);
@@ -1,25 +1,39 @@
 const socket = io();
 let sessionId = null;
-let peerConnection = null;
-let dataChannel = null;
+// Phones in the session by peer id, each with its own connection and send queue (see getPeer).
+// A phone whose connection drops keeps its entry until it rejoins or the disconnect delay runs out.
+const peers = new Map();
 let receivedFiles = [];
-let fileQueue = [];
-let isSendingFile = false;
+let fileQueue = []; // Files not yet handed to the phones
+const outgoing = new Map(); // Item being sent -> {fileId, chunkSize, chunks, states, done, progress}, see fanOut()
+const cancelledSends = new WeakSet(); // Items the user cancelled while they were being sent
+let nextSendId = 0; // fileId of the last outgoing item, the same on every phone's channel
 let sendingFiles = {}; // Track sending files by name
 let fileErrors = {}; // Store error messages for files
 let queueProcessingTimeout = null;
-let shouldStopQueue = false;
-let receivingChunks = {}; // Track file chunks being received {fileId: {chunks: [], totalChunks, fileName, fileSize, fileType}}
-const CHUNK_SIZE = 200 * 1024; // 200KB chunks (safe for WebRTC)
+const chunkPipeline = new ChunkPipeline(); // Reads, frames, checks and (de)compresses chunks in a Web Worker
+const fileHasher = new FileHasher(); // SHA-256 of outgoing files, in a worker, for dedupe-v1 offers
+const receivedHashes = new HashIndex(); // Files received on this device, to skip them when sent again
+receivedHashes.load();
+// Sender-side flow control numbers (throughput, RTT, window, chunk size per channel, compression savings) per phone, for the console
+window.transferStats = () => Object.fromEntries([...peers.values()].map(peer => [peer.id, peer.protocol.pool && peer.protocol.pool.stats()]));
 
 // Signaling client for cross-network P2P support
 let signalingClient = null;
 
+// Socket.IO reconnected (LAN mode): rejoin the session so the phone can reconnect to us
+socket.io.on('reconnect', () => {
+    if (sessionId && !signalingClient) {
+        socket.emit('pc_join', { session_id: sessionId });
+    }
+});
+
 // Mode: 'railway' (cloud/cross-network) or 'local' (LAN)
 let currentMode = 'railway'; // Default to cross-network (name kept for compatibility)
 
 // Initialize on page load
 window.addEventListener('DOMContentLoaded', async () => {
+    registerDownloadWorker(); // Streaming downloads for received files
     // Check if we're on cloud deployment URL or localhost
     if (window.location.hostname.includes('koyeb.app') || window.location.hostname.includes('railway.app') || window.location.hostname.includes('ngrok.io')) {
         currentMode = 'railway';
@@ -119,7 +133,7 @@ async function generateSession() {
         const qrCodeDiv = document.getElementById('qr-code');
         qrCodeDiv.innerHTML = ''; // Clear any existing QR code
         const qrImg = document.createElement('img');
-        qrImg.src = 'data:image/png;base64,' + data.qr_code;
+        qrImg.src = data.qr_image_url || `/api/qr/${sessionId}`;
         qrImg.style.maxWidth = '100%';
         qrImg.style.height = 'auto';
         qrImg.style.minWidth = '250px'; // Ensure minimum size for scanning
@@ -133,6 +147,29 @@ async function generateSession() {
             urlLink.href = mobileUrl;
             urlLink.textContent = mobileUrl;
         }
+        // The QR is hidden once a phone connects: more phones join with the same link
+        const addPhoneLink = document.getElementById('add-phone-link');
+        if (addPhoneLink) {
+            addPhoneLink.href = mobileUrl;
+            addPhoneLink.textContent = mobileUrl;
+        }
+        
+        // Other LAN addresses of this PC, best first - for when the QR address is unreachable
+        const altUrls = document.getElementById('qr-alt-urls');
+        const altUrlList = document.getElementById('qr-alt-url-list');
+        if (altUrls && altUrlList) {
+            const alternatives = (data.candidate_urls || []).filter(url => url !== mobileUrl);
+            altUrlList.innerHTML = '';
+            alternatives.forEach(url => {
+                const link = document.createElement('a');
+                link.href = url;
+                link.target = '_blank';
+                link.textContent = url;
+                altUrlList.appendChild(document.createElement('br'));
+                altUrlList.appendChild(link);
+            });
+            altUrls.classList.toggle('hidden', alternatives.length === 0);
+        }
         
         document.getElementById('loading').classList.add('hidden');
         document.getElementById('qr-container').classList.remove('hidden');
@@ -172,14 +209,8 @@ async function refreshQRCode() {
         socket.removeAllListeners();
         // Socket.IO will auto-reconnect, but we'll set up listeners in initializeSignaling
     }
-    if (peerConnection) {
-        peerConnection.close();
-        peerConnection = null;
-    }
-    if (dataChannel) {
-        dataChannel.close();
-        dataChannel = null;
-    }
+    peers.forEach(peer => closePeer(peer));
+    peers.clear();
     
     // Reset session
     sessionId = null;
@@ -195,44 +226,30 @@ async function refreshQRCode() {
 function initializeSignaling() {
     // Check if we should use the Node.js WebSocket signaling server
     if (window.SIGNALING_SERVER_URL && window.SIGNALING_SERVER_URL.trim() !== '') {
-        console.log('Using Node.js WebSocket signaling server:', window.SIGNALING_SERVER_URL);
+        console.log('Using WebSocket signaling server:', window.SIGNALING_SERVER_URL);
         signalingClient = new SignalingClient(
             window.SIGNALING_SERVER_URL,
             sessionId,
             'pc'
         );
         
-        // Set up event handlers
-        signalingClient.on('peer_connected', () => {
-            // Cancel any pending disconnection timeout (connection restored)
-            if (disconnectTimeout) {
-                clearTimeout(disconnectTimeout);
-                disconnectTimeout = null;
-            }
-            isDisconnected = false;
-            
-            document.getElementById('qr-container').classList.add('hidden');
-            document.getElementById('connected-view').classList.remove('hidden');
-            initializeWebRTC();
-            // File upload handlers will be set up once when data channel opens
-        });
+        // Set up event handlers - each names the phone it is about
+        signalingClient.on('peer_connected', handlePeerConnected);
         
-        signalingClient.on('webrtc_offer', async (offer) => {
-            await handleOffer(offer);
+        signalingClient.on('webrtc_offer', async (offer, from) => {
+            await handleOffer(getPeer(from), offer);
         });
         
-        signalingClient.on('webrtc_answer', async (answer) => {
-            await peerConnection.setRemoteDescription(new RTCSessionDescription(answer));
+        signalingClient.on('webrtc_answer', async (answer, from) => {
+            await handleAnswer(getPeer(from), answer);
         });
         
-        signalingClient.on('ice_candidate', async (candidate) => {
-            if (candidate) {
-                await peerConnection.addIceCandidate(new RTCIceCandidate(candidate));
-            }
+        signalingClient.on('ice_candidate', async (candidate, from) => {
+            await addIceCandidates(getPeer(from), [candidate]);
         });
         
-        signalingClient.on('peer_disconnected', () => {
-            handleDisconnection('Mobile device disconnected');
+        signalingClient.on('peer_disconnected', (role, peerId) => {
+            handleMobileDisconnected(peerId);
         });
         
         signalingClient.connect();
@@ -246,40 +263,120 @@ function initializeSignaling() {
 }
 
 function setupSocketListeners() {
-    socket.on('peer_connected', () => {
-        // Cancel any pending disconnection timeout (connection restored)
-        if (disconnectTimeout) {
-            clearTimeout(disconnectTimeout);
-            disconnectTimeout = null;
-        }
-        isDisconnected = false;
-        
-        document.getElementById('qr-container').classList.add('hidden');
-        document.getElementById('connected-view').classList.remove('hidden');
-        initializeWebRTC();
-        // File upload handlers will be set up once when data channel opens
+    socket.on('peer_connected', (data) => {
+        handlePeerConnected(data && data.peer_id);
     });
     
     socket.on('webrtc_offer', async (data) => {
-        await handleOffer(data.offer);
+        await handleOffer(getPeer(data.from), data.offer);
     });
     
     socket.on('webrtc_answer', async (data) => {
-        await peerConnection.setRemoteDescription(new RTCSessionDescription(data.answer));
+        await handleAnswer(getPeer(data.from), data.answer);
     });
     
     socket.on('ice_candidate', async (data) => {
-        if (data.candidate) {
-            await peerConnection.addIceCandidate(new RTCIceCandidate(data.candidate));
-        }
+        await addIceCandidates(getPeer(data.from), [data.candidate]);
     });
     
-    socket.on('mobile_disconnected', () => {
-        handleDisconnection('Mobile device disconnected');
+    socket.on('ice_candidates', async (data) => {
+        await addIceCandidates(getPeer(data.from), data.candidates || []);
     });
+    
+    socket.on('mobile_disconnected', (data) => {
+        handleMobileDisconnected(data && data.peer_id);
+    });
+}
+
+function handleMobileDisconnected(peerId) {
+    const peer = peers.get(peerId || 'mobile');
+    if (peer) {
+        handleDisconnection(peer, 'Mobile device disconnected');
+    }
+}
+
+/**
+ * The entry of phone `peerId`, created when it first connects
+ * A server from before fan-out names no phones: its one phone is 'mobile'.
+ */
+function getPeer(peerId) {
+    const id = peerId || 'mobile';
+    let peer = peers.get(id);
+    if (!peer) {
+        peer = {
+            id: id,
+            connection: null,
+            channel: null,
+            protocol: new TransferProtocol({ channels: TRANSFER_CHANNELS }), // Binary framing, negotiated per data channel
+            receiving: {}, // Files this phone sends us {fileId: IncomingFile or {chunks: [], totalChunks, fileName, fileSize, fileType}}
+            queue: [], // Items waiting for one of its send slots
+            active: new Set(), // Items being sent to it right now (several at once with striping)
+            interrupted: [], // Items whose send the connection dropped - resumed when it reconnects
+            disconnectTimeout: null
+        };
+        peers.set(id, peer);
+    }
+    return peer;
+}
+
+function handlePeerConnected(peerId) {
+    const peer = getPeer(peerId);
+    // Cancel any pending disconnection timeout (connection restored)
+    if (peer.disconnectTimeout) {
+        clearTimeout(peer.disconnectTimeout);
+        peer.disconnectTimeout = null;
+    }
+    isDisconnected = false;
+    
+    document.getElementById('qr-container').classList.add('hidden');
+    document.getElementById('connected-view').classList.remove('hidden');
+    updatePeerCount();
+    initializeWebRTC(peer);
+    // File upload handlers will be set up once when data channel opens
+}
+
+/**
+ * "N phones connected" in the connected view
+ */
+function updatePeerCount() {
+    const countEl = document.getElementById('connected-peers');
+    if (countEl) {
+        countEl.textContent = peers.size > 1 ?
+            `${peers.size} phones are connected. Files you choose go to all of them.` :
+            'Your phone is connected. You can now share files.';
+    }
+}
+
+/**
+ * Send a signaling message to one phone
+ */
+function signalPeer(peer, type, payload) {
+    if (!signalingClient) {
+        socket.emit(type, { session_id: sessionId, ...payload, to: peer.id });
+    } else if (type === 'webrtc_offer') {
+        signalingClient.sendOffer(payload.offer, peer.id);
+    } else if (type === 'webrtc_answer') {
+        signalingClient.sendAnswer(payload.answer, peer.id);
+    } else {
+        signalingClient.sendIceCandidates(payload.candidates, peer.id);
+    }
+}
+
+async function handleAnswer(peer, answer) {
+    if (peer.connection) {
+        await peer.connection.setRemoteDescription(new RTCSessionDescription(answer));
+    }
+}
+
+async function addIceCandidates(peer, candidates) {
+    for (const candidate of candidates) {
+        if (candidate && peer.connection) {
+            await peer.connection.addIceCandidate(new RTCIceCandidate(candidate));
+        }
+    }
 }
 
-function initializeWebRTC() {
+function initializeWebRTC(peer) {
     // Get TURN credentials from environment variables (passed from Flask template)
     const turnUsername = window.TURN_USERNAME || '';
     const turnPassword = window.TURN_PASSWORD || '';
@@ -353,11 +450,21 @@ function initializeWebRTC() {
         console.log(`     ${idx + 1}. ${server.urls} (${server.username || 'no auth'})`);
     });
     
-    peerConnection = new RTCPeerConnection(configuration);
+    if (peer.connection) {
+        // A reconnect: drop the old connection so its sends fail now and can resume on the new one
+        peer.connection.onconnectionstatechange = null;
+        peer.connection.close();
+    }
+    const peerConnection = new RTCPeerConnection(configuration);
+    peer.connection = peerConnection;
     
     // Log ICE candidates for debugging
     let candidateCount = { host: 0, srflx: 0, relay: 0 };
     let turnServerErrors = [];
+    // Candidates trickle in bursts - relay each burst as one signaling message
+    const iceBatcher = new IceCandidateBatcher((candidates) => {
+        signalPeer(peer, 'ice_candidates', { candidates: candidates });
+    });
     peerConnection.onicecandidate = (event) => {
         if (event.candidate) {
             // Log candidate type
@@ -373,16 +480,10 @@ function initializeWebRTC() {
             
             console.log('Candidate counts:', candidateCount);
             
-            if (signalingClient) {
-                signalingClient.sendIceCandidate(event.candidate);
-            } else {
-                socket.emit('ice_candidate', {
-                    session_id: sessionId,
-                    candidate: event.candidate
-                });
-            }
+            iceBatcher.add(event.candidate);
         } else {
-            // ICE gathering complete
+            // ICE gathering complete - send what is still waiting for the batch timer
+            iceBatcher.end();
             console.log('✅ ICE gathering complete. Total candidates:', candidateCount);
             
             // Only warn if no relay candidates AND no other candidate types available
@@ -427,32 +528,18 @@ function initializeWebRTC() {
         
         if (state === 'failed') {
             // Only treat 'failed' as fatal - 'disconnected' can recover
-            console.error('❌ Peer connection failed');
-            // Stop queue processing immediately
-            shouldStopQueue = true;
-            isSendingFile = false;
-            if (queueProcessingTimeout) {
-                clearTimeout(queueProcessingTimeout);
-                queueProcessingTimeout = null;
-            }
-            // Clear file queue and show error
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection failed - WebRTC peer connection failed');
-                });
-                fileQueue = [];
-            }
+            console.error('❌ Peer connection failed:', peer.id);
+            // Fail this phone's queue and show error - the other phones carry on
+            failPeerQueue(peer, 'Connection failed - WebRTC peer connection failed');
             // Show disconnection message
-            handleDisconnection('WebRTC connection failed. Please try reconnecting.');
+            handleDisconnection(peer, 'WebRTC connection failed. Please try reconnecting.');
         } else if (state === 'disconnected') {
             // 'disconnected' is NOT fatal - WebRTC can recover (e.g., when mobile goes to background)
-            console.warn('⚠️  Peer connection disconnected - waiting for recovery...');
-            // Pause queue processing but don't clear it
-            shouldStopQueue = true;
+            // Sends to this phone wait in its queue meanwhile (processPeerQueue checks the state)
+            console.warn('⚠️  Peer connection disconnected - waiting for recovery...', peer.id);
         } else if (state === 'connected') {
-            console.log('✅ Peer connection established');
-            // Reset stop flag when connection is restored
-            shouldStopQueue = false;
+            console.log('✅ Peer connection established:', peer.id);
+            resumeInterruptedFiles(peer);
         }
     };
     
@@ -479,29 +566,12 @@ function initializeWebRTC() {
                 }
             }
             
-            // Stop queue processing
-            shouldStopQueue = true;
-            if (queueProcessingTimeout) {
-                clearTimeout(queueProcessingTimeout);
-                queueProcessingTimeout = null;
-            }
-            // Clear all files in queue and show error
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Network connection failed. Both devices may be behind strict firewalls.');
-                });
-                fileQueue = [];
-            }
+            // Clear this phone's queue and show error
+            failPeerQueue(peer, 'Network connection failed. Both devices may be behind strict firewalls.');
             // Show disconnection message
-            handleDisconnection('WebRTC connection failed. ICE negotiation failed - may need TURN server or different network.');
+            handleDisconnection(peer, 'WebRTC connection failed. ICE negotiation failed - may need TURN server or different network.');
         } else if (iceState === 'disconnected') {
-            console.warn('⚠️  ICE connection disconnected');
-            // Stop queue processing
-            shouldStopQueue = true;
-            if (queueProcessingTimeout) {
-                clearTimeout(queueProcessingTimeout);
-                queueProcessingTimeout = null;
-            }
+            console.warn('⚠️  ICE connection disconnected:', peer.id);
         } else if (iceState === 'connected' || iceState === 'completed') {
             console.log('✅ ICE connection established');
             // Connection succeeded - if no TURN was used, that's fine
@@ -512,8 +582,8 @@ function initializeWebRTC() {
     };
     
     // Create data channel for file transfer
-    dataChannel = peerConnection.createDataChannel('files', { ordered: true });
-    setupDataChannel();
+    peer.channel = peerConnection.createDataChannel('files', { ordered: true });
+    setupDataChannel(peer);
     
     // Create and send offer
     // Explicitly disable audio/video to prevent microphone permission requests
@@ -526,22 +596,16 @@ function initializeWebRTC() {
             return peerConnection.setLocalDescription(offer);
         })
         .then(() => {
-            if (signalingClient) {
-                signalingClient.sendOffer(peerConnection.localDescription);
-            } else {
-                socket.emit('webrtc_offer', {
-                    session_id: sessionId,
-                    offer: peerConnection.localDescription
-                });
-            }
+            signalPeer(peer, 'webrtc_offer', { offer: peerConnection.localDescription });
         })
         .catch(error => console.error('Error creating offer:', error));
 }
 
-async function handleOffer(offer) {
-    if (!peerConnection) {
-        initializeWebRTC();
+async function handleOffer(peer, offer) {
+    if (!peer.connection) {
+        initializeWebRTC(peer);
     }
+    const peerConnection = peer.connection;
     
     await peerConnection.setRemoteDescription(new RTCSessionDescription(offer));
     // Explicitly disable audio/video to prevent microphone permission requests
@@ -552,153 +616,276 @@ async function handleOffer(offer) {
     });
     await peerConnection.setLocalDescription(answer);
     
-    if (signalingClient) {
-        signalingClient.sendAnswer(peerConnection.localDescription);
-    } else {
-        socket.emit('webrtc_answer', {
-            session_id: sessionId,
-            answer: peerConnection.localDescription
-        });
-    }
+    signalPeer(peer, 'webrtc_answer', { answer: peerConnection.localDescription });
 }
 
-function setupDataChannel() {
+function setupDataChannel(peer) {
+    const dataChannel = peer.channel;
     if (!dataChannel) {
-        console.error('setupDataChannel called but dataChannel is null');
+        console.error('setupDataChannel called but the data channel is null');
         return;
     }
     
-    console.log('Setting up data channel, current state:', dataChannel.readyState);
+    console.log('Setting up data channel for', peer.id, 'current state:', dataChannel.readyState);
+    peer.protocol.attach(dataChannel, peer.connection);
     
     // Add timeout for data channel opening (30 seconds)
     let dataChannelTimeout = setTimeout(() => {
-        if (dataChannel && dataChannel.readyState !== 'open') {
+        if (peer.channel === dataChannel && dataChannel.readyState !== 'open') {
             console.error('❌ Data channel timeout - failed to open within 30 seconds');
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Data channel failed to open - connection timeout');
-                });
-                fileQueue = [];
-            }
-            handleDisconnection('Data channel failed to open. Connection may be blocked by firewall or NAT.');
+            failPeerQueue(peer, 'Data channel failed to open - connection timeout');
+            handleDisconnection(peer, 'Data channel failed to open. Connection may be blocked by firewall or NAT.');
         }
     }, 30000); // 30 second timeout
     
-    // If channel is already open, setup handlers once
-    if (dataChannel.readyState === 'open') {
+    const opened = () => {
         clearTimeout(dataChannelTimeout);
-        console.log('Data channel already open');
-        // Setup handlers only once (guard will prevent duplicates)
+        peer.protocol.sendHello();
+        // Setup file upload handlers once data channel is ready (guard will prevent duplicates)
         if (!fileUploadSetup) {
             setupFileUpload();
         }
-        if (fileQueue.length > 0) {
-            processFileQueue();
-        }
+        // Start processing queue if there are files waiting, interrupted ones first
+        resumeInterruptedFiles(peer);
+    };
+    
+    // If channel is already open, setup handlers once
+    if (dataChannel.readyState === 'open') {
+        console.log('Data channel already open');
+        opened();
     }
     
     dataChannel.onopen = () => {
-        clearTimeout(dataChannelTimeout);
-        console.log('✅ Data channel opened successfully');
-        // Setup file upload handlers once data channel is ready (guard will prevent duplicates)
-        if (!fileUploadSetup) {
-            setupFileUpload();
-        }
-        // Start processing queue if there are files waiting
-        if (fileQueue.length > 0) {
-            console.log(`Processing ${fileQueue.length} queued files`);
-            processFileQueue();
-        }
+        console.log('✅ Data channel opened successfully:', peer.id);
+        opened();
     };
     
     dataChannel.onerror = (error) => {
         clearTimeout(dataChannelTimeout);
-        console.error('❌ Data channel error:', error);
-        if (fileQueue.length > 0) {
-            fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Data channel error occurred');
-            });
-            fileQueue = [];
-        }
+        console.error('❌ Data channel error:', peer.id, error);
+        failPeerQueue(peer, 'Data channel error occurred');
     };
     
     dataChannel.onclose = () => {
         clearTimeout(dataChannelTimeout);
-        console.warn('⚠️  Data channel closed');
-        if (fileQueue.length > 0 && dataChannel.readyState === 'closed') {
-            fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Data channel closed before file could be sent');
-            });
-            fileQueue = [];
-        }
+        // Queued files stay queued: they go out over the next data channel
+        console.warn('⚠️  Data channel closed:', peer.id);
     };
     
-    // Monitor bufferedAmount to help with queue processing
-    dataChannel.onbufferedamountlow = () => {
-        console.log('Buffer cleared, checking if we can process next file');
-        if (fileQueue.length > 0 && !isSendingFile && !shouldStopQueue) {
-            processFileQueue();
+    dataChannel.onmessage = (event) => handleDataChannelMessage(peer, event);
+    
+    peer.connection.ondatachannel = (event) => {
+        if (peer.protocol.receiveLane(event.channel, (buffer) => handleBinaryChunk(peer, buffer))) {
+            return; // The peer's extra channel for striped chunks
         }
+        event.channel.binaryType = 'arraybuffer';
+        event.channel.onmessage = (message) => handleDataChannelMessage(peer, message);
     };
-    
-    dataChannel.onmessage = (event) => {
-        try {
-            const data = JSON.parse(event.data);
-            if (data.type === 'file') {
-                // Single message file (small files)
-                receiveFile(data);
-            } else if (data.type === 'file_start') {
-                // Start of chunked file transfer
-                console.log('Starting chunked file transfer:', data.fileName, 'Total chunks:', data.totalChunks);
-                receivingChunks[data.fileId] = {
-                    chunks: new Array(data.totalChunks),
-                    totalChunks: data.totalChunks,
-                    fileName: data.fileName,
-                    fileSize: data.fileSize,
-                    fileType: data.fileType,
-                    receivedChunks: 0
-                };
-            } else if (data.type === 'file_chunk') {
-                // Receiving a chunk
-                handleFileChunk(data);
+}
+
+function handleDataChannelMessage(peer, event) {
+    try {
+        if (event.data instanceof ArrayBuffer) {
+            // Binary chunk frame
+            handleBinaryChunk(peer, event.data);
+            return;
+        }
+        const data = JSON.parse(event.data);
+        if (peer.protocol.handleControl(data)) {
+            // hello, file_accept, file_reject, file_ack - handled by the sender side
+        } else if (data.type === 'file_cancel') {
+            handleFileCancel(peer, data);
+        } else if (data.type === 'file_start' && data.needsAccept) {
+            // Offered file - nothing is sent until the user accepts it,
+            // unless it continues a file the connection dropped or we have it already
+            if (!resumeIncomingFile(peer, data) && !skipDuplicateFile(peer, data)) {
+                receiveFileOffer(peer, data);
             }
-        } catch (error) {
-            console.error('Error handling data channel message:', error);
+        } else if (data.type === 'file') {
+            // Single message file (small files)
+            receiveBase64File(data);
+        } else if (data.type === 'file_start') {
+            // Start of chunked file transfer
+            console.log('Starting chunked file transfer:', data.fileName, 'Total chunks:', data.totalChunks);
+            peer.receiving[data.fileId] = {
+                chunks: new Array(data.totalChunks),
+                totalChunks: data.totalChunks,
+                fileName: data.fileName,
+                fileSize: data.fileSize,
+                fileType: data.fileType,
+                binary: data.encoding === 'binary-v1',
+                receivedChunks: 0
+            };
+        } else if (data.type === 'file_chunk') {
+            // Receiving a chunk
+            handleFileChunk(peer, data);
+        }
+    } catch (error) {
+        console.error('Error handling data channel message:', error);
+    }
+}
+
+function handleBinaryChunk(peer, buffer) {
+    const frame = decodeChunkFrame(buffer);
+    if (!frame) {
+        console.error('Unsupported binary frame of', buffer.byteLength, 'bytes');
+        return;
+    }
+    const incoming = peer.receiving[frame.fileId];
+    if (incoming instanceof IncomingFile) {
+        incoming.handleChunk(frame);
+        return;
+    }
+    handleFileChunk(peer, frame);
+}
+
+/**
+ * Continue a file the sender offers again after a reconnect
+ * Returns false if `data` is a new file.
+ */
+function resumeIncomingFile(peer, data) {
+    const incoming = peer.protocol.findResumable(data);
+    if (!incoming) {
+        return false;
+    }
+    console.log('Resuming file:', incoming.name, 'from chunk', incoming.nextChunk);
+    delete peer.receiving[incoming.fileId];
+    peer.receiving[data.fileId] = incoming;
+    incoming.resume(peer.channel, data);
+    return true;
+}
+
+/**
+ * Turn down an offered file we received before (same hash) without asking
+ * Returns false if `data` is a file we do not have.
+ */
+function skipDuplicateFile(peer, data) {
+    const held = data.fileHash ? receivedHashes.get(data.fileHash) : null;
+    if (!held) {
+        return false;
+    }
+    console.log('Already received:', data.fileName, 'as', held.name);
+    new IncomingFile(peer.channel, data).reject('duplicate');
+    const fileData = {
+        id: Date.now() + Math.random(),
+        name: data.batch ? `${data.batch.files} files (${data.fileName})` : data.fileName,
+        size: data.fileSize,
+        type: data.fileType,
+        data: null,
+        blob: null,
+        incoming: null,
+        hash: data.fileHash,
+        downloaded: true // Processed
+    };
+    receivedFiles.push(fileData);
+    displayReceivedFile(fileData);
+    setReceivedFileStatus(fileData.id, `✓ Already received <button class="btn-reject" onclick="receiveAgain('${fileData.id}')">Receive again</button>`, '#4caf50');
+    updateDownloadAllButton();
+    return true;
+}
+
+/**
+ * Forget a skipped file's hash, so it comes through when the sender sends it again
+ */
+function receiveAgain(fileId) {
+    const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
+    if (file && file.hash) {
+        receivedHashes.delete(file.hash);
+        setReceivedFileStatus(file.id, 'Will be received if sent again', '#999');
+    }
+}
+
+function receiveFileOffer(peer, data) {
+    const incoming = new IncomingFile(peer.channel, data);
+    incoming.pipeline = chunkPipeline;
+    peer.receiving[data.fileId] = incoming;
+    peer.protocol.trackIncoming(incoming);
+    if (incoming.batch) {
+        // Saved as one .tar, or unpacked into the list where it would sit in memory anyway
+        incoming.openSink = (name, size, type) => openBatchSink(name, size, type, receiveFile);
+    }
+    const fileData = {
+        id: Date.now() + Math.random(), // Unique ID for each file
+        name: incoming.batch ? `${incoming.batch.files} files (${incoming.name})` : incoming.name,
+        size: incoming.size,
+        type: incoming.type,
+        data: null,
+        blob: null,
+        incoming: incoming,
+        peer: peer,
+        downloaded: false
+    };
+    console.log('File offered:', fileData.name, 'Size:', fileData.size);
+    
+    let lastPercent = -1;
+    incoming.onProgress = (fraction) => {
+        const percent = Math.floor(fraction * 100);
+        if (percent !== lastPercent) {
+            lastPercent = percent;
+            setReceivedFileStatus(fileData.id, `Receiving... ${percent}%`, '#667eea');
         }
     };
-    
-    // Note: dataChannel.onerror already set above (line ~606)
-    // Removed duplicate handler that was overwriting the first one
-    
-    peerConnection.ondatachannel = (event) => {
-        const channel = event.channel;
-        channel.onmessage = (event) => {
-            try {
-                const data = JSON.parse(event.data);
-                if (data.type === 'file') {
-                    receiveFile(data);
-                } else if (data.type === 'file_start') {
-                    receivingChunks[data.fileId] = {
-                        chunks: new Array(data.totalChunks),
-                        totalChunks: data.totalChunks,
-                        fileName: data.fileName,
-                        fileSize: data.fileSize,
-                        fileType: data.fileType,
-                        receivedChunks: 0
-                    };
-                } else if (data.type === 'file_chunk') {
-                    handleFileChunk(data);
-                }
-            } catch (error) {
-                console.error('Error handling data channel message:', error);
-            }
-        };
+    incoming.onComplete = (blob) => {
+        delete peer.receiving[incoming.fileId];
+        fileData.incoming = null;
+        if (incoming.hash) {
+            receivedHashes.add(incoming.hash, fileData.name, fileData.size);
+        }
+        if (blob) {
+            // No streaming sink on this page - hand the Blob to the browser now
+            downloadFile({ name: fileData.name, type: fileData.type, blob: blob });
+        }
+        updateFileItemUI(fileData.id, true);
+    };
+    incoming.onError = (message) => {
+        delete peer.receiving[incoming.fileId];
+        fileData.incoming = null;
+        fileData.downloaded = true; // Processed
+        setReceivedFileStatus(fileData.id, `✗ ${message}`, '#f44336');
+        updateDownloadAllButton();
     };
+    
+    receivedFiles.push(fileData);
+    displayReceivedFile(fileData);
+    updateDownloadAllButton();
+}
+
+function handleFileCancel(peer, data) {
+    const incoming = peer.receiving[data.fileId];
+    if (incoming instanceof IncomingFile) {
+        incoming.cancel();
+    } else if (incoming) {
+        // Legacy in-memory transfer - drop the partial chunks
+        delete peer.receiving[data.fileId];
+    }
+}
+
+async function acceptIncomingFile(file) {
+    file.downloaded = true; // Accepted - no second accept, not pending any more
+    setReceivedFileStatus(file.id, 'Waiting for sender...', '#667eea');
+    updateDownloadAllButton();
+    try {
+        if (!await file.incoming.accept()) {
+            // Save dialog cancelled
+            setReceivedFileStatus(file.id, 'Rejected', '#999');
+        }
+    } catch (error) {
+        console.error('Error accepting file:', error);
+        file.incoming.reject();
+        setReceivedFileStatus(file.id, `✗ ${error.message}`, '#f44336');
+    }
 }
 
-function handleFileChunk(chunkData) {
+function setReceivedFileStatus(fileId, text, color) {
+    const fileItem = document.getElementById(`file-${fileId}`);
+    if (fileItem) {
+        fileItem.querySelector('.file-actions').innerHTML = `<span style="color: ${color};">${text}</span>`;
+    }
+}
+
+function handleFileChunk(peer, chunkData) {
     const fileId = chunkData.fileId;
-    const chunkInfo = receivingChunks[fileId];
+    const chunkInfo = peer.receiving[fileId];
     
     if (!chunkInfo) {
         console.error('Received chunk for unknown file:', fileId);
@@ -709,96 +896,38 @@ function handleFileChunk(chunkData) {
     chunkInfo.chunks[chunkData.chunkIndex] = chunkData.data;
     chunkInfo.receivedChunks++;
     
-    console.log(`Received chunk ${chunkData.chunkIndex + 1}/${chunkData.totalChunks} for file ${chunkInfo.fileName}`);
+    console.log(`Received chunk ${chunkData.chunkIndex + 1}/${chunkInfo.totalChunks} for file ${chunkInfo.fileName}`);
     
     // Check if all chunks received
     if (chunkInfo.receivedChunks === chunkInfo.totalChunks) {
-        // Reassemble file
-        const completeData = chunkInfo.chunks.join('');
-        
         const fileData = {
             name: chunkInfo.fileName,
             size: chunkInfo.fileSize,
-            fileType: chunkInfo.fileType,
-            data: completeData
+            fileType: chunkInfo.fileType
         };
-        
         console.log(`All chunks received for ${chunkInfo.fileName}, reassembling...`);
-        receiveFile(fileData);
-        
-        // Clean up
-        delete receivingChunks[fileId];
+        delete peer.receiving[fileId];
+        if (chunkInfo.binary) {
+            // Binary chunks go straight into a Blob - no string copies
+            fileData.blob = new Blob(chunkInfo.chunks, { type: chunkInfo.fileType });
+            receiveFile(fileData);
+        } else {
+            // Reassemble base64 file, decoded in the worker
+            chunkPipeline.base64Blob(chunkInfo.chunks, chunkInfo.fileType).then(blob => {
+                fileData.blob = blob;
+                receiveFile(fileData);
+            }).catch(error => console.error('Could not decode received file:', chunkInfo.fileName, error));
+        }
     }
 }
 
-async function sendFileInChunks(file, base64Data, fileMetadata) {
-    const totalChunks = Math.ceil(base64Data.length / CHUNK_SIZE);
-    const fileId = Date.now() + Math.random(); // Unique ID for this file transfer
-    
-    console.log(`Sending file ${file.name} in ${totalChunks} chunks`);
-    
-    // Send file start message
-    const startMessage = {
-        type: 'file_start',
-        fileId: fileId,
-        fileName: file.name,
-        fileSize: file.size,
-        fileType: file.type,
-        totalChunks: totalChunks
-    };
-    
-    // Wait for buffer
-    while (dataChannel.bufferedAmount > 64 * 1024) {
-        await new Promise(resolve => setTimeout(resolve, 50));
-        if (shouldStopQueue) {
-            throw new Error('Queue cancelled by user');
-        }
-    }
-    
-    dataChannel.send(JSON.stringify(startMessage));
-    await new Promise(resolve => setTimeout(resolve, 50));
-    
-    // Send chunks
-    for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
-        if (shouldStopQueue) {
-            throw new Error('Queue cancelled by user');
-        }
-        
-        const start = chunkIndex * CHUNK_SIZE;
-        const end = Math.min(start + CHUNK_SIZE, base64Data.length);
-        const chunkData = base64Data.substring(start, end);
-        
-        const chunkMessage = {
-            type: 'file_chunk',
-            fileId: fileId,
-            chunkIndex: chunkIndex,
-            totalChunks: totalChunks,
-            data: chunkData
-        };
-        
-        // Wait for buffer to clear
-        while (dataChannel.bufferedAmount > 64 * 1024) {
-            await new Promise(resolve => setTimeout(resolve, 50));
-            if (shouldStopQueue) {
-                throw new Error('Queue cancelled by user');
-            }
-        }
-        
-        dataChannel.send(JSON.stringify(chunkMessage));
-        
-        // Update progress
-        const progress = Math.round(((chunkIndex + 1) / totalChunks) * 100);
-        const fileId_clean = file.name.replace(/[^a-zA-Z0-9]/g, '_');
-        const progressEl = document.getElementById(`progress-${fileId_clean}`);
-        if (progressEl) {
-            progressEl.style.width = `${progress}%`;
-        }
-        
-        // Small delay between chunks
-        await new Promise(resolve => setTimeout(resolve, 50));
-    }
-    
-    console.log(`File ${file.name} sent successfully in ${totalChunks} chunks`);
+/**
+ * A legacy single-message file: decode its base64 in the worker, then list it
+ */
+function receiveBase64File(data) {
+    chunkPipeline.base64Blob([data.data], data.fileType || 'application/octet-stream').then(blob => {
+        receiveFile({ name: data.name, size: data.size, fileType: data.fileType, blob: blob });
+    }).catch(error => console.error('Could not decode received file:', data.name, error));
 }
 
 function receiveFile(data) {
@@ -811,6 +940,7 @@ function receiveFile(data) {
         size: data.size || 0,
         type: fileType,
         data: data.data,
+        blob: data.blob || null,
         downloaded: false
     };
     
@@ -853,8 +983,16 @@ function displayReceivedFile(file) {
 function acceptFile(fileId) {
     const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
     if (file && !file.downloaded) {
+        if (file.incoming) {
+            // Offered file: stream it to disk from here on
+            acceptIncomingFile(file);
+            return;
+        }
         downloadFile(file);
         file.downloaded = true;
+        // The browser has its own copy now
+        file.data = null;
+        file.blob = null;
         updateFileItemUI(fileId, true);
     }
 }
@@ -868,7 +1006,15 @@ function rejectFile(fileId) {
     
     const file = receivedFiles.find(f => f.id.toString() === fileId.toString());
     if (file) {
+        if (file.incoming) {
+            // Tell the sender not to send it (or to stop)
+            file.incoming.reject();
+            delete file.peer.receiving[file.incoming.fileId];
+            file.incoming = null;
+        }
         file.downloaded = true; // Mark as processed
+        file.data = null;
+        file.blob = null;
     }
     
     updateDownloadAllButton();
@@ -932,14 +1078,15 @@ function updateDownloadAllButton() {
 
 // Clear processed files (accepted/rejected)
 function clearProcessedFiles() {
-    const processedFiles = receivedFiles.filter(f => f.downloaded);
+    // Files still streaming in stay listed until they finish
+    const processedFiles = receivedFiles.filter(f => f.downloaded && !f.incoming);
     
     if (processedFiles.length === 0) {
         return;
     }
     
     // Remove processed files from array
-    receivedFiles = receivedFiles.filter(f => !f.downloaded);
+    receivedFiles = receivedFiles.filter(f => !processedFiles.includes(f));
     
     // Remove processed files from DOM
     processedFiles.forEach(file => {
@@ -971,6 +1118,7 @@ window.rejectAllFiles = rejectAllFiles;
 // Make functions globally accessible
 window.acceptFile = acceptFile;
 window.rejectFile = rejectFile;
+window.receiveAgain = receiveAgain;
 
 // Setup download all and reject all button handlers using event delegation
 let buttonHandlersSetup = false;
@@ -1016,7 +1164,7 @@ if (document.readyState === 'loading') {
 }
 
 function downloadFile(file) {
-    const blob = new Blob([base64ToArrayBuffer(file.data)], { type: file.type });
+    const blob = file.blob;
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
@@ -1025,15 +1173,6 @@ function downloadFile(file) {
     URL.revokeObjectURL(url);
 }
 
-function base64ToArrayBuffer(base64) {
-    const binaryString = window.atob(base64);
-    const bytes = new Uint8Array(binaryString.length);
-    for (let i = 0; i < binaryString.length; i++) {
-        bytes[i] = binaryString.charCodeAt(i);
-    }
-    return bytes.buffer;
-}
-
 function formatFileSize(bytes) {
     if (bytes === 0) return '0 Bytes';
     const k = 1024;
@@ -1109,10 +1248,8 @@ function setupFileUpload() {
                 isProcessingChange = false;
             }, 100);
             
-            // Start processing queue if not already processing
-            if (!isSendingFile && fileQueue.length > 0) {
-                processFileQueue();
-            }
+            // Hand the files to the phones
+            processFileQueue();
         } else {
             // User cancelled file selection - already cleared above
             isProcessingChange = false;
@@ -1125,7 +1262,7 @@ function setupFileUpload() {
     const cancelBtn = document.getElementById('cancel-queue-btn');
     if (cancelBtn) {
         cancelBtn.addEventListener('click', () => {
-            if (confirm(`Cancel ${fileQueue.length} file(s) in queue?`)) {
+            if (confirm(`Cancel ${pendingSendCount()} file(s) in queue?`)) {
                 cancelQueue();
             }
         });
@@ -1162,6 +1299,10 @@ function setupFileUpload() {
 
 function queueFile(file) {
     fileQueue.push(file);
+    if (fileHasher.available()) {
+        // Hashed in the background while earlier files send; sendFileBinary() waits for it
+        fileHasher.hash(file).catch(() => {});
+    }
     displaySendingFile(file, 'queued');
     console.log('File queued:', file.name, 'Total in queue:', fileQueue.length);
     updateCancelButton();
@@ -1169,34 +1310,46 @@ function queueFile(file) {
 
 function cancelQueue() {
     console.log('Cancelling queue...');
-    shouldStopQueue = true;
     
-    // Clear the queue
-    const cancelledCount = fileQueue.length;
+    // Files not handed to the phones yet
+    const cancelledCount = pendingSendCount();
     fileQueue.forEach(file => {
-        updateFileStatus(file.name, 'error', 'Cancelled by user');
+        updateSendStatus(file, 'error', 'Cancelled by user');
     });
     fileQueue = [];
     
+    // Files on their way: sends in progress stop at their next chunk, waiting ones are dropped
+    outgoing.forEach((record, item) => cancelledSends.add(item));
+    peers.forEach(peer => {
+        [...peer.queue, ...peer.interrupted].forEach(item => finishPeerSend(peer, item, 'error', 'Cancelled by user'));
+        peer.queue = [];
+        peer.interrupted = [];
+    });
+    
     // Clear timeout
     if (queueProcessingTimeout) {
         clearTimeout(queueProcessingTimeout);
         queueProcessingTimeout = null;
     }
     
-    // Reset sending flag
-    isSendingFile = false;
-    
     console.log(`Cancelled ${cancelledCount} files from queue`);
     updateCancelButton();
 }
 
+/**
+ * Items queued or being sent to at least one phone
+ */
+function pendingSendCount() {
+    return fileQueue.length + outgoing.size;
+}
+
 function updateCancelButton() {
+    const pending = pendingSendCount();
     const cancelBtn = document.getElementById('cancel-queue-btn');
     if (cancelBtn) {
-        if (fileQueue.length > 0 || isSendingFile) {
+        if (pending > 0) {
             cancelBtn.style.display = 'inline-block';
-            cancelBtn.textContent = `Cancel Queue (${fileQueue.length + (isSendingFile ? 1 : 0)})`;
+            cancelBtn.textContent = `Cancel Queue (${pending})`;
         } else {
             cancelBtn.style.display = 'none';
         }
@@ -1206,7 +1359,7 @@ function updateCancelButton() {
     const viewProgressBtn = document.getElementById('view-progress-btn');
     if (viewProgressBtn) {
         // Show button if there are files in queue or being sent
-        if (fileQueue.length > 0 || isSendingFile || Object.keys(sendingFiles).length > 0) {
+        if (pending > 0 || Object.keys(sendingFiles).length > 0) {
             viewProgressBtn.style.display = 'inline-block';
         } else {
             viewProgressBtn.style.display = 'none';
@@ -1225,263 +1378,306 @@ function scrollToProgress() {
 // Make scrollToProgress globally accessible
 window.scrollToProgress = scrollToProgress;
 
+/**
+ * Hand the queued files to every connected phone, then start sending
+ *
+ * Each phone has its own queue and send slots, so a slow phone does not
+ * hold the others back; they share one SharedChunks per file, so the
+ * chunks are read, check-summed, compressed and framed once however
+ * many phones receive them.
+ */
 async function processFileQueue() {
-    // Check if queue should be stopped
-    if (shouldStopQueue) {
-        console.log('Queue processing stopped');
-        return;
-    }
-    
-    // Check if peer connection has failed (only 'failed' is fatal, 'disconnected' can recover)
-    if (peerConnection && peerConnection.connectionState === 'failed') {
-        console.error('❌ Cannot process queue - peer connection failed');
-        if (fileQueue.length > 0) {
-            fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Connection failed - cannot send files');
-            });
-            fileQueue = [];
-        }
-        return;
-    }
-    
-    // Check if ICE connection has failed
-    if (peerConnection && peerConnection.iceConnectionState === 'failed') {
-        console.error('❌ Cannot process queue - ICE connection failed');
-        if (fileQueue.length > 0) {
-            fileQueue.forEach(file => {
-                updateFileStatus(file.name, 'error', 'Network connection failed');
-            });
-            fileQueue = [];
-        }
-        return;
-    }
-    
-    // If we're currently sending a file, wait for it to finish
-    if (isSendingFile) {
-        if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-        queueProcessingTimeout = setTimeout(processFileQueue, 300);
-        return;
-    }
-    
     if (fileQueue.length === 0) {
         console.log('File queue is empty');
         updateCancelButton();
         return;
     }
     
-    if (!dataChannel) {
-        console.warn('⚠️  Data channel not initialized, waiting...');
-        if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-        queueProcessingTimeout = setTimeout(processFileQueue, 500);
+    const targets = [...peers.values()];
+    if (targets.length === 0) {
+        // The files go out once a phone connects (resumeInterruptedFiles)
+        console.warn('⚠️  No phone connected yet, waiting...');
         return;
     }
     
-    if (dataChannel.readyState !== 'open') {
-        const stateNames = {
-            'connecting': 'Connecting',
-            'open': 'Open',
-            'closing': 'Closing',
-            'closed': 'Closed'
-        };
-        const stateName = stateNames[dataChannel.readyState] || dataChannel.readyState;
-        console.warn(`⚠️  Data channel not ready, state: ${stateName} (${dataChannel.readyState}), waiting...`);
-        
-        // If closed or closing, don't keep retrying - show error
-        if (dataChannel.readyState === 'closed' || dataChannel.readyState === 'closing') {
-            console.error('❌ Data channel is closed/closing. Connection may be lost.');
-            shouldStopQueue = true;
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection lost - data channel closed');
-                });
-                fileQueue = [];
-            }
-            return;
-        }
-        
-        // If peer connection has failed while waiting, stop retrying
-        if (peerConnection && (peerConnection.connectionState === 'failed' || peerConnection.iceConnectionState === 'failed')) {
-            console.error('❌ Peer connection failed while waiting for data channel');
-            shouldStopQueue = true;
-            if (fileQueue.length > 0) {
-                fileQueue.forEach(file => {
-                    updateFileStatus(file.name, 'error', 'Connection failed before data channel could open');
-                });
-                fileQueue = [];
-            }
-            return;
-        }
-        
+    // Wait for data channels still opening - their hello decides the batching
+    const opening = targets.filter(peer => !peer.channel || peer.channel.readyState === 'connecting');
+    if (opening.length > 0) {
+        console.warn(`⚠️  Data channel not ready for ${opening.map(peer => peer.id).join(', ')}, waiting...`);
         if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
         queueProcessingTimeout = setTimeout(processFileQueue, 500);
         return;
     }
+    await Promise.all(targets.filter(peer => peer.channel.readyState === 'open').map(peer => peer.protocol.useBinary()));
     
-    // Wait for buffer to clear - be more conservative
-    const maxBufferSize = 128 * 1024; // 128KB max before waiting
-    
-    if (dataChannel.bufferedAmount > maxBufferSize) {
-        console.log('Buffer full, waiting...', Math.round(dataChannel.bufferedAmount / 1024), 'KB');
-        if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-        queueProcessingTimeout = setTimeout(processFileQueue, 500);
+    // Many small files go out together as one archive, if every phone can unpack it
+    const batching = targets.every(peer => peer.protocol.supportsBatch());
+    while (fileQueue.length > 0) {
+        fanOut((batching && takeBatch(fileQueue)) || fileQueue.shift(), targets);
+    }
+    updateCancelButton();
+    targets.forEach(peer => processPeerQueue(peer));
+}
+
+/**
+ * Queue `item` (a File or FileBatch) for each of `targets`
+ */
+function fanOut(item, targets) {
+    // Every phone's send must cut and frame the file the same way to share its chunks
+    const chunkSizes = targets.filter(peer => peer.protocol.pool).map(peer => peer.protocol.pool.chunkSize);
+    nextSendId = (nextSendId + 1) % 0x100000000;
+    const record = {
+        fileId: nextSendId,
+        chunkSize: chunkSizes.length > 0 ? Math.min(...chunkSizes) : BINARY_CHUNK_SIZE,
+        chunks: new SharedChunks(chunkPipeline, targets.length),
+        states: new Map(), // peer id -> {status, message}, until that phone is done with it
+        done: [], // {status, message} of the phones done with it
+        progress: new Map() // peer id -> fraction sent, while sending
+    };
+    outgoing.set(item, record);
+    targets.forEach(peer => {
+        record.states.set(peer.id, { status: 'queued', message: null });
+        peer.queue.push(item);
+    });
+    console.log(`Processing file: ${item.name} for ${targets.length} phone(s)`);
+}
+
+/**
+ * Start sends to `peer` until its send slots are full
+ */
+async function processPeerQueue(peer) {
+    if (peer.queue.length === 0 || peers.get(peer.id) !== peer) {
         return;
     }
-    
-    // Get next file from queue
-    const file = fileQueue.shift();
-    if (!file) {
-        updateCancelButton();
+    if (!peer.channel || peer.channel.readyState !== 'open') {
+        // Closed or closing: the next data channel picks the files up; opening: its onopen does
+        if (peer.channel && (peer.channel.readyState === 'closed' || peer.channel.readyState === 'closing')) {
+            console.error('❌ Data channel is closed/closing. Connection may be lost:', peer.id);
+            peer.queue.forEach(item => setPeerSendStatus(peer, item, 'interrupted'));
+            peer.interrupted.push(...peer.queue);
+            peer.queue = [];
+        }
         return;
     }
     
-    console.log(`Processing file: ${file.name} (${fileQueue.length} remaining in queue)`);
-    updateCancelButton();
-    
-    isSendingFile = true;
-    
+    // The peer's protocols decide how many files may be in flight at once
+    await peer.protocol.useBinary();
+    while (peer.queue.length > 0 && peer.active.size < peer.protocol.maxConcurrentFiles()) {
+        sendToPeer(peer, peer.queue.shift());
+    }
+}
+
+async function sendToPeer(peer, item) {
+    const record = outgoing.get(item);
+    peer.active.add(item);
+    let interrupted = false;
     try {
-        // Wait for buffer to be ready
-        let waitCount = 0;
-        while (dataChannel.bufferedAmount > 64 * 1024 && waitCount < 200) {
-            await new Promise(resolve => setTimeout(resolve, 50));
-            waitCount++;
-            if (shouldStopQueue) {
-                console.log('Queue stopped during buffer wait');
-                fileQueue.unshift(file); // Put file back in queue
-                isSendingFile = false;
-                shouldStopQueue = false;
-                updateCancelButton();
-                return;
-            }
+        if (cancelledSends.has(item)) {
+            throw new Error('Cancelled by user');
         }
-        
-        if (waitCount >= 200) {
-            console.warn('Buffer wait timeout for file:', file.name);
-        }
-        
-        await sendFile(file);
-        console.log('File sent successfully:', file.name);
+        // Flow control inside sendFile() waits for the channel's buffer to drain
+        await sendFile(peer, item, record);
+        console.log('File sent successfully:', item.name, 'to', peer.id);
     } catch (error) {
+        if ((error instanceof ChannelClosedError || isPeerInterrupted(peer)) && peers.get(peer.id) === peer) {
+            // The connection dropped, not the file: send it again once reconnected
+            console.warn('Send interrupted, will resume:', item.name, 'to', peer.id);
+            interrupted = true;
+            peer.interrupted.push(item);
+            setPeerSendStatus(peer, item, 'interrupted');
+            return;
+        }
         console.error('Error sending file:', error);
         const errorMsg = error.message || error.toString() || 'Unknown error occurred';
-        updateFileStatus(file.name, 'error', errorMsg);
+        finishPeerSend(peer, item, 'error', errorMsg);
     } finally {
-        isSendingFile = false;
-        
-        // Wait before processing next file to ensure buffer clears
-        if (fileQueue.length > 0 && !shouldStopQueue) {
-            if (queueProcessingTimeout) clearTimeout(queueProcessingTimeout);
-            queueProcessingTimeout = setTimeout(() => {
-                processFileQueue();
-            }, 300); // Wait 300ms between files
-        } else {
-            updateCancelButton();
+        peer.active.delete(item);
+        // Start the next file right away - its first send waits on flow control if needed
+        if (!interrupted) {
+            processPeerQueue(peer);
         }
+        updateCancelButton();
     }
 }
 
-async function sendFile(file) {
-    return new Promise((resolve, reject) => {
-        const reader = new FileReader();
-        reader.onerror = (error) => {
-            console.error('FileReader error:', error);
-            const errorMsg = error.message || 'Failed to read file';
-            updateFileStatus(file.name, 'error', errorMsg);
-            isSendingFile = false;
-            reject(error);
-        };
-        
-        reader.onload = async (e) => {
-            try {
-                const arrayBuffer = e.target.result;
-                const base64 = arrayBufferToBase64(arrayBuffer);
-                
-                const fileData = {
-                    type: 'file',
-                    name: file.name,
-                    size: file.size,
-                    fileType: file.type,
-                    data: base64
-                };
-                
-                // Update status to sending
-                updateFileStatus(file.name, 'sending');
-                
-                // Wait for buffer to be ready - conservative approach
-                let waitCount = 0;
-                const maxWait = 300; // Max 15 seconds of waiting
-                while (dataChannel.bufferedAmount > 64 * 1024 && waitCount < maxWait) {
-                    await new Promise(resolve => setTimeout(resolve, 50));
-                    waitCount++;
-                    if (shouldStopQueue) {
-                        reject(new Error('Queue cancelled by user'));
-                        return;
-                    }
-                }
-                
-                if (waitCount >= maxWait) {
-                    console.warn('Buffer wait timeout for file:', file.name, 'bufferedAmount:', dataChannel.bufferedAmount);
-                }
-                
-                // Check if file needs chunking
-                const base64Length = base64.length;
-                const estimatedJsonSize = base64Length + 500; // Add overhead for JSON structure
-                
-                if (estimatedJsonSize > CHUNK_SIZE) {
-                    // File is too large, send in chunks
-                    console.log(`File ${file.name} is large (${Math.round(estimatedJsonSize / 1024)}KB), sending in chunks`);
-                    await sendFileInChunks(file, base64, fileData);
-                    updateFileStatus(file.name, 'sent');
-                    resolve();
-                } else {
-                    // File is small enough, send normally
-                    console.log('Stringifying file data for:', file.name);
-                    const jsonString = JSON.stringify(fileData);
-                    console.log('JSON string length:', Math.round(jsonString.length / 1024), 'KB');
-                    
-                    // Send file - ensure data channel is still open
-                    if (dataChannel.readyState !== 'open') {
-                        const errorMsg = 'Data channel closed during send';
-                        updateFileStatus(file.name, 'error', errorMsg);
-                        reject(new Error(errorMsg));
-                        return;
-                    }
-                    
-                    try {
-                        dataChannel.send(jsonString);
-                        console.log('File sent successfully:', file.name, 'Size:', file.size, 'JSON size:', Math.round(jsonString.length / 1024), 'KB');
-                        
-                        // Small delay to ensure message is queued
-                        await new Promise(resolve => setTimeout(resolve, 100));
-                        
-                        // Update status to sent
-                        updateFileStatus(file.name, 'sent');
-                        resolve();
-                    } catch (sendError) {
-                        console.error('Error sending data channel message:', sendError);
-                        const errorMsg = sendError.message || sendError.toString() || 'Failed to send file over data channel';
-                        updateFileStatus(file.name, 'error', errorMsg);
-                        reject(sendError);
-                    }
-                }
-            } catch (error) {
-                console.error('Error sending file:', error);
-                const errorMsg = error.message || error.toString() || 'Unknown error occurred';
-                updateFileStatus(file.name, 'error', errorMsg);
-                reject(error);
-            }
-        };
-        reader.readAsArrayBuffer(file);
+/**
+ * True while the phone's connection is down (it may still recover)
+ */
+function isPeerInterrupted(peer) {
+    return !peer.channel || peer.channel.readyState !== 'open' ||
+        !peer.connection || peer.connection.connectionState !== 'connected';
+}
+
+/**
+ * Put the files an interrupted connection stopped back at the front of the phone's queue
+ */
+function resumeInterruptedFiles(peer) {
+    if (peer.interrupted.length > 0) {
+        peer.queue.unshift(...peer.interrupted);
+        peer.interrupted.forEach(item => setPeerSendStatus(peer, item, 'queued'));
+        peer.interrupted = [];
+    }
+    processPeerQueue(peer);
+    processFileQueue();
+}
+
+/**
+ * Give up on the files still waiting for `peer` (its connection failed)
+ */
+function failPeerQueue(peer, message) {
+    [...peer.queue, ...peer.interrupted].forEach(item => finishPeerSend(peer, item, 'error', message));
+    peer.queue = [];
+    peer.interrupted = [];
+    updateCancelButton();
+}
+
+async function sendFile(peer, item, record) {
+    if (await peer.protocol.useBinary()) {
+        return sendFileAsFrames(peer, item, record);
+    }
+    // A peer without a hello (an older page) gets base64 JSON messages, encoded in the worker
+    setPeerSendStatus(peer, item, 'sending');
+    const result = await sendFileLegacy(peer.channel, item, {
+        flowControl: peer.protocol.flow,
+        pipeline: chunkPipeline,
+        isCancelled: () => cancelledSends.has(item),
+        onProgress: (fraction) => setPeerProgress(peer, item, fraction)
+    });
+    console.log('File sent as JSON:', item.name, 'Size:', item.size, 'Messages:', result.totalChunks, peer.protocol.flow.stats());
+    finishPeerSend(peer, item, 'sent');
+}
+
+async function sendFileAsFrames(peer, item, record) {
+    setPeerSendStatus(peer, item, 'sending');
+    const protocol = peer.protocol;
+    const result = await sendFileBinary(peer.channel, item, record.fileId, {
+        onProgress: (fraction) => setPeerProgress(peer, item, fraction),
+        isCancelled: () => cancelledSends.has(item),
+        // A dropped connection leaves the receiver's partial file in place for a resume
+        isInterrupted: () => isPeerInterrupted(peer),
+        // Stripes the chunks over the extra channels when the peer supports it
+        flowControl: protocol.pool,
+        // Peers that support it accept or reject the file before it is sent
+        acceptor: protocol.supportsAccept() ? protocol : null,
+        // Peers that support it skip files they already have
+        hasher: fileHasher.available() ? fileHasher : null,
+        // Chunks prepared for one phone are reused for the others
+        pipeline: record.chunks,
+        chunkSize: record.chunkSize,
+        onWaiting: () => setPeerSendStatus(peer, item, 'waiting'),
+        onStart: () => setPeerSendStatus(peer, item, 'sending')
+    });
+    if (result.status === 'rejected') {
+        console.log('File rejected by receiver:', item.name, peer.id);
+        finishPeerSend(peer, item, 'rejected');
+        return;
+    }
+    if (result.status === 'duplicate') {
+        console.log('Receiver already has:', item.name, peer.id);
+        finishPeerSend(peer, item, 'duplicate');
+        return;
+    }
+    if (result.resumedFrom > 0) {
+        console.log('Resumed', item.name, 'from chunk', result.resumedFrom);
+    }
+    console.log('File sent as binary frames:', item.name, 'to', peer.id, 'Size:', item.size,
+        'Speed:', formatFileSize(result.bytes / Math.max(result.seconds, 0.001)) + '/s',
+        result.compressed ? `Compressed: ${formatFileSize(result.wireBytes)} on the wire (${Math.round((1 - result.wireBytes / Math.max(result.bytes, 1)) * 100)}% saved)` : 'Uncompressed',
+        protocol.pool.stats(), `Chunks prepared: ${record.chunks.packed}`);
+    finishPeerSend(peer, item, 'sent');
+}
+
+/**
+ * Record where `item`'s send to `peer` stands, and show it
+ */
+function setPeerSendStatus(peer, item, status, message = null) {
+    const record = outgoing.get(item);
+    if (!record) {
+        return;
+    }
+    record.states.set(peer.id, { status: status, message: message });
+    showSendStatus(item, record);
+}
+
+/**
+ * End `item`'s send to `peer` (sent, declined, already there or failed)
+ */
+function finishPeerSend(peer, item, status, message = null) {
+    const record = outgoing.get(item);
+    if (!record || !record.states.has(peer.id)) {
+        return;
+    }
+    record.chunks.leave();
+    record.progress.delete(peer.id);
+    setPeerSendStatus(peer, item, status, message);
+    record.states.delete(peer.id);
+    record.done.push({ status: status, message: message });
+    if (record.states.size === 0) {
+        outgoing.delete(item);
+    }
+}
+
+function setPeerProgress(peer, item, fraction) {
+    const record = outgoing.get(item);
+    if (!record) {
+        return;
+    }
+    record.progress.set(peer.id, fraction);
+    // The bar follows the slowest phone
+    const slowest = Math.min(...record.progress.values());
+    // A batch moves the progress bars of all its files together
+    (item.files || [item]).forEach(file => {
+        const progressEl = document.getElementById(`progress-${file.name.replace(/[^a-zA-Z0-9]/g, '_')}`);
+        if (progressEl) {
+            progressEl.style.width = `${Math.round(slowest * 100)}%`;
+        }
     });
 }
 
+/**
+ * Show one status for `item` across all the phones it is sent to
+ * With one phone this is that phone's status, as before fan-out.
+ */
+function showSendStatus(item, record) {
+    const open = [...record.states.values()];
+    const done = record.done;
+    const total = open.length + done.length;
+    if (total === 1) {
+        const only = open[0] || done[0];
+        updateSendStatus(item, only.status, only.message);
+        return;
+    }
+    const unfinished = open.filter(state => !['sent', 'duplicate', 'rejected', 'error'].includes(state.status));
+    const finished = done.concat(open.filter(state => !unfinished.includes(state)));
+    if (unfinished.length > 0) {
+        if (unfinished.some(state => state.status === 'sending' || state.status === 'waiting')) {
+            updateSendStatus(item, 'sending', null, `Sending... ${finished.length} of ${total} phones done`);
+        } else if (unfinished.some(state => state.status === 'interrupted')) {
+            updateSendStatus(item, 'interrupted');
+        } else {
+            updateSendStatus(item, 'queued');
+        }
+        return;
+    }
+    const failed = finished.filter(state => state.status === 'error');
+    const declined = finished.filter(state => state.status === 'rejected');
+    if (failed.length > 0) {
+        updateSendStatus(item, 'error', `Not sent to ${failed.length} of ${total} phones: ${failed[0].message}`);
+    } else if (declined.length === total) {
+        updateSendStatus(item, 'rejected');
+    } else {
+        const declinedNote = declined.length > 0 ? ` (declined on ${declined.length})` : '';
+        updateSendStatus(item, 'sent', null, `✓ Sent to ${total - declined.length} phones${declinedNote}`);
+    }
+}
+
 function displaySendingFile(file, status = 'queued') {
     const container = document.getElementById('file-list');
     const fileId = file.name.replace(/[^a-zA-Z0-9]/g, '_');
     
     // Check if file already displayed
     if (sendingFiles[file.name]) {
-        updateFileStatus(file.name, status);
+        updateSendStatus(file, status);
         return;
     }
     
@@ -1501,10 +1697,20 @@ function displaySendingFile(file, status = 'queued') {
     `;
     container.appendChild(fileItem);
     sendingFiles[file.name] = fileItem;
-    updateFileStatus(file.name, status);
+    updateSendStatus(file, status);
+}
+
+/**
+ * updateFileStatus() for a queued item: a File, or every File in a FileBatch
+ */
+function updateSendStatus(item, status, errorMessage = null, label = null) {
+    (item.files || [item]).forEach(file => updateFileStatus(file.name, status, errorMessage, label));
 }
 
-function updateFileStatus(fileName, status, errorMessage = null) {
+/**
+ * Show `status` for a file; `label` replaces the status text (fan-out summaries)
+ */
+function updateFileStatus(fileName, status, errorMessage = null, label = null) {
     const fileId = fileName.replace(/[^a-zA-Z0-9]/g, '_');
     const statusId = `status-${fileId}`;
     const progressId = `progress-${fileId}`;
@@ -1523,6 +1729,22 @@ function updateFileStatus(fileName, status, errorMessage = null) {
                 if (progressEl) progressEl.style.width = '10%';
                 if (errorDetailEl) errorDetailEl.style.display = 'none';
                 break;
+            case 'waiting':
+                statusEl.textContent = 'Waiting for receiver to accept...';
+                statusEl.style.color = '#ffa726';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '0%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
+            case 'rejected':
+                statusEl.textContent = '✗ Declined by receiver';
+                statusEl.style.color = '#999';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '0%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
             case 'sending':
                 statusEl.textContent = 'Sending...';
                 statusEl.style.color = '#667eea';
@@ -1531,6 +1753,21 @@ function updateFileStatus(fileName, status, errorMessage = null) {
                 if (progressEl) progressEl.style.width = '50%';
                 if (errorDetailEl) errorDetailEl.style.display = 'none';
                 break;
+            case 'duplicate':
+                statusEl.textContent = '✓ Already on the receiver';
+                statusEl.style.color = '#4caf50';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (progressEl) progressEl.style.width = '100%';
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
+            case 'interrupted':
+                statusEl.textContent = 'Interrupted - will resume when reconnected';
+                statusEl.style.color = '#ff9800';
+                statusEl.style.cursor = 'default';
+                statusEl.onclick = null;
+                if (errorDetailEl) errorDetailEl.style.display = 'none';
+                break;
             case 'sent':
                 statusEl.textContent = '✓ Sent';
                 statusEl.style.color = '#4caf50';
@@ -1562,6 +1799,9 @@ function updateFileStatus(fileName, status, errorMessage = null) {
                 }
                 break;
         }
+        if (label) {
+            statusEl.textContent = label;
+        }
     }
 }
 
@@ -1585,19 +1825,9 @@ function toggleErrorDetail(fileName) {
     }
 }
 
-function arrayBufferToBase64(buffer) {
-    const bytes = new Uint8Array(buffer);
-    let binary = '';
-    for (let i = 0; i < bytes.byteLength; i++) {
-        binary += String.fromCharCode(bytes[i]);
-    }
-    return window.btoa(binary);
-}
-
 // Disconnection handling
 let isReconnecting = false;
 let reconnectCountdown = null;
-let disconnectTimeout = null;
 let isDisconnected = false;
 
 // Page Visibility API - Track when tab is hidden (user picking files)
@@ -1607,15 +1837,15 @@ const MAX_FILE_PICKER_TIME = 180000; // 3 minutes max for file picking
 const DISCONNECT_DELAY_VISIBLE = 60000; // 1 minute when tab is visible (increased from 3s)
 const DISCONNECT_DELAY_HIDDEN = 60000; // 1 minute when tab is hidden (increased from 10s)
 
-function handleDisconnection(message) {
+function handleDisconnection(peer, message) {
     // If already showing disconnection, don't show again
     if (isDisconnected) {
         return;
     }
     
     // Clear any existing timeout
-    if (disconnectTimeout) {
-        clearTimeout(disconnectTimeout);
+    if (peer.disconnectTimeout) {
+        clearTimeout(peer.disconnectTimeout);
     }
     
     // Check if user is picking files (prioritize filePickerOpenTime over visibility)
@@ -1639,7 +1869,7 @@ function handleDisconnection(message) {
         delay = DISCONNECT_DELAY_VISIBLE;
     }
     
-    disconnectTimeout = setTimeout(() => {
+    peer.disconnectTimeout = setTimeout(() => {
         // Double-check if user is still picking files before disconnecting
         const currentTimeSincePicker = filePickerOpenTime ? (Date.now() - filePickerOpenTime) : 0;
         const stillPickingFiles = filePickerOpenTime && currentTimeSincePicker < MAX_FILE_PICKER_TIME;
@@ -1647,13 +1877,19 @@ function handleDisconnection(message) {
         if (stillPickingFiles) {
             // User is still picking files - cancel disconnection and wait more
             console.log('Cancelling disconnection - user still picking files');
-            disconnectTimeout = null;
+            peer.disconnectTimeout = null;
             // Schedule another check
-            handleDisconnection(message);
+            handleDisconnection(peer, message);
             return;
         }
         
-        console.log('Disconnection confirmed after delay:', message);
+        console.log('Disconnection confirmed after delay:', peer.id, message);
+        removePeer(peer, 'Connection closed before file could be sent');
+        if (peers.size > 0) {
+            // Other phones are still connected - carry on with them
+            updatePeerCount();
+            return;
+        }
         isDisconnected = true;
         
         // Clean up existing connections
@@ -1676,24 +1912,48 @@ function handleDisconnection(message) {
     }, delay);
 }
 
-function cleanupConnections() {
+/**
+ * Close the connection to `peer`, keeping its entry for a reconnect
+ */
+function closePeer(peer) {
     // Clear disconnect timeout if exists
-    if (disconnectTimeout) {
-        clearTimeout(disconnectTimeout);
-        disconnectTimeout = null;
+    if (peer.disconnectTimeout) {
+        clearTimeout(peer.disconnectTimeout);
+        peer.disconnectTimeout = null;
     }
     
     // Close peer connection
-    if (peerConnection) {
-        peerConnection.close();
-        peerConnection = null;
+    if (peer.connection) {
+        peer.connection.onconnectionstatechange = null;
+        peer.connection.close();
+        peer.connection = null;
     }
     
     // Close data channel
-    if (dataChannel) {
-        dataChannel.close();
-        dataChannel = null;
+    if (peer.channel) {
+        peer.channel.close();
+        peer.channel = null;
     }
+}
+
+/**
+ * Drop `peer` for good: its unsent files fail with `message`
+ */
+function removePeer(peer, message) {
+    if (peers.get(peer.id) === peer) {
+        peers.delete(peer.id);
+    }
+    closePeer(peer);
+    // Sends in progress see the closed channel and fail (the phone is gone, so they do not wait to resume)
+    [...peer.queue, ...peer.interrupted].forEach(item => finishPeerSend(peer, item, 'error', message));
+    peer.queue = [];
+    peer.interrupted = [];
+    updateCancelButton();
+}
+
+function cleanupConnections() {
+    // Close every phone's connection
+    peers.forEach(peer => removePeer(peer, 'Connection closed before file could be sent'));
     
     // Disconnect signaling client if using it
     if (signalingClient) {
@@ -1708,10 +1968,12 @@ function cleanupConnections() {
         socket.removeAllListeners();
     }
     
-    // Reset file sending state
+    // Reset file sending state - a new session cannot resume these
+    fileQueue.forEach(file => {
+        updateSendStatus(file, 'error', 'Connection closed before file could be sent');
+    });
     fileQueue = [];
-    isSendingFile = false;
-    shouldStopQueue = false;
+    outgoing.clear();
     if (queueProcessingTimeout) {
         clearTimeout(queueProcessingTimeout);
         queueProcessingTimeout = null;
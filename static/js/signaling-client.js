@@ -6,24 +6,32 @@
  * 
  * Usage:
  *   const signaling = new SignalingClient(signalingServerUrl, sessionId, peerType);
- *   signaling.on('peer_connected', () => { ... });
- *   signaling.sendOffer(offer);
+ *   signaling.on('peer_connected', (peerId) => { ... });
+ *   signaling.sendOffer(offer, peerId);
+ *
+ * A session has one PC and any number of phones. Each peer has a peer id
+ * ('pc' for the PC); events from a peer pass its id as their last argument,
+ * and the PC names the phone a message is for with the optional `to`.
  */
 
 class SignalingClient {
-    constructor(serverUrl, sessionId, peerType) {
+    constructor(serverUrl, sessionId, peerType, peerId = null) {
         this.serverUrl = serverUrl;
         this.sessionId = sessionId;
         this.peerType = peerType; // 'pc' or 'mobile'
+        this.peerId = peerId; // A phone's id, kept across reconnects; the server picks one if null
         this.ws = null;
         this.socket = null; // For Socket.IO
         this.useSocketIO = false;
         this.eventHandlers = {};
         this.connected = false;
+        this.features = []; // Optional protocol features announced by the server
         
         // Determine if we're using Socket.IO or WebSocket
+        // A bare path (e.g. '/ws') is the Python app's own WebSocket endpoint on this origin
         this.useSocketIO = serverUrl.includes('socket.io') || 
-                          (typeof io !== 'undefined' && !serverUrl.startsWith('ws://') && !serverUrl.startsWith('wss://'));
+                          (typeof io !== 'undefined' && !serverUrl.startsWith('ws://') && !serverUrl.startsWith('wss://') &&
+                           !serverUrl.startsWith('/'));
     }
     
     /**
@@ -58,32 +66,42 @@ class SignalingClient {
             if (this.peerType === 'pc') {
                 this.socket.emit('pc_join', { session_id: this.sessionId });
             } else {
-                this.socket.emit('mobile_join', { session_id: this.sessionId });
+                this.socket.emit('mobile_join', { session_id: this.sessionId, peer_id: this.peerId });
             }
         });
         
-        this.socket.on('peer_connected', () => {
-            this.emit('peer_connected');
+        const onReady = (data) => {
+            this.features = (data && data.features) || [];
+        };
+        this.socket.on('pc_ready', onReady);
+        this.socket.on('mobile_ready', onReady);
+        
+        this.socket.on('peer_connected', (data) => {
+            this.emit('peer_connected', data && data.peer_id);
         });
         
         this.socket.on('webrtc_offer', (data) => {
-            this.emit('webrtc_offer', data.offer);
+            this.emit('webrtc_offer', data.offer, data.from);
         });
         
         this.socket.on('webrtc_answer', (data) => {
-            this.emit('webrtc_answer', data.answer);
+            this.emit('webrtc_answer', data.answer, data.from);
         });
         
         this.socket.on('ice_candidate', (data) => {
-            this.emit('ice_candidate', data.candidate);
+            this.emit('ice_candidate', data.candidate, data.from);
+        });
+        
+        this.socket.on('ice_candidates', (data) => {
+            (data.candidates || []).forEach(candidate => this.emit('ice_candidate', candidate, data.from));
         });
         
         this.socket.on('pc_disconnected', () => {
-            this.emit('peer_disconnected', 'pc');
+            this.emit('peer_disconnected', 'pc', 'pc');
         });
         
-        this.socket.on('mobile_disconnected', () => {
-            this.emit('peer_disconnected', 'mobile');
+        this.socket.on('mobile_disconnected', (data) => {
+            this.emit('peer_disconnected', 'mobile', data && data.peer_id);
         });
         
         this.socket.on('connect_error', (error) => {
@@ -108,9 +126,12 @@ class SignalingClient {
             // Determine protocol based on current page protocol
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
             // Extract hostname and port from serverUrl or use current host
-            if (wsUrl.startsWith('http://') || wsUrl.startsWith('https://')) {
+            if (wsUrl.startsWith('/')) {
+                // Same-origin path served by app.py
+                wsUrl = `${protocol}//${window.location.host}${wsUrl}`;
+            } else if (wsUrl.startsWith('http://') || wsUrl.startsWith('https://')) {
                 const url = new URL(wsUrl);
-                wsUrl = `${protocol}//${url.host}`;
+                wsUrl = `${protocol}//${url.host}${url.pathname === '/' ? '' : url.pathname}`;
             } else {
                 // Assume it's just a hostname/port
                 wsUrl = `${protocol}//${wsUrl}`;
@@ -129,7 +150,8 @@ class SignalingClient {
             this.send({
                 type: 'join',
                 session_id: this.sessionId,
-                peer_type: this.peerType
+                peer_type: this.peerType,
+                peer_id: this.peerId || undefined
             });
             
             // Start keepalive heartbeat (send ping every 20 seconds to prevent timeout)
@@ -177,32 +199,37 @@ class SignalingClient {
         switch (data.type) {
             case 'joined':
                 console.log('Joined session:', data.session_id);
+                this.features = data.features || [];
                 this.emit('joined', data);
                 break;
                 
             case 'peer_connected':
-                console.log('Peer connected');
-                this.emit('peer_connected');
+                console.log('Peer connected:', data.peer_id);
+                this.emit('peer_connected', data.peer_id);
                 break;
                 
             case 'webrtc_offer':
-                this.emit('webrtc_offer', data.offer);
+                this.emit('webrtc_offer', data.offer, data.from);
                 break;
                 
             case 'webrtc_answer':
-                this.emit('webrtc_answer', data.answer);
+                this.emit('webrtc_answer', data.answer, data.from);
                 break;
                 
             case 'ice_candidate':
-                this.emit('ice_candidate', data.candidate);
+                this.emit('ice_candidate', data.candidate, data.from);
+                break;
+                
+            case 'ice_candidates':
+                (data.candidates || []).forEach(candidate => this.emit('ice_candidate', candidate, data.from));
                 break;
                 
             case 'pc_disconnected':
-                this.emit('peer_disconnected', 'pc');
+                this.emit('peer_disconnected', 'pc', 'pc');
                 break;
                 
             case 'mobile_disconnected':
-                this.emit('peer_disconnected', 'mobile');
+                this.emit('peer_disconnected', 'mobile', data.peer_id);
                 break;
                 
             case 'pong':
@@ -229,17 +256,26 @@ class SignalingClient {
             if (data.type === 'webrtc_offer') {
                 this.socket.emit('webrtc_offer', {
                     session_id: this.sessionId,
-                    offer: data.offer
+                    offer: data.offer,
+                    to: data.to
                 });
             } else if (data.type === 'webrtc_answer') {
                 this.socket.emit('webrtc_answer', {
                     session_id: this.sessionId,
-                    answer: data.answer
+                    answer: data.answer,
+                    to: data.to
                 });
             } else if (data.type === 'ice_candidate') {
                 this.socket.emit('ice_candidate', {
                     session_id: this.sessionId,
-                    candidate: data.candidate
+                    candidate: data.candidate,
+                    to: data.to
+                });
+            } else if (data.type === 'ice_candidates') {
+                this.socket.emit('ice_candidates', {
+                    session_id: this.sessionId,
+                    candidates: data.candidates,
+                    to: data.to
                 });
             }
         } else if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -250,35 +286,55 @@ class SignalingClient {
     }
     
     /**
-     * Send WebRTC offer
+     * Send WebRTC offer (to the phone `to`; phones' messages always go to the PC)
      */
-    sendOffer(offer) {
+    sendOffer(offer, to) {
         this.send({
             type: 'webrtc_offer',
             session_id: this.sessionId,
-            offer: offer
+            offer: offer,
+            to: to
         });
     }
     
     /**
      * Send WebRTC answer
      */
-    sendAnswer(answer) {
+    sendAnswer(answer, to) {
         this.send({
             type: 'webrtc_answer',
             session_id: this.sessionId,
-            answer: answer
+            answer: answer,
+            to: to
         });
     }
     
     /**
      * Send ICE candidate
      */
-    sendIceCandidate(candidate) {
+    sendIceCandidate(candidate, to) {
         this.send({
             type: 'ice_candidate',
             session_id: this.sessionId,
-            candidate: candidate
+            candidate: candidate,
+            to: to
+        });
+    }
+    
+    /**
+     * Send several ICE candidates in one message
+     * Falls back to one message per candidate if the server predates batching.
+     */
+    sendIceCandidates(candidates, to) {
+        if (!this.features.includes('ice_candidates')) {
+            candidates.forEach(candidate => this.sendIceCandidate(candidate, to));
+            return;
+        }
+        this.send({
+            type: 'ice_candidates',
+            session_id: this.sessionId,
+            candidates: candidates,
+            to: to
         });
     }
     
@@ -329,3 +385,40 @@ class SignalingClient {
     }
 }
 
+
+/**
+ * Coalesces trickled ICE candidates into batches
+ * 
+ * Candidates gathered within `windowMs` of the first one are handed to
+ * `flush` together; end() (gathering complete) flushes immediately, so the
+ * last batch never waits for the timer.
+ */
+class IceCandidateBatcher {
+    constructor(flush, windowMs = 10) {
+        this.onFlush = flush;
+        this.windowMs = windowMs;
+        this.pending = [];
+        this.timer = null;
+    }
+    
+    add(candidate) {
+        this.pending.push(candidate);
+        if (!this.timer) {
+            this.timer = setTimeout(() => this.flush(), this.windowMs);
+        }
+    }
+    
+    end() {
+        this.flush();
+    }
+    
+    flush() {
+        clearTimeout(this.timer);
+        this.timer = null;
+        if (this.pending.length > 0) {
+            const batch = this.pending;
+            this.pending = [];
+            this.onFlush(batch);
+        }
+    }
+}
@@ -0,0 +1,199 @@
+/**
+ * Streaming sinks for received files
+ *
+ * A sink takes a received file chunk by chunk: write(chunk) resolves once
+ * the chunk is handed on, close() finishes the file. openFileSink() picks the
+ * best sink the browser supports:
+ *
+ *   FileSystemSink      File System Access API - writes straight to the file
+ *                       the user picked (desktop Chromium)
+ *   ServiceWorkerSink   streams an ordinary download through download-sw.js
+ *                       (secure contexts with service workers)
+ *   MemorySink          collects a Blob, as before - the only option on plain
+ *                       http:// LAN pages, where neither of the above exists
+ *
+ * Only MemorySink holds the file in memory; close() returns its Blob, the
+ * streaming sinks return null.
+ */
+
+const DOWNLOAD_WORKER_URL = '/download-sw.js';
+const DOWNLOAD_PATH = '/stream-download/';
+const DOWNLOAD_WORKER_TIMEOUT = 3000; // ms to wait for the worker before using memory
+const DOWNLOAD_KEEPALIVE_INTERVAL = 10000; // ms between pings that keep the worker running
+
+let downloadWorker = null;
+
+/**
+ * Register the download service worker (idempotent)
+ * Resolves to the active worker, or null where service workers are unavailable.
+ */
+function registerDownloadWorker() {
+    if (!downloadWorker) {
+        if (window.isSecureContext && 'serviceWorker' in navigator) {
+            downloadWorker = navigator.serviceWorker.register(DOWNLOAD_WORKER_URL)
+                .then(() => navigator.serviceWorker.ready)
+                .then(registration => registration.active)
+                .catch(error => {
+                    console.warn('Download service worker unavailable:', error);
+                    return null;
+                });
+        } else {
+            downloadWorker = Promise.resolve(null);
+        }
+    }
+    return downloadWorker;
+}
+
+class FileSystemSink {
+    constructor(writable) {
+        this.writable = writable;
+    }
+
+    static async open(name) {
+        // Must run within the user's click on Accept (transient activation)
+        const handle = await window.showSaveFilePicker({ suggestedName: name });
+        return new FileSystemSink(await handle.createWritable());
+    }
+
+    write(chunk) {
+        return this.writable.write(chunk);
+    }
+
+    async close() {
+        await this.writable.close();
+        return null;
+    }
+
+    abort() {
+        return this.writable.abort().catch(() => {});
+    }
+}
+
+class ServiceWorkerSink {
+    constructor(worker, port, id, name) {
+        this.port = port;
+        this.pending = null; // {resolve, reject} of the write awaiting its ack
+        this.failed = null;
+        port.onmessage = ({ data }) => {
+            if (data.type === 'ack' && this.pending) {
+                this.pending.resolve();
+                this.pending = null;
+            } else if (data.type === 'cancelled') {
+                this.fail(new Error('Download cancelled'));
+            }
+        };
+        // The worker may be stopped while idle; messages keep it alive during the download
+        this.keepalive = setInterval(() => worker.postMessage({ type: 'keepalive' }), DOWNLOAD_KEEPALIVE_INTERVAL);
+        this.frame = document.createElement('iframe');
+        this.frame.hidden = true;
+        this.frame.src = `${DOWNLOAD_PATH}${id}/${encodeURIComponent(name)}`;
+        document.body.appendChild(this.frame);
+    }
+
+    static open(worker, name, size, type) {
+        return new Promise((resolve, reject) => {
+            const channel = new MessageChannel();
+            const id = Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+            const timeout = setTimeout(() => reject(new Error('Download worker did not respond')), DOWNLOAD_WORKER_TIMEOUT);
+            channel.port1.onmessage = ({ data }) => {
+                if (data.type === 'ready') {
+                    clearTimeout(timeout);
+                    resolve(new ServiceWorkerSink(worker, channel.port1, id, name));
+                }
+            };
+            worker.postMessage({ type: 'stream', id: id, name: name, size: size, mimeType: type }, [channel.port2]);
+        });
+    }
+
+    write(chunk) {
+        if (this.failed) {
+            return Promise.reject(this.failed);
+        }
+        return new Promise((resolve, reject) => {
+            this.pending = { resolve, reject };
+            // Hand the chunk's buffer over instead of copying it
+            this.port.postMessage({ type: 'chunk', chunk: chunk }, [chunk.buffer]);
+        });
+    }
+
+    close() {
+        this.port.postMessage({ type: 'end' });
+        this.cleanup();
+        return null;
+    }
+
+    abort() {
+        this.port.postMessage({ type: 'abort' });
+        this.cleanup();
+    }
+
+    fail(error) {
+        this.failed = error;
+        if (this.pending) {
+            this.pending.reject(error);
+            this.pending = null;
+        }
+        this.cleanup();
+    }
+
+    cleanup() {
+        clearInterval(this.keepalive);
+        // Leave the iframe long enough for the browser to take over the download
+        const frame = this.frame;
+        setTimeout(() => frame.remove(), 60000);
+    }
+}
+
+class MemorySink {
+    constructor(type) {
+        this.type = type;
+        this.chunks = [];
+    }
+
+    write(chunk) {
+        this.chunks.push(chunk);
+        return Promise.resolve();
+    }
+
+    close() {
+        const blob = new Blob(this.chunks, { type: this.type });
+        this.chunks = [];
+        return blob;
+    }
+
+    abort() {
+        this.chunks = [];
+    }
+}
+
+/**
+ * Open the best available sink for a file of `size` bytes
+ *
+ * Call it directly from a click handler: the save dialog needs the click's
+ * user activation. Rejects with an AbortError if the user cancels the dialog.
+ */
+async function openFileSink(name, size, type) {
+    if (typeof window.showSaveFilePicker === 'function') {
+        try {
+            return await FileSystemSink.open(name);
+        } catch (error) {
+            if (error.name === 'AbortError') {
+                throw error;
+            }
+            // e.g. no user activation left (Download All) - try the next sink
+            console.warn('Save dialog unavailable, falling back:', error.message);
+        }
+    }
+    const worker = await Promise.race([
+        registerDownloadWorker(),
+        new Promise(resolve => setTimeout(() => resolve(null), DOWNLOAD_WORKER_TIMEOUT))
+    ]);
+    if (worker) {
+        try {
+            return await ServiceWorkerSink.open(worker, name, size, type);
+        } catch (error) {
+            console.warn('Streaming download unavailable, receiving into memory:', error.message);
+        }
+    }
+    return new MemorySink(type);
+}
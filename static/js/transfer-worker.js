@@ -0,0 +1,53 @@
+/**
+ * Web Worker: per-chunk work for ChunkPipeline (file-transfer.js)
+ *
+ * Messages in:  {id, op, args}
+ * Messages out: {id, result} or {id, error}
+ *
+ * The operations are file-transfer.js's own functions, loaded here with
+ * importScripts, so the worker and the page-thread fallback cannot drift
+ * apart. ArrayBuffers in the results are transferred, not copied.
+ */
+
+importScripts('file-transfer.js');
+
+const operations = {
+    async pack({ blob, fileId, chunkIndex, options }) {
+        const chunk = await packChunk(blob, fileId, chunkIndex, options);
+        return [chunk, [chunk.frame]];
+    },
+
+    async unpack({ buffer, byteOffset, byteLength, compressed, crc }) {
+        const bytes = await unpackChunk(new Uint8Array(buffer, byteOffset, byteLength), compressed, crc);
+        if (!bytes) {
+            return [null, []];
+        }
+        return [{ buffer: bytes.buffer, byteOffset: bytes.byteOffset, byteLength: bytes.byteLength }, [bytes.buffer]];
+    },
+
+    async probe({ blob, name, type }) {
+        return [await worthCompressing({ name, type }, blob), []];
+    },
+
+    async crc({ blob }) {
+        return [await crc32Blob(blob), []];
+    },
+
+    async legacyMessage({ blob, fields }) {
+        return [await legacyMessage(blob, fields), []];
+    },
+
+    async base64Blob({ parts, type }) {
+        return [base64Blob(parts, type), []];
+    }
+};
+
+self.onmessage = async (event) => {
+    const { id, op, args } = event.data;
+    try {
+        const [result, transfer] = await operations[op](args);
+        self.postMessage({ id, result }, transfer);
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};
@@ -0,0 +1,306 @@
+"""
+Build-free static asset pipeline for QR File Share
+Every .js and .css file under static/ is fingerprinted with a hash of its
+content when the app starts, then minified and precompressed (gzip, plus
+brotli when the optional `brotli` package is installed) in a background
+thread, off the startup path. Templates keep calling
+url_for('static', filename=...): the URL gains ?v=<fingerprint>, and a
+request carrying the current fingerprint is cached for a year as immutable.
+Other requests (the Web Workers, which resolve their URLs relative to the
+page's script without the query) revalidate with the ETag and get a 304
+while the file is unchanged. An asset edited on disk is rebuilt on its next
+request, so the pages can be worked on without restarting the server.
+
+    assets = StaticAssets()
+    assets.init_app(app)   # ASSET_PIPELINE=0 serves the files as they are
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli  # Optional, see requirements-brotli.txt
+except ImportError:
+    brotli = None
+
+PIPELINE_VERSION = b'1'  # Bump when the minifiers' output changes, to change every fingerprint
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+logger = logging.getLogger('qrfs.assets')
+
+# JavaScript tokens the minifier must copy as they are
+_JS_NUMBER = re.compile(r'0[xXbBoO][0-9a-fA-F_]+n?|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?')
+_JS_WORD = re.compile(r'[\w$\\\u0080-\uffff]+')
+# Keywords after which a / starts a regular expression, not a division
+_JS_REGEX_AFTER_WORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                         'throw', 'case', 'do', 'else', 'yield', 'await'}
+_JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+# A line break after these, or before those, can go: no statement ends there
+_JS_JOINS_AFTER = set('{([,;=:?&|*%<>!')
+_JS_JOINS_BEFORE = set(')]},.;:?')
+_CSS_TOKEN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*.*?\*/|\s+|[^"\'/\s]+|/', re.S)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char in '_$\\' or ord(char) > 127
+
+
+def _needs_space(before, after):
+    """True if two tokens would merge into something else without a space"""
+    a, b = before[-1], after[0]
+    if _is_word_char(a) and _is_word_char(b):
+        return True
+    if a.isdigit() and b == '.':
+        return True
+    return (a == b and a in '+-') or (a == '/' and b in '/*')
+
+
+def minify_js(source):
+    """Drop the comments and the whitespace between tokens of a script
+
+    Strings, template literals and regular expressions are copied as they
+    are. One line break is kept wherever one might end a statement, so
+    automatic semicolon insertion works out the same. Names are not touched.
+    """
+    out = []
+    prev = ''  # Last token written
+    space = ''  # Whitespace seen since: '', ' ' or '\n'
+    templates = []  # Open ${...} substitutions: braces opened inside each
+    i, n = 0, len(source)
+
+    def emit(token):
+        nonlocal prev, space
+        if prev and space == '\n' and not (prev[-1] in _JS_JOINS_AFTER or token[0] in _JS_JOINS_BEFORE):
+            out.append('\n')
+        elif prev and space and _needs_space(prev, token):
+            out.append(' ')
+        out.append(token)
+        prev = token
+        space = ''
+
+    def template_part(start):
+        """Scan template text from `start`; returns the end index, past '`' or '${'"""
+        j = start
+        while j < n:
+            if source[j] == '\\':
+                j += 2
+            elif source[j] == '`':
+                return j + 1
+            elif source.startswith('${', j):
+                templates.append(0)
+                return j + 2
+            else:
+                j += 1
+        raise ValueError('Unterminated template literal')
+
+    while i < n:
+        char = source[i]
+        if char in ' \t\r\n\f\v\u00a0\u2028\u2029\ufeff':
+            if char in '\n\r\u2028\u2029':
+                space = '\n'
+            elif not space:
+                space = ' '
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end < 0:
+                raise ValueError('Unterminated comment')
+            if '\n' in source[i:end]:
+                space = '\n'
+            elif not space:
+                space = ' '
+            i = end + 2
+        elif char in '\'"':
+            j = i + 1
+            while j < n and source[j] != char:
+                if source[j] == '\n':
+                    raise ValueError('Unterminated string')
+                j += 2 if source[j] == '\\' else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif char == '`':
+            j = template_part(i + 1)
+            emit(source[i:j])
+            i = j
+        elif char == '}' and templates and templates[-1] == 0:
+            templates.pop()
+            j = template_part(i + 1)
+            emit(source[i:j])
+            i = j
+        elif char == '/' and (not prev or prev[-1] in _JS_REGEX_AFTER or prev in _JS_REGEX_AFTER_WORDS):
+            j, in_class = i + 1, False
+            while j < n and (in_class or source[j] != '/'):
+                if source[j] == '\n':
+                    raise ValueError('Unterminated regular expression')
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalpha():
+                j += 1  # Flags
+            emit(source[i:j])
+            i = j
+        else:
+            match = (char.isdigit() or (char == '.' and source[i + 1:i + 2].isdigit())) and _JS_NUMBER.match(source, i)
+            match = match or _JS_WORD.match(source, i)
+            token = match.group() if match else char
+            if templates and token == '{':
+                templates[-1] += 1
+            elif templates and token == '}':
+                templates[-1] -= 1
+            emit(token)
+            i += len(token)
+    return ''.join(out) + '\n'
+
+
+def minify_css(source):
+    """Drop the comments and the whitespace CSS does not need"""
+    out = []
+    space = False
+    for match in _CSS_TOKEN.finditer(source):
+        token = match.group()
+        if token.startswith('/*') or token.isspace():
+            space = True  # A comment separates tokens like a space
+            continue
+        if out and token.startswith('}') and out[-1].endswith(';') and out[-1][0] not in '"\'':
+            out[-1] = out[-1][:-1]  # The last declaration needs no ';'
+            if not out[-1]:
+                out.pop()
+        if space and out and out[-1][-1] not in '{};,' and token[0] not in '{};,':
+            out.append(' ')
+        space = False
+        if token[0] not in '"\'':
+            token = token.replace(';}', '}')
+        out.append(token)
+    return ''.join(out) + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+class Asset:
+    """One static file: its fingerprint now, minified and compressed variants once built"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            self.source = f.read()
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        # Of the source, so URLs need no build; the pipeline version covers minifier changes
+        self.fingerprint = hashlib.sha256(PIPELINE_VERSION + self.source).hexdigest()[:12]
+        self.bodies = None  # Content-Encoding -> bytes, only where smaller than identity
+
+    def build(self):
+        if self.bodies is not None:
+            return
+        try:
+            body = MINIFIERS[os.path.splitext(self.path)[1]](self.source.decode('utf-8')).encode('utf-8')
+        except (ValueError, UnicodeDecodeError) as error:
+            logger.warning('Serving %s unminified: %s', self.path, error)
+            body = self.source
+        bodies = {'identity': body}
+        variants = {'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=11)
+        for encoding, data in variants.items():
+            if len(data) < len(body):
+                bodies[encoding] = data
+        self.bodies = bodies
+        self.source = None
+
+
+class StaticAssets:
+    """Minified, precompressed, fingerprinted .js and .css for Flask's static route"""
+
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get('ASSET_PIPELINE', '1') != '0'
+        self.enabled = enabled
+        self.assets = {}  # 'js/mobile.js' -> Asset
+        self._lock = threading.Lock()  # Held while an asset builds
+        self._send_original = None
+
+    def init_app(self, app):
+        """Serve app's static endpoint through the pipeline; assets build in the background"""
+        self._send_original = app.view_functions['static']
+        app.view_functions['static'] = self.send
+        app.url_defaults(self._url_defaults)
+        if not self.enabled:
+            return
+        for root, _, files in os.walk(app.static_folder):
+            for name in files:
+                if os.path.splitext(name)[1] in MINIFIERS:
+                    path = os.path.join(root, name)
+                    self.assets[os.path.relpath(path, app.static_folder).replace(os.sep, '/')] = Asset(path)
+        # Off the startup path: the first request for an asset builds it if this has not yet
+        threading.Thread(target=self.build_all, name='asset-pipeline', daemon=True).start()
+
+    def build_all(self):
+        for asset in list(self.assets.values()):
+            self._build(asset)
+
+    def _build(self, asset):
+        if asset.bodies is None:
+            with self._lock:
+                asset.build()
+        return asset.bodies
+
+    def get(self, filename):
+        """The current Asset for a static filename, or None if it is not one"""
+        if not self.enabled:
+            return None
+        asset = self.assets.get(filename)
+        if asset is None:
+            return None
+        try:
+            if os.stat(asset.path).st_mtime_ns != asset.mtime:
+                asset = self.assets[filename] = Asset(asset.path)
+        except OSError:
+            return None  # Deleted: let the original view answer
+        return asset
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            asset = self.get(values.get('filename'))
+            if asset is not None:
+                values['v'] = asset.fingerprint
+
+    @staticmethod
+    def _encoding(bodies):
+        """The smallest variant the client accepts"""
+        for encoding in ('br', 'gzip'):
+            if encoding in bodies and request.accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+    def send(self, filename):
+        """View for /static/<filename>"""
+        asset = self.get(filename)
+        if asset is None:
+            return self._send_original(filename=filename)
+        bodies = self._build(asset)
+        encoding = self._encoding(bodies)
+        response = Response(bodies[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(f'{asset.fingerprint}-{encoding}')
+        # A stale ?v (a page cached from before an update) still gets the current file, uncached
+        response.headers['Cache-Control'] = IMMUTABLE if request.args.get('v') == asset.fingerprint else REVALIDATE
+        return response.make_conditional(request)
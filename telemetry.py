@@ -0,0 +1,278 @@
+"""
+Metrics and logging for QR File Share
+Minimal Prometheus-style counters, gauges and histograms rendered in the text
+exposition format for GET /metrics, plus leveled logging with a rate limit so
+per-connection messages cannot flood the console under load. Standard library
+only; each worker reports its own numbers, except the session gauges, which
+read the session store (shared by every worker with REDIS_URL set).
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Socket.IO handlers are sub-millisecond when healthy; the tail shows queueing
+EVENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# A QR render is dominated by qrcode's mask search (tens of ms)
+QR_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    """Base for a metric family with optional labels"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Child metric for one label combination (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def __getattr__(self, attr):
+        # Unlabelled metrics forward inc()/set()/observe() to their only child
+        if attr.startswith('_') or self.__dict__.get('labelnames', True):
+            raise AttributeError(attr)
+        return getattr(self._children[()], attr)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _sample_lines(self, values, child):
+        yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Compute the value at scrape time instead of tracking it"""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _sample_lines(self, values, child):
+        yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}'
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=EVENT_BUCKETS, registry=None):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def _sample_lines(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (math.inf,), counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+            yield f'{self.name}_bucket{le} {cumulative}'
+        labels = _format_labels(self.labelnames, values)
+        yield f'{self.name}_sum{labels} {_format_value(total)}'
+        yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    """Set of metric families rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:  # A failing gauge callback must not break the scrape
+                logger.warning('Could not collect %s: %s', metric.name, e)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Application metrics
+SESSIONS_ACTIVE = Gauge('qrfs_sessions_active', 'Sessions in the session store (all workers when shared via Redis)')
+SESSIONS_PAIRED = Gauge('qrfs_sessions_paired',
+                        'Sessions with both PC and mobile connected (all workers when shared via Redis)')
+CONNECTS = Counter('qrfs_socket_connects_total', 'Socket.IO connections accepted')
+DISCONNECTS = Counter('qrfs_socket_disconnects_total', 'Socket.IO connections closed')
+SESSIONS_CREATED = Counter('qrfs_sessions_created_total', 'Sessions created by /api/generate-session')
+QR_RENDER_SECONDS = Histogram('qrfs_qr_render_seconds', 'Time to render a QR code PNG',
+                              buckets=QR_BUCKETS)
+EVENT_SECONDS = Histogram('qrfs_socketio_event_seconds', 'Socket.IO event handler latency, including emits',
+                          labelnames=('event',))
+EVENT_EMITS = Counter('qrfs_socketio_event_emits_total',
+                      'Messages emitted while handling an event (relay fan-out)', labelnames=('event',))
+
+
+def observe_event(event, emits, seconds):
+    """Record one handled Socket.IO event: latency and how many emits it fanned out to"""
+    EVENT_SECONDS.labels(event).observe(seconds)
+    if emits:
+        EVENT_EMITS.labels(event).inc(emits)
+
+
+# Logging
+
+logger = logging.getLogger('qrfs')
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message template: `burst` at once, then `rate` per second
+
+    Dropped records are counted and reported on the next one that gets through.
+    Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate=5.0, burst=20, max_level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self._buckets = {}  # (logger, template) -> [tokens, last_time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 1000:
+                    self._buckets.clear()  # Bound memory if templates are not constant
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        return True
+
+
+def configure_logging(level='INFO'):
+    """Send 'qrfs.*' logs to stderr at `level`, rate-limited (idempotent)"""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S'))
+    handler.addFilter(RateLimitFilter())
+    logger.addHandler(handler)
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    logger.propagate = False
@@ -0,0 +1,119 @@
+"""
+JSON-over-WebSocket signaling for QR File Share
+Serves the protocol of signaling-server/server.js (join, webrtc_offer,
+webrtc_answer, ice_candidate, ice_candidates, ping) from the Python app, on top of the same
+SignalingHandlers and session store as Socket.IO. Point clients at it with
+SIGNALING_SERVER_URL=/ws (same origin) or wss://host/ws.
+
+The protocol logic here is transport-agnostic: receive() turns one client
+message into a list of (sid, text) deliveries, and app.py (threading) and
+asgi_app.py (asyncio) do the actual socket I/O. Rooms are local to this
+process, so both peers of a session must reach the same worker.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+
+import telemetry
+from signaling import JoinRoom, emit_count
+
+logger = logging.getLogger('qrfs.ws')
+
+# Relay messages and the payload field each one requires (mirrors server.js)
+RELAYS = {
+    'webrtc_offer': 'offer',
+    'webrtc_answer': 'answer',
+    'ice_candidate': None,
+    'ice_candidates': 'candidates',
+}
+
+
+def _message(message_type, data=None):
+    return json.dumps({'type': message_type, **(data or {})})
+
+
+class WebSocketSignaling:
+    """Connection and room bookkeeping for the JSON WebSocket protocol"""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._rooms = {}  # room (a session, or one peer of it) -> set of sids
+        self._memberships = {}  # sid -> set of rooms
+
+    def open(self):
+        """Register a new connection; returns its sid"""
+        sid = f'ws-{uuid.uuid4().hex}'
+        with self._lock:
+            self._connections.add(sid)
+        telemetry.CONNECTS.inc()
+        self._run('connect', sid)
+        return sid
+
+    def close(self, sid):
+        """Forget a closed connection; returns deliveries for the remaining peer"""
+        telemetry.DISCONNECTS.inc()
+        deliveries = self._run('disconnect', sid)
+        with self._lock:
+            self._connections.discard(sid)
+            for session_id in self._memberships.pop(sid, ()):
+                room = self._rooms.get(session_id)
+                if room is not None:
+                    room.discard(sid)
+                    if not room:
+                        del self._rooms[session_id]
+        return deliveries
+
+    def receive(self, sid, text):
+        """Handle one client message; returns [(sid, text)] to send"""
+        try:
+            data = json.loads(text)
+            message_type = data.get('type')
+        except (ValueError, TypeError, AttributeError):  # Not JSON, no text at all, or not an object
+            return [(sid, _message('error', {'message': 'Invalid message format'}))]
+
+        if message_type == 'ping':
+            return [(sid, _message('pong'))]
+        if message_type == 'join':
+            return self._run('join', sid, data)
+        if message_type in RELAYS:
+            field = RELAYS[message_type]
+            session_id = data.get('session_id')
+            value = data.get(field) if field else None
+            # A candidate batch must be a list; other payloads must be present
+            invalid = not isinstance(value, list) if field == 'candidates' else field and not value
+            if not session_id or invalid:
+                missing = f'session_id or {field}' if field else 'session_id'
+                return [(sid, _message('error', {'message': f'Missing {missing}'}))]
+            if session_id not in self.handlers.sessions:
+                return [(sid, _message('error', {'message': 'Session not found'}))]
+            return self._run(message_type, sid, data)
+
+        logger.warning('Unknown message type: %s', message_type)
+        return []
+
+    def _run(self, event, sid, *args):
+        """Call a signaling handler and resolve its actions to deliveries"""
+        start = time.perf_counter()
+        actions = getattr(self.handlers, event)(sid, *args)
+        deliveries = []
+        with self._lock:
+            for action in actions:
+                if isinstance(action, JoinRoom):
+                    self._rooms.setdefault(action.room, set()).add(action.sid)
+                    self._memberships.setdefault(action.sid, set()).add(action.room)
+                    continue
+                text = _message(action.event, action.data)
+                if action.to in self._rooms:
+                    targets = self._rooms[action.to]
+                elif action.to in self._connections:
+                    targets = (action.to,)
+                else:
+                    targets = ()
+                deliveries.extend((target, text) for target in targets if target != action.skip_sid)
+        telemetry.observe_event(f'ws_{event}', emit_count(actions), time.perf_counter() - start)
+        return deliveries